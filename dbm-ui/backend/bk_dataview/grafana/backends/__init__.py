@@ -19,8 +19,8 @@ class BaseHandler:
         """处理用户"""
         raise NotImplementedError(".handle_org() must be overridden.")
 
-    def handle_datasources(self, request, org_name: str, org_id: int, ds_list: int):
-        """批量处理datasources"""
+    def handle_datasources(self, request, org_name: str, org_id: int, ds_list: int) -> bool:
+        """批量处理datasources，返回是否全部处理成功"""
         raise NotImplementedError(".handle_datasources() must be overridden.")
 
     def handle_dashboards(self, request, org_name: str, org_id: int, db_list):
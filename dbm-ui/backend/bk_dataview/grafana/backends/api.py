@@ -28,10 +28,11 @@ class APIHandler(BaseHandler):
     def handle_org(self, request, org_name: str, username: str):
         pass
 
-    def handle_datasources(self, request, org_name: str, org_id: int, ds_list: List[DataSource]):
-        """API不能批量处理多个数据源"""
+    def handle_datasources(self, request, org_name: str, org_id: int, ds_list: List[DataSource]) -> bool:
+        """API不能批量处理多个数据源，返回是否全部处理成功"""
         _ORG_DATASOURCES_CACHE.setdefault(org_name, {})
 
+        success = True
         for ds in ds_list:
             if ds.name in _ORG_DATASOURCES_CACHE[org_name]:
                 continue
@@ -44,19 +45,22 @@ class APIHandler(BaseHandler):
                 if resp.status_code == 200:
                     _ORG_DATASOURCES_CACHE[org_name][ds.name] = ds
                     logger.info("update provision datasource success, %s", resp)
-                    return
+                    continue
 
             # https://github.com/grafana/grafana/issues/53934
             if resp.status_code in [403, 404]:
                 resp = client.create_datasource(org_id, ds)
-                # 412 code 代表已经存在
-                if resp.status_code == 200:
+                # 412 code 代表已经存在，同样视为注入成功
+                if resp.status_code in [200, 412]:
                     _ORG_DATASOURCES_CACHE[org_name][ds.name] = ds
-                else:
-                    logger.error(asdict(ds))
-                    logger.error("create provision datasource failed, %s", resp)
+                    logger.info("create provision datasource success, %s", resp)
+                    continue
+
+            logger.error(asdict(ds))
+            logger.error("provision datasource failed, %s", resp)
+            success = False
 
-                logger.info("create provision datasource success, %s", resp)
+        return success
 
     def handle_dashboards(self, request, org_name: str, org_id: int, db_list):
         pass
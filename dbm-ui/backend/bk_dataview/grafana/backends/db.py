@@ -21,7 +21,7 @@ class DBHandler(BaseHandler):
     def handle_org(self, request, org_name: str, username: str):
         pass
 
-    def handle_datasources(self, request, org_name: str, org_id: int, ds_list: int):
+    def handle_datasources(self, request, org_name: str, org_id: int, ds_list: int) -> bool:
         created = list(
             models.DataSource.objects.filter(org_id=org_id, name__in=[ds.name for ds in ds_list]).values_list(
                 "name", flat=True
@@ -48,6 +48,7 @@ class DBHandler(BaseHandler):
 
         if len(want_create) > 0:
             models.DataSource.objects.bulk_create(want_create)
+        return True
 
     def handle_dashboards(self, request, org_name: str, org_id: int):
         pass
@@ -11,3 +11,23 @@ specific language governing permissions and limitations under the License.
 
 DEFAULT_ORG_ID = 1
 DEFAULT_ORG_NAME = "dbm"
+
+# 用户、org等grafana元数据的共享缓存(多个worker共用)
+GRAFANA_CACHE_TTL = 60 * 60
+GRAFANA_USER_CACHE_KEY = "grafana_user:{username}"
+GRAFANA_ORG_CACHE_KEY = "grafana_org_id:{org_name}"
+GRAFANA_ORG_NAME_CACHE_KEY = "grafana_org_name:{org_id}"
+GRAFANA_ORG_USER_CACHE_KEY = "grafana_org_user:{org_id}:{username}"
+
+# 数据源、面板注入：按(org, 配置版本)只注入一次，配置变更后通过更新代际使标记失效
+GRAFANA_PROVISION_GENERATION_KEY = "grafana_provision_generation"
+GRAFANA_PROVISIONED_KEY = "grafana_provisioned:{org_name}:{version}"
+GRAFANA_PROVISION_LOCK_KEY = "grafana_provision_lock:{org_name}"
+# 注入标记的有效期，过期后重新注入一次，兜底grafana侧的数据丢失
+GRAFANA_PROVISIONED_TTL = 24 * 60 * 60
+GRAFANA_PROVISION_LOCK_TTL = 5 * 60
+# 注入未全部成功时的标记有效期，到期后重试注入
+GRAFANA_PROVISION_RETRY_TTL = 60
+
+# 非html响应流式透传时的分块大小
+GRAFANA_STREAM_CHUNK_SIZE = 64 * 1024
@@ -12,17 +12,22 @@ import glob
 import json
 import logging
 import os.path
+import uuid
 from dataclasses import dataclass
+from functools import lru_cache
 from json import JSONDecodeError
 from typing import Dict, List, Optional
 
 import yaml
+from django.core.cache import cache
 
 from backend import env
 from backend.components import BKLogApi
 from backend.configuration.constants import SystemSettingsEnum
 from backend.configuration.models import SystemSettings
+from backend.utils.md5 import count_md5
 
+from .constants import GRAFANA_PROVISION_GENERATION_KEY
 from .settings import grafana_settings
 from .utils import os_env
 
@@ -58,6 +63,41 @@ class Dashboard:
     overwrite: bool = True
 
 
+# 影响注入内容的系统配置，变更时需要重新注入
+PROVISIONING_SETTINGS = [SystemSettingsEnum.BKM_DBM_TOKEN.value, SystemSettingsEnum.BKM_DBM_REPORT.value]
+
+
+@lru_cache(maxsize=1)
+def provisioning_files_fingerprint() -> str:
+    """注入配置文件的指纹，配置文件只会随部署变更，进程内计算一次即可"""
+    if not grafana_settings.PROVISIONING_PATH:
+        return ""
+
+    files = []
+    for root, __, file_names in os.walk(grafana_settings.PROVISIONING_PATH):
+        for file_name in file_names:
+            if file_name.rsplit(".", 1)[-1] in ["yaml", "yml", "json"]:
+                stat = os.stat(os.path.join(root, file_name))
+                files.append(f"{os.path.join(root, file_name)}:{stat.st_mtime}:{stat.st_size}")
+    return count_md5(sorted(files))
+
+
+def provisioning_version() -> str:
+    """注入配置的版本，由配置文件指纹和系统配置的代际组成"""
+    generation = cache.get(GRAFANA_PROVISION_GENERATION_KEY) or "0"
+    return count_md5(f"{provisioning_files_fingerprint()}:{generation}")
+
+
+def invalidate_provisioning(sender=None, instance=None, **kwargs):
+    """
+    使已注入的标记失效，下次请求时重新注入数据源和面板
+    可直接调用，也作为SystemSettings的post_save信号处理函数
+    """
+    if instance is not None and instance.key not in PROVISIONING_SETTINGS:
+        return
+    cache.set(GRAFANA_PROVISION_GENERATION_KEY, uuid.uuid1().hex, timeout=None)
+
+
 class BaseProvisioning:
     def datasources(self, request, org_name: str, org_id: int) -> List[Datasource]:
         raise NotImplementedError(".datasources() must be overridden.")
@@ -65,7 +65,10 @@ def requests_curl_log(resp, *args, **kwargs):
 
             curl_req += " -H '{k}: {v}'".format(k=key, v=value)
 
-    if resp.headers.get("Content-Type").startswith("application/json"):
+    if kwargs.get("stream"):
+        # 流式响应不能在hook中读取内容，否则会提前缓冲整个响应体
+        resp_text = f"<streamed> (Content-Length: {resp.headers.get('Content-Length', '-')})"
+    elif resp.headers.get("Content-Type", "").startswith("application/json"):
         resp_text = resp.content
     else:
         resp_text = f"Bin...(total {len(resp.content)} Bytes)"
@@ -14,7 +14,8 @@ from urllib import parse
 
 import requests
 from django.conf import settings
-from django.http import Http404, HttpResponse, HttpResponseRedirect
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
 from django.utils.decorators import method_decorator
 from django.utils.encoding import smart_str
 from django.utils.translation import gettext_lazy as _
@@ -31,9 +32,23 @@ from backend.iam_app.dataclass.actions import ActionEnum
 from backend.iam_app.handlers.drf_perm.base import IAMPermission
 
 from . import client
-from .constants import DEFAULT_ORG_ID, DEFAULT_ORG_NAME
+from .constants import (
+    DEFAULT_ORG_ID,
+    DEFAULT_ORG_NAME,
+    GRAFANA_CACHE_TTL,
+    GRAFANA_ORG_CACHE_KEY,
+    GRAFANA_ORG_NAME_CACHE_KEY,
+    GRAFANA_ORG_USER_CACHE_KEY,
+    GRAFANA_PROVISION_LOCK_KEY,
+    GRAFANA_PROVISION_LOCK_TTL,
+    GRAFANA_PROVISION_RETRY_TTL,
+    GRAFANA_PROVISIONED_KEY,
+    GRAFANA_PROVISIONED_TTL,
+    GRAFANA_STREAM_CHUNK_SIZE,
+    GRAFANA_USER_CACHE_KEY,
+)
 from .promsql import extract_condition_from_promql
-from .provisioning import Dashboard, Datasource
+from .provisioning import Dashboard, Datasource, provisioning_version
 from .settings import grafana_settings
 from .utils import requests_curl_log
 
@@ -42,12 +57,6 @@ rpool = requests.Session()
 logger = logging.getLogger(__name__)
 
 CACHE_HEADERS = ["Cache-Control", "Expires", "Pragma", "Last-Modified"]
-# 缓存配置
-_USER_CACHE = {}
-_ORG_CACHE = {}
-_ORG_CACHE_REVERSE = {}
-_ORG_DASHBOARDS_CACHE = {}
-_ORG_USERS = {}
 
 
 class ForbiddenError(Exception):
@@ -113,16 +122,40 @@ class ProxyBaseView(View):
         return org_id
 
     def perform_provisioning(self, request):
-        """默认的数据源, 面板注入"""
+        """
+        默认的数据源, 面板注入
+        每个(org, 配置版本)只注入一次，注入完成后写入共享的标记；配置变更时通过provisioning.invalidate_provisioning使标记失效
+        其他worker正在注入时不等待，直接处理请求，避免阻塞请求线程
+        """
         if len(self.provisioning_classes) == 0:
-            logger.warning("perform_provisioning: provisioning_classes len is  %s", len(self.provisioning_classes))
             return
 
-        logger.warning("perform_provisioning: %s", self.provisioning_classes)
         org_name = request.org_name
+        provisioned_key = GRAFANA_PROVISIONED_KEY.format(org_name=org_name, version=provisioning_version())
+        lock_key = GRAFANA_PROVISION_LOCK_KEY.format(org_name=org_name)
+        if cache.get(provisioned_key):
+            return
+
+        # 多个worker同时发现未注入时，只由一个worker执行注入
+        if not cache.add(lock_key, 1, timeout=GRAFANA_PROVISION_LOCK_TTL):
+            logger.info("perform_provisioning: org %s is provisioning by other worker, skip", org_name)
+            return
+
+        success = False
+        try:
+            logger.info("perform_provisioning: %s, org: %s", self.provisioning_classes, org_name)
+            success = self._provision(request, org_name)
+        finally:
+            # 只有数据源和面板全部注入成功才写入长期标记，否则写入短期标记，到期后重试
+            cache.set(provisioned_key, 1, timeout=GRAFANA_PROVISIONED_TTL if success else GRAFANA_PROVISION_RETRY_TTL)
+            cache.delete(lock_key)
+
+    def _provision(self, request, org_name: str) -> bool:
+        """注入数据源和面板，返回是否全部注入成功"""
         # 默认-1, 和 grafana保持一致
-        org_id = _ORG_CACHE.get(org_name, -1)
+        org_id = cache.get(GRAFANA_ORG_CACHE_KEY.format(org_name=org_name), -1)
 
+        success = True
         for provisioning_cls in self.provisioning_classes:
             provisioning = provisioning_cls()
 
@@ -133,7 +166,7 @@ class ProxyBaseView(View):
                     if not isinstance(ds, Datasource):
                         raise ValueError("%s is not instance %s" % (type(ds), Datasource))
                     logger.info(f"create datasource monitor for grafana. {ds}")
-                    self.handler.handle_datasources(request, org_name, org_id, [ds])
+                    success = self.handler.handle_datasources(request, org_name, org_id, [ds]) and success
             else:
                 logger.error("skip datasource init for grafana, please set BKM_DBM_TOKEN in database")
 
@@ -142,59 +175,53 @@ class ProxyBaseView(View):
                 if not isinstance(db, Dashboard):
                     raise ValueError("%s is not instance %s" % (type(db), Dashboard))
 
-                self.provision_dashboard(request, org_name, org_id, db)
+                success = self.provision_dashboard(request, org_name, org_id, db) and success
+
+        return success
 
     def provision_user(self, request, username: str):
         """注入用户"""
-        if username in _USER_CACHE:
-            return _USER_CACHE[username]
+        user_cache_key = GRAFANA_USER_CACHE_KEY.format(username=username)
+        _user = cache.get(user_cache_key)
+        if _user:
+            return _user
 
         resp = client.get_user_by_login_or_email(username)
         if resp.status_code == 200:
             _user = resp.json()
-            _USER_CACHE[username] = _user
+            cache.set(user_cache_key, _user, timeout=GRAFANA_CACHE_TTL)
             return _user
 
         if resp.status_code == 404:
             resp = client.create_user(username)
             _user = resp.json()
-            _USER_CACHE[username] = _user
+            cache.set(user_cache_key, _user, timeout=GRAFANA_CACHE_TTL)
             return _user
 
     def provision_org(self, org_name: str, username: str):
         """注入org"""
-        if org_name in _ORG_CACHE:
-            org_id = _ORG_CACHE[org_name]
-        else:
-            org_id = self._get_org_id(org_name)
+        org_id = cache.get(GRAFANA_ORG_CACHE_KEY.format(org_name=org_name)) or self._get_org_id(org_name)
 
-        if username in _ORG_USERS.get(org_id, []):
+        if cache.get(GRAFANA_ORG_USER_CACHE_KEY.format(org_id=org_id, username=username)):
             return org_id
 
         resp = client.get_org_users(org_id)
-        _ORG_USERS[org_id] = set()
-        for i in resp.json():
-            _ORG_USERS[org_id].add(i["login"])
-            if i["login"] == username:
-                break
-        else:
+        org_users = [i["login"] for i in resp.json()]
+        if username not in org_users:
             resp = client.add_user_to_org(org_id, username)
             if resp.status_code != 200:
                 logger.error("add_user_to_org(%s, %s)", org_id, username, resp.content)
                 raise ForbiddenError()
+            org_users.append(username)
 
-        _ORG_USERS[org_id].add(username)
-        _ORG_CACHE[org_name] = org_id
-        _ORG_CACHE_REVERSE[org_id] = org_name
+        cache_data = {GRAFANA_ORG_USER_CACHE_KEY.format(org_id=org_id, username=login): 1 for login in org_users}
+        cache_data[GRAFANA_ORG_CACHE_KEY.format(org_name=org_name)] = org_id
+        cache_data[GRAFANA_ORG_NAME_CACHE_KEY.format(org_id=org_id)] = org_name
+        cache.set_many(cache_data, timeout=GRAFANA_CACHE_TTL)
         return org_id
 
-    def provision_dashboard(self, request, org_name: str, org_id: int, db: Dashboard):
-        """注入面板"""
-        _ORG_DASHBOARDS_CACHE.setdefault(org_name, {})
-
-        if db.title in _ORG_DASHBOARDS_CACHE[org_name]:
-            return
-
+    def provision_dashboard(self, request, org_name: str, org_id: int, db: Dashboard) -> bool:
+        """注入面板，是否需要注入由perform_provisioning的注入标记控制，返回是否注入成功"""
         resp = client.update_dashboard(org_id, 0, db.dashboard)
         if resp.status_code == 200:
             dash = resp.json()
@@ -202,7 +229,7 @@ class ProxyBaseView(View):
             tags = db.dashboard["tags"]
             if not tags:
                 logger.error("provision dashboard skipped for empty tags: %s", tags)
-                return
+                return True
 
             # 支持多个仪表盘
             cluster_types = []
@@ -226,10 +253,11 @@ class ProxyBaseView(View):
                     cluster_type=cluster_type,
                     view=view,
                 )
-            _ORG_DASHBOARDS_CACHE[org_name][db.title] = resp.json()
             # logger.info("provision dashboard success, %s", resp)
-        else:
-            logger.info("provision dashboard error, %s", resp.content)
+            return True
+
+        logger.error("provision dashboard error, %s", resp.content)
+        return False
 
     def _get_org_id(self, org_name):
         resp = client.get_organization_by_name(org_name)
@@ -249,8 +277,10 @@ class ProxyBaseView(View):
         """
         根据org_id获取org_name
         """
-        if org_id in _ORG_CACHE_REVERSE:
-            return _ORG_CACHE_REVERSE[org_id]
+        org_name_cache_key = GRAFANA_ORG_NAME_CACHE_KEY.format(org_id=org_id)
+        org_name = cache.get(org_name_cache_key)
+        if org_name:
+            return org_name
 
         resp = client.get_organization_by_id(org_id)
         if resp.status_code != 200:
@@ -261,7 +291,7 @@ class ProxyBaseView(View):
             raise Http404
 
         _org = resp.json()
-        _ORG_CACHE_REVERSE[org_id] = _org["name"]
+        cache.set(org_name_cache_key, _org["name"], timeout=GRAFANA_CACHE_TTL)
         return _org["name"]
 
     def get_request_headers(self, request):
@@ -270,7 +300,7 @@ class ProxyBaseView(View):
             "X-WEBAUTH-USER": request.user.username,
         }
 
-        org_id = _ORG_CACHE.get(request.org_name)
+        org_id = cache.get(GRAFANA_ORG_CACHE_KEY.format(org_name=request.org_name))
         if org_id:
             headers["X-Grafana-Org-Id"] = str(org_id)
         return headers
@@ -332,12 +362,24 @@ class ProxyBaseView(View):
         return proxy_response
 
     def get_django_response(self, proxy_response):
-        """"""
+        """html需要注入控制代码，读取完整内容后返回；其余响应(静态资源、查询结果等)直接流式透传"""
         content_type = proxy_response.headers.get("Content-Type", "")
 
-        content = self.update_response(proxy_response, proxy_response.content)
+        if "text/html" in content_type:
+            content = self.update_response(proxy_response, proxy_response.content)
+            response = HttpResponse(content, status=proxy_response.status_code, content_type=content_type)
+        else:
+
+            def stream_content():
+                try:
+                    yield from proxy_response.iter_content(chunk_size=GRAFANA_STREAM_CHUNK_SIZE)
+                finally:
+                    proxy_response.close()
+
+            response = StreamingHttpResponse(
+                stream_content(), status=proxy_response.status_code, content_type=content_type
+            )
 
-        response = HttpResponse(content, status=proxy_response.status_code, content_type=content_type)
         for header in CACHE_HEADERS:
             value = proxy_response.headers.get(header)
             if value:
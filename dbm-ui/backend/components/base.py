@@ -13,6 +13,7 @@ import json
 import logging
 import os.path
 import sys
+import threading
 import time
 from typing import Any, Callable, Dict, List
 from urllib import parse
@@ -23,7 +24,9 @@ from django.core.cache import cache
 from django.core.handlers.wsgi import WSGIRequest
 from django.utils import translation
 from django.utils.translation import ugettext as _
+from requests import adapters
 from urllib3.exceptions import ConnectTimeoutError
+from urllib3.util.retry import Retry
 
 from backend import env
 from backend.components.constants import CLIENT_CRT_PATH, SSL_KEY, SSLEnum
@@ -39,6 +42,68 @@ logger = logging.getLogger("root")
 # TODO 整体复杂度较高，待优化降低复杂度和提高可读性
 
 
+class DataAPITransport(object):
+    """
+    DataAPI 进程内共享的连接池，按后端host复用 HTTPAdapter，保持与 ESB/APIGW 等后端的长连接。
+    session 仍然每次请求新建，只挂载共享的 adapter，因此用户的鉴权 headers 和 cookies 不会在请求间泄露
+    """
+
+    _adapters: Dict[str, adapters.HTTPAdapter] = {}
+    _lock = threading.Lock()
+    _pid = os.getpid()
+
+    @classmethod
+    def _new_adapter(cls) -> adapters.HTTPAdapter:
+        # 只对建立连接失败进行重试，此时请求未发出，对非幂等请求也是安全的。读超时交由 DataAPI 自身的重试处理
+        retry = Retry(total=env.DATA_API_POOL_MAX_RETRIES, connect=env.DATA_API_POOL_MAX_RETRIES, read=0, status=0)
+        return adapters.HTTPAdapter(
+            pool_connections=env.DATA_API_POOL_CONNECTIONS, pool_maxsize=env.DATA_API_POOL_MAXSIZE, max_retries=retry
+        )
+
+    @classmethod
+    def get_adapter(cls, url: str) -> adapters.HTTPAdapter:
+        """获取后端host对应的 adapter，不存在则创建"""
+        host = parse.urlparse(url).netloc
+        with cls._lock:
+            # fork 出的子进程不能复用父进程的连接，需要重建连接池
+            if cls._pid != os.getpid():
+                cls._adapters, cls._pid = {}, os.getpid()
+
+            adapter = cls._adapters.get(host)
+            if adapter is None:
+                adapter = cls._adapters[host] = cls._new_adapter()
+        return adapter
+
+    @classmethod
+    def mount(cls, session: requests.Session, url: str):
+        """为 session 挂载共享的 adapter"""
+        parsed_url = parse.urlparse(url)
+        session.mount(f"{parsed_url.scheme}://{parsed_url.netloc}", cls.get_adapter(url))
+        if not env.DATA_API_POOL_KEEP_ALIVE:
+            session.headers.update({"Connection": "close"})
+
+    @classmethod
+    def stats(cls) -> Dict[str, Dict[str, int]]:
+        """
+        连接池命中统计，key 为后端 host
+        requests 为请求总数，miss 为新建连接的次数，hit 为复用已有长连接的次数
+        """
+        stats: Dict[str, Dict[str, int]] = {}
+        with cls._lock:
+            host_adapters = list(cls._adapters.items())
+        for host, adapter in host_adapters:
+            stat = stats[host] = {"requests": 0, "hit": 0, "miss": 0}
+            pools = adapter.poolmanager.pools
+            for pool in filter(None, [pools.get(key) for key in pools.keys()]):
+                stat["requests"] += pool.num_requests
+                stat["miss"] += pool.num_connections
+            if not env.DATA_API_POOL_KEEP_ALIVE:
+                # 关闭长连接时每个请求都会重新建连，而池中连接对象的重连不计入新建次数
+                stat["miss"] = stat["requests"]
+            stat["hit"] = max(stat["requests"] - stat["miss"], 0)
+        return stats
+
+
 class DataResponse(object):
     """response for data api request"""
 
@@ -459,6 +524,8 @@ class DataAPI(object):
         @return: requests response
         """
         session = requests.session()
+        url = self.build_actual_url(params)
+        DataAPITransport.mount(session, url)
         try:
             local_request = local.request
         except AppBaseException:
@@ -467,7 +534,6 @@ class DataAPI(object):
         self._set_session_headers(session, local_request, headers, params, use_admin=use_admin)
         self._set_session_cookies(session, local_request, use_admin=use_admin)
 
-        url = self.build_actual_url(params)
         non_file_data, file_data = self._split_file_data(params)
         request_method = self.method.upper()
 
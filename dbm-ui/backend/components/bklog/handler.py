@@ -12,10 +12,11 @@ specific language governing permissions and limitations under the License.
 import json
 import logging
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, Generator, List, Tuple
 
 from backend import env
 from backend.components import BKLogApi
+from backend.components.constants import BKLOG_MAX_RESULT_WINDOW, BKLOG_SCROLL_PAGE_SIZE
 from backend.utils.string import pascal_to_snake
 from backend.utils.time import datetime2str
 
@@ -66,3 +67,121 @@ class BKLogHandler(object):
             backup_logs.append({pascal_to_snake(key): value for key, value in raw_log.items()})
 
         return backup_logs
+
+
+class BKLogScroll(object):
+    """
+    流式拉取采集项在时间范围内的全部日志
+    窗口内的日志在ES最大翻页范围内逐页拉取，超出时将窗口二分后分别拉取；
+    窗口按dtEventTimeStamp(毫秒)左闭右开切分，子窗口之间不重不漏；
+    窗口无法再切分(不足1毫秒)时只能拉取到前BKLOG_MAX_RESULT_WINDOW条，此时记录截断信息
+    """
+
+    SORT_LIST = [["dtEventTimeStamp", "asc"], ["gseIndex", "asc"], ["iterationIndex", "asc"]]
+
+    def __init__(
+        self,
+        collector: str,
+        start_time: datetime,
+        end_time: datetime,
+        query_string: str = "*",
+        page_size: int = BKLOG_SCROLL_PAGE_SIZE,
+    ):
+        """
+        @param collector: 采集项名称
+        @param start_time: 开始时间
+        @param end_time: 结束时间(包含该秒内的日志)
+        @param query_string: 过滤条件
+        @param page_size: 每页条数
+        """
+        self.collector = collector
+        self.start_time = start_time.replace(microsecond=0)
+        self.end_time = end_time.replace(microsecond=0)
+        self.query_string = query_string
+        self.page_size = min(page_size, BKLOG_MAX_RESULT_WINDOW)
+        # 拉取的日志条数、查询次数和被截断的窗口(开始时间，结束时间，命中条数)
+        self.count = 0
+        self.queries = 0
+        self.truncated_windows: List[Tuple[datetime, datetime, int]] = []
+
+    @property
+    def truncated(self) -> bool:
+        return bool(self.truncated_windows)
+
+    @staticmethod
+    def _hits_total(hits: Dict) -> Tuple[int, bool]:
+        """解析命中总数，返回(总数，是否为下限值)"""
+        total = hits.get("total", 0)
+        if isinstance(total, dict):
+            return total.get("value", 0), total.get("relation", "eq") != "eq"
+        return total, False
+
+    @staticmethod
+    def _to_millis(o_datetime: datetime) -> int:
+        return int(o_datetime.timestamp()) * 1000 + o_datetime.microsecond // 1000
+
+    def _to_datetime(self, millis: int) -> datetime:
+        return datetime.fromtimestamp(millis / 1000, tz=self.start_time.tzinfo)
+
+    def _search(self, start_ms: int, end_ms: int, start: int, size: int) -> Dict:
+        """
+        查询[start_ms, end_ms)窗口内的日志
+        日志平台的查询时间只精确到秒，这里将其放宽到覆盖窗口的整秒，再通过dtEventTimeStamp的左闭右开区间精确过滤
+        """
+        self.queries += 1
+        resp = BKLogApi.esquery_search(
+            {
+                "indices": f"{env.DBA_APP_BK_BIZ_ID}_bklog.{self.collector}",
+                "start_time": datetime2str(self._to_datetime(start_ms // 1000 * 1000)),
+                "end_time": datetime2str(self._to_datetime(-(-end_ms // 1000) * 1000)),
+                "query_string": f"({self.query_string}) AND dtEventTimeStamp:[{start_ms} TO {end_ms}}}",
+                "start": start,
+                "size": size,
+                "sort_list": self.SORT_LIST,
+            },
+            use_admin=True,
+        )
+        return resp["hits"]
+
+    def _scroll(self, start_ms: int, end_ms: int) -> Generator[Dict, None, None]:
+        hits = self._search(start_ms, end_ms, 0, self.page_size)
+        total, is_lower_bound = self._hits_total(hits)
+
+        # 超出最大翻页范围时二分窗口，两个子窗口[start, middle)和[middle, end)左闭右开，不重不漏
+        overflow = total > BKLOG_MAX_RESULT_WINDOW or (is_lower_bound and total >= BKLOG_MAX_RESULT_WINDOW)
+        if overflow and end_ms - start_ms > 1:
+            middle = start_ms + (end_ms - start_ms) // 2
+            yield from self._scroll(start_ms, middle)
+            yield from self._scroll(middle, end_ms)
+            return
+
+        if overflow:
+            start_time, end_time = self._to_datetime(start_ms), self._to_datetime(end_ms)
+            logger.error(
+                "bklog scroll truncated, collector: %s, window: [%s, %s), hits: %s",
+                self.collector,
+                start_time,
+                end_time,
+                total,
+            )
+            self.truncated_windows.append((start_time, end_time, total))
+
+        start, limit = 0, min(total, BKLOG_MAX_RESULT_WINDOW)
+        while hits["hits"]:
+            self.count += len(hits["hits"])
+            yield from hits["hits"]
+            start += len(hits["hits"])
+            if start >= limit:
+                break
+            hits = self._search(start_ms, end_ms, start, min(self.page_size, limit - start))
+
+    def __iter__(self) -> Generator[Dict, None, None]:
+        """逐条返回原始的日志命中记录"""
+        # 结束时间所在的秒内的日志同样需要拉取
+        yield from self._scroll(self._to_millis(self.start_time), self._to_millis(self.end_time) + 1000)
+
+    def logs(self) -> Generator[Dict, None, None]:
+        """逐条返回解析后的日志内容，字段名转换为蛇形"""
+        for hit in self:
+            raw_log = json.loads(hit["_source"]["log"])
+            yield {pascal_to_snake(key): value for key, value in raw_log.items()}
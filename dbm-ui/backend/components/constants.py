@@ -22,3 +22,9 @@ class SSLEnum(str, StructuredEnum):
     SERVER_KEY = EnumField("server.key", _("服务器私钥"))
     CLIENT_CRT = EnumField("client.crt", _("客户端证书文件"))
     CLIENT_KEY = EnumField("client.key", _("客户端私钥"))
+
+
+# 日志平台分页拉取日志时每页的条数
+BKLOG_SCROLL_PAGE_SIZE = 5000
+# 日志平台单次查询可翻页的最大条数(ES的max_result_window)，超过时需要切分时间窗口
+BKLOG_MAX_RESULT_WINDOW = 10000
@@ -12,7 +12,7 @@ specific language governing permissions and limitations under the License.
 import logging
 
 from django.apps import AppConfig
-from django.db.models.signals import post_migrate
+from django.db.models.signals import post_migrate, post_save
 from django.utils.translation import ugettext_lazy as _
 
 logger = logging.getLogger("root")
@@ -37,4 +37,10 @@ class ConfigurationConfig(AppConfig):
     name = "backend.configuration"
 
     def ready(self):
+        from backend.bk_dataview.grafana.provisioning import invalidate_provisioning
+
+        from .models.system import SystemSettings
+
         post_migrate.connect(register_system_settings, sender=self)
+        # 监控相关配置变更后，grafana需要重新注入数据源和面板
+        post_save.connect(invalidate_provisioning, sender=SystemSettings)
@@ -25,6 +25,7 @@ from backend.db_meta.models import Machine
 from backend.db_periodic_task.models import DBPeriodicTask
 from backend.db_services.ipchooser.query.resource import ResourceQueryHelper
 from backend.flow.consts import DEFAULT_INSTANCE
+from backend.flow.utils.base.flow_cache import FlowScopedCache
 from backend.utils.string import base64_decode, base64_encode
 
 logger = logging.getLogger("root")
@@ -186,6 +187,8 @@ class DBPasswordHandler(object):
         data = DBPrivManagerApi.modify_admin_password(
             params=modify_password_params, raw=True, timeout=DBPrivManagerApi.TIMEOUT
         )["data"]
+        # 密码修改后失效流程中缓存的密码，运行中的流程重新查询
+        FlowScopedCache.invalidate_all()
         return data
 
     @classmethod
@@ -21,6 +21,7 @@ from backend.db_meta.enums import ClusterType, TenDBClusterSpiderRole
 from backend.db_meta.models import Cluster
 from backend.db_periodic_task.models import DBPeriodicTask
 from backend.exceptions import ApiResultError
+from backend.flow.utils.base.flow_cache import FlowScopedCache
 
 logger = logging.getLogger("root")
 
@@ -40,6 +41,8 @@ def randomize_admin_password(db_type: str, if_async: bool, range_type: str, clus
             },
             raw=True,
         )
+        # 密码随机化后失效流程中缓存的密码
+        FlowScopedCache.invalidate_all()
     except ApiResultError as e:
         # 捕获接口返回结果异常
         logger.error(_("「接口modify_mysql_admin_password返回结果异常」{}").format(e.message))
@@ -17,6 +17,7 @@ from rest_framework.response import Response
 from backend import env
 from backend.bk_web import viewsets
 from backend.bk_web.swagger import common_swagger_auto_schema
+from backend.components.base import DataAPITransport
 from backend.configuration.constants import DISK_CLASSES, SystemSettingsEnum
 from backend.configuration.models.system import BizSettings, SystemSettings
 from backend.configuration.serializers import (
@@ -109,6 +110,12 @@ class SystemSettingsViewSet(viewsets.SystemViewSet):
             )
         return Response(envs)
 
+    @common_swagger_auto_schema(operation_summary=_("查询第三方接口连接池统计"), tags=tags)
+    @action(detail=False, methods=["get"])
+    def data_api_pool_stats(self, request):
+        """当前进程内第三方接口连接池的长连接复用情况，按后端host统计"""
+        return Response(DataAPITransport.stats())
+
     @common_swagger_auto_schema(operation_summary=_("查询敏感环境变量"), tags=tags)
     @action(detail=False, methods=["get"])
     def sensitive_environ(self, request):
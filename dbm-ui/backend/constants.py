@@ -74,3 +74,8 @@ class CommonHostDBMeta:
 
 # 集群状态数据缓存key
 CACHE_CLUSTER_STATS = "cluster_stats"
+
+# excel流式导出时，用于计算列宽的采样行数
+EXCEL_WIDTH_SAMPLE_ROWS = 500
+# excel流式导出时，每次返回的文件块大小
+EXCEL_STREAM_CHUNK_SIZE = 64 * 1024
@@ -134,8 +134,11 @@ class Cluster(AuditedModel):
         """
         处理当前的动作是否和集群正在运行的动作存在执行互斥
         """
+        cluster_exclusive_infos = ClusterOperateRecord.objects.batch_has_exclusive_operations(
+            ticket_type, cluster_ids, **kwargs
+        )
         for cluster_id in cluster_ids:
-            exclusive_infos = cls.is_exclusive(cluster_id, ticket_type, **kwargs)
+            exclusive_infos = cluster_exclusive_infos.get(cluster_id)
             if not exclusive_infos:
                 continue
 
@@ -19,6 +19,9 @@ from blue_krill.data_types.enum import EnumField, StructuredEnum
 DB_MONITOR_TPLS_DIR = os.path.join(settings.BASE_DIR, "backend/db_monitor/tpls")
 TPLS_COLLECT_DIR = os.path.join(DB_MONITOR_TPLS_DIR, "collect")
 TPLS_ALARM_DIR = os.path.join(DB_MONITOR_TPLS_DIR, "alarm")
+# 同步平台告警策略时跳过的模板目录，以及并发保存到监控的线程数
+TPLS_ALARM_SKIP_DIR = "v1"
+SYNC_PLAT_POLICY_CONCURRENCY = 5
 
 SWAGGER_TAG = "db_monitor"
 
@@ -191,6 +194,19 @@ BK_MONITOR_SAVE_DISPATCH_GROUP_TEMPLATE = {
 
 MONITOR_EVENTS = "monitor_events"
 
+# 监控事件搜索的单页数量(监控接口单次上限)
+BKM_SEARCH_EVENT_PAGE_SIZE = 5000
+# 告警事件数量统计：按业务分时间桶记录各策略/app_id的事件数，按检查点增量拉取，定期全量重建以修正已恢复的事件
+MONITOR_EVENT_BUCKET_KEY = "monitor_event_bucket_{bk_biz_id}_{bucket}"
+MONITOR_EVENT_CHECKPOINT_KEY = "monitor_event_checkpoint_{bk_biz_id}"
+# 检查点所在秒内已统计的事件ID，下次拉取会包含这一秒，需按事件ID去重
+MONITOR_EVENT_BOUNDARY_KEY = "monitor_event_boundary_{bk_biz_id}"
+MONITOR_EVENT_REBUILD_KEY = "monitor_event_rebuild_{bk_biz_id}"
+MONITOR_EVENT_WINDOW_DAYS = 14
+MONITOR_EVENT_BUCKET_SECONDS = 60 * 60
+MONITOR_EVENT_REBUILD_INTERVAL = 24 * 60 * 60
+MONITOR_EVENT_SYNC_CONCURRENCY = 5
+
 AUTOFIX_ACTION_NAME = "dbm_autofix_http_callback"
 
 # 故障自愈模板
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import datetime
+import json
+import logging
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from django.utils import timezone
+
+from backend.db_monitor.constants import (
+    MONITOR_EVENT_BOUNDARY_KEY,
+    MONITOR_EVENT_BUCKET_KEY,
+    MONITOR_EVENT_BUCKET_SECONDS,
+    MONITOR_EVENT_CHECKPOINT_KEY,
+    MONITOR_EVENT_REBUILD_INTERVAL,
+    MONITOR_EVENT_REBUILD_KEY,
+    MONITOR_EVENT_WINDOW_DAYS,
+)
+from backend.db_monitor.models import MonitorPolicy
+from backend.utils.redis import RedisConn
+
+logger = logging.getLogger("root")
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class MonitorEventCounter:
+    """
+    告警事件数量的增量统计
+    按业务将各策略/app_id的事件数写入时间桶，每次只拉取检查点之后的新窗口，最近N天的总数由时间桶累加得到。
+    事件数记录的是拉取时的状态，已恢复的事件会在定期的全量重建中剔除
+    监控接口的时间范围精确到秒且包含两端，检查点记录为拉取截止的整秒，下次从检查点这一秒开始拉取，
+    上次拉取返回的事件(截止这一秒仍在持续)按事件ID去重
+    """
+
+    @classmethod
+    def _bucket(cls, timestamp: float) -> int:
+        return int(timestamp // MONITOR_EVENT_BUCKET_SECONDS * MONITOR_EVENT_BUCKET_SECONDS)
+
+    @classmethod
+    def _window_buckets(cls, now: float) -> List[int]:
+        """统计窗口内的全部时间桶"""
+        start = cls._bucket(now - MONITOR_EVENT_WINDOW_DAYS * 24 * 60 * 60)
+        return list(range(start, cls._bucket(now) + 1, MONITOR_EVENT_BUCKET_SECONDS))
+
+    @classmethod
+    def _event_begin_time(cls, event: Dict) -> Optional[float]:
+        """事件的开始时间戳，无法解析时返回None"""
+        try:
+            return timezone.make_aware(datetime.datetime.strptime(event["begin_time"], TIME_FORMAT)).timestamp()
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    @classmethod
+    def _time_range(cls, start: int, end: int) -> str:
+        tz = timezone.get_current_timezone()
+        start_time, end_time = datetime.datetime.fromtimestamp(start, tz), datetime.datetime.fromtimestamp(end, tz)
+        return f"{start_time.strftime(TIME_FORMAT)} -- {end_time.strftime(TIME_FORMAT)}"
+
+    @classmethod
+    def fetch_bucket_counts(
+        cls, bk_biz_id: int, strategy_ids: List[int], start: int, end: int, counted_ids: Optional[Set[str]] = None
+    ) -> Tuple[Dict[int, Dict[str, int]], List[str]]:
+        """
+        拉取时间范围内的事件，并按时间桶统计各策略/app_id的事件数量
+        @param start: 开始时间(整秒，包含)
+        @param end: 截止时间(整秒，包含)
+        @param counted_ids: 上次已统计的检查点所在秒内的事件ID，本次跳过
+        @return: ({bucket: {"strategy_id:app_id": count}}, 本次返回的全部事件ID)
+        """
+        events = MonitorPolicy.bkm_search_event(
+            bk_biz_ids=[bk_biz_id],
+            strategy_id=strategy_ids,
+            time_range=cls._time_range(start, end),
+            group_count=False,
+        )
+        counted_ids = counted_ids or set()
+        bucket_counts: Dict[int, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        boundary_ids: List[str] = []
+        for event in events:
+            event_id = str(event.get("id", ""))
+            # 截止这一秒仍在持续的事件(不论开始时间)，下次拉取时都会再次返回，需全部记录。已跳过的事件也要继续记录
+            if event_id:
+                boundary_ids.append(event_id)
+            if event_id and event_id in counted_ids:
+                continue
+
+            begin_time = cls._event_begin_time(event)
+            field = f"{event['strategy_id']}:{MonitorPolicy.get_event_app_id(event)}"
+            bucket_counts[cls._bucket(end if begin_time is None else begin_time)][field] += 1
+        return bucket_counts, boundary_ids
+
+    @classmethod
+    def sync(cls, bk_biz_id: int, strategy_ids: List[int]) -> Dict[int, Dict[Any, int]]:
+        """
+        增量同步业务的事件数量，并返回统计窗口内各策略/app_id的事件总数
+        @param bk_biz_id: 业务ID
+        @param strategy_ids: 监控策略ID列表
+        """
+        now = int(time.time())
+        window_buckets = cls._window_buckets(now)
+        checkpoint_key = MONITOR_EVENT_CHECKPOINT_KEY.format(bk_biz_id=bk_biz_id)
+        rebuild_key = MONITOR_EVENT_REBUILD_KEY.format(bk_biz_id=bk_biz_id)
+        boundary_key = MONITOR_EVENT_BOUNDARY_KEY.format(bk_biz_id=bk_biz_id)
+        checkpoint, rebuilt, boundary = RedisConn.mget(checkpoint_key, rebuild_key, boundary_key)
+
+        # 首次统计、检查点过旧或到达重建周期时全量拉取整个窗口，否则从检查点这一秒开始拉取新窗口
+        rebuild = not checkpoint or not rebuilt or int(float(checkpoint)) < window_buckets[0]
+        start = window_buckets[0] if rebuild else int(float(checkpoint))
+        counted_ids = set() if rebuild else set(json.loads(boundary or "[]"))
+        bucket_counts, boundary_ids = cls.fetch_bucket_counts(bk_biz_id, strategy_ids, start, now, counted_ids)
+
+        bucket_expire = MONITOR_EVENT_WINDOW_DAYS * 24 * 60 * 60 + MONITOR_EVENT_BUCKET_SECONDS
+        pipeline = RedisConn.pipeline()
+        if rebuild:
+            pipeline.delete(
+                *[MONITOR_EVENT_BUCKET_KEY.format(bk_biz_id=bk_biz_id, bucket=bucket) for bucket in window_buckets]
+            )
+            pipeline.set(rebuild_key, 1, ex=MONITOR_EVENT_REBUILD_INTERVAL)
+        for bucket, counts in bucket_counts.items():
+            bucket_key = MONITOR_EVENT_BUCKET_KEY.format(bk_biz_id=bk_biz_id, bucket=bucket)
+            for field, count in counts.items():
+                pipeline.hincrby(bucket_key, field, count)
+            pipeline.expire(bucket_key, bucket_expire)
+        pipeline.set(checkpoint_key, now)
+        pipeline.set(boundary_key, json.dumps(boundary_ids))
+        pipeline.execute()
+
+        logger.info(
+            "sync monitor events of biz %s, rebuild: %s, range: %s, buckets: %s",
+            bk_biz_id,
+            rebuild,
+            cls._time_range(start, now),
+            len(bucket_counts),
+        )
+        return cls.rolling_counts(bk_biz_id, strategy_ids, window_buckets)
+
+    @classmethod
+    def rolling_counts(
+        cls, bk_biz_id: int, strategy_ids: List[int], window_buckets: List[int]
+    ) -> Dict[int, Dict[Any, int]]:
+        """累加窗口内的时间桶，得到各策略/app_id的事件总数"""
+        pipeline = RedisConn.pipeline(transaction=False)
+        for bucket in window_buckets:
+            pipeline.hgetall(MONITOR_EVENT_BUCKET_KEY.format(bk_biz_id=bk_biz_id, bucket=bucket))
+
+        strategy_ids = set(strategy_ids)
+        totals: Dict[Tuple[int, str], int] = defaultdict(int)
+        for counts in pipeline.execute():
+            for field, count in counts.items():
+                strategy_id, app_id = field.split(":", 1)
+                if int(strategy_id) in strategy_ids:
+                    totals[(int(strategy_id), app_id)] += int(count)
+
+        event_counts = defaultdict(dict)
+        for (strategy_id, app_id), count in totals.items():
+            event_counts[strategy_id][app_id] = count
+        return event_counts
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("db_monitor", "0020_auto_20240621_1216"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="monitorpolicy",
+            name="content_hash",
+            field=models.CharField(default="", max_length=32, verbose_name="策略模板内容哈希"),
+        ),
+    ]
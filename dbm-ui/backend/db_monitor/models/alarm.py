@@ -10,13 +10,17 @@ specific language governing permissions and limitations under the License.
 """
 import copy
 import datetime
+import hashlib
 import json
 import logging
 import os
+import time
 from collections import defaultdict
-from typing import Any, Dict, List
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
 
-from django.db import models
+from django.db import connections, models
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
@@ -33,21 +37,20 @@ from backend.db_monitor.constants import (
     BK_MONITOR_DISPATCH_RULE_MIXIN,
     BK_MONITOR_SAVE_DISPATCH_GROUP_TEMPLATE,
     BK_MONITOR_SAVE_USER_GROUP_TEMPLATE,
+    BKM_SEARCH_EVENT_PAGE_SIZE,
     DEFAULT_ALERT_NOTICE,
     PLAT_PRIORITY,
+    SYNC_PLAT_POLICY_CONCURRENCY,
     TARGET_LEVEL_TO_PRIORITY,
     TPLS_ALARM_DIR,
+    TPLS_ALARM_SKIP_DIR,
     AlertSourceEnum,
     DutyRuleCategory,
     PolicyStatus,
     TargetLevel,
     TargetPriority,
 )
-from backend.db_monitor.exceptions import (
-    BkMonitorDeleteAlarmException,
-    BkMonitorSaveAlarmException,
-    BuiltInNotAllowDeleteException,
-)
+from backend.db_monitor.exceptions import BkMonitorDeleteAlarmException, BuiltInNotAllowDeleteException
 from backend.db_monitor.tasks import update_app_policy
 from backend.db_monitor.utils import (
     bkm_delete_alarm_strategy,
@@ -62,6 +65,50 @@ __all__ = ["NoticeGroup", "AlertRule", "RuleTemplate", "DispatchGroup", "Monitor
 logger = logging.getLogger("root")
 
 
+@lru_cache
+def load_alarm_tpl_manifest() -> Tuple[List[Dict], List[str]]:
+    """
+    加载平台告警策略模板清单，每个进程只读取解析一次
+    @return: (模板清单, 解析失败的模板文件列表)，模板清单包含策略名、业务、版本、内容哈希和解析后的模板
+    """
+    manifest, invalid_tpls = [], []
+    for root, dirs, files in os.walk(TPLS_ALARM_DIR):
+        if TPLS_ALARM_SKIP_DIR in dirs:
+            dirs.remove(TPLS_ALARM_SKIP_DIR)
+
+        for alarm_tpl in files:
+            with open(os.path.join(root, alarm_tpl), "rb") as f:
+                content = f.read()
+            try:
+                template_dict = json.loads(content)
+                # 监控API不支持传入额外的字段
+                template_dict.pop("export_at", "")
+                policy_name = template_dict["name"]
+            except (json.decoder.JSONDecodeError, KeyError):
+                logger.error("[sync_plat_monitor_policy] load template failed: %s", alarm_tpl)
+                invalid_tpls.append(alarm_tpl)
+                continue
+
+            deleted = template_dict.pop("deleted", False)
+            if not deleted and not template_dict.get("details"):
+                logger.error("[sync_plat_monitor_policy] template %s has no details", alarm_tpl)
+                invalid_tpls.append(alarm_tpl)
+                continue
+
+            manifest.append(
+                {
+                    "name": policy_name,
+                    "bk_biz_id": template_dict.get("bk_biz_id", PLAT_BIZ_ID),
+                    "db_type": template_dict.get("db_type"),
+                    "version": template_dict.get("version", 0),
+                    "deleted": deleted,
+                    "content_hash": hashlib.md5(content).hexdigest(),
+                    "template": template_dict,
+                }
+            )
+    return manifest, invalid_tpls
+
+
 class NoticeGroup(AuditedModel):
     """告警通知组：一期粒度仅支持到业务级，可开关是否同步DBA人员数据"""
 
@@ -626,6 +673,8 @@ class MonitorPolicy(AuditedModel):
 
     # 支持版本管理
     version = models.IntegerField(verbose_name=_("版本"), default=0)
+    # 平台策略模板的内容哈希，与版本一起判断模板是否变更
+    content_hash = models.CharField(verbose_name=_("策略模板内容哈希"), max_length=LEN_SHORT, default="")
 
     alert_source = models.CharField(
         verbose_name=_("告警数据来源"),
@@ -1010,107 +1059,121 @@ class MonitorPolicy(AuditedModel):
         )
 
     @classmethod
-    def sync_plat_monitor_policy(cls, action_id=None, db_type=None, force=False):
-        if action_id is None:
-            action_id = get_dbm_autofix_action_id()
-        skip_dir = "v1"
-        now = datetime.datetime.now(timezone.utc)
-        logger.warning("[sync_plat_monitor_policy] sync bkm alarm policy start: %s", now)
-
-        # 逐个json导入，本地+远程
-        updated_policies = 0
-        for root, dirs, files in os.walk(TPLS_ALARM_DIR):
-            if skip_dir in dirs:
-                dirs.remove(skip_dir)
-
-            for alarm_tpl in files:
-
-                with open(os.path.join(root, alarm_tpl), "r", encoding="utf-8") as f:
-                    logger.info("[sync_plat_monitor_policy] start sync bkm alarm tpl: %s " % alarm_tpl)
-                    try:
-                        template_dict = json.loads(f.read())
-                        # 监控API不支持传入额外的字段
-                        template_dict.pop("export_at", "")
-                        policy_name = template_dict["name"]
-                    except json.decoder.JSONDecodeError:
-                        logger.error("[sync_plat_monitor_policy] load template failed: %s", alarm_tpl)
-                        continue
-
-                    # 如指定db_type，只同步指定db_type的策略(跳过非指定db_type的策略)
-                    if db_type is not None and template_dict.get("db_type") != db_type:
-                        continue
-
-                    deleted = template_dict.pop("deleted", False)
-
-                    if not template_dict.get("details"):
-                        logger.error(("[sync_plat_monitor_policy] template %s has no details" % alarm_tpl))
-                        continue
-
-                    # patch template
-                    labels = list(set(template_dict["details"]["labels"]))
-                    template_dict["details"]["labels"] = labels
-                    template_dict["details"]["name"] = policy_name
-                    template_dict["details"]["priority"] = TargetPriority.PLATFORM.value
-                    # 平台策略仅开启基于分派通知
-                    template_dict["details"]["notice"]["options"]["assign_mode"] = ["by_rule"]
-                    for label in labels:
-                        if label.startswith("NEED_AUTOFIX") and action_id is not None:
-                            template_dict["details"]["actions"] = [
-                                {
-                                    "config_id": action_id,
-                                    "signal": ["abnormal"],
-                                    "user_groups": [],
-                                    "options": {
-                                        "converge_config": {
-                                            "is_enabled": False,
-                                            "converge_func": "skip_when_success",
-                                            "timedelta": 60,
-                                            "count": 1,
-                                        }
-                                    },
-                                }
-                            ]
-
-                    policy = MonitorPolicy(**template_dict)
-
-                policy_name = policy.name
-                logger.info("[sync_plat_monitor_policy] start sync bkm alarm policy: %s " % policy_name)
-                try:
-                    synced_policy = MonitorPolicy.objects.get(bk_biz_id=policy.bk_biz_id, name=policy_name)
-
-                    if deleted:
-                        logger.info("[sync_plat_monitor_policy] delete old alarm: %s " % policy_name)
-                        synced_policy.delete()
-                        continue
+    def patch_plat_template(cls, template: Dict, action_id=None) -> Dict:
+        """补充平台策略模板的标签、优先级、通知和自愈配置"""
+        template = copy.deepcopy(template)
+        labels = list(set(template["details"]["labels"]))
+        template["details"]["labels"] = labels
+        template["details"]["name"] = template["name"]
+        template["details"]["priority"] = TargetPriority.PLATFORM.value
+        # 平台策略仅开启基于分派通知
+        template["details"]["notice"]["options"]["assign_mode"] = ["by_rule"]
+        for label in labels:
+            if label.startswith("NEED_AUTOFIX") and action_id is not None:
+                template["details"]["actions"] = [
+                    {
+                        "config_id": action_id,
+                        "signal": ["abnormal"],
+                        "user_groups": [],
+                        "options": {
+                            "converge_config": {
+                                "is_enabled": False,
+                                "converge_func": "skip_when_success",
+                                "timedelta": 60,
+                                "count": 1,
+                            }
+                        },
+                    }
+                ]
+        return template
 
-                    if synced_policy.version >= policy.version and not force:
-                        logger.info("[sync_plat_monitor_policy] skip same version alarm: %s " % policy_name)
-                        continue
+    @classmethod
+    def sync_plat_monitor_policy(cls, action_id=None, db_type=None, force=False) -> Dict[str, Any]:
+        """
+        同步平台告警策略：模板清单只在进程内加载一次，与已有策略的版本批量比对，仅有变更的模板才会保存到监控
+        @param action_id: 自愈套餐ID
+        @param db_type: 只同步指定db_type的策略
+        @param force: 是否忽略版本强制同步
+        """
+        start = time.time()
+        manifest, invalid_tpls = load_alarm_tpl_manifest()
+        if db_type is not None:
+            manifest = [tpl for tpl in manifest if tpl["db_type"] == db_type]
+
+        # 一次查询所有模板对应的已有策略版本和内容哈希：已有策略版本更高的模板跳过，版本相同时内容未变更的模板跳过
+        synced_versions = {
+            (bk_biz_id, name): (version, content_hash)
+            for bk_biz_id, name, version, content_hash in cls.objects.filter(
+                name__in=[tpl["name"] for tpl in manifest]
+            ).values_list("bk_biz_id", "name", "version", "content_hash")
+        }
+        changed_tpls, skipped = [], 0
+        for tpl in manifest:
+            synced = synced_versions.get((tpl["bk_biz_id"], tpl["name"]))
+            if tpl["deleted"]:
+                if synced is None:
+                    skipped += 1
+                    continue
+            elif synced is not None and not force:
+                synced_version, synced_hash = synced
+                if synced_version > tpl["version"] or (
+                    synced_version == tpl["version"] and synced_hash == tpl["content_hash"]
+                ):
+                    skipped += 1
+                    continue
+            changed_tpls.append(tpl)
+
+        synced_policies = {
+            (policy.bk_biz_id, policy.name): policy
+            for policy in cls.objects.filter(name__in=[tpl["name"] for tpl in changed_tpls])
+        }
+        if changed_tpls and action_id is None:
+            action_id = get_dbm_autofix_action_id()
 
-                    for keeped_field in MonitorPolicy.KEEPED_FIELDS:
+        def _sync(tpl: Dict) -> bool:
+            synced_policy = synced_policies.get((tpl["bk_biz_id"], tpl["name"]))
+            try:
+                if tpl["deleted"]:
+                    logger.info("[sync_plat_monitor_policy] delete old alarm: %s ", tpl["name"])
+                    synced_policy.delete()
+                    return True
+
+                policy = cls(**cls.patch_plat_template(tpl["template"], action_id))
+                if synced_policy:
+                    for keeped_field in cls.KEEPED_FIELDS:
                         setattr(policy, keeped_field, getattr(synced_policy, keeped_field))
-
                     policy.details["id"] = synced_policy.monitor_policy_id
-                    logger.info("[sync_plat_monitor_policy] update bkm alarm policy: %s " % policy_name)
-                except MonitorPolicy.DoesNotExist:
-                    logger.info("[sync_plat_monitor_policy] create bkm alarm policy: %s " % policy_name)
-
-                try:
-                    # fetch targets/test_rules/notify_rules/notify_groups from parent details
-                    for attr, value in policy.parse_details().items():
-                        setattr(policy, attr, value)
-
-                    policy.save()
-                    updated_policies += 1
-                    logger.error("[sync_plat_monitor_policy] save bkm alarm policy success: %s", policy_name)
-                except BkMonitorSaveAlarmException as e:
-                    logger.error("[sync_plat_monitor_policy] save bkm alarm policy failed: %s, %s ", policy_name, e)
-
-        logger.warning(
-            "[sync_plat_monitor_policy] finish sync bkm alarm policy end: %s, update_cnt: %s",
-            datetime.datetime.now(timezone.utc) - now,
-            updated_policies,
-        )
+
+                # fetch targets/test_rules/notify_rules/notify_groups from parent details
+                for attr, value in policy.parse_details().items():
+                    setattr(policy, attr, value)
+                policy.content_hash = tpl["content_hash"]
+                policy.save()
+                logger.info(
+                    "[sync_plat_monitor_policy] save bkm alarm policy success: %s(%s)",
+                    tpl["name"],
+                    tpl["content_hash"],
+                )
+                return True
+            except Exception as e:  # pylint: disable=broad-except
+                logger.error("[sync_plat_monitor_policy] sync bkm alarm policy failed: %s, %s ", tpl["name"], e)
+                return False
+            finally:
+                connections.close_all()
+
+        results = []
+        if changed_tpls:
+            with ThreadPoolExecutor(max_workers=min(len(changed_tpls), SYNC_PLAT_POLICY_CONCURRENCY)) as executor:
+                results = list(executor.map(_sync, changed_tpls))
+
+        report = {
+            "skipped": skipped,
+            "updated": results.count(True),
+            "failed": results.count(False) + len(invalid_tpls),
+            "cost": round(time.time() - start, 3),
+        }
+        logger.warning("[sync_plat_monitor_policy] finish sync bkm alarm policy: %s", report)
+        return report
 
     @staticmethod
     def bkm_search_event(
@@ -1200,7 +1263,6 @@ class MonitorPolicy(AuditedModel):
             "data_source": data_source,
         }
 
-        # TODO: 单次查询上限5000条，若需要突破上限，需要循环查询
         params = {
             "bk_biz_ids": bk_biz_ids,
             "conditions": [
@@ -1210,7 +1272,7 @@ class MonitorPolicy(AuditedModel):
             ],
             "days": days,
             "page": 1,
-            "page_size": 5000,
+            "page_size": BKM_SEARCH_EVENT_PAGE_SIZE,
         }
 
         # 精确范围查找
@@ -1218,22 +1280,37 @@ class MonitorPolicy(AuditedModel):
             params["time_range"] = time_range
             params.pop("days")
 
-        events = BKMonitorV3Api.search_event(params)
+        # 单次查询存在上限，需要循环翻页直到取完
+        events = []
+        while True:
+            page_events = BKMonitorV3Api.search_event(params)
+            events.extend(page_events)
+            if len(page_events) < BKM_SEARCH_EVENT_PAGE_SIZE:
+                break
+            params["page"] += 1
 
         # 需要根据app_id来拆分全局内置策略的告警数量
         if group_count:
-            tmp = defaultdict(int)
-            for event in events:
-                app_id = event["origin_alarm"]["data"]["dimensions"].get("appid") or 0
-                # 缺少业app_id维度的策略
-                if not app_id:
-                    logger.error("find bad appid event: %s", json.dumps(event))
-
-                tmp[(event["strategy_id"], app_id)] += 1
-
             event_counts = defaultdict(dict)
-            for (strategy_id, appid), event_count in tmp.items():
+            for (strategy_id, appid), event_count in MonitorPolicy.count_events(events).items():
                 event_counts[strategy_id][appid] = event_count
             return event_counts
 
         return events
+
+    @staticmethod
+    def get_event_app_id(event: Dict):
+        """获取事件的app_id维度，缺少app_id维度时返回0"""
+        app_id = event["origin_alarm"]["data"]["dimensions"].get("appid") or 0
+        # 缺少业app_id维度的策略
+        if not app_id:
+            logger.error("find bad appid event: %s", json.dumps(event))
+        return app_id
+
+    @staticmethod
+    def count_events(events: List[Dict]) -> Dict[Tuple[int, Any], int]:
+        """按策略和app_id统计事件数量"""
+        event_counts = defaultdict(int)
+        for event in events:
+            event_counts[(event["strategy_id"], MonitorPolicy.get_event_app_id(event))] += 1
+        return event_counts
@@ -2,21 +2,18 @@ import json
 import logging
 from collections import defaultdict
 from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
 
 from blueapps.core.celery.celery import app
 from celery.schedules import crontab
 from django.utils import timezone
 from django.utils.translation import ugettext as _
 
-from backend import env
-from backend.components import BKLogApi
+from backend.components.bklog.handler import BKLogScroll
 from backend.db_meta.enums import ClusterType, InstanceInnerRole
-from backend.db_meta.models import Cluster
-from backend.db_periodic_task.local_tasks.context_manager import start_new_span
+from backend.db_meta.models import Cluster, StorageInstance
 from backend.db_periodic_task.local_tasks.register import register_periodic_task
-from backend.db_periodic_task.utils import TimeUnit, calculate_countdown
 from backend.db_report.models import ChecksumCheckReport, ChecksumInstance
-from backend.utils.time import datetime2str
 
 logger = logging.getLogger("celery")
 
@@ -60,115 +57,137 @@ def auto_check_checksum():
         )
     )
     cluster_type_filter = [ClusterType.TenDBHA.value, ClusterType.TenDBCluster.value]
-    cluster_ids = list(Cluster.objects.filter(cluster_type__in=cluster_type_filter).values_list("id", flat=True))
-    count = len(cluster_ids)
-    # 所有集群的校验结果检查，在一个小时内完成
-    for index, cluster_id in enumerate(cluster_ids):
-        countdown = calculate_countdown(count=count, index=index, duration=TimeUnit.HOUR)
-        logger.info("cluster({}) checksum will be run after {} seconds.".format(cluster_id, countdown))
-        with start_new_span(check_cluster_checksum):
-            check_cluster_checksum.apply_async(
-                kwargs={
-                    "cluster_id": cluster_id,
-                    "start_time": start_time,
-                    "end_time": end_time,
-                    "log_start_time": log_start_time,
-                },
-                countdown=countdown,
-            )
+    clusters = Cluster.objects.filter(cluster_type__in=cluster_type_filter)
+    # 所有集群的校验日志只拉取一次，再按集群、实例聚合
+    scroll = BKLogScroll("mysql_checksum_result", log_start_time, end_time)
+    checksums = aggregate_checksum_logs(scroll, start_time)
+    logger.info(
+        "[auto_check_checksum] fetch {} checksum logs with {} queries, truncated: {}".format(
+            scroll.count, scroll.queries, scroll.truncated_windows
+        )
+    )
+    save_checksum_reports(clusters, checksums, scroll.truncated)
 
 
 @app.task
 def check_cluster_checksum(cluster_id: int, start_time: datetime, end_time: datetime, log_start_time: datetime):
-    try:
-        cluster = Cluster.objects.get(id=cluster_id)
-    except Cluster.DoesNotExist:
+    """单个集群的校验结果检查"""
+    clusters = Cluster.objects.filter(id=cluster_id)
+    if not clusters.exists():
         # 忽略不在dbm meta信息中的集群
         logger.error(_("无法在dbm meta中查询到集群{}的相关信息，请排查该集群的状态".format(cluster_id)))
         return
+    scroll = BKLogScroll(
+        "mysql_checksum_result", log_start_time, end_time, query_string=f'log: "cluster_id: {cluster_id}"'
+    )
+    checksums = aggregate_checksum_logs(scroll, start_time)
+    save_checksum_reports(clusters, checksums, scroll.truncated)
+
+
+def aggregate_checksum_logs(scroll: BKLogScroll, start_time: datetime) -> Dict[Tuple[int, str, int], Checksum]:
+    """
+    流式聚合校验日志，只保留每个备库实例的上报状态和数据不一致的库表
+    @param scroll: 校验日志的拉取器
+    @param start_time: 数据不一致的统计开始时间，早于该时间的日志只用于判断是否上报
+    @return: {(cluster_id, ip, port): Checksum}
+    """
+    checksums: Dict[Tuple[int, str, int], Checksum] = {}
+    for hit in scroll:
+        log = json.loads(hit["_source"]["log"])
+        key = (log["cluster_id"], log["ip"], log["port"])
+        if key not in checksums:
+            checksums[key] = Checksum(log["ip"], log["port"])
+        checksum = checksums[key]
+        checksum.reported = True
+        checksum.master_port = log["master_port"]
+        log_timestamp = round(int(hit["_source"]["dtEventTimeStamp"]) / 1000)
+        log_datetime = datetime.fromtimestamp(log_timestamp).astimezone(timezone.utc)
+        is_consistent = log["master_crc"] == log["this_crc"] and log["master_cnt"] == log["this_cnt"]
+        # 检查校验日志，数据是否一致；近1天上报的日志中数据不一致，记录到报告中
+        if (not is_consistent) and log_datetime >= start_time:
+            checksum.add_not_consistent_table(log["db"], log["tbl"])
+    return checksums
+
+
+def save_checksum_reports(clusters, checksums: Dict[Tuple[int, str, int], Checksum], truncated: bool = False):
+    """
+    根据聚合后的校验结果生成集群的校验报告，报告和实例详情均批量写入
+    @param clusters: 待检查的集群queryset
+    @param checksums: 聚合后的校验结果
+    @param truncated: 日志是否被截断，截断时未上报的结果可能不准确
+    """
     # 备库以及repeater上报校验数据
     inner_role_filter = [InstanceInnerRole.SLAVE.value, InstanceInnerRole.REPEATER.value]
-    instances = cluster.storageinstance_set.filter(instance_inner_role__in=inner_role_filter)
-    machines = [instance.machine.ip for instance in instances]
-    machines = list(tuple(machines))
-    if len(machines) <= 0:
-        return
-    # BKLogApi.esquery_search的过滤条件filter
-    # 获取近2天的日志
-    machine_filter = [
-        {"field": "serverIp", "operator": "is one of", "value": machines},
-        {"field": "cloudId", "operator": "is", "value": cluster.bk_cloud_id},
-    ]
-
-    resp = BKLogApi.esquery_search(
-        {
-            "indices": "{}_bklog.mysql_checksum_result".format(env.DBA_APP_BK_BIZ_ID),
-            "start_time": datetime2str(log_start_time),
-            "end_time": datetime2str(end_time),
-            "filter": machine_filter,
-            "start": 0,
-            "size": 10000,
-            "sort_list": [["dtEventTimeStamp", "desc"]],
-        }
-    )
+    cluster_instances: Dict[int, List[Tuple[str, int]]] = defaultdict(list)
+    for inst in StorageInstance.objects.filter(cluster__in=clusters, instance_inner_role__in=inner_role_filter).values(
+        "cluster__id", "machine__ip", "port"
+    ):
+        cluster_instances[inst["cluster__id"]].append((inst["machine__ip"], inst["port"]))
 
-    # 数据不一致的实例列表
-    fail = []
-    # 没有校验的实例列表
-    not_reported = []
-    err_msg = ""
-    status = True
-    # 检查每个备库实例的校验日志
-    for instance in instances:
-        slave_ip = instance.machine.ip
-        slave_port = instance.port
-        checksum = Checksum(slave_ip, slave_port)
-        for hit in resp["hits"]["hits"]:
-            log = json.loads(hit["_source"]["log"])
-            # 过滤出本集群本实例的日志
-            if log["cluster_id"] == cluster.id:
-                if log["ip"] == slave_ip and log["port"] == slave_port:
-                    checksum.reported = True
-                    checksum.master_port = log["master_port"]
-                    log_timestamp = round(int(hit["_source"]["dtEventTimeStamp"]) / 1000)
-                    log_datetime = datetime.fromtimestamp(log_timestamp).astimezone(timezone.utc)
-                    is_consistent = log["master_crc"] == log["this_crc"] and log["master_cnt"] == log["this_cnt"]
-                    # 检查校验日志，数据是否一致；近1天上报的日志中数据不一致，记录到报告中
-                    if (not is_consistent) and log_datetime >= start_time:
-                        checksum.add_not_consistent_table(log["db"], log["tbl"])
-        if not checksum.reported:
-            not_reported.append(checksum)
-        elif len(checksum.details) > 0:
-            fail.append(checksum)
-
-    if len(fail) > 0:
-        err_msg = _("数据不一致")
-        status = False
-    if len(not_reported) > 0:
-        status = False
-        if err_msg == "":
-            err_msg = _("近2天未校验")
+    reports: List[ChecksumCheckReport] = []
+    # 有失败实例的集群报告需要主键关联实例详情，逐个写入；其余报告批量写入
+    fail_reports: List[Tuple[ChecksumCheckReport, List[Checksum]]] = []
+    for cluster in clusters:
+        if not cluster_instances[cluster.id]:
+            continue
+        # 数据不一致的实例列表
+        fail = []
+        # 没有校验的实例列表
+        not_reported = []
+        err_msg = ""
+        status = True
+        # 检查每个备库实例的校验日志
+        for slave_ip, slave_port in cluster_instances[cluster.id]:
+            checksum = checksums.get((cluster.id, slave_ip, slave_port), Checksum(slave_ip, slave_port))
+            if not checksum.reported:
+                not_reported.append(checksum)
+            elif len(checksum.details) > 0:
+                fail.append(checksum)
+
+        if len(fail) > 0:
+            err_msg = _("数据不一致")
+            status = False
+        if len(not_reported) > 0:
+            status = False
+            if err_msg == "":
+                err_msg = _("近2天未校验")
+            else:
+                err_msg = err_msg + _(";近2天未校验")
+            if truncated:
+                err_msg = err_msg + _("(日志查询结果被截断)")
+        fail.extend(not_reported)
+        # 集群的校验结果
+        report = ChecksumCheckReport(
+            bk_biz_id=cluster.bk_biz_id,
+            bk_cloud_id=cluster.bk_cloud_id,
+            cluster=cluster.immute_domain,
+            cluster_type=cluster.cluster_type,
+            status=status,
+            msg=err_msg,
+            # 校验status失败的备库实例的个数
+            fail_slaves=len(fail),
+        )
+        if fail:
+            fail_reports.append((report, fail))
         else:
-            err_msg = err_msg + _(";近2天未校验")
-    fail.extend(not_reported)
-    # 集群的校验结果
-    report = ChecksumCheckReport.objects.create(
-        bk_biz_id=cluster.bk_biz_id,
-        bk_cloud_id=cluster.bk_cloud_id,
-        cluster=cluster.immute_domain,
-        cluster_type=cluster.cluster_type,
-        status=status,
-        msg=err_msg,
-        # 校验status失败的备库实例的个数
-        fail_slaves=len(fail),
-    )
-    for f in fail:
-        # 每个备库实例的校验结果
-        ChecksumInstance.objects.create(
-            ip=f.ip,
-            port=f.port,
-            master_ip=f.master_ip,
-            master_port=f.master_port,
-            details=f.details,
-            report=report,
+            reports.append(report)
+
+    ChecksumCheckReport.objects.bulk_create(reports, batch_size=500)
+
+    # bulk_create在mysql下不回填主键，失败报告逐个写入以获取主键，实例详情再批量写入
+    instances: List[ChecksumInstance] = []
+    for report, fails in fail_reports:
+        report.save()
+        instances.extend(
+            # 每个备库实例的校验结果
+            ChecksumInstance(
+                ip=f.ip,
+                port=f.port,
+                master_ip=f.master_ip,
+                master_port=f.master_port,
+                details=f.details,
+                report=report,
+            )
+            for f in fails
         )
+    ChecksumInstance.objects.bulk_create(instances, batch_size=500)
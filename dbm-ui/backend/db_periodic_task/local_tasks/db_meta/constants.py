@@ -11,6 +11,9 @@ specific language governing permissions and limitations under the License.
 
 from backend.db_meta.enums import ClusterType
 
+# 元数据巡检结果批量写入的单批数量
+META_CHECK_REPORT_BATCH_SIZE = 500
+
 UNIFY_QUERY_PARAMS = {
     "bk_biz_id": 3,
     "query_configs": [
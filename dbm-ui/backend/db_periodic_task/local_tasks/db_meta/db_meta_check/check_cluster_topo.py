@@ -8,66 +8,77 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
-from django.utils.translation import ugettext as _
+from django.utils.translation import ugettext_lazy as _
 
+from backend.constants import IP_PORT_DIVIDER
 from backend.db_meta.enums import ClusterType, InstanceInnerRole, InstanceRole, MachineType
-from backend.db_meta.models import Cluster
+from backend.db_meta.models import StorageInstance
 from backend.db_report.enums import MetaCheckSubType
-from backend.db_report.models import MetaCheckReport
+
+from .engine import TENDBCLUSTER_TOPO_RULE, TENDBHA_TOPO_RULE, TENDBSINGLE_TOPO_RULE, MetaCheckReportWriter
 
 
 def check_cluster_topo():
-    _check_tendbsingle_topo()
-    _check_tendbha_topo()
-    _check_tendbcluster_topo()
+    with MetaCheckReportWriter() as writer:
+        _check_tendbsingle_topo(writer)
+        _check_tendbha_topo(writer)
+        _check_tendbcluster_topo(writer)
 
 
-def _check_tendbsingle_topo():
+def _check_tendbsingle_topo(writer: MetaCheckReportWriter):
     """
-    有且只有一个存储实例
+    有且只有一个存储实例，且实例角色与集群类型匹配
     """
-    for c in Cluster.objects.filter(cluster_type=ClusterType.TenDBSingle):
-        messages = []
-        if c.proxyinstance_set.exists():
-            messages.append(_("有 {} 个接入层实例".format(c.proxyinstance_set.count())))
-
-        if c.storageinstance_set.count() != 1:
-            messages.append(_("有 {} 个存储层实例".format(c.storageinstance_set.count())))
-
-        ins = c.storageinstance_set.get()
-        if not (
-            ins.machine.machine_type == MachineType.SINGLE.value
-            and ins.instance_role == InstanceRole.ORPHAN.value
-            and ins.instance_inner_role == InstanceInnerRole.ORPHAN.value
-        ):
-            messages.append(
-                _(
-                    "实例 {} ({}-{}-{}) 与集群类型不匹配".format(
-                        ins.ip_port, ins.machine.machine_type, ins.instance_role, ins.instance_inner_role
-                    )
-                )
-            )
+    TENDBSINGLE_TOPO_RULE.check(writer)
 
-        if messages:
-            MetaCheckReport.objects.create(
-                bk_biz_id=c.bk_biz_id,
-                bk_cloud_id=c.bk_cloud_id,
-                cluster=c.immute_domain,
-                cluster_type=ClusterType.TenDBSingle,
-                status=False,
-                msg=", ".join(messages),
-                subtype=MetaCheckSubType.ClusterTopo.value,
-            )
+    mismatch_instances = (
+        StorageInstance.objects.filter(cluster__cluster_type=ClusterType.TenDBSingle)
+        .exclude(
+            machine__machine_type=MachineType.SINGLE.value,
+            instance_role=InstanceRole.ORPHAN.value,
+            instance_inner_role=InstanceInnerRole.ORPHAN.value,
+        )
+        .values(
+            "port",
+            "instance_role",
+            "instance_inner_role",
+            "machine__ip",
+            "machine__machine_type",
+            "cluster__bk_biz_id",
+            "cluster__bk_cloud_id",
+            "cluster__immute_domain",
+        )
+    )
+    for ins in mismatch_instances.iterator():
+        writer.add(
+            bk_biz_id=ins["cluster__bk_biz_id"],
+            bk_cloud_id=ins["cluster__bk_cloud_id"],
+            cluster=ins["cluster__immute_domain"],
+            cluster_type=ClusterType.TenDBSingle,
+            msg=_("实例 {}{}{} ({}-{}-{}) 与集群类型不匹配").format(
+                ins["machine__ip"],
+                IP_PORT_DIVIDER,
+                ins["port"],
+                ins["machine__machine_type"],
+                ins["instance_role"],
+                ins["instance_inner_role"],
+            ),
+            subtype=MetaCheckSubType.ClusterTopo.value,
+        )
 
 
-def _check_tendbha_topo():
+def _check_tendbha_topo(writer: MetaCheckReportWriter):
     """
     1. 至少 2 个 proxy
     2. 1 个 master
     3. 至少 1 个 slave
     """
-    Cluster.objects.filter(cluster_type=ClusterType.TenDBHA)
+    TENDBHA_TOPO_RULE.check(writer)
 
 
-def _check_tendbcluster_topo():
-    Cluster.objects.filter(cluster_type=ClusterType.TenDBCluster)
+def _check_tendbcluster_topo(writer: MetaCheckReportWriter):
+    """
+    1. 至少 2 个 spider master
+    2. 至少 1 个 remote master 和 1 个 remote slave
+    """
+    TENDBCLUSTER_TOPO_RULE.check(writer)
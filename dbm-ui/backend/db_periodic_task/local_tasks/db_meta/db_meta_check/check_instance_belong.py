@@ -12,34 +12,50 @@ specific language governing permissions and limitations under the License.
 from django.db.models import Count, Q, QuerySet
 from django.utils.translation import ugettext_lazy as _
 
+from backend.constants import IP_PORT_DIVIDER
 from backend.db_meta.models import ProxyInstance, StorageInstance
 from backend.db_report.enums import MetaCheckSubType
-from backend.db_report.models import MetaCheckReport
+
+from .engine import MetaCheckReportWriter
 
 
 def check_instance_belong():
     """
     所有实例都应该属于唯一一个集群
     """
-    _instance_belong(StorageInstance.objects.all())
-    _instance_belong(ProxyInstance.objects.all())
+    with MetaCheckReportWriter() as writer:
+        _instance_belong(StorageInstance.objects.all(), writer)
+        _instance_belong(ProxyInstance.objects.all(), writer)
 
 
-def _instance_belong(qs: QuerySet):
-    for ins in qs.annotate(cluster_count=Count("cluster")).filter(~Q(cluster_count=1)):
-        if ins.cluster.exists():  # 大于 1 个集群
-            msg = _("{} 属于 {} 个集群".format(ins.ip_port, ins.cluster.count()))  # ToDo 详情
+def _instance_belong(qs: QuerySet, writer: MetaCheckReportWriter):
+    instances = (
+        qs.annotate(cluster_count=Count("cluster"))
+        .filter(~Q(cluster_count=1))
+        .values(
+            "bk_biz_id",
+            "port",
+            "cluster_type",
+            "cluster_count",
+            "machine__ip",
+            "machine__bk_cloud_id",
+            "machine__machine_type",
+        )
+    )
+    for ins in instances.iterator():
+        ip_port = f"{ins['machine__ip']}{IP_PORT_DIVIDER}{ins['port']}"
+        if ins["cluster_count"]:  # 大于 1 个集群
+            msg = _("{} 属于 {} 个集群".format(ip_port, ins["cluster_count"]))  # ToDo 详情
         else:  # 不属于任何集群
-            msg = _("{} 不属于任何集群".format(ins.ip_port))
-
-        MetaCheckReport.objects.create(
-            bk_biz_id=ins.bk_biz_id,
-            bk_cloud_id=ins.machine.bk_cloud_id,
-            ip=ins.machine.ip,
-            port=ins.port,
-            cluster_type=ins.cluster_type,
-            machine_type=ins.machine.machine_type,
-            status=False,
+            msg = _("{} 不属于任何集群".format(ip_port))
+
+        writer.add(
+            bk_biz_id=ins["bk_biz_id"],
+            bk_cloud_id=ins["machine__bk_cloud_id"],
+            ip=ins["machine__ip"],
+            port=ins["port"],
+            cluster_type=ins["cluster_type"],
+            machine_type=ins["machine__machine_type"],
             msg=msg,
             subtype=MetaCheckSubType.InstanceBelong.value,
         )
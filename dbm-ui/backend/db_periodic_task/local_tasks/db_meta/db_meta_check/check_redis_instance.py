@@ -11,18 +11,20 @@ specific language governing permissions and limitations under the License.
 
 import logging
 from collections import defaultdict
+from typing import Dict, List
 
-from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Q
+from django.db.models import Q, QuerySet
 from django.utils.translation import ugettext_lazy as _
 
-from backend.db_meta.enums import ClusterType, InstanceRole, InstanceStatus
-from backend.db_meta.models import Cluster
+from backend.constants import IP_PORT_DIVIDER
+from backend.db_meta.enums import InstanceRole, InstanceStatus
+from backend.db_meta.models import Cluster, ProxyInstance, StorageInstance, StorageInstanceTuple
 from backend.db_report.enums import MetaCheckSubType
-from backend.db_report.models import MetaCheckReport
 from backend.ticket.constants import TicketType
 from backend.ticket.models.ticket import ClusterOperateRecord
 
+from .engine import REDIS_TOPO_RULE, MetaCheckReportWriter
+
 logger = logging.getLogger("root")
 
 
@@ -46,91 +48,83 @@ def _check_redis_instance():
      REDIS_INSTANCE_DESTROY = TicketEnumField("REDIS_INSTANCE_DESTROY", _("Redis 主从集群删除"), _("集群管理"))
     """
 
-    # 构建查询条件:tendisplus,ssd,cache 三种类型一起检查,巡检0点发起
-    query = (
-        Q(cluster_type=ClusterType.TendisPredixyTendisplusCluster)
-        | Q(cluster_type=ClusterType.TwemproxyTendisSSDInstance)
-        | Q(cluster_type=ClusterType.TendisTwemproxyRedisInstance)
-        | Q(cluster_type=ClusterType.TendisRedisCluster)
+    ignore_cluster_ids = get_ignore_cluster_ids()
+    with MetaCheckReportWriter() as writer:
+        # proxy节点数不能小于2，tendisplus,ssd,cache 等类型一起检查
+        REDIS_TOPO_RULE.check(writer, exclude_cluster_ids=ignore_cluster_ids)
+
+        # 检查所有集群的主从对应关系
+        clusters = Cluster.objects.filter(cluster_type__in=REDIS_TOPO_RULE.cluster_types).exclude(
+            id__in=ignore_cluster_ids
+        )
+        _check_redis_master_slave(clusters, writer)
+
+        # 实例状态异常
+        for instance_model in [StorageInstance, ProxyInstance]:
+            create_meta_status_reports(instance_model, clusters, writer)
+
+
+def _check_redis_master_slave(clusters: QuerySet, writer: MetaCheckReportWriter):
+    """
+    检查集群的master/slave是否一一对应
+    一次查询全部集群的主从实例和主从关系，在内存中配对，异常写入巡检结果，不中断其他集群的检查
+    """
+    cluster_infos = {
+        cluster["id"]: cluster
+        for cluster in clusters.values("id", "immute_domain", "bk_biz_id", "bk_cloud_id", "cluster_type")
+    }
+    cluster_ids = list(cluster_infos.keys())
+    instances = StorageInstance.objects.filter(
+        cluster__id__in=cluster_ids,
+        instance_role__in=[InstanceRole.REDIS_MASTER.value, InstanceRole.REDIS_SLAVE.value],
+    ).values("id", "port", "instance_role", "machine__ip", "cluster__id")
+
+    tuple_fields = ["id", "machine__ip", "port", "instance_role", "cluster__id"]
+    tuples = (
+        StorageInstanceTuple.objects.filter(
+            Q(ejector__cluster__id__in=cluster_ids) | Q(receiver__cluster__id__in=cluster_ids)
+        )
+        .values(*[f"ejector__{field}" for field in tuple_fields], *[f"receiver__{field}" for field in tuple_fields])
+        .distinct()
     )
-    # 遍历集群
-    for c in Cluster.objects.filter(query):
-        logger.info("meta_check: start by {}".format(c))
-        if check_ignore(c):
+    # 实例ID -> 对端实例列表，master的对端为receiver，slave的对端为ejector
+    peers = defaultdict(list)
+    for pair in tuples:
+        ejector = {field: pair[f"ejector__{field}"] for field in tuple_fields}
+        receiver = {field: pair[f"receiver__{field}"] for field in tuple_fields}
+        peers[ejector["id"]].append(receiver)
+        peers[receiver["id"]].append(ejector)
+
+    # (集群ID, 实例角色, 实例IP) -> 对端IP集合，集群不支持一主多从、一从多主
+    peer_ips = defaultdict(set)
+    for ins in instances.iterator():
+        cluster = cluster_infos[ins["cluster__id"]]
+        address = f"{ins['machine__ip']}{IP_PORT_DIVIDER}{ins['port']}"
+        is_master = ins["instance_role"] == InstanceRole.REDIS_MASTER.value
+        role, peer_role = ("master", "slave") if is_master else ("slave", "master")
+        ins_peers = [peer for peer in peers[ins["id"]] if peer["instance_role"] != ins["instance_role"]]
+
+        if not ins_peers:
+            msg = _("集群{}的{}：{} 获取{}失败").format(cluster["immute_domain"], role, address, peer_role)
+            create_meta_alone_report(cluster, ins["machine__ip"], ins["port"], msg, writer)
             continue
-        # proxy节点数不能小于2
-        if c.proxyinstance_set.count() < 2:
-            msg = _("cluster:{} now had proxies[{}] < 2").format(c.immute_domain, c.proxyinstance_set.count())
-            MetaCheckReport.objects.create(
-                bk_biz_id=c.bk_biz_id,
-                bk_cloud_id=c.bk_cloud_id,
-                ip="none",
-                cluster=c.immute_domain,
-                cluster_type=c.cluster_type,
-                status=False,
-                msg=msg,
-                subtype=MetaCheckSubType.AloneInstance.value,
+
+        ip_key = (cluster["id"], ins["instance_role"], ins["machine__ip"])
+        peer_ips[ip_key].update(peer["machine__ip"] for peer in ins_peers)
+        if len(peer_ips[ip_key]) > 1:
+            msg = _("集群{}的{}机器{}对应多台{}机器，不支持一对多的主从架构").format(
+                cluster["immute_domain"], role, ins["machine__ip"], peer_role
             )
+            create_meta_alone_report(cluster, ins["machine__ip"], ins["port"], msg, writer)
 
-        # 检查master对应的slave是否缺失
-        master_slave_map, slave_master_map = defaultdict(), defaultdict()
-        for master_obj in c.storageinstance_set.filter(instance_role=InstanceRole.REDIS_MASTER.value):
-            try:
-                slave_obj = master_obj.as_ejector.get().receiver
-            except ObjectDoesNotExist:
-                logger.error("Error occurred while getting slave_obj")
-                msg = _("集群{}的master：{} 获取slave失败").format(c.immute_domain, master_obj)
-                create_meta_alone_report(c, master_obj, msg)
-                raise NotImplementedError(_("集群{}的master{}get slave_obj failed".format(c.immute_domain, master_obj)))
-
-            # 集群不支持一个主多个从架构
-            ifslave = master_slave_map.get(master_obj.machine.ip)
-            if ifslave and ifslave != slave_obj.machine.ip:
-                msg = _("unsupport mutil slave with cluster {} 4:{}".format(c.immute_domain, master_obj.machine.ip))
-                create_meta_alone_report(c, master_obj, msg)
-                raise Exception(
-                    "unsupport mutil slave with cluster {} 4:{}".format(c.immute_domain, master_obj.machine.ip)
-                )
-            else:
-                master_slave_map[master_obj.machine.ip] = slave_obj.machine.ip
-            # 没获取到对应端口
-            if master_obj.port != slave_obj.port:
-                msg = _("集群{}的master实例：{} 没有slave").format(c.immute_domain, master_obj)
-                create_meta_alone_report(c, master_obj, msg)
-
-        # 检查slave对应的master是否缺失
-        for slave_obj in c.storageinstance_set.filter(instance_role=InstanceRole.REDIS_SLAVE.value):
-            try:
-                master_obj = slave_obj.as_receiver.get().ejector
-            except ObjectDoesNotExist:
-                logger.error("Error occurred while getting master_obj")
-                msg = _("集群{}的slave：{} 获取master失败").format(c.immute_domain, slave_obj)
-                create_meta_alone_report(c, slave_obj, msg)
-                raise NotImplementedError(_("集群{}的slave{} get master_obj failed".format(c.immute_domain, slave_obj)))
-
-            # 不支持一从多主
-            ifmaster = slave_master_map.get(slave_obj.machine.ip)
-            if ifmaster and ifmaster != master_obj.machine.ip:
-                msg = _("unsupport mutil master with cluster {} 4:{}".format(c.immute_domain, slave_obj.machine.ip))
-                create_meta_alone_report(c, slave_obj, msg)
-                raise Exception(
-                    "unsupport mutil master for cluster {}:{}".format(c.immute_domain, slave_obj.machine.ip)
-                )
-            else:
-                slave_master_map[slave_obj.machine.ip] = master_obj.machine.ip
-            # 没获取到对应端口
-            if slave_obj.port != master_obj.port:
-                msg = _("集群{}的slave实例：{} 没有master").format(c.immute_domain, slave_obj)
-                create_meta_alone_report(c, slave_obj, msg)
-        # 实例状态异常
-        for instance_obj in c.storageinstance_set.filter():
-            create_meta_statue_report(c, instance_obj)
-        # proxy状态异常
-        for instance_obj in c.proxyinstance_set.filter():
-            create_meta_statue_report(c, instance_obj)
+        # 没获取到对应端口
+        if any(peer["port"] != ins["port"] for peer in ins_peers):
+            msg = _("集群{}的{}实例：{} 没有{}").format(cluster["immute_domain"], role, address, peer_role)
+            create_meta_alone_report(cluster, ins["machine__ip"], ins["port"], msg, writer)
 
 
-def check_ignore(cluster) -> bool:
+def get_ignore_cluster_ids() -> List[int]:
+    """获取存在禁用、删除单据的集群，这些集群不做检查"""
     ignore_tickets = [
         TicketType.REDIS_INSTANCE_CLOSE.value,
         TicketType.REDIS_PROXY_CLOSE.value,
@@ -138,43 +132,58 @@ def check_ignore(cluster) -> bool:
         TicketType.REDIS_INSTANCE_CLOSE.value,
         TicketType.REDIS_INSTANCE_DESTROY.value,
     ]
-    if ClusterOperateRecord.objects.filter(ticket__ticket_type__in=ignore_tickets, cluster_id=cluster.id).exists():
-        logger.info("meta_check: will ignore cluster {} , 4 it has destory label".format(cluster))
-        return True
-    return False
+    return list(
+        ClusterOperateRecord.objects.filter(ticket__ticket_type__in=ignore_tickets)
+        .values_list("cluster_id", flat=True)
+        .distinct()
+    )
 
 
-def create_meta_statue_report(c, instance_obj):
+def create_meta_status_reports(instance_model, clusters: QuerySet, writer: MetaCheckReportWriter):
     """
     实例状态不为running的写入表中
     """
-    if instance_obj.status != InstanceStatus.RUNNING:
-        msg = _("集群{}的实例:{}实例状态异常:{}").format(c.immute_domain, instance_obj.ip_port, instance_obj.status)
-        MetaCheckReport.objects.create(
-            bk_biz_id=c.bk_biz_id,
-            bk_cloud_id=c.bk_cloud_id,
-            ip=instance_obj.machine.ip,
-            port=instance_obj.port,
-            cluster=c.immute_domain,
-            cluster_type=c.cluster_type,
-            status=False,
+    instances = (
+        instance_model.objects.filter(cluster__in=clusters)
+        .exclude(status=InstanceStatus.RUNNING)
+        .values(
+            "port",
+            "status",
+            "machine__ip",
+            "cluster__bk_biz_id",
+            "cluster__bk_cloud_id",
+            "cluster__immute_domain",
+            "cluster__cluster_type",
+        )
+    )
+    for ins in instances.iterator():
+        msg = _("集群{}的实例:{}{}{}实例状态异常:{}").format(
+            ins["cluster__immute_domain"], ins["machine__ip"], IP_PORT_DIVIDER, ins["port"], ins["status"]
+        )
+        writer.add(
+            bk_biz_id=ins["cluster__bk_biz_id"],
+            bk_cloud_id=ins["cluster__bk_cloud_id"],
+            ip=ins["machine__ip"],
+            port=ins["port"],
+            cluster=ins["cluster__immute_domain"],
+            cluster_type=ins["cluster__cluster_type"],
             msg=msg,
             subtype=MetaCheckSubType.StatusAbnormal.value,
         )
 
 
-def create_meta_alone_report(c, instance_obj, msg):
+def create_meta_alone_report(cluster: Dict, ip: str, port: int, msg: str, writer: MetaCheckReportWriter):
     """
     孤立实例写入表中
+    @param cluster: 集群信息，包括immute_domain、bk_biz_id、bk_cloud_id、cluster_type
     """
-    MetaCheckReport.objects.create(
-        bk_biz_id=c.bk_biz_id,
-        bk_cloud_id=c.bk_cloud_id,
-        ip=instance_obj.machine.ip,
-        port=instance_obj.port,
-        cluster=c.immute_domain,
-        cluster_type=c.cluster_type,
-        status=False,
+    writer.add(
+        bk_biz_id=cluster["bk_biz_id"],
+        bk_cloud_id=cluster["bk_cloud_id"],
+        ip=ip,
+        port=port,
+        cluster=cluster["immute_domain"],
+        cluster_type=cluster["cluster_type"],
         msg=msg,
         subtype=MetaCheckSubType.AloneInstance.value,
     )
@@ -8,13 +8,15 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
-from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import F
 from django.utils.translation import ugettext_lazy as _
 
+from backend.constants import IP_PORT_DIVIDER
 from backend.db_meta.enums import InstanceInnerRole
 from backend.db_meta.models import StorageInstanceTuple
 from backend.db_report.enums import MetaCheckSubType
-from backend.db_report.models import MetaCheckReport
+
+from .engine import MetaCheckReportWriter
 
 
 def check_replicate_role():
@@ -22,42 +24,37 @@ def check_replicate_role():
     ejector 只能是 master, repeater; 即不能是 slave
     receiver 只能是 slave, repeater; 即不能是 master
     """
-    for bad_ejector_tuple in StorageInstanceTuple.objects.filter(
-        ejector__instance_inner_role=InstanceInnerRole.SLAVE.value
-    ):
-        ejector = bad_ejector_tuple.ejector
-        try:
-            MetaCheckReport.objects.create(
-                bk_biz_id=ejector.bk_biz_id,
-                bk_cloud_id=ejector.machine.bk_cloud_id,
-                ip=ejector.machine.ip,
-                port=ejector.port,
-                cluster=ejector.cluster.get().immute_domain,
-                cluster_type=ejector.cluster_type,
-                machine_type=ejector.machine.machine_type,
-                status=False,
-                msg=_("{} {} 不能作为同步 ejector".format(ejector.ip_port, ejector.instance_inner_role)),
-                subtype=MetaCheckSubType.ReplicateRole.value,
-            )
-        except ObjectDoesNotExist:  # 忽略实例没有集群关系的异常, instance-belong 会发现这个错误
-            pass
+    with MetaCheckReportWriter() as writer:
+        _check_bad_tuple_instance("ejector", InstanceInnerRole.SLAVE.value, writer)
+        _check_bad_tuple_instance("receiver", InstanceInnerRole.MASTER.value, writer)
+
 
-    for bad_receiver_tuple in StorageInstanceTuple.objects.filter(
-        receiver__instance_inner_role=InstanceInnerRole.MASTER.value
-    ):
-        receiver = bad_receiver_tuple.ejector
-        try:
-            MetaCheckReport.objects.create(
-                bk_biz_id=receiver.bk_biz_id,
-                bk_cloud_id=receiver.machine.bk_cloud_id,
-                ip=receiver.machine.ip,
-                port=receiver.port,
-                cluster=receiver.cluster.get().immute_domain,
-                cluster_type=receiver.cluster_type,
-                machine_type=receiver.machine.machine_type,
-                status=False,
-                msg=_("{} {} 不能作为同步 receiver".format(receiver.ip_port, receiver.instance_inner_role)),
-                subtype=MetaCheckSubType.ReplicateRole.value,
-            )
-        except ObjectDoesNotExist:  # 忽略实例没有集群关系的异常, instance-belong 会发现这个错误
-            pass
+def _check_bad_tuple_instance(side: str, bad_inner_role: str, writer: MetaCheckReportWriter):
+    """
+    一次查询出同步关系中角色错误的实例
+    @param side: 同步关系的一端 ejector/receiver
+    @param bad_inner_role: 该端不允许的实例角色
+    @param writer: 巡检结果写入器
+    """
+    # 忽略实例没有集群关系的情况, instance-belong 会发现这个错误
+    bad_instances = (
+        StorageInstanceTuple.objects.filter(
+            **{f"{side}__instance_inner_role": bad_inner_role, f"{side}__cluster__isnull": False}
+        )
+        .values(
+            bk_biz_id=F(f"{side}__bk_biz_id"),
+            bk_cloud_id=F(f"{side}__machine__bk_cloud_id"),
+            ip=F(f"{side}__machine__ip"),
+            port=F(f"{side}__port"),
+            cluster=F(f"{side}__cluster__immute_domain"),
+            cluster_type=F(f"{side}__cluster_type"),
+            machine_type=F(f"{side}__machine__machine_type"),
+        )
+        .distinct()
+    )
+    for ins in bad_instances.iterator():
+        writer.add(
+            **ins,
+            msg=_("{}{}{} {} 不能作为同步 {}".format(ins["ip"], IP_PORT_DIVIDER, ins["port"], bad_inner_role, side)),
+            subtype=MetaCheckSubType.ReplicateRole.value,
+        )
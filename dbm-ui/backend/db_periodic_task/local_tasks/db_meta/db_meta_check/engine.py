@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from django.db.models import Aggregate, Count, Q
+from django.utils.translation import ugettext_lazy as _
+
+from backend.db_meta.enums import ClusterType, InstanceInnerRole, InstanceRole, TenDBClusterSpiderRole
+from backend.db_meta.models import Cluster
+from backend.db_periodic_task.local_tasks.db_meta.constants import META_CHECK_REPORT_BATCH_SIZE
+from backend.db_report.enums import MetaCheckSubType
+from backend.db_report.models import MetaCheckReport
+
+
+class MetaCheckReportWriter:
+    """
+    巡检结果写入器，缓存巡检结果并分批 bulk_create，避免每条结果单独写库
+    用法:
+        with MetaCheckReportWriter() as writer:
+            writer.add(bk_biz_id=..., msg=..., subtype=...)
+    """
+
+    def __init__(self, batch_size: int = META_CHECK_REPORT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.reports: List[MetaCheckReport] = []
+
+    def add(self, **kwargs):
+        self.reports.append(MetaCheckReport(status=False, **kwargs))
+        if len(self.reports) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.reports:
+            MetaCheckReport.objects.bulk_create(self.reports, batch_size=self.batch_size)
+        self.reports = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.flush()
+
+
+def count_storage(**filters) -> Count:
+    """统计集群关联的存储实例数量，可按实例属性过滤"""
+    return Count(
+        "storageinstance",
+        filter=Q(**{f"storageinstance__{k}": v for k, v in filters.items()}) if filters else None,
+        distinct=True,
+    )
+
+
+def count_proxy(**filters) -> Count:
+    """统计集群关联的接入层实例数量，可按实例属性过滤"""
+    return Count(
+        "proxyinstance",
+        filter=Q(**{f"proxyinstance__{k}": v for k, v in filters.items()}) if filters else None,
+        distinct=True,
+    )
+
+
+@dataclass
+class TopoCounter:
+    """集群拓扑计数规则：统计集群关联的某类实例数量，并校验数量是否在期望范围内"""
+
+    label: str
+    aggregation: Aggregate
+    min_count: int = 0
+    max_count: Optional[int] = None
+
+    def check(self, count: int) -> Optional[str]:
+        if count < self.min_count or (self.max_count is not None and count > self.max_count):
+            return _("有 {} 个{}").format(count, self.label)
+        return None
+
+
+@dataclass
+class ClusterTopoRule:
+    """
+    集群拓扑规则：对一类集群做一次聚合查询，得到每个集群各类实例的数量后在内存中校验
+    """
+
+    cluster_types: List[str]
+    counters: Dict[str, TopoCounter]
+    subtype: str = MetaCheckSubType.ClusterTopo.value
+
+    def check(self, writer: MetaCheckReportWriter, exclude_cluster_ids: List[int] = None):
+        """
+        执行规则校验，不符合规则的集群写入巡检结果
+        @param writer: 巡检结果写入器
+        @param exclude_cluster_ids: 忽略检查的集群ID列表
+        """
+        clusters = (
+            Cluster.objects.filter(cluster_type__in=self.cluster_types)
+            .exclude(id__in=exclude_cluster_ids or [])
+            .annotate(**{name: counter.aggregation for name, counter in self.counters.items()})
+            .values("immute_domain", "bk_biz_id", "bk_cloud_id", "cluster_type", *self.counters.keys())
+        )
+        for cluster in clusters.iterator():
+            messages = []
+            for name, counter in self.counters.items():
+                message = counter.check(cluster[name])
+                if message:
+                    messages.append(message)
+
+            if messages:
+                writer.add(
+                    bk_biz_id=cluster["bk_biz_id"],
+                    bk_cloud_id=cluster["bk_cloud_id"],
+                    cluster=cluster["immute_domain"],
+                    cluster_type=cluster["cluster_type"],
+                    msg=", ".join(messages),
+                    subtype=self.subtype,
+                )
+
+
+# 各类集群的拓扑规则
+TENDBSINGLE_TOPO_RULE = ClusterTopoRule(
+    cluster_types=[ClusterType.TenDBSingle],
+    counters={
+        "proxy_count": TopoCounter(_("接入层实例"), count_proxy(), max_count=0),
+        "storage_count": TopoCounter(_("存储层实例"), count_storage(), min_count=1, max_count=1),
+    },
+)
+
+TENDBHA_TOPO_RULE = ClusterTopoRule(
+    cluster_types=[ClusterType.TenDBHA],
+    counters={
+        "proxy_count": TopoCounter(_("接入层实例"), count_proxy(), min_count=2),
+        "master_count": TopoCounter(
+            _("master实例"),
+            count_storage(instance_role=InstanceRole.BACKEND_MASTER, instance_inner_role=InstanceInnerRole.MASTER),
+            min_count=1,
+            max_count=1,
+        ),
+        "slave_count": TopoCounter(
+            _("slave实例"),
+            count_storage(instance_role=InstanceRole.BACKEND_SLAVE, instance_inner_role=InstanceInnerRole.SLAVE),
+            min_count=1,
+        ),
+    },
+)
+
+TENDBCLUSTER_TOPO_RULE = ClusterTopoRule(
+    cluster_types=[ClusterType.TenDBCluster],
+    counters={
+        "spider_master_count": TopoCounter(
+            _("spider master实例"),
+            count_proxy(tendbclusterspiderext__spider_role=TenDBClusterSpiderRole.SPIDER_MASTER),
+            min_count=2,
+        ),
+        "remote_master_count": TopoCounter(
+            _("remote master实例"), count_storage(instance_role=InstanceRole.REMOTE_MASTER), min_count=1
+        ),
+        "remote_slave_count": TopoCounter(
+            _("remote slave实例"), count_storage(instance_role=InstanceRole.REMOTE_SLAVE), min_count=1
+        ),
+    },
+)
+
+REDIS_TOPO_RULE = ClusterTopoRule(
+    cluster_types=[
+        ClusterType.TendisPredixyTendisplusCluster,
+        ClusterType.TwemproxyTendisSSDInstance,
+        ClusterType.TendisTwemproxyRedisInstance,
+        ClusterType.TendisRedisCluster,
+    ],
+    counters={"proxy_count": TopoCounter(_("接入层实例"), count_proxy(), min_count=2)},
+    subtype=MetaCheckSubType.AloneInstance.value,
+)
@@ -10,22 +10,42 @@ specific language governing permissions and limitations under the License.
 """
 import logging
 
+from celery import shared_task
 from celery.schedules import crontab
 
 from backend.db_periodic_task.local_tasks.register import register_periodic_task
 
+from .check_cluster_topo import check_cluster_topo
 from .check_instance_belong import check_instance_belong
 from .check_redis_instance import check_redis_instance
 from .check_replicate_role import check_replicate_role
 
 logger = logging.getLogger("celery")
 
+# 相互独立的巡检规则，分别在独立的子任务中并行执行
+META_CHECKS = {
+    "redis_instance": check_redis_instance,
+    "instance_belong": check_instance_belong,
+    "replicate_role": check_replicate_role,
+    "cluster_topo": check_cluster_topo,
+}
+
+
+@shared_task
+def db_meta_check_subtask(check_name: str):
+    """
+    执行单个元数据巡检规则
+    @param check_name: 巡检规则名称
+    """
+    logger.info("db_meta_check: start {}".format(check_name))
+    META_CHECKS[check_name]()
+    logger.info("db_meta_check: finish {}".format(check_name))
+
 
 @register_periodic_task(run_every=crontab(minute=3, hour=2))
 def db_meta_check_task():
     """
     巡检校验元数据
     """
-    check_redis_instance()
-    check_instance_belong()
-    check_replicate_role()
+    for check_name in META_CHECKS:
+        db_meta_check_subtask.apply_async(kwargs={"check_name": check_name})
@@ -10,6 +10,8 @@ specific language governing permissions and limitations under the License.
 """
 import json
 import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 from blueapps.core.celery.celery import app
 from celery.schedules import crontab
@@ -18,7 +20,8 @@ from django.core.cache import cache
 from backend import env
 from backend.configuration.constants import DEFAULT_DB_ADMINISTRATORS, PLAT_BIZ_ID, SystemSettingsEnum
 from backend.configuration.models import DBAdministrator, SystemSettings
-from backend.db_monitor.constants import DEFAULT_ALERT_NOTICE, MONITOR_EVENTS
+from backend.db_monitor.constants import DEFAULT_ALERT_NOTICE, MONITOR_EVENT_SYNC_CONCURRENCY, MONITOR_EVENTS
+from backend.db_monitor.event_counter import MonitorEventCounter
 from backend.db_monitor.models import CollectInstance, DispatchGroup, MonitorPolicy, NoticeGroup
 from backend.db_monitor.tasks import update_app_policy
 from backend.db_periodic_task.local_tasks.context_manager import start_new_span
@@ -71,8 +74,8 @@ def update_dba_notice_group(dba_id: int):
 
 @register_periodic_task(run_every=crontab(minute="*/5"))
 def sync_plat_monitor_policy(action_id=None, db_type=None, force=False):
-    """同步平台告警策略"""
-    MonitorPolicy.sync_plat_monitor_policy(action_id=action_id, db_type=db_type, force=force)
+    """同步平台告警策略，返回跳过/更新/失败的模板数量和耗时"""
+    return MonitorPolicy.sync_plat_monitor_policy(action_id=action_id, db_type=db_type, force=force)
 
 
 @register_periodic_task(run_every=crontab(minute=0, hour="*/1"))
@@ -140,17 +143,22 @@ def sync_monitor_policy_events():
 
     logger.info("sync_monitor_policy_events started")
 
+    # 平台业务(0)的策略归属于dba业务
+    biz_strategy_ids = defaultdict(set)
+    for bk_biz_id, monitor_policy_id in MonitorPolicy.objects.values_list("bk_biz_id", "monitor_policy_id"):
+        biz_strategy_ids[bk_biz_id or env.DBA_APP_BK_BIZ_ID].add(monitor_policy_id)
+
+    def _sync(bk_biz_id):
+        try:
+            return MonitorEventCounter.sync(bk_biz_id, list(biz_strategy_ids[bk_biz_id]))
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error("sync_monitor_policy_events failed for biz %s: %s", bk_biz_id, e)
+            return {}
+
     event_counts = {}
-    for bk_biz_id in MonitorPolicy.objects.values_list("bk_biz_id", flat=True).distinct():
-        monitor_policy_ids = list(
-            MonitorPolicy.objects.filter(bk_biz_id=bk_biz_id).values_list("monitor_policy_id", flat=True).distinct()
-        )
-
-        bk_biz_id = bk_biz_id or env.DBA_APP_BK_BIZ_ID
-        biz_event_counts = MonitorPolicy.bkm_search_event(
-            bk_biz_ids=[bk_biz_id], strategy_id=monitor_policy_ids, days=14
-        )
-        event_counts.update(biz_event_counts)
+    with ThreadPoolExecutor(max_workers=MONITOR_EVENT_SYNC_CONCURRENCY) as executor:
+        for biz_event_counts in executor.map(_sync, biz_strategy_ids):
+            event_counts.update(biz_event_counts)
 
     logger.info("sync_monitor_policy_events -> policy_event_counts = %s", event_counts)
     cache.set(MONITOR_EVENTS, json.dumps(event_counts))
@@ -10,46 +10,58 @@ specific language governing permissions and limitations under the License.
 """
 import logging
 from collections import defaultdict
+from typing import Dict, List
 
+from backend.components.bklog.handler import BKLogScroll
 from backend.db_meta.enums import ClusterType
 from backend.db_meta.models import Cluster
 from backend.db_periodic_task.constants import BACKUP_TASK_SUCCESS
 from backend.db_report.enums import MysqlBackupCheckSubType
 from backend.db_report.models import MysqlBackupCheckReport
 
-from .bklog_query import ClusterBackup
-from .check_full_backup import get_query_date_time
+from .bklog_query import ClusterBackup, fetch_binlogs_by_cluster
+from .check_full_backup import get_query_date_time, truncated_msg
 
 logger = logging.getLogger("root")
 
 
 def check_binlog_backup(date_str: str):
-    _check_tendbha_binlog_backup(date_str)
-    _check_tendbcluster_binlog_backup(date_str)
+    # binlog备份日志只拉取一次，按集群ID分组后供各类集群巡检
+    start_time, end_time = get_query_date_time(date_str)
+    cluster_binlogs, scroll = fetch_binlogs_by_cluster(start_time, end_time)
+    logger.info(
+        "==== fetch {} binlog logs with {} queries, truncated: {} ====".format(
+            scroll.count, scroll.queries, scroll.truncated_windows
+        )
+    )
+    _check_tendbha_binlog_backup(date_str, cluster_binlogs, scroll)
+    _check_tendbcluster_binlog_backup(date_str, cluster_binlogs, scroll)
 
 
-def _check_tendbha_binlog_backup(date_str: str):
+def _check_tendbha_binlog_backup(date_str: str, cluster_binlogs: Dict[int, List[Dict]], scroll: BKLogScroll):
     """
     master 实例必须要有备份binlog
     且binlog序号要连续
     """
     logger.info("==== start check binlog for cluster type {} ====".format(ClusterType.TenDBHA))
-    return _check_binlog_backup(ClusterType.TenDBHA, date_str)
+    return _check_binlog_backup(ClusterType.TenDBHA, date_str, cluster_binlogs, scroll)
 
 
-def _check_tendbcluster_binlog_backup(date_str: str):
+def _check_tendbcluster_binlog_backup(date_str: str, cluster_binlogs: Dict[int, List[Dict]], scroll: BKLogScroll):
     """
     master 实例必须要有备份binlog
     且binlog序号要连续
     """
     logger.info("==== start check binlog for cluster type {} ====".format(ClusterType.TenDBCluster))
-    return _check_binlog_backup(ClusterType.TenDBCluster, date_str)
+    return _check_binlog_backup(ClusterType.TenDBCluster, date_str, cluster_binlogs, scroll)
 
 
-def _check_binlog_backup(cluster_type, date_str):
+def _check_binlog_backup(cluster_type, date_str, cluster_binlogs: Dict[int, List[Dict]], scroll: BKLogScroll):
     """
     master 实例必须要有备份binlog
     且binlog序号要连续
+    @param cluster_binlogs: 按集群ID分组的binlog备份记录
+    @param scroll: 日志拉取器，用于判断日志是否被截断
     """
     start_time, end_time = get_query_date_time(date_str)
     logger.info(
@@ -57,6 +69,7 @@ def _check_binlog_backup(cluster_type, date_str):
             cluster_type, start_time, end_time
         )
     )
+    reports = []
     for c in Cluster.objects.filter(cluster_type=cluster_type):
         backup = ClusterBackup(c.id, c.immute_domain)
         logger.info(
@@ -66,7 +79,7 @@ def _check_binlog_backup(cluster_type, date_str):
         )
         # todo 需要获取集群的 master 分片实例，或者分片数
 
-        items = backup.query_binlog_from_bklog(start_time, end_time)
+        items = cluster_binlogs.get(c.id, [])
         instance_binlogs = defaultdict(list)
         shard_binlog_stat = {}
         for i in items:
@@ -87,15 +100,18 @@ def _check_binlog_backup(cluster_type, date_str):
                 backup.success = False
 
         if not backup.success:
-            MysqlBackupCheckReport.objects.create(
-                bk_biz_id=c.bk_biz_id,
-                bk_cloud_id=c.bk_cloud_id,
-                cluster=c.immute_domain,
-                cluster_type=cluster_type,
-                status=False,
-                msg="binlog is not consecutive:{}".format(shard_binlog_stat),
-                subtype=MysqlBackupCheckSubType.BinlogSeq.value,
+            reports.append(
+                MysqlBackupCheckReport(
+                    bk_biz_id=c.bk_biz_id,
+                    bk_cloud_id=c.bk_cloud_id,
+                    cluster=c.immute_domain,
+                    cluster_type=cluster_type,
+                    status=False,
+                    msg=truncated_msg("binlog is not consecutive:{}".format(shard_binlog_stat), scroll),
+                    subtype=MysqlBackupCheckSubType.BinlogSeq.value,
+                )
             )
+    MysqlBackupCheckReport.objects.bulk_create(reports, batch_size=500)
 
 
 def is_consecutive_strings(str_list: list):
@@ -11,16 +11,18 @@ specific language governing permissions and limitations under the License.
 import logging
 from collections import defaultdict
 from datetime import datetime, time, timedelta
+from typing import Dict, List
 
 from django.db.models import Q
 from django.utils import timezone
 
+from backend.components.bklog.handler import BKLogScroll
 from backend.db_meta.enums import ClusterType
 from backend.db_meta.models import Cluster
 from backend.db_report.enums import MysqlBackupCheckSubType
 from backend.db_report.models import MysqlBackupCheckReport
 
-from .bklog_query import ClusterBackup
+from .bklog_query import ClusterBackup, fetch_backup_logs_by_domain
 
 logger = logging.getLogger("root")
 
@@ -42,11 +44,27 @@ def get_query_date_time(date_str: str):
         return start_of_day, end_of_day
 
 
+def truncated_msg(msg: str, scroll: BKLogScroll) -> str:
+    """日志拉取被截断时，在巡检结果中注明，提示结果可能不准确"""
+    if not scroll.truncated:
+        return msg
+    windows = ["[{},{}]:{}".format(start, end, total) for start, end, total in scroll.truncated_windows]
+    return "{} (bklog truncated:{})".format(msg, ",".join(windows))
+
+
 def check_full_backup(date_str: str):
+    # 全备日志只拉取一次，按集群域名分组后供各类集群巡检
+    start_time, end_time = get_query_date_time(date_str)
+    domain_backups, scroll = fetch_backup_logs_by_domain(start_time, end_time)
+    logger.info(
+        "==== fetch {} full backup logs with {} queries, truncated: {} ====".format(
+            scroll.count, scroll.queries, scroll.truncated_windows
+        )
+    )
     # tendbha 全备巡检
-    _check_tendbha_full_backup(date_str)
+    _check_tendbha_full_backup(date_str, domain_backups, scroll)
     # tendbcluster 全备巡检
-    _check_tendbcluster_full_backup(date_str)
+    _check_tendbcluster_full_backup(date_str, domain_backups, scroll)
 
 
 class BackupFile:
@@ -97,7 +115,7 @@ def _build_backup_info_files(backups_info: []):
     return backups
 
 
-def _check_tendbha_full_backup(date_str: str):
+def _check_tendbha_full_backup(date_str: str, domain_backups: Dict[str, List[Dict]], scroll: BKLogScroll):
     """
     tendbha 必须有一份完整的备份
     """
@@ -112,13 +130,12 @@ def _check_tendbha_full_backup(date_str: str):
             ClusterType.TenDBHA, start_time, end_time
         )
     )
+    reports = []
     query = Q(cluster_type=ClusterType.TenDBHA) & Q(create_at__lt=timezone.now() - timedelta(days=1))
     for c in Cluster.objects.filter(query):
         logger.info("==== start check full backup for cluster {} ====".format(c.immute_domain))
         backup = ClusterBackup(c.id, c.immute_domain)
-
-        items = backup.query_backup_log_from_bklog(start_time, end_time)
-        backup.backups = _build_backup_info_files(items)
+        backup.backups = _build_backup_info_files(domain_backups.get(c.immute_domain, []))
 
         for bid, bk in backup.backups.items():
             if bk.is_full_backup == 1:
@@ -126,18 +143,21 @@ def _check_tendbha_full_backup(date_str: str):
                     backup.success = True
                     break
         if not backup.success:
-            MysqlBackupCheckReport.objects.create(
-                bk_biz_id=c.bk_biz_id,
-                bk_cloud_id=c.bk_cloud_id,
-                cluster=c.immute_domain,
-                cluster_type=ClusterType.TenDBHA,
-                status=False,
-                msg="no success full backup found",
-                subtype=MysqlBackupCheckSubType.FullBackup.value,
+            reports.append(
+                MysqlBackupCheckReport(
+                    bk_biz_id=c.bk_biz_id,
+                    bk_cloud_id=c.bk_cloud_id,
+                    cluster=c.immute_domain,
+                    cluster_type=ClusterType.TenDBHA,
+                    status=False,
+                    msg=truncated_msg("no success full backup found", scroll),
+                    subtype=MysqlBackupCheckSubType.FullBackup.value,
+                )
             )
+    MysqlBackupCheckReport.objects.bulk_create(reports, batch_size=500)
 
 
-def _check_tendbcluster_full_backup(date_str: str):
+def _check_tendbcluster_full_backup(date_str: str, domain_backups: Dict[str, List[Dict]], scroll: BKLogScroll):
     """
     tendbcluster 集群必须有完整的备份
     """
@@ -148,11 +168,11 @@ def _check_tendbcluster_full_backup(date_str: str):
         )
     )
 
+    reports = []
     for c in Cluster.objects.filter(cluster_type=ClusterType.TenDBCluster):
         logger.info("==== start check full backup for cluster {} ====".format(c.immute_domain))
         backup = ClusterBackup(c.id, c.immute_domain)
-        items = backup.query_backup_log_from_bklog(start_time, end_time)
-        backup.backups = _build_backup_info_files(items)
+        backup.backups = _build_backup_info_files(domain_backups.get(c.immute_domain, []))
 
         backup_id_stat = defaultdict(list)
         backup_id_invalid = {}
@@ -175,12 +195,15 @@ def _check_tendbcluster_full_backup(date_str: str):
 
         # 只记录失败的结果
         if not backup.success:
-            MysqlBackupCheckReport.objects.create(
-                bk_biz_id=c.bk_biz_id,
-                bk_cloud_id=c.bk_cloud_id,
-                cluster=c.immute_domain,
-                cluster_type=ClusterType.TenDBCluster,
-                status=False,
-                msg="no success full backup found:{}".format(message),
-                subtype=MysqlBackupCheckSubType.FullBackup.value,
+            reports.append(
+                MysqlBackupCheckReport(
+                    bk_biz_id=c.bk_biz_id,
+                    bk_cloud_id=c.bk_cloud_id,
+                    cluster=c.immute_domain,
+                    cluster_type=ClusterType.TenDBCluster,
+                    status=False,
+                    msg=truncated_msg("no success full backup found:{}".format(message), scroll),
+                    subtype=MysqlBackupCheckSubType.FullBackup.value,
+                )
             )
+    MysqlBackupCheckReport.objects.bulk_create(reports, batch_size=500)
@@ -8,14 +8,21 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+import logging
+
 from celery.schedules import crontab
 
 from backend.db_periodic_task.local_tasks import register_periodic_task
 from backend.db_services.taskflow import task as TaskFlow
+from backend.flow.signal.handlers import get_flow_state_signal_stats
+from backend.flow.utils.base.job_poller import JobStatusPoller
+from backend.ticket.constants import EXCLUSIVE_WAIT_SWEEP_INTERVAL
 from backend.ticket.tasks.ticket_tasks import TicketTask
 
+logger = logging.getLogger("celery")
 
-@register_periodic_task(run_every=5)
+
+@register_periodic_task(run_every=EXCLUSIVE_WAIT_SWEEP_INTERVAL)
 def auto_retry_exclusive_inner_flow():
     TicketTask.retry_exclusive_inner_flow()
 
@@ -30,6 +37,19 @@ def clean_bamboo_engine_expired_data():
     TaskFlow.clean_bamboo_engine_expired_data()
 
 
+@register_periodic_task(run_every=5)
+def auto_poll_job_instance_status():
+    """统一轮询流程节点中运行的job状态，供节点调度时读取"""
+    JobStatusPoller.poll()
+
+
+@register_periodic_task(run_every=crontab(minute="*/10"))
+def report_flow_state_signal_stats():
+    """记录流程状态信号的合并效果：收到的信号数、被合并的信号数和流程状态评估次数"""
+    stats = get_flow_state_signal_stats()
+    logger.info("[report_flow_state_signal_stats] flow state signal stats: %s", stats)
+
+
 @register_periodic_task(run_every=crontab(hour="*/1", minute=0))
 def auto_clear_expire_flow():
     TicketTask.auto_clear_expire_flow()
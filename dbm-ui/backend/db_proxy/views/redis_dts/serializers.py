@@ -70,6 +70,23 @@ class DtsLast30DaysToScheduleJobsSerializer(BaseProxyPassSerializer):
     db_type = serializers.CharField(help_text=_("db类型"), required=True)
 
 
+class DtsClaimTasksSerializer(BaseProxyPassSerializer):
+    bk_cloud_id = serializers.IntegerField(help_text=_("云区域ID"), required=True)
+    dts_server = serializers.IPAddressField(help_text=_("DTS_server IP"), required=True)
+    max_data_size = serializers.IntegerField(help_text=_("最大数据量"), required=False)
+    zone_name = serializers.CharField(help_text=_("城市名"), required=False, allow_blank=True)
+    db_type = serializers.CharField(help_text=_("db类型"), required=False, allow_blank=True)
+    limit = serializers.IntegerField(help_text=_("认领条数"), required=False, default=1)
+    wait_seconds = serializers.IntegerField(help_text=_("无可认领task时的长轮询等待时间(秒)"), required=False, default=0)
+
+
+class DtsClaimStatsSerializer(BaseProxyPassSerializer):
+    bk_cloud_id = serializers.IntegerField(help_text=_("云区域ID"), required=True)
+    max_data_size = serializers.IntegerField(help_text=_("最大数据量"), required=False)
+    zone_name = serializers.CharField(help_text=_("城市名"), required=False, allow_blank=True)
+    db_type = serializers.CharField(help_text=_("db类型"), required=False, allow_blank=True)
+
+
 class DtsJobToScheduleTasksSerializer(BaseProxyPassSerializer):
     bill_id = serializers.IntegerField(help_text=_("任务ID"), required=True)
     src_cluster = serializers.CharField(help_text=_("源集群"), required=True)
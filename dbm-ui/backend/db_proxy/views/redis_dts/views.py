@@ -15,6 +15,8 @@ from rest_framework.response import Response
 from backend.bk_web.swagger import common_swagger_auto_schema
 from backend.db_proxy.constants import SWAGGER_TAG
 from backend.db_proxy.views.redis_dts.serializers import (
+    DtsClaimStatsSerializer,
+    DtsClaimTasksSerializer,
     DtsDistributeLockSerializer,
     DtsJobSrcIPRunningTasksSerializer,
     DtsJobTasksSerializer,
@@ -37,10 +39,12 @@ from backend.db_proxy.views.redis_dts.serializers import (
 )
 from backend.db_proxy.views.views import BaseProxyPassViewSet
 from backend.db_services.redis.redis_dts.apis import (
+    dts_claim_tasks,
     dts_distribute_trylock,
     dts_distribute_unlock,
     dts_tasks_updates,
     dts_test_redis_connections,
+    get_dts_claim_stats,
     get_dts_job_detail,
     get_dts_job_tasks,
     get_dts_server_max_sync_port,
@@ -206,6 +210,26 @@ class DtsApiProxyPassViewSet(BaseProxyPassViewSet):
         validated_data = self.params_validate(self.get_serializer_class())
         return Response(get_job_to_schedule_tasks(validated_data))
 
+    @common_swagger_auto_schema(
+        operation_summary=_("dts server认领待调度的tasks"),
+        request_body=DtsClaimTasksSerializer,
+        tags=[SWAGGER_TAG],
+    )
+    @action(methods=["POST"], detail=False, serializer_class=DtsClaimTasksSerializer, url_path="redis_dts/claim_tasks")
+    def claim_tasks(self, request):
+        validated_data = self.params_validate(self.get_serializer_class())
+        return Response(dts_claim_tasks(validated_data))
+
+    @common_swagger_auto_schema(
+        operation_summary=_("获取task认领的队列深度和认领统计"),
+        request_body=DtsClaimStatsSerializer,
+        tags=[SWAGGER_TAG],
+    )
+    @action(methods=["POST"], detail=False, serializer_class=DtsClaimStatsSerializer, url_path="redis_dts/claim_stats")
+    def get_claim_stats(self, request):
+        validated_data = self.params_validate(self.get_serializer_class())
+        return Response(get_dts_claim_stats(validated_data))
+
     @common_swagger_auto_schema(
         operation_summary=_("获取一个job的中某个slave机器上运行中的tasks"),
         request_body=DtsJobSrcIPRunningTasksSerializer,
@@ -19,3 +19,12 @@ class ResourceNodeType(str, StructuredEnum):
     BIZ = EnumField("biz", _("业务"))
     CLUSTER = EnumField("cluster", _("集群"))
     MODULE = EnumField("module", _("模块"))
+
+
+# 集群列表总数缓存前缀和缓存时间(秒)
+CLUSTER_COUNT_CACHE_KEY = "resource_cluster_count"
+CLUSTER_COUNT_CACHE_TIMEOUT = 60
+# 集群总数超过该阈值后，不再每次精确计数，而是使用缓存的计数结果
+CLUSTER_COUNT_ESTIMATE_THRESHOLD = 2000
+# 集群/实例通用属性查询时，每批处理的记录数
+COMMON_QUERY_CHUNK_SIZE = 1000
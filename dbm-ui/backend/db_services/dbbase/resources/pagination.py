@@ -22,6 +22,7 @@ class ResourceLimitOffsetPagination(AuditedLimitOffsetPagination):
     limit = 10
     offset = 0
     count = 0
+    next_cursor = ""
 
     def paginate_list(self, request, bk_biz_id: int, query_method: Callable, query_params: Dict):
         limit_query_param = request.query_params.get(self.limit_query_param)
@@ -46,6 +47,7 @@ class ResourceLimitOffsetPagination(AuditedLimitOffsetPagination):
 
         self.request = request
         self.count = data_list.count
+        self.next_cursor = data_list.next_cursor
 
         if self.count > self.limit and self.template is not None:
             self.display_page_controls = True
@@ -54,3 +56,9 @@ class ResourceLimitOffsetPagination(AuditedLimitOffsetPagination):
             return []
 
         return data_list.data
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        # 补充游标分页的下一页游标，前端可通过cursor参数继续翻页
+        response.data["next_cursor"] = self.next_cursor
+        return response
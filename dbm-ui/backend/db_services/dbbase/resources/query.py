@@ -9,11 +9,14 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 import abc
-from typing import Any, Callable, Dict, List, Tuple, Union
+import hashlib
+from collections import defaultdict
+from typing import Any, Callable, Dict, Generator, List, Tuple
 
 import attr
+from django.core.cache import cache
 from django.db.models import F, Prefetch, Q, QuerySet
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse
 from django.utils.translation import ugettext_lazy as _
 
 from backend.constants import IP_PORT_DIVIDER
@@ -30,15 +33,25 @@ from backend.db_meta.models import (
     StorageInstanceTuple,
 )
 from backend.db_services.dbbase.instances.handlers import InstanceHandler
+from backend.db_services.dbbase.resources.constants import (
+    CLUSTER_COUNT_CACHE_KEY,
+    CLUSTER_COUNT_CACHE_TIMEOUT,
+    CLUSTER_COUNT_ESTIMATE_THRESHOLD,
+    COMMON_QUERY_CHUNK_SIZE,
+)
 from backend.db_services.dbbase.resources.query_base import (
     build_q_for_domain_by_cluster,
     build_q_for_domain_by_instance,
     build_q_for_instance_filter,
+    build_q_for_keyset,
+    encode_cursor,
+    parse_ordering,
 )
 from backend.db_services.ipchooser.handlers.host_handler import HostHandler
 from backend.db_services.ipchooser.query.resource import ResourceQueryHelper
 from backend.flow.utils.dns_manage import DnsManage
 from backend.ticket.models import ClusterOperateRecord
+from backend.utils.basic import chunk_iterable
 from backend.utils.excel import ExcelHandler
 from backend.utils.time import datetime2str
 
@@ -47,6 +60,8 @@ from backend.utils.time import datetime2str
 class ResourceList:
     count = attr.ib(validator=attr.validators.instance_of(int))
     data = attr.ib(validator=attr.validators.instance_of(list))
+    # 游标分页时下一页的游标，为空表示没有下一页
+    next_cursor = attr.ib(default="", validator=attr.validators.instance_of(str))
 
 
 class CommonQueryResourceMixin(abc.ABC):
@@ -76,17 +91,19 @@ class CommonQueryResourceMixin(abc.ABC):
         return entry_details
 
     @staticmethod
-    def common_query_cluster(bk_biz_id: int, cluster_types: list, cluster_ids: list) -> Tuple[List[Dict], List[Dict]]:
-        """集群的通用属性查询"""
+    def common_query_cluster(
+        bk_biz_id: int, cluster_types: list, cluster_ids: list
+    ) -> Tuple[List[Dict], Generator[Dict, None, None]]:
+        """
+        集群的通用属性查询
+        集群按批次迭代，每批单独查询实例和访问入口，内存占用与业务规模无关
+        返回的数据为生成器，需要列表的调用方自行物化
+        """
         # 获取所有符合条件的集群对象
-        clusters = Cluster.objects.prefetch_related(
-            "storageinstance_set", "proxyinstance_set", "storageinstance_set__machine", "proxyinstance_set__machine"
-        ).filter(bk_biz_id=bk_biz_id, cluster_type__in=cluster_types)
+        clusters = Cluster.objects.filter(bk_biz_id=bk_biz_id, cluster_type__in=cluster_types)
         if cluster_ids:
             clusters = clusters.filter(id__in=cluster_ids)
 
-        cluster_entry_map = ClusterEntry.get_cluster_entry_map(cluster_ids=list(clusters.values_list("id", flat=True)))
-
         # 初始化用于存储Excel数据的字典列表
         headers = [
             {"id": "cluster_id", "name": _("集群 ID")},
@@ -99,64 +116,60 @@ class CommonQueryResourceMixin(abc.ABC):
             {"id": "region", "name": _("地域")},
             {"id": "disaster_tolerance_level", "name": _("容灾级别")},
         ]
+        # 数据按批次生成，角色表头需要预先查询
+        instance_models = [ProxyInstance, StorageInstance]
         role_header_ids = set()
-
-        def fill_instances_to_cluster_info(
-            _cluster_info: Dict, instances: List[Union[StorageInstance, ProxyInstance]]
-        ):
-            """
-            把实例信息填充到集群信息中
-            """
-            for ins in instances:
-                # 获取存储实例所属角色
-                role = ins.instance_role
-
-                # 如果该角色已经存在于集群信息字典中，则添加新的IP和端口；否则，更新字典的值
-                if role in cluster_info:
-                    cluster_info[role] += f"\n{ins.machine.ip}#{ins.port}"
-                else:
-                    role_header_ids.add(role)
-                    cluster_info[role] = f"{ins.machine.ip}#{ins.port}"
-
-        # 遍历所有的集群对象
-        data_list = []
-        for cluster in clusters:
-            # 创建一个空字典来保存当前集群的信息
-            cluster_info = {
-                "cluster_id": cluster.id,
-                "cluster_name": cluster.name,
-                "cluster_alias": cluster.alias,
-                "cluster_type": cluster.cluster_type,
-                "master_domain": cluster.immute_domain,
-                "slave_domain": cluster_entry_map[cluster.id].get("slave_domain", ""),
-                "major_version": cluster.major_version,
-                "region": cluster.region,
-                "disaster_tolerance_level": cluster.get_disaster_tolerance_level_display(),
-            }
-            fill_instances_to_cluster_info(cluster_info, cluster.proxyinstance_set.all())
-            fill_instances_to_cluster_info(cluster_info, cluster.storageinstance_set.all())
-
-            # 将当前集群的信息追加到data_list列表中
-            data_list.append(cluster_info)
-
+        for model in instance_models:
+            role_header_ids.update(
+                model.objects.filter(cluster__in=clusters).values_list("instance_role", flat=True).distinct()
+            )
         for ins_role in InstanceRole.get_values():
             if ins_role in role_header_ids:
                 headers.append({"id": ins_role, "name": InstanceRole.get_choice_label(ins_role)})
 
-        return headers, data_list
+        def generate_cluster_infos():
+            cluster_id_iter = clusters.order_by("id").values_list("id", flat=True).iterator(COMMON_QUERY_CHUNK_SIZE)
+            for chunk_ids in chunk_iterable(cluster_id_iter, COMMON_QUERY_CHUNK_SIZE):
+                cluster_entry_map = ClusterEntry.get_cluster_entry_map(cluster_ids=chunk_ids)
+                # 按集群、角色聚合实例的IP和端口，先proxy后storage
+                cluster_role_instances: Dict[int, Dict[str, List[str]]] = defaultdict(lambda: defaultdict(list))
+                for model in instance_models:
+                    instances = model.objects.filter(cluster__in=chunk_ids).values_list(
+                        "cluster__id", "instance_role", "machine__ip", "port"
+                    )
+                    for cluster_id, role, ip, port in instances:
+                        cluster_role_instances[cluster_id][role].append(f"{ip}#{port}")
+
+                for cluster in Cluster.objects.filter(id__in=chunk_ids).order_by("id"):
+                    # 创建一个空字典来保存当前集群的信息
+                    cluster_info = {
+                        "cluster_id": cluster.id,
+                        "cluster_name": cluster.name,
+                        "cluster_alias": cluster.alias,
+                        "cluster_type": cluster.cluster_type,
+                        "master_domain": cluster.immute_domain,
+                        "slave_domain": cluster_entry_map[cluster.id].get("slave_domain", ""),
+                        "major_version": cluster.major_version,
+                        "region": cluster.region,
+                        "disaster_tolerance_level": cluster.get_disaster_tolerance_level_display(),
+                    }
+                    for role, addresses in cluster_role_instances[cluster.id].items():
+                        cluster_info[role] = "\n".join(addresses)
+                    yield cluster_info
+
+        return headers, generate_cluster_infos()
 
     @staticmethod
-    def common_query_instance(bk_biz_id: int, cluster_types: list, bk_host_ids: list) -> Tuple[List[Dict], List[Dict]]:
-        """实例通用属性查询"""
+    def common_query_instance(
+        bk_biz_id: int, cluster_types: list, bk_host_ids: list
+    ) -> Tuple[List[Dict], Generator[Dict, None, None]]:
+        """
+        实例通用属性查询
+        实例按批次迭代，每批单独关联机器、城市和集群信息；需要列表的调用方自行物化
+        """
         query_condition = Q(bk_biz_id=bk_biz_id, cluster_type__in=cluster_types)
         if bk_host_ids:
             query_condition = query_condition & Q(machine__bk_host_id__in=bk_host_ids)
-        storages = StorageInstance.objects.prefetch_related("machine", "machine__bk_city", "cluster").filter(
-            query_condition
-        )
-        proxies = ProxyInstance.objects.prefetch_related("machine", "machine__bk_city", "cluster").filter(
-            query_condition
-        )
         headers = [
             {"id": "bk_host_id", "name": _("主机 ID")},
             {"id": "bk_cloud_id", "name": _("云区域 ID")},
@@ -172,52 +185,59 @@ class CommonQueryResourceMixin(abc.ABC):
             {"id": "master_domain", "name": _("主域名")},
             {"id": "major_version", "name": _("主版本")},
         ]
-        # 插入数据
-        data_list = []
-        for instances in [storages, proxies]:
-            for ins in instances:
-                for cluster in ins.cluster.all():
-                    data_list.append(
-                        {
-                            "bk_host_id": ins.machine.bk_host_id,
-                            "bk_cloud_id": ins.machine.bk_cloud_id,
-                            "ip": ins.machine.ip,
-                            "ip_port": ins.ip_port,
-                            "instance_role": ins.instance_role,
-                            "bk_idc_city_name": ins.machine.bk_city.bk_idc_city_name,
-                            "bk_idc_name": ins.machine.bk_idc_name,
-                            "cluster_id": cluster.id,
-                            "cluster_name": cluster.name,
-                            "cluster_alias": cluster.alias,
-                            "cluster_type": cluster.cluster_type,
-                            "master_domain": cluster.immute_domain,
-                            "major_version": cluster.major_version,
-                        }
-                    )
 
-        return headers, data_list
+        def generate_instance_infos():
+            for model in [StorageInstance, ProxyInstance]:
+                instance_ids = model.objects.filter(query_condition).order_by("id").values_list("id", flat=True)
+                instance_id_iter = instance_ids.iterator(COMMON_QUERY_CHUNK_SIZE)
+                for chunk_ids in chunk_iterable(instance_id_iter, COMMON_QUERY_CHUNK_SIZE):
+                    instances = (
+                        model.objects.select_related("machine", "machine__bk_city")
+                        .prefetch_related("cluster")
+                        .filter(id__in=chunk_ids)
+                        .order_by("id")
+                    )
+                    for ins in instances:
+                        for cluster in ins.cluster.all():
+                            yield {
+                                "bk_host_id": ins.machine.bk_host_id,
+                                "bk_cloud_id": ins.machine.bk_cloud_id,
+                                "ip": ins.machine.ip,
+                                "ip_port": ins.ip_port,
+                                "instance_role": ins.instance_role,
+                                "bk_idc_city_name": ins.machine.bk_city.bk_idc_city_name,
+                                "bk_idc_name": ins.machine.bk_idc_name,
+                                "cluster_id": cluster.id,
+                                "cluster_name": cluster.name,
+                                "cluster_alias": cluster.alias,
+                                "cluster_type": cluster.cluster_type,
+                                "master_domain": cluster.immute_domain,
+                                "major_version": cluster.major_version,
+                            }
+
+        return headers, generate_instance_infos()
 
     @classmethod
-    def export_cluster(cls, bk_biz_id: int, cluster_ids: list) -> HttpResponse:
+    def export_cluster(cls, bk_biz_id: int, cluster_ids: list) -> StreamingHttpResponse:
         """集群通用属性导出"""
         headers, data_list = cls.common_query_cluster(bk_biz_id, cls.cluster_types, cluster_ids)
 
         biz_abbr = AppCache.get_app_attr(bk_biz_id)
         db_type = ClusterType.cluster_type_to_db_type(cls.cluster_types[0])
-        wb = ExcelHandler.serialize(data_list, headers=headers, match_header=True)
+        wb = ExcelHandler.serialize_stream(data_list, headers=headers, match_header=True)
 
-        return ExcelHandler.response(wb, f"{biz_abbr}({bk_biz_id}){db_type}_cluster.xlsx")
+        return ExcelHandler.stream_response(wb, f"{biz_abbr}({bk_biz_id}){db_type}_cluster.xlsx")
 
     @classmethod
-    def export_instance(cls, bk_biz_id: int, bk_host_ids: list) -> HttpResponse:
+    def export_instance(cls, bk_biz_id: int, bk_host_ids: list) -> StreamingHttpResponse:
         """实例通用属性导出"""
         headers, data_list = cls.common_query_instance(bk_biz_id, cls.cluster_types, bk_host_ids)
 
         biz_name = AppCache.get_biz_name(bk_biz_id)
         db_type = ClusterType.cluster_type_to_db_type(cls.cluster_types[0])
-        wb = ExcelHandler.serialize(data_list, headers=headers, match_header=True)
+        wb = ExcelHandler.serialize_stream(data_list, headers=headers, match_header=True)
 
-        return ExcelHandler.response(wb, f"{biz_name}({bk_biz_id}){db_type}_instances.xlsx")
+        return ExcelHandler.stream_response(wb, f"{biz_name}({bk_biz_id}){db_type}_instances.xlsx")
 
     @classmethod
     def get_temporary_cluster_info(cls, cluster, ticket_type):
@@ -435,12 +455,16 @@ class ListRetrieveResource(BaseListRetrieveResource):
                     query_params, cluster_queryset, proxy_queryset, storage_queryset
                 )
 
-        #  部署时间表头排序
-        if query_params.get("ordering"):
-            cluster_queryset = cluster_queryset.order_by(query_params.get("ordering"))
-
+        # 部署时间表头排序和游标分页，在分页查询集群ID时处理
         cluster_infos = cls._filter_cluster_hook(
-            bk_biz_id, cluster_queryset, proxy_queryset, storage_queryset, limit, offset
+            bk_biz_id,
+            cluster_queryset,
+            proxy_queryset,
+            storage_queryset,
+            limit,
+            offset,
+            ordering=query_params.get("ordering"),
+            cursor=query_params.get("cursor"),
         )
         return cluster_infos
 
@@ -463,24 +487,27 @@ class ListRetrieveResource(BaseListRetrieveResource):
         @param storage_queryset: 过滤的storage查询集
         @param limit: 分页限制
         @param offset: 分页起始
+        kwargs 中的 ordering 和 cursor 分别为排序字段和键集分页游标
         """
-
-        count = cluster_queryset.count()
-        limit = count if limit == -1 else limit
+        ordering, cursor = kwargs.pop("ordering", None), kwargs.pop("cursor", None)
+        count = cls._count_clusters(bk_biz_id, cluster_queryset)
         if count == 0:
             return ResourceList(count=0, data=[])
 
+        # 只查询当前页的集群ID，后续的预取和映射信息都只基于当前页的集群构造
+        cluster_ids, next_cursor = cls._get_page_cluster_ids(cluster_queryset, limit, offset, ordering, cursor)
+        page_storage_queryset = storage_queryset.filter(cluster__in=cluster_ids)
         storage_instance_queryset = StorageInstance.objects.prefetch_related(
             Prefetch(
                 "as_ejector",
                 queryset=StorageInstanceTuple.objects.filter(
-                    ejector__in=storage_queryset.values_list("id", flat=True)
+                    ejector__in=page_storage_queryset.values_list("id", flat=True)
                 ),
                 to_attr="instance_tuples",
             )
         )
         # 预取proxy_queryset，storage_queryset，clusterentry_set,加块查询效率
-        cluster_list = cluster_queryset[offset : limit + offset].prefetch_related(
+        cluster_list = Cluster.objects.filter(id__in=cluster_ids).prefetch_related(
             Prefetch("proxyinstance_set", queryset=proxy_queryset.select_related("machine"), to_attr="proxies"),
             Prefetch("storageinstance_set", queryset=storage_queryset.select_related("machine"), to_attr="storages"),
             Prefetch("storageinstance_set", queryset=storage_instance_queryset, to_attr="storage_instances"),
@@ -488,9 +515,9 @@ class ListRetrieveResource(BaseListRetrieveResource):
             Prefetch("clusterentry_set", to_attr="entries"),
             "tag_set",
         )
-        # 由于对 queryset 切片工作方式的模糊性，这里的values可能会获得非预期的排序，所以不要在切片后用values
-        # cluster_ids = list(cluster_queryset.values_list("id", flat=True))
-        cluster_ids = [c.id for c in cluster_queryset]
+        # id__in 查询不保证顺序，这里按照分页的顺序重新排列
+        cluster_index_map = {cluster_id: index for index, cluster_id in enumerate(cluster_ids)}
+        cluster_list = sorted(cluster_list, key=lambda x: cluster_index_map[x.id])
 
         # 获取集群与访问入口的映射
         cluster_entry_map = ClusterEntry.get_cluster_entry_map(cluster_ids)
@@ -508,6 +535,9 @@ class ListRetrieveResource(BaseListRetrieveResource):
         cloud_info = ResourceQueryHelper.search_cc_cloud(get_cache=True)
         biz_info = AppCache.objects.get(bk_biz_id=bk_biz_id)
 
+        # 获取集群统计信息
+        cluster_stats_map = Cluster.get_cluster_stats(bk_biz_id, cls.cluster_types)
+
         # 将集群的查询结果序列化为集群字典信息
         clusters: List[Dict[str, Any]] = []
         for cluster in cluster_list:
@@ -522,12 +552,55 @@ class ListRetrieveResource(BaseListRetrieveResource):
                 cluster_operate_records_map=cluster_operate_records_map,
                 cloud_info=cloud_info,
                 biz_info=biz_info,
-                cluster_stats_map=Cluster.get_cluster_stats(bk_biz_id, cls.cluster_types),
+                cluster_stats_map=cluster_stats_map,
                 **kwargs,
             )
             clusters.append(cluster_info)
 
-        return ResourceList(count=count, data=clusters)
+        return ResourceList(count=count, data=clusters, next_cursor=next_cursor)
+
+    @classmethod
+    def _count_clusters(cls, bk_biz_id: int, cluster_queryset: QuerySet) -> int:
+        """
+        统计过滤后的集群总数。
+        先做一次带上限的计数，超过阈值的大业务使用缓存的精确计数，避免每次翻页都对DISTINCT联表做全量count
+        """
+        threshold = CLUSTER_COUNT_ESTIMATE_THRESHOLD
+        count = cluster_queryset.values("id")[: threshold + 1].count()
+        if count <= threshold:
+            return count
+
+        query_digest = hashlib.md5(str(cluster_queryset.order_by().query).encode()).hexdigest()
+        cache_key = f"{CLUSTER_COUNT_CACHE_KEY}_{bk_biz_id}_{query_digest}"
+        return cache.get_or_set(cache_key, cluster_queryset.count, CLUSTER_COUNT_CACHE_TIMEOUT)
+
+    @classmethod
+    def _get_page_cluster_ids(
+        cls, cluster_queryset: QuerySet, limit: int, offset: int, ordering: str = None, cursor: str = None
+    ) -> Tuple[List[int], str]:
+        """
+        查询当前页的集群ID，返回(集群ID列表, 下一页游标)
+        @param cluster_queryset: 过滤集群查询集
+        @param limit: 分页限制，-1表示不分页
+        @param offset: 分页起始，传入cursor时忽略
+        @param ordering: 排序字段
+        @param cursor: 键集分页游标，基于(排序字段, id)定位上一页的最后一条记录
+        """
+        field, desc = parse_ordering(ordering)
+        # 补充id作为排序字段，保证排序稳定，切片后values的结果顺序才是确定的
+        cluster_queryset = cluster_queryset.order_by(*([f"-{field}", "-id"] if desc else [field, "id"]))
+        if cursor:
+            cluster_queryset = cluster_queryset.filter(build_q_for_keyset(ordering, cursor))
+            offset = 0
+
+        value_fields = ["id"] if field == "id" else ["id", field]
+        page_queryset = cluster_queryset.values_list(*value_fields)
+        page_rows = list(page_queryset[offset:] if limit == -1 else page_queryset[offset : offset + limit])
+
+        next_cursor = ""
+        if limit != -1 and len(page_rows) == limit:
+            next_cursor = encode_cursor(page_rows[-1][-1], page_rows[-1][0])
+        return [row[0] for row in page_rows], next_cursor
 
     @classmethod
     def _to_cluster_representation(
@@ -1,4 +1,11 @@
+import base64
+import datetime
+import json
+from typing import Any, Optional, Tuple
+
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db.models import Q
+from django.utils import timezone
 
 from backend.constants import IP_PORT_DIVIDER
 from backend.db_meta.enums import ClusterEntryType
@@ -51,3 +58,47 @@ def build_q_for_instance_filter(params_data: dict) -> Q:
 
     # 合并两种过滤条件
     return q_ip | q_ip_port
+
+
+def parse_ordering(ordering: Optional[str]) -> Tuple[str, bool]:
+    """解析排序字段，返回(字段名, 是否倒序)，未指定排序时按id升序"""
+    ordering = ordering or "id"
+    return ordering.lstrip("-"), ordering.startswith("-")
+
+
+def encode_cursor(order_value: Any, pk: int) -> str:
+    """
+    将分页最后一条记录的(排序字段值, id)编码为游标
+    时间保留到微秒(DjangoJSONEncoder只保留到毫秒)，否则边界记录会在下一页重复或被跳过
+    """
+    if isinstance(order_value, datetime.datetime):
+        order_value = {"datetime": order_value.isoformat()}
+    payload = json.dumps([order_value, pk], cls=DjangoJSONEncoder)
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, int]:
+    """解析游标，得到(排序字段值, id)"""
+    try:
+        order_value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        if isinstance(order_value, dict):
+            order_value = datetime.datetime.fromisoformat(order_value["datetime"])
+            if timezone.is_naive(order_value):
+                order_value = timezone.make_aware(order_value)
+        return order_value, int(pk)
+    except (ValueError, TypeError, KeyError):
+        raise ValueError(f"invalid cursor: {cursor}")
+
+
+def build_q_for_keyset(ordering: Optional[str], cursor: str) -> Q:
+    """
+    构造基于(排序字段, id)的键集分页条件，获取游标之后的记录
+    @param ordering: 排序字段，如 -create_at
+    @param cursor: 上一页返回的游标
+    """
+    field, desc = parse_ordering(ordering)
+    order_value, pk = decode_cursor(cursor)
+    lookup = "lt" if desc else "gt"
+    if field == "id":
+        return Q(**{f"id__{lookup}": pk})
+    return Q(**{f"{field}__{lookup}": order_value}) | Q(**{field: order_value, f"id__{lookup}": pk})
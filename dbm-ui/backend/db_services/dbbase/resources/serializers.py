@@ -14,6 +14,7 @@ from rest_framework import serializers
 from backend.db_meta.enums import ClusterStatus, ClusterType, InstanceStatus, MachineType, TenDBClusterSpiderRole
 from backend.db_meta.models.cluster import Cluster
 from backend.db_services.dbbase.constants import IP_PORT_DIVIDER
+from backend.db_services.dbbase.resources.query_base import decode_cursor
 from backend.flow.consts import SqlserverSyncMode
 
 
@@ -32,6 +33,14 @@ class ListResourceSLZ(serializers.Serializer):
     bk_cloud_id = serializers.CharField(required=False, help_text=_("管控区域"))
     cluster_type = serializers.CharField(required=False, help_text=_("集群类型"))
     ordering = serializers.CharField(required=False, help_text=_("排序字段,非必填"))
+    cursor = serializers.CharField(required=False, help_text=_("游标分页的游标，传入时忽略offset，非必填"))
+
+    def validate_cursor(self, cursor):
+        try:
+            decode_cursor(cursor)
+        except ValueError:
+            raise serializers.ValidationError(_("非法的分页游标: {}").format(cursor))
+        return cursor
 
 
 class ListMySQLResourceSLZ(ListResourceSLZ):
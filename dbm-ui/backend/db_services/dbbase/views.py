@@ -106,7 +106,7 @@ class DBBaseViewSet(viewsets.SystemViewSet):
     def common_query_cluster(self, request, *args, **kwargs):
         data = self.params_validate(self.get_serializer_class())
         __, cluster_infos = ListRetrieveResource.common_query_cluster(**data)
-        return Response(cluster_infos)
+        return Response(list(cluster_infos))
 
     @common_swagger_auto_schema(
         operation_summary=_("根据过滤条件查询业务下集群详细信息"),
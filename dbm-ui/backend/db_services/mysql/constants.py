@@ -30,3 +30,12 @@ QUERY_SCHEMA_TABLES_SQL = (
 QUERY_TABLES_FROM_DB_SQL = (
     "select table_schema as table_schema, table_name as table_name from information_schema.tables where {db_sts}"
 )
+
+# SQL摘要的LRU缓存条数(按SQL的md5缓存)
+SQL_DIGEST_CACHE_SIZE = 4096
+# 批量摘要时，超过该条数才使用进程池并行解析
+SQL_DIGEST_PROCESS_POOL_THRESHOLD = 500
+# 批量摘要进程池的进程数
+SQL_DIGEST_PROCESS_POOL_WORKERS = 4
+# 单次批量摘要的最大SQL条数
+SQL_DIGEST_BATCH_MAX_SIZE = 5000
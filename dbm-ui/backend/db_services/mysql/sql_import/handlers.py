@@ -387,7 +387,7 @@ class SQLHandler(object):
         获取语义执行的结果
         :param root_id: 语义执行的root id
         """
-        flow_tree = FlowTree.objects.get(root_id=root_id).tree
+        flow_tree = FlowTree.objects.get(root_id=root_id).pipeline_tree
         taskflow_handler = TaskFlowHandler(root_id)
 
         # 获取语义执行的版本ID
@@ -10,11 +10,23 @@ specific language governing permissions and limitations under the License.
 """
 
 import logging
+import os
 import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List
 
 import sqlparse
 from django.utils.translation import gettext as _
 
+from backend.db_services.mysql.constants import (
+    SQL_DIGEST_BATCH_MAX_SIZE,
+    SQL_DIGEST_CACHE_SIZE,
+    SQL_DIGEST_PROCESS_POOL_THRESHOLD,
+    SQL_DIGEST_PROCESS_POOL_WORKERS,
+)
 from backend.db_services.mysql.sqlparse.exceptions import SQLParseBaseException
 from backend.flow.consts import SYSTEM_DBS
 from backend.utils.md5 import count_md5
@@ -24,6 +36,59 @@ logger = logging.getLogger("root")
 LIMIT = 1000
 
 
+class SQLDigestCache:
+    """SQL摘要的LRU缓存，以SQL的md5为key，进程内共享"""
+
+    _cache: "OrderedDict[str, dict]" = OrderedDict()
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, sql_md5: str) -> dict:
+        with cls._lock:
+            digest = cls._cache.get(sql_md5)
+            if digest is not None:
+                cls._cache.move_to_end(sql_md5)
+        # 返回副本，避免调用方修改缓存内容
+        return dict(digest) if digest is not None else None
+
+    @classmethod
+    def set(cls, sql_md5: str, digest: dict):
+        with cls._lock:
+            cls._cache[sql_md5] = dict(digest)
+            cls._cache.move_to_end(sql_md5)
+            while len(cls._cache) > SQL_DIGEST_CACHE_SIZE:
+                cls._cache.popitem(last=False)
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._cache.clear()
+
+
+class SQLDigestProcessPool:
+    """批量摘要的进程池，每个进程懒加载创建一次并复用，fork后的子进程重新创建"""
+
+    _executor: ProcessPoolExecutor = None
+    _pid: int = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls) -> ProcessPoolExecutor:
+        with cls._lock:
+            if cls._executor is None or cls._pid != os.getpid():
+                cls._executor = ProcessPoolExecutor(max_workers=SQL_DIGEST_PROCESS_POOL_WORKERS)
+                cls._pid = os.getpid()
+            return cls._executor
+
+    @classmethod
+    def reset(cls):
+        """进程池不可用时丢弃，下次使用时重新创建"""
+        with cls._lock:
+            if cls._executor is not None and cls._pid == os.getpid():
+                cls._executor.shutdown(wait=False)
+            cls._executor, cls._pid = None, None
+
+
 class SQLParseHandler:
     def __init__(self):
         self.sql_items = []
@@ -65,39 +130,100 @@ class SQLParseHandler:
 
             if token.is_group:
                 self.parse_tokens(token.tokens)
+            elif token.ttype.parent == sqlparse.tokens.Token.Literal.String:
+                self.sql_items.append("'?'")
+            elif token.ttype.parent == sqlparse.tokens.Token.Literal.Number:
+                self.sql_items.append("?")
             else:
-                if token.ttype.parent == sqlparse.tokens.Token.Literal.String:
-                    self.sql_items.append("'?'")
-                elif token.ttype.parent == sqlparse.tokens.Token.Literal.Number:
-                    self.sql_items.append("?")
-                else:
-                    self.sql_items.append(token.value)
+                # 摘要中的空白统一折叠为单个空格，这里直接按空白切分，空白token不产生任何内容
+                self.sql_items.extend(token.value.split())
 
-    def parse_sql(self, sql: str) -> dict:
+    @staticmethod
+    def _edge_leaf_value(token: sqlparse.sql.Token, index: int) -> str:
+        """获取语句首个(index=0)或最后一个(index=-1)叶子token的值"""
+        while token.is_group and token.tokens:
+            token = token.tokens[index]
+        return token.value
+
+    def parse_statement(self, statement: sqlparse.sql.Statement, sql: str) -> dict:
         """
-        解析 SQL
+        一次遍历已解析的语句，同时提取命令、表名和SQL摘要
+        @param statement: sqlparse解析后的语句
+        @param sql: 原始SQL
         """
-        parsed_sqls = sqlparse.parse(sql)
-        if len(parsed_sqls) == 0:
-            return {}
-        tokens = sqlparse.parse(sql)[0].tokens
-        self.parse_tokens(tokens=tokens)
+        self.sql_items, self.commands, self.tables = [], set(), set()
+        self.parse_tokens(tokens=statement.tokens)
         digest_sql = " ".join(self.sql_items)
-        for char in ["\r", "\n", "\t"]:
-            digest_sql.replace(char, " ")
-            sql.replace(char, " ")
-        digest_sql = re.sub(r"\s+", " ", digest_sql)
         sql = re.sub(r"\s+", " ", sql)
-        query_digest_md5 = count_md5(digest_sql)
+        # 摘要md5沿用首尾空白折叠为单个空格后(不去除)的摘要计算，保证与历史的摘要md5一致
+        leading = " " if self._edge_leaf_value(statement, 0)[:1].isspace() else ""
+        trailing = " " if digest_sql and self._edge_leaf_value(statement, -1)[-1:].isspace() else ""
         return {
             "command": ",".join(sorted(self.commands)),
             "query_string": sql.strip(" "),
-            "query_digest_text": digest_sql.strip(" "),
-            "query_digest_md5": query_digest_md5,
+            "query_digest_text": digest_sql,
+            "query_digest_md5": count_md5(f"{leading}{digest_sql}{trailing}"),
             "table_name": ",".join(sorted(self.tables)),
             "query_length": len(sql),
         }
 
+    def parse_sql(self, sql: str) -> dict:
+        """
+        解析 SQL，相同SQL的解析结果会被缓存
+        """
+        sql_md5 = count_md5(sql)
+        digest = SQLDigestCache.get(sql_md5)
+        if digest is not None:
+            return digest
+
+        parsed_sqls = sqlparse.parse(sql)
+        if len(parsed_sqls) == 0:
+            return {}
+        digest = self.parse_statement(parsed_sqls[0], sql)
+        SQLDigestCache.set(sql_md5, digest)
+        return digest
+
+    @classmethod
+    def parse_sqls(cls, sqls: List[str]) -> List[dict]:
+        """批量解析 SQL"""
+        handler = cls()
+        return [handler.parse_sql(sql) for sql in sqls]
+
+    @classmethod
+    def batch_parse_sql(cls, sqls: List[str], use_process_pool: bool = True) -> List[Dict]:
+        """
+        批量解析 SQL，结果与输入的顺序一致
+        @param sqls: SQL列表，条数不超过SQL_DIGEST_BATCH_MAX_SIZE
+        @param use_process_pool: 是否允许使用进程池，条数超过阈值时才会启用
+        """
+        if len(sqls) > SQL_DIGEST_BATCH_MAX_SIZE:
+            raise SQLParseBaseException(_("批量解析的SQL条数不能超过{}").format(SQL_DIGEST_BATCH_MAX_SIZE))
+
+        if not use_process_pool or len(sqls) <= SQL_DIGEST_PROCESS_POOL_THRESHOLD:
+            return cls.parse_sqls(sqls)
+
+        # 只把未命中缓存的SQL分发到进程池，解析结果回填当前进程的缓存
+        digests = [SQLDigestCache.get(count_md5(sql)) for sql in sqls]
+        missed = [index for index, digest in enumerate(digests) if digest is None]
+        if not missed:
+            return digests
+
+        chunk_size = max(1, len(missed) // (SQL_DIGEST_PROCESS_POOL_WORKERS * 4))
+        chunks = [[sqls[index] for index in missed[i : i + chunk_size]] for i in range(0, len(missed), chunk_size)]
+        try:
+            executor = SQLDigestProcessPool.get()
+            missed_digests = [digest for chunk in executor.map(cls.parse_sqls, chunks) for digest in chunk]
+        except BrokenProcessPool:
+            logger.exception("sql digest process pool broken, fallback to parse in current process")
+            SQLDigestProcessPool.reset()
+            missed_digests = cls.parse_sqls([sqls[index] for index in missed])
+
+        for index, digest in zip(missed, missed_digests):
+            digests[index] = digest
+            if digest:
+                SQLDigestCache.set(count_md5(sqls[index]), digest)
+        return digests
+
     def parse_select_statement(self, sql: str, need_keywords: list = None):
         """判断并解析select语句"""
         # 默认select语句要有limit
@@ -147,7 +273,8 @@ class SQLParseHandler:
             return
 
         # 判断解析表结构，不允许查询系统表
-        dbs = [table.split(".")[0] for table in self.parse_sql(sql)["table_name"].split(",")]
+        table_names = self.parse_statement(parsed_sqls[0], sql)["table_name"]
+        dbs = [table.split(".")[0] for table in table_names.split(",")]
         if dbs and set(dbs).intersection(set(SYSTEM_DBS)):
             raise SQLParseBaseException(_("不允许查询以下系统库表:{}").format(SYSTEM_DBS))
 
@@ -4,8 +4,12 @@ import json
 from blueapps.account.decorators import login_exempt
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 
+from backend.db_services.mysql.sqlparse.exceptions import SQLParseBaseException
 from backend.db_services.mysql.sqlparse.handlers import SQLParseHandler
+from backend.db_services.mysql.sqlparse.serializers import BatchParseSQLSerializer
+from backend.exceptions import ValidationError
 
 
 @login_exempt
@@ -13,3 +17,24 @@ from backend.db_services.mysql.sqlparse.handlers import SQLParseHandler
 def parse_sql(request):
     sql = json.loads(request.body.decode()).get("content", "")
     return JsonResponse(SQLParseHandler().parse_sql(sql=sql))
+
+
+@require_POST
+def batch_parse_sql(request):
+    """批量解析SQL，需要登录态；是否使用进程池由服务端根据条数决定"""
+    try:
+        data = json.loads(request.body.decode())
+    except ValueError:
+        data = None
+    serializer = BatchParseSQLSerializer(data=data)
+    if not serializer.is_valid():
+        err = ValidationError()
+        return JsonResponse(
+            {"result": False, "code": err.code, "message": err.message, "data": serializer.errors}, status=400
+        )
+
+    try:
+        results = SQLParseHandler.batch_parse_sql(sqls=serializer.validated_data["contents"])
+    except SQLParseBaseException as err:
+        return JsonResponse({"result": False, "code": err.code, "message": err.message, "data": None}, status=400)
+    return JsonResponse({"results": results})
@@ -10,7 +10,7 @@ specific language governing permissions and limitations under the License.
 """
 from django.urls import include, path, re_path
 
-from backend.db_services.mysql.sqlparse.views import parse_sql
+from backend.db_services.mysql.sqlparse.views import batch_parse_sql, parse_sql
 
 urlpatterns = [
     path("bizs/<int:bk_biz_id>/", include("backend.db_services.mysql.resources.urls")),
@@ -25,4 +25,5 @@ urlpatterns = [
     path("", include("backend.db_services.mysql.toolbox.urls")),
     path("", include("backend.db_services.mysql.push_peripheral_config.urls")),
     re_path("^parse_sql/?$", parse_sql, name="parse_sql"),
+    re_path("^batch_parse_sql/?$", batch_parse_sql, name="batch_parse_sql"),
 ]
@@ -28,6 +28,7 @@ from backend.db_services.redis.util import is_support_redis_auotfix
 from backend.ticket.builders import BuilderFactory
 from backend.ticket.constants import TicketStatus, TicketType
 from backend.ticket.flow_manager.manager import TicketFlowManager
+from backend.ticket.handler import TicketHandler
 from backend.ticket.models import Ticket
 from backend.utils.time import datetime2str
 
@@ -117,6 +118,7 @@ def create_ticket(cluster: RedisAutofixCore, cluster_ids: list, redis_proxies: l
         builder = BuilderFactory.create_builder(ticket)
         builder.patch_ticket_detail()
         builder.init_ticket_flows()
+        TicketHandler.sync_related_objects([ticket])
         TicketFlowManager(ticket=ticket).run_next_flow()
     except Exception as e:
         cluster.deal_status = AutofixStatus.AF_FAIL.value
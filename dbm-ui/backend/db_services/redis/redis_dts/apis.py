@@ -9,6 +9,7 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 import logging
+import time
 from datetime import datetime, timedelta, timezone
 from typing import Tuple
 
@@ -20,9 +21,19 @@ from backend.components import DRSApi
 from backend.db_meta.enums import ClusterType
 from backend.db_meta.models import Cluster
 from backend.exceptions import ApiError
+from backend.utils.redis import RedisConn
 from backend.utils.time import datetime2str, strptime
 
-from .constants import DtsOperateType, DtsTaskType
+from .constants import (
+    DTS_CLAIM_MAX_LIMIT,
+    DTS_CLAIM_MAX_WAIT_SECONDS,
+    DTS_CLAIM_POLL_INTERVAL,
+    DTS_CLAIM_STATS_KEY,
+    DTS_SCHEDULE_DAYS,
+    DTS_UNASSIGNED_SERVER,
+    DtsOperateType,
+    DtsTaskType,
+)
 from .enums import DtsCopyType
 from .models import (
     TbDtsServerBlacklist,
@@ -35,7 +46,7 @@ from .models import (
     dts_task_format_time,
     lightning_task_format_time,
 )
-from .util import dts_job_cnt_and_status, dts_task_status, is_in_incremental_sync
+from .util import batch_dts_job_cnt_and_status, dts_task_status, is_in_incremental_sync
 
 logger = logging.getLogger("root")
 
@@ -60,24 +71,22 @@ def get_dts_history_jobs(payload: dict) -> dict:
         end_time = strptime(payload.get("end_time"))
         where &= Q(create_time__lte=end_time)
     jobs = TbTendisDTSJob.objects.filter(where).order_by("-create_time")
+    total_cnt = jobs.count()
 
     # 分页
-    start_idx = 0
-    end_idx = jobs.count()
     if "page" in payload and "page_size" in payload and payload.get("page_size") > 0:
         page = payload.get("page")
         page_size = payload.get("page_size")
-        start_idx = (page - 1) * page_size
-        end_idx = page * page_size
-        if end_idx >= len(jobs):
-            end_idx = len(jobs)
+        jobs = jobs[(page - 1) * page_size : page * page_size]
 
-    resp = []
-    for job in jobs[start_idx:end_idx]:
-        status_ret = dts_job_cnt_and_status(job)
+    # 一次聚合当前页所有job的task状态
+    jobs = list(jobs)
+    job_status_map = batch_dts_job_cnt_and_status(jobs)
 
+    resp = []
+    for job in jobs:
         job_json = model_to_dict(job)
-        job_json.update(status_ret)
+        job_json.update(job_status_map[(job.bill_id, job.src_cluster, job.dst_cluster)])
 
         # fill dst_copy_type with bill type
         if job_json["dts_copy_type"] == "":
@@ -87,7 +96,7 @@ def get_dts_history_jobs(payload: dict) -> dict:
         job_json["update_time"] = datetime2str(job.update_time)
         resp.append(job_json)
 
-    return {"total_cnt": jobs.count(), "jobs": resp}
+    return {"total_cnt": total_cnt, "jobs": resp}
 
 
 def get_dts_job_detail(payload: dict) -> list:
@@ -458,6 +467,89 @@ def get_job_to_schedule_tasks(payload: dict) -> list:
     return rets
 
 
+def _dts_claimable_tasks(payload: dict):
+    """可认领的task：未分配dts_server、未开始执行，且在调度时间范围内"""
+    schedule_from = datetime.now(timezone.utc).astimezone() - timedelta(days=DTS_SCHEDULE_DAYS)
+    where = Q(bk_cloud_id=payload.get("bk_cloud_id")) & Q(dts_server=DTS_UNASSIGNED_SERVER)
+    where = where & Q(task_type="") & Q(status=0) & Q(create_time__gt=schedule_from)
+    if payload.get("max_data_size"):
+        where = where & Q(src_dbsize__lte=payload["max_data_size"])
+    if payload.get("zone_name"):
+        where = where & Q(src_ip_zonename=payload["zone_name"])
+    if payload.get("db_type"):
+        where = where & Q(src_dbtype=payload["db_type"])
+    return TbTendisDtsTask.objects.filter(where)
+
+
+def dts_claim_tasks(payload: dict) -> list:
+    """
+    dts server认领待调度的tasks：在一个事务中按优先级选出至多limit个task并分配给当前dts server
+    使用 SELECT ... FOR UPDATE SKIP LOCKED，多个dts server并发认领时互不阻塞也不会重复认领
+    未认领到task时，可通过wait_seconds长轮询等待
+    """
+    dts_server = payload["dts_server"]
+    limit = min(max(payload.get("limit") or 1, 1), DTS_CLAIM_MAX_LIMIT)
+    deadline = time.time() + min(payload.get("wait_seconds") or 0, DTS_CLAIM_MAX_WAIT_SECONDS)
+
+    while True:
+        start = time.time()
+        with transaction.atomic():
+            tasks = list(
+                _dts_claimable_tasks(payload)
+                .select_for_update(skip_locked=True)
+                .order_by("-src_cluster_priority", "create_time", "src_weight")[:limit]
+            )
+            if tasks:
+                now = datetime.now(timezone.utc)
+                TbTendisDtsTask.objects.filter(id__in=[task.id for task in tasks]).update(
+                    dts_server=dts_server, update_time=now
+                )
+
+        _record_claim_stats(payload["bk_cloud_id"], len(tasks), (time.time() - start) * 1000)
+
+        if tasks or time.time() + DTS_CLAIM_POLL_INTERVAL > deadline:
+            break
+        time.sleep(DTS_CLAIM_POLL_INTERVAL)
+
+    rets = []
+    for task in tasks:
+        task.dts_server, task.update_time = dts_server, now
+        json_data = model_to_dict(task)
+        dts_task_clean_pwd_and_fmt_time(json_data, task)
+        rets.append(json_data)
+    return rets
+
+
+def _record_claim_stats(bk_cloud_id: int, claimed: int, latency_ms: float):
+    """按云区域记录认领统计，认领到task和空轮询分开计数"""
+    stats_key = DTS_CLAIM_STATS_KEY.format(bk_cloud_id=bk_cloud_id)
+    pipeline = RedisConn.pipeline(transaction=False)
+    if claimed:
+        pipeline.hincrby(stats_key, "claims")
+        pipeline.hincrby(stats_key, "claimed_tasks", claimed)
+        pipeline.hincrbyfloat(stats_key, "claim_latency_ms", latency_ms)
+    else:
+        pipeline.hincrby(stats_key, "empty_polls")
+        pipeline.hincrbyfloat(stats_key, "empty_poll_latency_ms", latency_ms)
+    pipeline.execute()
+
+
+def get_dts_claim_stats(payload: dict) -> dict:
+    """获取云区域下task认领的队列深度(可认领的task数)和认领统计"""
+    counter = RedisConn.hgetall(DTS_CLAIM_STATS_KEY.format(bk_cloud_id=payload["bk_cloud_id"]))
+    claims, empty_polls = int(counter.get("claims", 0)), int(counter.get("empty_polls", 0))
+    return {
+        "queue_depth": _dts_claimable_tasks(payload).count(),
+        "claims": claims,
+        "claimed_tasks": int(counter.get("claimed_tasks", 0)),
+        "avg_claim_latency_ms": round(float(counter.get("claim_latency_ms", 0)) / claims, 2) if claims else 0,
+        "empty_polls": empty_polls,
+        "avg_empty_poll_latency_ms": (
+            round(float(counter.get("empty_poll_latency_ms", 0)) / empty_polls, 2) if empty_polls else 0
+        ),
+    }
+
+
 def get_job_src_ip_running_tasks(payload: dict) -> list:
     """获取一个job的所有待调度的tasks"""
     bill_id = payload.get("bill_id")
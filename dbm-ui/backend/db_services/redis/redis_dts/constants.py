@@ -12,6 +12,17 @@ from django.utils.translation import ugettext_lazy as _
 
 from blue_krill.data_types.enum import EnumField, StructuredEnum
 
+# 未分配dts_server的task占位IP
+DTS_UNASSIGNED_SERVER = "1.1.1.1"
+# 待调度task的查询时间范围(天)
+DTS_SCHEDULE_DAYS = 30
+# 单次认领task的最大数量，以及长轮询的最大等待时间和轮询间隔(秒)
+DTS_CLAIM_MAX_LIMIT = 100
+DTS_CLAIM_MAX_WAIT_SECONDS = 20
+DTS_CLAIM_POLL_INTERVAL = 1
+# task认领的统计计数key，按云区域区分
+DTS_CLAIM_STATS_KEY = "redis_dts_claim_stats_{bk_cloud_id}"
+
 
 class DtsTaskType(str, StructuredEnum):
     """DTS task类型枚举"""
@@ -0,0 +1,20 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("redis_dts", "0017_auto_20240908_1038_squashed_0018_auto_20240914_1754"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="tbtendisdtstask",
+            index=models.Index(
+                fields=["bk_cloud_id", "dts_server", "task_type", "status", "-src_cluster_priority", "create_time"],
+                name="idx_dts_task_claim",
+            ),
+        ),
+    ]
@@ -84,6 +84,11 @@ class TbTendisDtsTask(models.Model):
             models.Index(fields=["dts_server", "update_time"], name="idx_jobserver_updatetime"),
             models.Index(fields=["bill_id", "src_cluster", "dst_cluster"], name="idx_billid_clusters"),
             models.Index(fields=["bk_cloud_id", "dts_server", "task_type", "src_dbtype", "status", "create_time"]),
+            # 认领待调度task时按优先级和创建时间有序扫描
+            models.Index(
+                fields=["bk_cloud_id", "dts_server", "task_type", "status", "-src_cluster_priority", "create_time"],
+                name="idx_dts_task_claim",
+            ),
         ]
         constraints = [
             models.UniqueConstraint(
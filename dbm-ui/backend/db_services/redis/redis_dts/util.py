@@ -16,7 +16,7 @@ import re
 import traceback
 from typing import Dict, List, Tuple
 
-from django.db.models import Q
+from django.db.models import Count, Q
 
 from backend.components import DRSApi
 from backend.constants import IP_PORT_DIVIDER
@@ -848,67 +848,124 @@ def dts_task_status(task_row: TbTendisDtsTask) -> str:
     return DtsSyncStatus.UNKNOWN.value
 
 
-def dts_job_cnt_and_status(job: TbTendisDTSJob) -> dict:
+def _dts_task_status_conditions() -> Dict[str, Q]:
     """
-    获取job 任务状态
+    task 分类条件，与 is_* 系列判断保持一致，用于在数据库中聚合统计
     """
-    ret = {}
-    pending_exec_cnt = 0
-    running_cnt = 0
-    failed_cnt = 0
-    success_cnt = 0
-    transfer_completed_cnt = 0
-    transfer_terminated_cnt = 0
-    full_transfer_failed_cnt = 0
-    incremental_sync_failed_cnt = 0
-    full_transfer_running_cnt = 0
-    incremental_sync_running_cnt = 0
-    tasks = TbTendisDtsTask.objects.filter(
-        Q(bill_id=job.bill_id) & Q(src_cluster=job.src_cluster) & Q(dst_cluster=job.dst_cluster)
+    running_status, failed_status = [0, 1], -1
+    ssd_full_types = [
+        DtsTaskType.TENDISSSD_BACKUP,
+        DtsTaskType.TENDISSSD_BACKUPFILE_FETCH,
+        DtsTaskType.TENDISSSD_TREDISDUMP,
+        DtsTaskType.TENDISSSD_CMDSIMPORTER,
+    ]
+    ssd_incr_types = [DtsTaskType.TENDISSSD_MAKESYNC, DtsTaskType.TENDISSSD_WATCHOLDSYNC]
+    plus_full_types = [DtsTaskType.TENDISPLUS_MAKESYNC, DtsTaskType.TENDISPLUS_SENDBULK]
+    ssd, redis, plus = (
+        Q(src_dbtype=ClusterType.TendisTendisSSDInstance),
+        Q(src_dbtype=ClusterType.TendisRedisInstance),
+        Q(src_dbtype=ClusterType.TendisTendisplusInsance),
     )
-    for task in tasks:
-        if is_pending_execution(task):
-            pending_exec_cnt += 1
-        elif task.task_type == DtsTaskType.TENDISSSD_BACKUP.value and task.status == 0:
-            pending_exec_cnt += 1
-        elif task.task_type == DtsTaskType.TENDISSSD_BACKUP.value and task.status == 1:
-            running_cnt += 1
-        elif task.task_type != DtsTaskType.TENDISSSD_BACKUP.value and (task.status == 0 or task.status == 1):
-            running_cnt += 1
-        elif task.status == -1:
-            failed_cnt += 1
-        elif task.status == 2:
-            success_cnt += 1
-
-        if is_transfer_competed(task):
-            transfer_completed_cnt += 1
-        elif is_transfer_terminated(task):
-            transfer_terminated_cnt += 1
-        elif is_full_transfer_failed(task):
-            full_transfer_failed_cnt += 1
-        elif is_incremental_sync_failed(task):
-            incremental_sync_failed_cnt += 1
-        elif is_in_full_transfer(task):
-            full_transfer_running_cnt += 1
-        elif is_in_incremental_sync(task):
-            incremental_sync_running_cnt += 1
-    ret["total_cnt"] = len(tasks)
-    ret["pending_exec_cnt"] = pending_exec_cnt
-    ret["running_cnt"] = running_cnt
-    ret["failed_cnt"] = failed_cnt
-    ret["success_cnt"] = success_cnt
-    if pending_exec_cnt == len(tasks):
+    backup = Q(task_type=DtsTaskType.TENDISSSD_BACKUP.value)
+    pending = Q(task_type="", status=0)
+
+    # 执行状态分类(互斥)
+    conditions = {
+        "pending_exec_cnt": pending | (backup & Q(status=0)),
+        "running_cnt": ~pending & ((backup & Q(status=1)) | (~backup & Q(status__in=running_status))),
+        "failed_cnt": Q(status=failed_status),
+        "success_cnt": Q(status=2),
+    }
+
+    # 迁移阶段分类，按判断的先后顺序排除前序分类，保证互斥
+    stage_conditions = {
+        "transfer_completed_cnt": Q(status=2),
+        "transfer_terminated_cnt": Q(sync_operate=DtsOperateType.FORCE_KILL_SUCC, status__in=[failed_status, 2]),
+        "full_transfer_failed_cnt": Q(status=failed_status)
+        & (
+            (ssd & Q(task_type__in=ssd_full_types))
+            | (redis & Q(task_type=DtsTaskType.MAKE_CACHE_SYNC))
+            | (plus & Q(task_type__in=plus_full_types))
+        ),
+        "incremental_sync_failed_cnt": Q(status=failed_status)
+        & (
+            (ssd & Q(task_type__in=ssd_incr_types))
+            | (redis & Q(task_type=DtsTaskType.WATCH_CACHE_SYNC))
+            | (plus & Q(task_type=DtsTaskType.TENDISPLUS_SENDINCR))
+        ),
+        "full_transfer_running_cnt": Q(status__in=running_status)
+        & (
+            (ssd & Q(task_type__in=ssd_full_types))
+            | (redis & Q(task_type=DtsTaskType.MAKE_CACHE_SYNC, message__contains="rdb"))
+            | (plus & Q(task_type__in=plus_full_types))
+        ),
+        "incremental_sync_running_cnt": Q(status__in=running_status)
+        & (
+            (ssd & Q(task_type__in=ssd_incr_types))
+            | (redis & Q(task_type__in=[DtsTaskType.MAKE_CACHE_SYNC, DtsTaskType.WATCH_CACHE_SYNC]))
+            | (plus & Q(task_type=DtsTaskType.TENDISPLUS_SENDINCR))
+        ),
+    }
+    previous = None
+    for name, condition in stage_conditions.items():
+        conditions[name] = condition & ~previous if previous else condition
+        previous = previous | condition if previous else condition
+    return conditions
+
+
+def dts_job_status_from_counts(counts: dict) -> dict:
+    """
+    根据job下task的分类统计得出job任务状态
+    """
+    total_cnt = counts.get("total_cnt", 0)
+    ret = {"total_cnt": total_cnt}
+    for cnt_key in ["pending_exec_cnt", "running_cnt", "failed_cnt", "success_cnt"]:
+        ret[cnt_key] = counts.get(cnt_key, 0)
+
+    if counts.get("pending_exec_cnt", 0) == total_cnt:
         ret["status"] = DtsSyncStatus.PENDING_EXECUTION.value
-    elif transfer_completed_cnt == len(tasks):
+    elif counts.get("transfer_completed_cnt", 0) == total_cnt:
         ret["status"] = DtsSyncStatus.TRANSFER_COMPLETED.value
-    elif transfer_terminated_cnt == len(tasks):
+    elif counts.get("transfer_terminated_cnt", 0) == total_cnt:
         ret["status"] = DtsSyncStatus.TRANSFER_TERMINATED.value
-    elif full_transfer_failed_cnt > 0:
+    elif counts.get("full_transfer_failed_cnt", 0) > 0:
         ret["status"] = DtsSyncStatus.FULL_TRANSFER_FAILED.value
-    elif incremental_sync_failed_cnt > 0:
+    elif counts.get("incremental_sync_failed_cnt", 0) > 0:
         ret["status"] = DtsSyncStatus.INCREMENTAL_SYNC_FAILED.value
-    elif full_transfer_running_cnt > 0:
+    elif counts.get("full_transfer_running_cnt", 0) > 0:
         ret["status"] = DtsSyncStatus.IN_FULL_TRANSFER.value
-    elif incremental_sync_running_cnt > 0:
+    elif counts.get("incremental_sync_running_cnt", 0) > 0:
         ret["status"] = DtsSyncStatus.IN_INCREMENTAL_SYNC.value
     return ret
+
+
+def batch_dts_job_cnt_and_status(jobs: List[TbTendisDTSJob]) -> Dict[Tuple[int, str, str], dict]:
+    """
+    批量获取job任务状态，一次按(bill_id, src_cluster, dst_cluster)分组聚合所有job的task
+    @return: {(bill_id, src_cluster, dst_cluster): 任务状态}
+    """
+    job_keys = {(job.bill_id, job.src_cluster, job.dst_cluster) for job in jobs}
+    if not job_keys:
+        return {}
+
+    job_filter = Q()
+    for bill_id, src_cluster, dst_cluster in job_keys:
+        job_filter |= Q(bill_id=bill_id, src_cluster=src_cluster, dst_cluster=dst_cluster)
+    task_counts = (
+        TbTendisDtsTask.objects.filter(job_filter)
+        .values("bill_id", "src_cluster", "dst_cluster")
+        .annotate(
+            total_cnt=Count("id"),
+            **{name: Count("id", filter=cond) for name, cond in _dts_task_status_conditions().items()},
+        )
+    )
+
+    job_counts = {(row["bill_id"], row["src_cluster"], row["dst_cluster"]): row for row in task_counts}
+    return {job_key: dts_job_status_from_counts(job_counts.get(job_key, {})) for job_key in job_keys}
+
+
+def dts_job_cnt_and_status(job: TbTendisDTSJob) -> dict:
+    """
+    获取job 任务状态
+    """
+    return batch_dts_job_cnt_and_status([job])[(job.bill_id, job.src_cluster, job.dst_cluster)]
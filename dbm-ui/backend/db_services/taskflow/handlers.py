@@ -9,6 +9,7 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 
+import hashlib
 import json
 import logging
 import re
@@ -20,7 +21,8 @@ from typing import Any, Dict, List, Optional
 
 from bamboo_engine.api import EngineAPIResult
 from bamboo_engine.eri import NodeType
-from django.utils import timezone
+from django.db.models import Count, Max
+from django.utils import timezone, translation
 from django.utils.translation import gettext as _
 
 from backend import env
@@ -37,6 +39,8 @@ from backend.db_services.taskflow.exceptions import (
 from backend.flow.consts import StateType
 from backend.flow.engine.bamboo.engine import BambooEngine
 from backend.flow.models import FlowNode, FlowTree
+from backend.ticket.constants import TODO_RUNNING_STATUS
+from backend.ticket.models import Todo
 from backend.utils.string import format_json_string
 from backend.utils.time import calculate_cost_time, datetime2str
 
@@ -47,6 +51,20 @@ class TaskFlowHandler:
     def __init__(self, root_id: str):
         self.root_id = root_id
 
+    def get_flow_etag(self) -> str:
+        """
+        根据流程、节点和待办的最近变更计算任务详情的ETag，内容未变化时客户端可以直接复用缓存
+        """
+        tree = FlowTree.objects.filter(root_id=self.root_id).values("status", "updated_at").first()
+        nodes = FlowNode.objects.filter(root_id=self.root_id).aggregate(count=Count("id"), updated=Max("updated_at"))
+        todos = Todo.objects.filter(flow__flow_obj_id=self.root_id, status__in=TODO_RUNNING_STATUS).aggregate(
+            count=Count("id"), updated=Max("update_at")
+        )
+        signature = json.dumps(
+            [self.root_id, translation.get_language(), tree, nodes, todos], default=str, sort_keys=True
+        )
+        return '"{}"'.format(hashlib.md5(signature.encode("utf-8")).hexdigest())
+
     def revoke_pipeline(self):
         """撤销当前流程"""
 
@@ -44,6 +44,10 @@ class FlowTaskSerializer(serializers.ModelSerializer):
         return calculate_cost_time(obj.updated_at, obj.created_at)
 
 
+class FlowTreeStatesSerializer(serializers.Serializer):
+    since = serializers.IntegerField(help_text=_("增量查询的版本号，只返回此版本之后变化的节点"), required=False)
+
+
 class NodeSerializer(serializers.Serializer):
     node_id = serializers.CharField(help_text=_("节点ID"))
 
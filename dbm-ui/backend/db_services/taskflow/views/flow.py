@@ -9,6 +9,7 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 import logging
+import time
 
 from django.http import HttpResponse
 from django.utils.translation import ugettext as _
@@ -25,6 +26,7 @@ from backend.db_services.taskflow.serializers import (
     CallbackNodeSerializer,
     DownloadExcelSerializer,
     FlowTaskSerializer,
+    FlowTreeStatesSerializer,
     NodeSerializer,
     VersionSerializer,
 )
@@ -94,11 +96,23 @@ class TaskFlowViewSet(viewsets.AuditedModelViewSet):
 
     @common_swagger_auto_schema(
         operation_summary=_("任务详情"),
+        query_serializer=FlowTreeStatesSerializer(),
         tags=[SWAGGER_TAG],
     )
     def retrieve(self, requests, *args, **kwargs):
         root_id = kwargs["root_id"]
-        tree_states = BambooEngine(root_id=root_id).get_pipeline_tree_states()
+        since = self.params_validate(FlowTreeStatesSerializer).get("since")
+        etag = None
+        if since is None:
+            # 流程、节点和待办都未发生变化时，直接返回304，避免重复组装整棵流程树
+            etag = TaskFlowHandler(root_id=root_id).get_flow_etag()
+            if requests.headers.get("If-None-Match") == etag:
+                return HttpResponse(status=304, headers={"ETag": etag})
+            # 版本号取查询前的时间，客户端可用此版本号增量获取之后变化的节点
+            version = int(time.time() * 1000)
+            tree_states = {**(BambooEngine(root_id=root_id).get_pipeline_tree_states() or {}), "version": version}
+        else:
+            tree_states = BambooEngine(root_id=root_id).get_pipeline_tree_states_diff(since=since) or {}
         flow_info = super().retrieve(requests, *args, **kwargs).data
 
         # 补充获取业务和主机信息
@@ -120,7 +134,10 @@ class TaskFlowViewSet(viewsets.AuditedModelViewSet):
         )
         todos = TodoSerializer(todo_qs, many=True).data
 
-        return Response({"flow_info": flow_info, "todos": todos, **tree_states})
+        response = Response({"flow_info": flow_info, "todos": todos, **tree_states})
+        if etag:
+            response["ETag"] = etag
+        return response
 
     @common_swagger_auto_schema(
         operation_summary=_("撤销流程"),
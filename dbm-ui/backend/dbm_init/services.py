@@ -22,6 +22,7 @@ from django.http import HttpRequest
 from django.utils import timezone
 
 from backend import env
+from backend.bk_dataview.grafana.provisioning import invalidate_provisioning
 from backend.bk_dataview.grafana.views import SwitchOrgView
 from backend.components import BKMonitorV3Api, CCApi, ItsmApi
 from backend.components.constants import SSL_KEY
@@ -371,6 +372,8 @@ class Services:
             return False
         request.user = User.objects.filter(is_superuser=True).first()
         request.org_name = "dbm"
+        # 初始化时强制重新注入
+        invalidate_provisioning()
         SwitchOrgView().initial(request)
         return True
 
@@ -68,6 +68,8 @@ BK_IAM_USE_APIGATEWAY = True
 BK_IAM_APIGATEWAY = get_type_env(key="BK_IAM_APIGATEWAY", _type=str, default="https://iam-apigw.example.com")
 BK_IAM_API_VERSION = get_type_env(key="BK_IAM_API_VERSION", _type=str, default="v1")
 IAM_APP_URL = get_type_env(key="IAM_APP_URL", _type=str, default="https://iam.example.com")
+# 用户动作策略的本地缓存时间(秒)，为0表示不缓存，每次都请求权限中心
+IAM_POLICY_CACHE_TIMEOUT = get_type_env(key="IAM_POLICY_CACHE_TIMEOUT", _type=int, default=30)
 BK_IAM_RESOURCE_API_HOST = get_type_env(key="BK_IAM_RESOURCE_API_HOST", _type=str, default="https://bkdbm.example.com")
 BK_IAM_GRADE_MANAGER_ID = get_type_env(key="BK_IAM_GRADE_MANAGER_ID", _type=int, default=0)
 
@@ -124,6 +126,15 @@ BK_SOPS_PROJECT_ID = get_type_env(key="BK_SOPS_PROJECT_ID", _type=int, default=1
 ENABLE_CLEAN_EXPIRED_BAMBOO_TASK = get_type_env(key="ENABLE_CLEAN_EXPIRED_BAMBOO_TASK", _type=bool, default=False)
 ENABLE_CLEAN_EXPIRED_FLOW_INSTANCE = get_type_env(key="ENABLE_CLEAN_EXPIRED_FLOW_INSTANCE", _type=bool, default=False)
 BAMBOO_TASK_VALIDITY_DAY = get_type_env(key="BAMBOO_TASK_VALIDITY_DAY", _type=int, default=360)
+# 流程树存储的压缩方式，可选 gzip/zstd(需安装zstandard)，为空表示不压缩
+FLOW_TREE_COMPRESS_TYPE = get_type_env(key="FLOW_TREE_COMPRESS_TYPE", _type=str, default="")
+# 节点状态信号的合并窗口(秒)，为0表示不合并，每个信号都评估一次流程状态
+FLOW_STATE_COALESCE_WINDOW = get_type_env(key="FLOW_STATE_COALESCE_WINDOW", _type=int, default=2)
+# 是否采样流程写入bamboo的数据大小，开启后每次创建流程都会序列化一次流程树
+FLOW_BUILD_SIZE_SAMPLING = get_type_env(key="FLOW_BUILD_SIZE_SAMPLING", _type=bool, default=False)
+# redis集群批量操作(集群信息查询、集群预检查)的并发上限，以及单个任务的超时时间(秒)
+REDIS_CLUSTER_FAN_OUT_CONCURRENCY = get_type_env(key="REDIS_CLUSTER_FAN_OUT_CONCURRENCY", _type=int, default=10)
+REDIS_CLUSTER_FAN_OUT_TIMEOUT = get_type_env(key="REDIS_CLUSTER_FAN_OUT_TIMEOUT", _type=int, default=120)
 
 # 是否在部署 MySQL 的时候安装 PERL
 YUM_INSTALL_PERL = get_type_env(key="YUM_INSTALL_PERL", _type=bool, default=False)
@@ -180,3 +191,9 @@ DEBUG_TOOL_BAR = get_type_env(key="DEBUG_TOOL_BAR", _type=bool, default=False)
 WINDOW_SSH_PORT = get_type_env(key="WINDOW_SSH_PORT", _type=int, default=22)
 # 本地测试人员优先使用的版本
 REPO_VERSION_FOR_DEV = get_type_env(key="REPO_VERSION_FOR_DEV", _type=str, default="")
+
+# 第三方接口(ESB/APIGW)请求连接池配置，按后端host复用长连接
+DATA_API_POOL_CONNECTIONS = get_type_env(key="DATA_API_POOL_CONNECTIONS", _type=int, default=10)
+DATA_API_POOL_MAXSIZE = get_type_env(key="DATA_API_POOL_MAXSIZE", _type=int, default=50)
+DATA_API_POOL_MAX_RETRIES = get_type_env(key="DATA_API_POOL_MAX_RETRIES", _type=int, default=2)
+DATA_API_POOL_KEEP_ALIVE = get_type_env(key="DATA_API_POOL_KEEP_ALIVE", _type=bool, default=True)
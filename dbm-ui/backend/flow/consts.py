@@ -28,6 +28,61 @@ BIGDATA_DEPEND_PLUGINS = ["bkmonitorbeat"]
 # 默认flow缓存数据过期时间：7天
 DEFAULT_FLOW_CACHE_EXPIRE_TIME = 7 * 24 * 60 * 60
 
+# job状态共享轮询：运行中的job集合key，job状态缓存key前缀
+JOB_POLLER_RUNNING_KEY = "flow_job_poller_running"
+JOB_POLLER_STATUS_KEY = "flow_job_poller_status"
+# job状态缓存的过期时间，略大于轮询周期，轮询停止后节点会自动回退为直接查询
+JOB_POLLER_STATUS_EXPIRE_TIME = 15
+# 超过该时间没有节点读取的job，认为已不再需要轮询
+JOB_POLLER_IDLE_EXPIRE_TIME = 5 * 60
+# 轮询job状态/批量拉取日志的并发数和单批数量
+JOB_POLLER_CONCURRENCY = 10
+JOB_POLLER_BATCH_SIZE = 100
+JOB_LOG_BATCH_SIZE = 500
+
+# 节点自适应轮询：初始(快速)轮询间隔，快速轮询阶段时长，退避倍数，默认/最大轮询间隔上限(秒)
+SCHEDULE_INITIAL_INTERVAL = 5
+SCHEDULE_FAST_DURATION = 30
+SCHEDULE_BACKOFF_FACTOR = 2
+SCHEDULE_DEFAULT_CEILING = 30
+SCHEDULE_MAX_CEILING = 5 * 60
+# 长耗时节点的预期执行时长(秒)，用于放宽节点的轮询间隔上限
+MYSQL_BACKUP_EXPECTED_DURATION = 2 * 60 * 60
+
+# 已翻译的流程树骨架缓存key(按root_id和语言区分)，以及缓存时间
+FLOW_TREE_SKELETON_CACHE_KEY = "flow_tree_skeleton_{root_id}_{language}"
+FLOW_TREE_SKELETON_CACHE_TIME = 60 * 60
+
+# 状态信号合并：窗口期内同一流程的节点状态变更只触发一次FlowTree状态评估
+# 窗口标记key，窗口内待评估的最新节点状态key，信号统计计数key
+FLOW_STATE_COALESCE_WINDOW_KEY = "flow_state_coalesce_window_{root_id}"
+FLOW_STATE_COALESCE_PENDING_KEY = "flow_state_coalesce_pending_{root_id}"
+FLOW_STATE_SIGNAL_STATS_KEY = "flow_state_signal_stats"
+# 待评估状态的过期时间，避免评估任务丢失后合并窗口无法再次投递评估
+FLOW_STATE_COALESCE_PENDING_EXPIRE = 60
+
+# 流程构建：FlowNode批量写入的分批大小，按单据类型统计构建耗时的key
+FLOW_NODE_BULK_CREATE_BATCH_SIZE = 500
+FLOW_BUILD_STATS_KEY = "flow_build_stats"
+
+# 子流程共享全局参数：子流程global_data中引用根流程的标记key，以及根流程全局参数的进程内缓存数量
+GLOBAL_DATA_REF_KEY = "__global_data_ref"
+GLOBAL_DATA_CACHE_SIZE = 128
+
+# 流程级别的密码/配置缓存：按root_id缓存(加密存储)，缓存代数key(密码轮换后递增以失效全部缓存)，缓存过期时间
+FLOW_SCOPED_CACHE_KEY = "flow_scoped_cache_{root_id}_{generation}"
+FLOW_SCOPED_CACHE_GENERATION_KEY = "flow_scoped_cache_generation"
+FLOW_SCOPED_CACHE_EXPIRE_TIME = 2 * 60 * 60
+
+
+class FlowTreeCompressType(str, StructuredEnum):
+    """流程树存储的压缩方式"""
+
+    NONE = EnumField("", _("不压缩"))
+    GZIP = EnumField("gzip", _("gzip"))
+    ZSTD = EnumField("zstd", _("zstd"))
+
+
 # 默认DB moudle id
 DEFAULT_DB_MODULE_ID = 0
 DEFAULT_CONFIG_CONFIRM = 0
@@ -49,6 +104,8 @@ DEFAULT_TWEMPROXY_ADMIN_PORT_EXTRA = 1000
 DEFAULT_REDIS_DBNUM = 0
 # 默认Redis databases
 DEFAULT_REDIS_INSTANCE_DATABASES = 2
+# 批量预检查redis集群时，单次DRS ping请求的最大实例数
+REDIS_PRECHECK_PING_CHUNK_SIZE = 200
 DEFAULT_REDIS_CLUSTER_DATABASES = 1
 
 # 切换时， 默认允许多久心跳
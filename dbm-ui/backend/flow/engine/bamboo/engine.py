@@ -11,16 +11,21 @@ specific language governing permissions and limitations under the License.
 import copy
 import logging
 from collections import defaultdict
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 from bamboo_engine import api, builder, states
 from bamboo_engine.api import EngineAPIResult
 from bamboo_engine.builder import Data
 from bamboo_engine.eri import NodeType
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import translation
 from django.utils.translation import ugettext as _
 from pipeline.eri.models import State
 from pipeline.eri.runtime import BambooDjangoRuntime
 
+from backend.core.translation.constants import Language
+from backend.flow.consts import FLOW_TREE_SKELETON_CACHE_KEY, FLOW_TREE_SKELETON_CACHE_TIME
 from backend.flow.engine.bamboo.builder import Builder
 from backend.flow.engine.exceptions import PipelineError
 from backend.flow.models import FlowNode, FlowTree, StateType
@@ -30,6 +35,9 @@ from backend.utils.time import datetime2timestamp
 
 logger = logging.getLogger("json")
 
+# 增量获取流程状态时，返回的节点字段
+DIFF_ACTIVITY_FIELDS = ["status", "created_at", "started_at", "updated_at", "hosts", "skip", "retry"]
+
 
 class BambooEngine:
     builder_cls = Builder
@@ -56,7 +64,7 @@ class BambooEngine:
             uid=uid,
             ticket_type=self.data["ticket_type"],
             root_id=self.root_id,
-            tree=insensitive_data,
+            **FlowTree.dump_tree(insensitive_data),
             bk_biz_id=self.data["bk_biz_id"],
             status=StateType.CREATED,
             created_by=self.data["created_by"],
@@ -114,6 +122,27 @@ class BambooEngine:
         self.format_bamboo_engine_status(result.data)
         return result
 
+    def get_pipeline_root_state(self) -> Optional[str]:
+        """
+        仅查询根节点及异常子节点的State记录获取流程状态，避免组装完整的状态树
+        与 format_bamboo_engine_status 保持一致：根节点运行中时，若存在失败/撤销/暂停的子节点，则以子节点状态为准
+        """
+        promote_states = [StateType.FAILED, StateType.REVOKED, StateType.SUSPENDED]
+        root_state, child_states = None, set()
+        for node_id, name in (
+            State.objects.filter(root_id=self.root_id)
+            .filter(Q(node_id=self.root_id) | Q(name__in=promote_states))
+            .values_list("node_id", "name")
+        ):
+            if node_id == self.root_id:
+                root_state = name
+            else:
+                child_states.add(name)
+
+        if root_state != StateType.RUNNING:
+            return root_state
+        return next((state for state in promote_states if state in child_states), root_state)
+
     def get_children_states(self, node_id: str) -> EngineAPIResult:
         result = api.get_children_states(runtime=BambooDjangoRuntime(), node_id=node_id)
         return result
@@ -153,63 +182,96 @@ class BambooEngine:
                 self.hide_sensitive_data(value)
         return copy_data
 
-    def recursion_subprocess_status(
-        self, activities: Dict, flow_node_maps: Dict, node_children_status: Dict[str, Dict[str, Union[str, List]]]
-    ):
-        """为子流程添加状态"""
+    @staticmethod
+    def get_subprocess_status(node_id: str, node_children_status: Dict, act_status: Set[str]) -> str:
+        """
+        根据子流程自身状态、直接子节点状态和所有子孙动作节点的状态，计算子流程的状态
+        @param node_id: 子流程节点ID
+        @param node_children_status: pipeline 节点状态，根据父亲节点分组
+        @param act_status: 子流程下所有动作节点的状态
+        """
+        status = node_children_status[node_id]["status"]
+        children_status_list = node_children_status[node_id]["children_states"]
+        if status == states.RUNNING and states.FAILED in children_status_list:
+            status = states.FAILED
+        elif status == states.RUNNING and states.REVOKED in children_status_list:
+            status = states.REVOKED
+
+        if states.FAILED in act_status:
+            status = states.FAILED
+        elif states.REVOKED in act_status:
+            status = states.REVOKED
+        return status
+
+    @staticmethod
+    def fill_node_info(activity: Dict, node: FlowNode, node_state_maps: Dict):
+        """为节点补充运行状态、时间、主机和跳过重试信息"""
+        activity["status"] = StateType.EXPIRED if node.is_expired else node.status
+        activity["created_at"] = int(datetime2timestamp(node.created_at))
+        activity["started_at"] = int(datetime2timestamp(node.started_at))
+        activity["updated_at"] = int(datetime2timestamp(node.updated_at))
+        activity["hosts"] = node.hosts
+        # 补充node跳过和重试信息
+        if node.node_id in node_state_maps:
+            activity["skip"] = node_state_maps[node.node_id].skip
+            activity["retry"] = node_state_maps[node.node_id].retry
+
+    def recursion_activities_status(
+        self,
+        activities: Dict,
+        flow_node_maps: Dict,
+        node_state_maps: Dict,
+        node_children_status: Dict,
+        since: Optional[int] = None,
+        changed_activities: Optional[Dict] = None,
+    ) -> Tuple[Set[str], bool]:
+        """
+        自底向上一次遍历流程树：为动作节点补充状态信息，同时汇总出子流程的状态，每个子树只遍历一次
+        @param activities: 当前层级的活动节点
+        @param flow_node_maps: 节点ID与FlowNode的映射
+        @param node_state_maps: 节点ID与bamboo State的映射
+        @param node_children_status: pipeline 节点状态，根据父亲节点分组
+        @param since: 增量模式的版本号(毫秒时间戳)，只收集在此之后更新过的节点
+        @param changed_activities: 增量模式下收集变更节点的字典
+        @return: (当前层级下所有动作节点的状态集合, 是否存在变更节点)
+        """
+        act_status: Set[str] = set()
+        has_changed = False
         for node_id, activity in activities.items():
+            node = flow_node_maps.get(node_id)
+
+            sub_act_status, sub_changed = set(), False
             if activity.get("pipeline"):
-                self.recursion_subprocess_status(
-                    activities[node_id]["pipeline"]["activities"], flow_node_maps, node_children_status
+                sub_act_status, sub_changed = self.recursion_activities_status(
+                    activity["pipeline"]["activities"],
+                    flow_node_maps,
+                    node_state_maps,
+                    node_children_status,
+                    since,
+                    changed_activities,
                 )
+                act_status |= sub_act_status
 
-            if activity.get("type") == "SubProcess":
-                status = node_children_status[node_id]["status"]
-                children_status_list = node_children_status.get(node_id, {}).get("children_states", [])
-                if status == states.RUNNING and states.FAILED in children_status_list:
-                    status = states.FAILED
-                elif status == states.RUNNING and states.REVOKED in children_status_list:
-                    status = states.REVOKED
-
-                act_status = []
-                if activity.get("pipeline"):
-                    self.recursion_subprocess_act_status(
-                        self.root_id, activity["pipeline"]["activities"], act_status, flow_node_maps
-                    )
-                if states.FAILED in act_status:
-                    status = states.FAILED
-                elif states.REVOKED in act_status:
-                    status = states.REVOKED
-                activities[node_id]["status"] = status
-
-    def recursion_nodes_status(self, tree: Dict, flow_node_maps: Dict, node_state_maps: Dict):
-        for key, values in tree.items():
-            if key in flow_node_maps:
-                node = flow_node_maps[key]
-                tree[key]["status"] = StateType.EXPIRED if node.is_expired else node.status
-                tree[key]["created_at"] = int(datetime2timestamp(node.created_at))
-                tree[key]["started_at"] = int(datetime2timestamp(node.started_at))
-                tree[key]["updated_at"] = int(datetime2timestamp(node.updated_at))
-                tree[key]["hosts"] = node.hosts
-                # 补充node跳过和重试信息
-                if key in node_state_maps:
-                    tree[key]["skip"] = node_state_maps[key].skip
-                    tree[key]["retry"] = node_state_maps[key].retry
-                continue
+            activity_type = activity.get("type")
+            if activity_type == NodeType.SubProcess.value:
+                activity["status"] = self.get_subprocess_status(node_id, node_children_status, sub_act_status)
+            elif activity_type == NodeType.ServiceActivity.value and node:
+                act_status.add(node.status)
 
-            if isinstance(values, dict):
-                self.recursion_nodes_status(values, flow_node_maps, node_state_maps)
+            if node:
+                self.fill_node_info(activity, node, node_state_maps)
 
-    def recursion_subprocess_act_status(self, root_id: str, activities: Dict, act_status: List, flow_node_maps: Dict):
-        for node_id, activity in activities.items():
-            activity_type = activity.get("type")
-            if activity_type == "SubProcess":
-                self.recursion_subprocess_act_status(
-                    root_id, activity["pipeline"]["activities"], act_status, flow_node_maps
-                )
-            elif activity_type == "ServiceActivity":
-                status = flow_node_maps[node_id].status
-                act_status.append(status)
+            if since is None:
+                continue
+            # 子树中存在变更节点时，子流程的汇总状态也可能变化，需要一并返回
+            is_changed = sub_changed or bool(node and datetime2timestamp(node.updated_at) * 1000 >= since)
+            if is_changed:
+                changed_activities[node_id] = {
+                    field: activity[field] for field in DIFF_ACTIVITY_FIELDS if field in activity
+                }
+            has_changed = has_changed or is_changed
+
+        return act_status, has_changed
 
     def recursion_translate_activity(self, activities: Dict):
         """递归翻译节点名称"""
@@ -218,12 +280,8 @@ class BambooEngine:
             if "pipeline" in activity:
                 self.recursion_translate_activity(activity["pipeline"]["activities"])
 
-    def get_pipeline_tree_states(self) -> Optional[Dict]:
-        """获取流程数据包括状态"""
-        tree = self.get_pipeline_tree()
-        if not tree:
-            return None
-        activities = tree["activities"]
+    def get_tree_state_maps(self) -> Tuple[Dict, Dict, Dict]:
+        """获取流程的FlowNode映射、bamboo State映射和按父节点分组的子节点状态"""
         flow_node_maps = {node.node_id: node for node in FlowNode.objects.filter(root_id=self.root_id)}
         node_state_maps = {node.node_id: node for node in BambooDjangoRuntime().get_state_by_root(self.root_id)}
         # pipeline 节点状态，根据父亲节点分组
@@ -231,17 +289,66 @@ class BambooEngine:
         for node in node_state_maps.values():
             node_children_status[node.node_id]["status"] = node.name
             node_children_status[node.parent_id]["children_states"].append(node.name)
+        return flow_node_maps, node_state_maps, node_children_status
 
-        self.recursion_subprocess_status(activities, flow_node_maps, node_children_status)
-        self.recursion_translate_activity(activities)
-        self.recursion_nodes_status(tree, flow_node_maps, node_state_maps)
+    def get_pipeline_tree_skeleton(self) -> Optional[Dict]:
+        """
+        获取已翻译节点名称的流程树骨架(不含状态)，按root_id和语言缓存
+        流程树创建后不会变更，因此可以长期缓存，避免每次请求都要解析和翻译整棵树
+        """
+        cache_key = FLOW_TREE_SKELETON_CACHE_KEY.format(root_id=self.root_id, language=translation.get_language())
+        tree = cache.get(cache_key)
+        if tree:
+            return tree
+
+        tree = self.get_pipeline_tree()
+        if not tree:
+            return None
+        self.recursion_translate_activity(tree["activities"])
+        cache.set(cache_key, tree, FLOW_TREE_SKELETON_CACHE_TIME)
+        return tree
+
+    @classmethod
+    def clear_pipeline_tree_skeleton(cls, root_id: str):
+        """清理流程树骨架在各个语言下的缓存"""
+        cache.delete_many(
+            [
+                FLOW_TREE_SKELETON_CACHE_KEY.format(root_id=root_id, language=language)
+                for language in Language.get_values()
+            ]
+        )
+
+    def get_pipeline_tree_states(self) -> Optional[Dict]:
+        """获取流程数据包括状态，状态叠加在缓存的流程树骨架上"""
+        tree = self.get_pipeline_tree_skeleton()
+        if not tree:
+            return None
+        flow_node_maps, node_state_maps, node_children_status = self.get_tree_state_maps()
+        self.recursion_activities_status(tree["activities"], flow_node_maps, node_state_maps, node_children_status)
         return tree
 
+    def get_pipeline_tree_states_diff(self, since: int) -> Optional[Dict]:
+        """
+        增量获取流程状态：只返回 FlowNode.updated_at 在 since 之后变化的节点及其所属子流程
+        @param since: 客户端上一次获取到的版本号(毫秒时间戳)
+        @return: {"version": 新的版本号, "activities": {node_id: 节点状态信息}}
+        """
+        tree = self.get_pipeline_tree()
+        if not tree:
+            return None
+        flow_node_maps, node_state_maps, node_children_status = self.get_tree_state_maps()
+        changed_activities: Dict[str, Dict] = {}
+        self.recursion_activities_status(
+            tree["activities"], flow_node_maps, node_state_maps, node_children_status, since, changed_activities
+        )
+        version = max([int(datetime2timestamp(node.updated_at) * 1000) for node in flow_node_maps.values()] + [since])
+        return {"version": version, "activities": changed_activities}
+
     def get_pipeline_tree(self) -> Optional[Dict]:
         """获取流程树"""
         try:
             flow = FlowTree.objects.get(root_id=self.root_id)
-            return flow.tree
+            return flow.pipeline_tree
         except FlowTree.DoesNotExist:
             return None
 
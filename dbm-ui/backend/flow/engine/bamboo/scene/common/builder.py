@@ -8,9 +8,11 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
-import copy
+import json
 import logging
-from typing import Any, Dict, Optional
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
 
 from bamboo_engine import api, builder
 from bamboo_engine.builder import (
@@ -29,14 +31,41 @@ from django.utils import translation
 from django.utils.translation import ugettext as _
 from pipeline.eri.runtime import BambooDjangoRuntime
 
+from backend import env
+from backend.flow.consts import FLOW_BUILD_STATS_KEY, FLOW_NODE_BULK_CREATE_BATCH_SIZE, GLOBAL_DATA_REF_KEY
 from backend.flow.models import FlowNode, FlowTree, StateType
 from backend.flow.plugins.components.collections.common.create_random_job_user import AddTempUserForClusterComponent
 from backend.flow.plugins.components.collections.common.drop_random_job_user import DropTempUserForClusterComponent
 from backend.ticket.constants import TicketType
+from backend.utils.redis import RedisConn
 
 logger = logging.getLogger("json")
 
 
+def get_flow_build_stats() -> Dict[str, Dict[str, float]]:
+    """
+    按单据类型获取流程构建的统计指标
+    count: 构建次数; avg_seconds: 平均构建耗时; last_seconds: 最近一次构建耗时; last_nodes: 最近一次构建的节点数;
+    last_bytes: 最近一次采样的写入bamboo的流程数据大小; last_run_seconds: 最近一次api.run_pipeline的耗时
+    """
+    stats: Dict[str, Dict[str, float]] = defaultdict(dict)
+    for field, value in RedisConn.hgetall(FLOW_BUILD_STATS_KEY).items():
+        ticket_type, metric = field.rsplit(":", 1)
+        stats[ticket_type][metric] = float(value)
+
+    return {
+        ticket_type: {
+            "count": int(metric.get("count", 0)),
+            "avg_seconds": round(metric.get("total_seconds", 0) / metric["count"], 3) if metric.get("count") else 0,
+            "last_seconds": round(metric.get("last_seconds", 0), 3),
+            "last_nodes": int(metric.get("last_nodes", 0)),
+            "last_bytes": int(metric.get("last_bytes", 0)),
+            "last_run_seconds": round(metric.get("last_run_seconds", 0), 3),
+        }
+        for ticket_type, metric in stats.items()
+    }
+
+
 class Builder(object):
     """
     构建bamboo流程的抽象类，解决开发人员在编排流程的学习成本，减少代码重复率
@@ -45,6 +74,7 @@ class Builder(object):
         root_id: 根流程id
         data: 单据所传递数据,默认存入全局参数{global_data}
 
+    构建过程中的FlowNode暂存在builder实例中，子流程加入父流程时并入父流程，在run_pipeline时统一批量写入
     """
 
     def __init__(self, root_id: str, data: Optional[Dict] = None, need_random_pass_cluster_ids: list = None):
@@ -54,8 +84,11 @@ class Builder(object):
         @param data: 流程的全局只读参数，默认不是不会同步到各个子流程当中的
         @param need_random_pass_cluster_ids: 是否按照集群维度添加临时账号，目前针对mysql/spider组件场景
         """
+        self.build_start = time.perf_counter()
         self.root_id = root_id
         self.data = data
+        # 本流程及已加入的子流程的FlowNode，等待run_pipeline时批量写入
+        self.flow_nodes: List[FlowNode] = []
         self.need_random_pass_cluster_ids = need_random_pass_cluster_ids
         self.start_act = EmptyStartEvent()
         self.end_act = EmptyEndEvent()
@@ -113,6 +146,7 @@ class Builder(object):
         write_payload_var: str = None,
         error_ignorable: bool = False,
         extend: bool = True,
+        expected_duration: int = None,
     ):
         """
         add_act 方法：为流程加入活动节点，并加入流程数字典
@@ -125,10 +159,13 @@ class Builder(object):
         todo  write_payload_var 变量名称变更为 write_context_var 这样表达清晰点
         @param error_ignorable：节点是否忽略错误继续往下执行
         @param extend: extend
+        @param expected_duration: 节点预期的执行时长(秒)，用于自适应轮询节点放宽轮询间隔，默认不指定
         """
 
         act = ServiceActivity(name=act_name, component_code=act_component_code, error_ignorable=error_ignorable)
         kwargs.update({"root_id": self.root_id, "node_id": act.id, "node_name": act_name})
+        if expected_duration:
+            kwargs.update(expected_duration=expected_duration)
         act.component.inputs.kwargs = Var(type=Var.PLAIN, value=kwargs)
         act.component.inputs.trans_data = Var(type=Var.SPLICE, value="${trans_data}")
         act.component.inputs.global_data = Var(type=Var.SPLICE, value="${global_data}")
@@ -137,7 +174,7 @@ class Builder(object):
 
         self.rewritable_node_source_keys.append({"source_act": act.id, "source_key": "trans_data"})
 
-        FlowNode.objects.create(uid=self.data.get("uid"), root_id=self.root_id, node_id=act.id)
+        self.flow_nodes.append(FlowNode(uid=self.data.get("uid"), root_id=self.root_id, node_id=act.id))
         if extend:
             self.pipe = self.pipe.extend(act)
         return act
@@ -158,10 +195,13 @@ class Builder(object):
 
         for act_info in acts_list:
             if isinstance(act_info, SubProcess):
+                self.collect_sub_flow_nodes(act_info)
                 acts.append(act_info)
                 continue
             act = ServiceActivity(name=act_info["act_name"], component_code=act_info["act_component_code"])
             act_info["kwargs"].update({"root_id": self.root_id, "node_id": act.id, "node_name": act_info["act_name"]})
+            if act_info.get("expected_duration"):
+                act_info["kwargs"].update(expected_duration=act_info["expected_duration"])
             act.component.inputs.kwargs = Var(type=Var.PLAIN, value=act_info["kwargs"])
             act.component.inputs.trans_data = Var(type=Var.SPLICE, value="${trans_data}")
             act.component.inputs.global_data = Var(type=Var.SPLICE, value="${global_data}")
@@ -177,7 +217,7 @@ class Builder(object):
             flow_node_list.append(FlowNode(uid=self.data["uid"], root_id=self.root_id, node_id=act.id))
             acts.append(act)
 
-        FlowNode.objects.bulk_create(flow_node_list)
+        self.flow_nodes.extend(flow_node_list)
         self.pipe = self.pipe.extend(pg).connect(*acts).to(pg).converge(cg)
 
     def add_sub_pipeline(self, sub_flow):
@@ -185,7 +225,7 @@ class Builder(object):
         add_sub_pipeline 方法： 为主流程加入子流程
         @param sub_flow: 子流程
         """
-
+        self.collect_sub_flow_nodes(sub_flow)
         self.pipe = self.pipe.extend(sub_flow)
         # return self
 
@@ -198,6 +238,8 @@ class Builder(object):
         if not isinstance(sub_flow_list, list) or len(sub_flow_list) == 0:
             raise Exception(_("传入的sub_flow_list参数不合法，请检测"))
 
+        for sub_flow in sub_flow_list:
+            self.collect_sub_flow_nodes(sub_flow)
         pg = ParallelGateway()
         cg = ConvergeGateway()
         self.pipe = self.pipe.extend(pg).connect(*sub_flow_list).to(pg).converge(cg)
@@ -219,36 +261,88 @@ class Builder(object):
         )
         self.pipe.extend(self.end_act)
         pipeline = builder.build_tree(self.start_act, id=self.root_id, data=self.global_data)
-        pipeline_copy = copy.deepcopy(pipeline)
-        insensitive_data = self.hide_sensitive_data(pipeline_copy)
+        node_count = self.flush_flow_nodes()
         # 考虑到有些任务没有单据关联，因此uid一般为root_id，此时创建FlowTree的时候uid应该为null
         uid = self.data.get("uid") if isinstance(self.data.get("uid"), int) else None
         FlowTree.objects.create(
             uid=uid,
             ticket_type=self.data["ticket_type"],
             root_id=self.root_id,
-            tree=insensitive_data,
+            **FlowTree.dump_tree(self.hide_sensitive_data(pipeline)),
             bk_biz_id=self.data["bk_biz_id"],
             status=StateType.CREATED,
             created_by=self.data["created_by"],
             db_type=TicketType.get_db_type_by_ticket(self.data["ticket_type"]),
         )
+        build_seconds = time.perf_counter() - self.build_start
+
+        # 序列化整个流程树的开销较大，仅在开启采样时统计
+        pipeline_bytes = len(json.dumps(pipeline, default=str)) if env.FLOW_BUILD_SIZE_SAMPLING else 0
 
-        if not api.run_pipeline(runtime=BambooDjangoRuntime(), pipeline=pipeline).result:
+        run_start = time.perf_counter()
+        result = api.run_pipeline(runtime=BambooDjangoRuntime(), pipeline=pipeline).result
+        self.record_build_stats(
+            ticket_type=self.data["ticket_type"],
+            seconds=build_seconds,
+            node_count=node_count,
+            pipeline_bytes=pipeline_bytes,
+            run_seconds=time.perf_counter() - run_start,
+        )
+        if not result:
             logger.error(_("部署bamboo流程任务创建失败，任务结束"))
             return False
 
         return True
 
-    def hide_sensitive_data(self, copy_data: Optional[Dict]) -> Optional[Dict]:
-        """隐藏pipeline中敏感数据"""
-        for key, value in list(copy_data.items()):
-            if key == "inputs":
-                copy_data.pop(key)
-                continue
-            if isinstance(value, dict):
-                self.hide_sensitive_data(value)
-        return copy_data
+    def hide_sensitive_data(self, data: Optional[Dict]) -> Optional[Dict]:
+        """
+        隐藏pipeline中敏感数据：单次遍历生成剔除inputs后的投影
+        只重建dict结构，其余的值直接引用原对象，不会修改和复制原pipeline
+        """
+        return {
+            key: self.hide_sensitive_data(value) if isinstance(value, dict) else value
+            for key, value in data.items()
+            if key != "inputs"
+        }
+
+    def collect_sub_flow_nodes(self, sub_flow):
+        """将子流程构建的FlowNode并入当前流程"""
+        self.flow_nodes.extend(getattr(sub_flow, "flow_nodes", []))
+
+    def flush_flow_nodes(self) -> int:
+        """
+        批量写入流程(包括子流程)暂存的FlowNode，同一子流程重复加入时按node_id去重
+        """
+        flow_nodes = list({node.node_id: node for node in self.flow_nodes}.values())
+        FlowNode.objects.bulk_create(flow_nodes, batch_size=FLOW_NODE_BULK_CREATE_BATCH_SIZE)
+        self.flow_nodes = []
+        return len(flow_nodes)
+
+    @classmethod
+    def record_build_stats(
+        cls, ticket_type: str, seconds: float, node_count: int, pipeline_bytes: int = 0, run_seconds: float = 0
+    ):
+        """
+        按单据类型记录流程构建耗时
+        @param ticket_type: 单据类型
+        @param seconds: 从创建builder到流程树落库的耗时
+        @param node_count: 流程的活动节点数
+        @param pipeline_bytes: 流程树(包括各节点和子流程的参数)序列化后的大小，近似为bamboo写入数据表的数据量，未采样时为0
+        @param run_seconds: api.run_pipeline的耗时
+        """
+        logger.info(
+            f"build flow of {ticket_type} in {seconds:.3f}s, nodes: {node_count}, "
+            f"bytes: {pipeline_bytes}, run_pipeline: {run_seconds:.3f}s"
+        )
+        pipeline = RedisConn.pipeline(transaction=False)
+        pipeline.hincrby(FLOW_BUILD_STATS_KEY, f"{ticket_type}:count")
+        pipeline.hincrbyfloat(FLOW_BUILD_STATS_KEY, f"{ticket_type}:total_seconds", seconds)
+        pipeline.hset(FLOW_BUILD_STATS_KEY, f"{ticket_type}:last_seconds", seconds)
+        pipeline.hset(FLOW_BUILD_STATS_KEY, f"{ticket_type}:last_nodes", node_count)
+        if pipeline_bytes:
+            pipeline.hset(FLOW_BUILD_STATS_KEY, f"{ticket_type}:last_bytes", pipeline_bytes)
+        pipeline.hset(FLOW_BUILD_STATS_KEY, f"{ticket_type}:last_run_seconds", run_seconds)
+        pipeline.execute()
 
     @staticmethod
     def get_ip_list(ips: list) -> list:
@@ -259,22 +353,51 @@ class SubBuilder(Builder):
     """
     SubBuilder：创建bamboo子流程的对象，活动节点所有的需要参数都是通过流程上下文传递，
     流程上下文只要一个dict参数
+    子流程默认将data完整写入自身的global_data。开启share_global_data后，子流程只保存对根流程全局参数的引用，
+    以及global_data_keys指定的、与根流程不同的参数切片，运行时由BaseService合并还原，避免每个子流程重复存储单据数据
     """
 
+    def __init__(
+        self,
+        root_id: str,
+        data: Optional[Dict] = None,
+        need_random_pass_cluster_ids: list = None,
+        share_global_data: bool = False,
+        global_data_keys: Optional[List[str]] = None,
+    ):
+        """
+        @param share_global_data: 子流程是否引用根流程的全局参数，仅对基于BaseService的活动节点生效
+        @param global_data_keys: 共享模式下，子流程单独保存的参数key，会覆盖根流程全局参数中的同名参数
+        """
+        self.share_global_data = share_global_data or global_data_keys is not None
+        self.global_data_keys = global_data_keys or []
+        super().__init__(root_id, data, need_random_pass_cluster_ids)
+
+    def sub_global_data(self) -> Dict:
+        """子流程的全局参数：非共享模式为完整的data，共享模式为根流程引用和参数切片"""
+        if not self.share_global_data:
+            return self.data
+        sub_data = {key: self.data[key] for key in self.global_data_keys if key in self.data}
+        sub_data[GLOBAL_DATA_REF_KEY] = self.root_id
+        return sub_data
+
     def build_sub_process(self, sub_name) -> Optional[SubProcess]:
         """
         build_sub_bamboo方法: 建立子流程树
         """
         sub_data = Data()
         # 拼接流程的RewritableNode属性
-        sub_data.inputs["${global_data}"] = Var(type=Var.PLAIN, value=self.data)
+        sub_data.inputs["${global_data}"] = Var(type=Var.PLAIN, value=self.sub_global_data())
         sub_data.inputs["${trans_data}"] = RewritableNode(
             source_act=self.rewritable_node_source_keys, type=Var.SPLICE, value=None
         )
         # sub_data.inputs['${trans_data}'] = DataInput(type=Var.SPLICE, value='${trans_data}')
         sub_params = Params({"${trans_data}": Var(type=Var.SPLICE, value="${trans_data}")})
         self.pipe.extend(self.end_act)
-        return SubProcess(start=self.start_act, data=sub_data, params=sub_params, name=sub_name)
+        sub_process = SubProcess(start=self.start_act, data=sub_data, params=sub_params, name=sub_name)
+        # 子流程的FlowNode随子流程对象传递，加入父流程时并入父流程
+        sub_process.flow_nodes = self.flow_nodes
+        return sub_process
 
 
 class RewritableNode(RewritableNodeOutput):
@@ -27,6 +27,7 @@ from backend.flow.plugins.components.collections.mysql.dns_manage import MySQLDn
 from backend.flow.plugins.components.collections.mysql.exec_actuator_script import ExecuteDBActuatorScriptComponent
 from backend.flow.plugins.components.collections.mysql.mysql_db_meta import MySQLDBMetaComponent
 from backend.flow.plugins.components.collections.mysql.trans_flies import TransFileComponent
+from backend.flow.utils.base.payload_handler import PayloadHandler
 from backend.flow.utils.mysql.mysql_act_dataclass import (
     CreateDnsKwargs,
     DBMetaOPKwargs,
@@ -310,4 +311,6 @@ class MySQLHAApplyFlow(object):
             sub_pipelines.append(sub_pipeline.build_sub_process(sub_name=_("部署MySQL高可用集群")))
 
         mysql_ha_pipeline.add_parallel_sub_pipeline(sub_flow_list=sub_pipelines)
+        # 预取内置账号，各实例的部署节点共享流程缓存
+        PayloadHandler.prefetch_flow_cache(root_id=self.root_id, bk_cloud_ids=[int(self.data["bk_cloud_id"])])
         mysql_ha_pipeline.run_pipeline(init_trans_data_class=HaApplyManualContext())
@@ -82,7 +82,8 @@ class MySQLHADisableFlow(object):
             # 获取集群的实例信息
             cluster = self.__get_ha_cluster_info(cluster_id=cluster_id)
 
-            sub_pipeline = SubBuilder(root_id=self.root_id, data=self.data)
+            # 子流程参数与根流程一致，直接引用根流程的全局参数
+            sub_pipeline = SubBuilder(root_id=self.root_id, data=self.data, share_global_data=True)
 
             # 预检测，检测proxy的连接情况
             sub_pipeline.add_act(
@@ -20,7 +20,7 @@ from backend.configuration.constants import DBType
 from backend.db_meta.enums import ClusterType, InstanceInnerRole
 from backend.db_meta.exceptions import ClusterNotExistException, DBMetaBaseException
 from backend.db_meta.models import Cluster
-from backend.flow.consts import DBA_SYSTEM_USER, LONG_JOB_TIMEOUT
+from backend.flow.consts import DBA_SYSTEM_USER, LONG_JOB_TIMEOUT, MYSQL_BACKUP_EXPECTED_DURATION
 from backend.flow.engine.bamboo.scene.common.builder import Builder, SubBuilder
 from backend.flow.engine.bamboo.scene.common.get_file_list import GetFileList
 from backend.flow.engine.exceptions import MySQLBackupLocalException
@@ -137,6 +137,7 @@ class MySQLHAFullBackupFlow(object):
                     )
                 ),
                 # write_payload_var="backup_report_response",
+                expected_duration=MYSQL_BACKUP_EXPECTED_DURATION,
             )
 
             sub_pipe.add_act(
@@ -33,6 +33,11 @@ class MySQLBackupLocalException(AppBaseException):
     MESSAGE_TPL = _("{msg}")
 
 
+class RootGlobalDataNotFound(AppBaseException):
+    MESSAGE = _("根流程全局参数不存在")
+    MESSAGE_TPL = _("根流程[{root_id}]的全局参数不存在")
+
+
 class IncompatibleBackupTypeAndLocal(AppBaseException):
     MESSAGE = _("MySQL备份方式和位置不兼容")
     MESSAGE_TPL = _("MySQL备份方式{backup_type}和位置{backup_local}不兼容")
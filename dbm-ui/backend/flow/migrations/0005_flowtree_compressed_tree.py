@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("flow", "0004_alter_flowtree_index_together"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="flowtree",
+            name="compressed_tree",
+            field=models.BinaryField(blank=True, null=True, verbose_name="压缩的流程树"),
+        ),
+    ]
@@ -8,11 +8,16 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+import gzip
+import json
+from typing import Dict, Optional
+
 from django.db import models
 from django.utils.translation import ugettext_lazy as _
 
+from backend import env
 from backend.configuration.constants import DBType
-from backend.flow.consts import StateType
+from backend.flow.consts import FlowTreeCompressType, StateType
 from backend.ticket.constants import TicketType
 
 
@@ -23,6 +28,7 @@ class FlowTree(models.Model):
     ticket_type = models.CharField(_("单据类型"), choices=TicketType.get_choices(), max_length=64)
     root_id = models.CharField(_("流程ID"), max_length=33, primary_key=True)
     tree = models.JSONField(_("流程树"), null=True, blank=True)
+    compressed_tree = models.BinaryField(_("压缩的流程树"), null=True, blank=True)
     status = models.CharField(
         _("流程状态"), default=StateType.CREATED.value, choices=StateType.get_choices(), max_length=20
     )
@@ -36,6 +42,44 @@ class FlowTree(models.Model):
         ordering = ("-created_at",)
         index_together = [("bk_biz_id", "db_type")]
 
+    # gzip 和 zstd 压缩数据的魔数，用于解压时识别压缩方式
+    GZIP_MAGIC = b"\x1f\x8b"
+    ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+    @classmethod
+    def dump_tree(cls, tree: Optional[Dict]) -> Dict:
+        """
+        根据配置的压缩方式，生成创建FlowTree时流程树相关的字段
+        @param tree: 流程树
+        """
+        compress_type = env.FLOW_TREE_COMPRESS_TYPE
+        if not tree or compress_type == FlowTreeCompressType.NONE:
+            return {"tree": tree}
+
+        content = json.dumps(tree).encode("utf-8")
+        if compress_type == FlowTreeCompressType.ZSTD:
+            import zstandard
+
+            compressed = zstandard.ZstdCompressor().compress(content)
+        else:
+            compressed = gzip.compress(content, mtime=0)
+        return {"tree": None, "compressed_tree": compressed}
+
+    @property
+    def pipeline_tree(self) -> Optional[Dict]:
+        """获取流程树，兼容压缩存储和未压缩存储的数据"""
+        if not self.compressed_tree:
+            return self.tree
+
+        compressed = bytes(self.compressed_tree)
+        if compressed.startswith(self.ZSTD_MAGIC):
+            import zstandard
+
+            content = zstandard.ZstdDecompressor().decompress(compressed)
+        else:
+            content = gzip.decompress(compressed)
+        return json.loads(content)
+
 
 class FlowNode(models.Model):
     uid = models.CharField(_("单据ID"), max_length=127, blank=True, null=True)
@@ -11,15 +11,19 @@ specific language governing permissions and limitations under the License.
 import copy
 import json
 import logging
+import math
 import re
+import time
 from abc import ABCMeta
 from collections import defaultdict
+from functools import lru_cache
 from typing import Any, Dict, List, Optional, Union
 
 from bamboo_engine import states
 from django.utils import translation
 from django.utils.translation import ugettext as _
-from pipeline.core.flow.activity import Service, StaticIntervalGenerator
+from pipeline.core.flow.activity import AbstractIntervalGenerator, Service
+from pipeline.eri.runtime import BambooDjangoRuntime
 
 from backend import env
 from backend.components import JobApi
@@ -27,7 +31,20 @@ from backend.components.sops.client import BkSopsApi
 from backend.core.encrypt.constants import AsymmetricCipherConfigType
 from backend.core.encrypt.handlers import AsymmetricHandler
 from backend.core.translation.constants import Language
-from backend.flow.consts import DEFAULT_FLOW_CACHE_EXPIRE_TIME, SUCCESS_LIST, WriteContextOpType
+from backend.flow.consts import (
+    DEFAULT_FLOW_CACHE_EXPIRE_TIME,
+    GLOBAL_DATA_CACHE_SIZE,
+    GLOBAL_DATA_REF_KEY,
+    SCHEDULE_BACKOFF_FACTOR,
+    SCHEDULE_DEFAULT_CEILING,
+    SCHEDULE_FAST_DURATION,
+    SCHEDULE_INITIAL_INTERVAL,
+    SCHEDULE_MAX_CEILING,
+    SUCCESS_LIST,
+    WriteContextOpType,
+)
+from backend.flow.engine.exceptions import RootGlobalDataNotFound
+from backend.flow.utils.base.job_poller import JobStatusPoller
 from backend.ticket.models import Flow
 from backend.utils.excel import ExcelHandler
 from backend.utils.redis import RedisConn
@@ -36,6 +53,18 @@ logger = logging.getLogger("flow")
 cpl = re.compile("<ctx>(?P<context>.+?)</ctx>")  # 非贪婪模式，只匹配第一次出现的自定义tag
 
 
+@lru_cache(maxsize=GLOBAL_DATA_CACHE_SIZE)
+def load_root_global_data(root_id: str) -> Dict:
+    """
+    读取根流程的全局参数。全局参数在流程运行期间只读，因此按root_id缓存在进程内
+    根流程上下文不存在时抛出异常，异常不会被缓存
+    """
+    context_values = BambooDjangoRuntime().get_context_values(pipeline_id=root_id, keys={"${global_data}"})
+    if not context_values:
+        raise RootGlobalDataNotFound(root_id=root_id)
+    return context_values[0].value
+
+
 class ServiceLogMixin:
     def log_info(self, msg: str):
         logger.info(msg, extra=self.extra_log)
@@ -70,11 +99,69 @@ class ServiceLogMixin:
         }
 
 
+class AdaptiveIntervalGenerator(AbstractIntervalGenerator):
+    """
+    自适应轮询间隔：节点开始轮询后的快速阶段内使用固定的短间隔，之后按指数退避增加间隔，直到节点的间隔上限
+    节点可通过 kwargs 中的 expected_duration(秒) 提示预期的执行时长，以此放宽长耗时节点的间隔上限
+    """
+
+    def __init__(
+        self,
+        initial: int = SCHEDULE_INITIAL_INTERVAL,
+        ceiling: int = SCHEDULE_DEFAULT_CEILING,
+        fast_duration: int = SCHEDULE_FAST_DURATION,
+        factor: int = SCHEDULE_BACKOFF_FACTOR,
+        start_time: float = None,
+    ):
+        super().__init__()
+        self.initial = initial
+        self.ceiling = max(ceiling, initial)
+        self.fast_duration = fast_duration
+        self.factor = factor
+        self.start_time = start_time
+
+    def for_node(self, start_time: float, expected_duration: int = None) -> "AdaptiveIntervalGenerator":
+        """根据节点的轮询起始时间和预期执行时长，生成节点独享的间隔生成器"""
+        ceiling = self.ceiling
+        if expected_duration:
+            # 间隔上限取预期时长的1/10，短任务退化为固定的快速轮询
+            ceiling = min(max(int(expected_duration) // 10, self.initial), SCHEDULE_MAX_CEILING)
+        return AdaptiveIntervalGenerator(self.initial, ceiling, self.fast_duration, self.factor, start_time)
+
+    def restart(self, start_time: float) -> "AdaptiveIntervalGenerator":
+        """保留节点的间隔上限，从start_time重新开始快速轮询"""
+        return AdaptiveIntervalGenerator(self.initial, self.ceiling, self.fast_duration, self.factor, start_time)
+
+    def next(self):
+        super().next()
+        if self.start_time is None:
+            return self.initial
+
+        elapsed = time.time() - self.start_time
+        if elapsed <= self.fast_duration:
+            return self.initial
+        # 快速阶段后，耗时每增长factor倍，轮询间隔也增长factor倍
+        exponent = int(math.log(elapsed / self.fast_duration, self.factor)) + 1
+        return min(self.initial * self.factor**exponent, self.ceiling)
+
+
 class BaseService(Service, ServiceLogMixin, metaclass=ABCMeta):
     """
     DB Service 基类
     """
 
+    @classmethod
+    def resolve_global_data(cls, data):
+        """还原共享模式子流程的全局参数：根流程全局参数合并子流程的参数切片"""
+        global_data = data.get_one_of_inputs("global_data")
+        if not isinstance(global_data, dict) or GLOBAL_DATA_REF_KEY not in global_data:
+            return
+
+        # 复制缓存的根流程参数，避免节点修改全局参数时污染缓存
+        resolved_data = copy.deepcopy(load_root_global_data(global_data[GLOBAL_DATA_REF_KEY]))
+        resolved_data.update({key: value for key, value in global_data.items() if key != GLOBAL_DATA_REF_KEY})
+        data.inputs["global_data"] = resolved_data
+
     @classmethod
     def active_language(cls, data):
         # 激活国际化
@@ -176,6 +263,7 @@ class BaseService(Service, ServiceLogMixin, metaclass=ABCMeta):
         return ExcelHandler.response(wb, excel_name)
 
     def execute(self, data, parent_data):
+        self.resolve_global_data(data)
         self.active_language(data)
 
         kwargs = data.get_one_of_inputs("kwargs") or {}
@@ -192,10 +280,37 @@ class BaseService(Service, ServiceLogMixin, metaclass=ABCMeta):
     def _execute(self, data, parent_data):
         raise NotImplementedError()
 
+    def _setup_adaptive_interval(self, data, kwargs: dict):
+        """为使用自适应轮询的节点生成独享的间隔生成器"""
+        if not isinstance(self.interval, AdaptiveIntervalGenerator):
+            return
+        if not data.get_one_of_outputs("schedule_start_time"):
+            data.outputs["schedule_start_time"] = time.time()
+        self.interval = self.interval.for_node(
+            start_time=data.get_one_of_outputs("schedule_start_time"),
+            expected_duration=kwargs.get("expected_duration"),
+        )
+
+    def refresh_adaptive_interval(self, data, progress):
+        """
+        记录节点本次轮询观测到的执行进度，进度发生变化时重新开始快速轮询
+        @param progress: 可json序列化的进度标识，如任务状态、已完成的步骤/主机数
+        """
+        if not isinstance(self.interval, AdaptiveIntervalGenerator):
+            return
+        last_progress = data.get_one_of_outputs("schedule_progress")
+        data.outputs["schedule_progress"] = progress
+        if last_progress is None or last_progress == progress:
+            return
+        data.outputs["schedule_start_time"] = time.time()
+        self.interval = self.interval.restart(data.outputs["schedule_start_time"])
+
     def schedule(self, data, parent_data, callback_data=None):
+        self.resolve_global_data(data)
         self.active_language(data)
 
         kwargs = data.get_one_of_inputs("kwargs") or {}
+        self._setup_adaptive_interval(data, kwargs)
         try:
             result = self._schedule(data, parent_data)
             return result
@@ -243,20 +358,25 @@ class BaseService(Service, ServiceLogMixin, metaclass=ABCMeta):
 
 class BkJobService(BaseService, metaclass=ABCMeta):
     __need_schedule__ = True
-    interval = StaticIntervalGenerator(5)
+    interval = AdaptiveIntervalGenerator()
 
     @staticmethod
     def __status__(instance_id: str) -> Optional[Dict]:
         """
-        获取任务状态
+        获取任务状态，优先读取共享轮询器的缓存
         """
-        payload = {
-            "bk_biz_id": env.JOB_BLUEKING_BIZ_ID,
-            "job_instance_id": instance_id,
-            "return_ip_result": True,
-        }
-        resp = JobApi.get_job_instance_status(payload, raw=True)
-        return resp
+        return JobStatusPoller.get_status(instance_id)
+
+    @staticmethod
+    def __job_progress__(job_data: Dict) -> List:
+        """job的执行进度：作业状态，以及各步骤的状态和各状态的主机数"""
+        progress = [job_data.get("job_instance", {}).get("status")]
+        for step in job_data.get("step_instance_list") or []:
+            ip_status_count = defaultdict(int)
+            for ip_result in step.get("step_ip_result_list") or []:
+                ip_status_count[ip_result.get("status")] += 1
+            progress.append([step.get("status"), sorted(ip_status_count.items())])
+        return progress
 
     def __log__(
         self,
@@ -274,47 +394,64 @@ class BkJobService(BaseService, metaclass=ABCMeta):
         }
         return JobApi.get_job_instance_ip_log({**payload, **ip_dict}, raw=True)
 
+    def __batch_log__(self, job_instance_id: int, step_instance_id: int, ip_dicts: List[Dict]) -> Dict[str, Dict]:
+        """
+        批量获取任务日志，key为ip。批量接口查询不到的ip，回退为单个ip查询
+        """
+        ip_logs = JobStatusPoller.batch_get_ip_logs(job_instance_id, step_instance_id, ip_dicts)
+        for ip_dict in ip_dicts:
+            if ip_dict["ip"] in ip_logs:
+                continue
+            resp = self.__log__(job_instance_id, step_instance_id, ip_dict)
+            if resp.get("result"):
+                ip_logs[ip_dict["ip"]] = resp["data"]
+        return ip_logs
+
     def __get_target_ip_context(
         self,
-        job_instance_id: int,
-        step_instance_id: int,
-        ip_dict: dict,
+        ip_logs: Dict[str, Dict],
+        ip_dicts: List[Dict],
         data,
         trans_data,
         write_payload_var: str,
         write_op: str,
     ):
         """
-        对单个节点获取执行后log，并赋值给定义好流程上下文的trans_data
+        对节点获取执行后log，并赋值给定义好流程上下文的trans_data
         write_op 控制写入变量的方式，rewrite是默认值，代表覆盖写入；append代表以{"ip":xxx} 形式追加里面变量里面
         """
-        resp = self.__log__(job_instance_id, step_instance_id, ip_dict)
-        if not resp["result"]:
-            # 结果返回异常，则异常退出
-            return False
-        try:
-            # 以dict形式追加写入
-            result = json.loads(re.search(cpl, resp["data"]["log_content"]).group("context"))
-            if write_op == WriteContextOpType.APPEND.value:
-                context = copy.deepcopy(getattr(trans_data, write_payload_var))
-                ip = ip_dict["ip"]
-                if context:
-                    context[ip] = copy.deepcopy(result)
-                else:
-                    context = {ip: copy.deepcopy(result)}
-
-                setattr(trans_data, write_payload_var, copy.deepcopy(context))
+        # 追加写入时，只拷贝一次上下文，各个ip的结果直接写入拷贝后的上下文
+        context = None
+        if write_op == WriteContextOpType.APPEND.value:
+            context = dict(getattr(trans_data, write_payload_var) or {})
 
+        is_success = True
+        for ip_dict in ip_dicts:
+            ip = ip_dict["ip"]
+            if ip not in ip_logs:
+                # 结果返回异常，则异常退出
+                self.log_error(_("[获取执行日志失败] ip:[{}]").format(ip))
+                is_success = False
+                continue
+            try:
+                # 日志内容每次都是新解析的对象，无需再拷贝
+                result = json.loads(re.search(cpl, ip_logs[ip]["log_content"]).group("context"))
+            except Exception as e:
+                self.log_error(_("[写入上下文结果失败] ip:[{}] failed: {}").format(ip, e))
+                is_success = False
+                continue
+
+            if context is not None:
+                # 以dict形式追加写入
+                context[ip] = result
             else:
                 # 默认覆盖写入
-                setattr(trans_data, write_payload_var, copy.deepcopy(result))
-            data.outputs["trans_data"] = trans_data
+                setattr(trans_data, write_payload_var, result)
 
-            return True
-
-        except Exception as e:
-            self.log_error(_("[写入上下文结果失败] failed: {}").format(e))
-            return False
+        if context is not None:
+            setattr(trans_data, write_payload_var, context)
+        data.outputs["trans_data"] = trans_data
+        return is_success
 
     def _schedule(self, data, parent_data, callback_data=None) -> bool:
         ext_result = data.get_one_of_outputs("ext_result")
@@ -349,6 +486,8 @@ class BkJobService(BaseService, metaclass=ABCMeta):
         # 7.等待用户; 8.手动结束; 9.状态异常; 10.步骤强制终止中; 11.步骤强制终止成功; 12.步骤强制终止失败
         # """
         if not (resp["result"] and resp["data"]["finished"]):
+            if resp["result"]:
+                self.refresh_adaptive_interval(data, self.__job_progress__(resp["data"]))
             self.log_info(_("[{}] 任务正在执行🤔").format(node_name))
             return True
 
@@ -377,10 +516,10 @@ class BkJobService(BaseService, metaclass=ABCMeta):
 
             # 转载job脚本节点报错日志，兼容多IP执行场景的日志输出
             if ip_dicts:
+                ip_logs = self.__batch_log__(job_instance_id, step_instance_id, ip_dicts)
                 for ip_dict in ip_dicts:
-                    resp = self.__log__(job_instance_id, step_instance_id, ip_dict)
-                    if resp.get("result"):
-                        self.log_error(f"{ip_dict}:{resp['data']['log_content']}")
+                    if ip_dict["ip"] in ip_logs:
+                        self.log_error(f"{ip_dict}:{ip_logs[ip_dict['ip']]['log_content']}")
 
             self.finish_schedule()
             return False
@@ -396,21 +535,16 @@ class BkJobService(BaseService, metaclass=ABCMeta):
         # 追加写入是特殊行为，如果想IP日志结果都写入，可以选择追加写入，上下文变成list，每个元素是{"ip":"log"} WriteContextOpType.APPEND
         self.log_info(_("[{}]该节点需要获取执行后日志，赋值到流程上下文").format(node_name))
 
-        is_false = False
-        for ip_dict in ip_dicts:
-            if not self.__get_target_ip_context(
-                job_instance_id=job_instance_id,
-                step_instance_id=step_instance_id,
-                ip_dict=ip_dict,
-                data=data,
-                trans_data=trans_data,
-                write_payload_var=write_payload_var,
-                write_op=kwargs.get("write_op", WriteContextOpType.REWRITE.value),
-            ):
-                self.log_error(_("[{}] 获取执行后写入流程上下文失败，ip:[{}]").format(node_name, ip_dict["ip"]))
-                is_false = True
-
-        if is_false:
+        ip_logs = self.__batch_log__(job_instance_id, step_instance_id, ip_dicts)
+        if not self.__get_target_ip_context(
+            ip_logs=ip_logs,
+            ip_dicts=ip_dicts,
+            data=data,
+            trans_data=trans_data,
+            write_payload_var=write_payload_var,
+            write_op=kwargs.get("write_op", WriteContextOpType.REWRITE.value),
+        ):
+            self.log_error(_("[{}] 获取执行后写入流程上下文失败").format(node_name))
             self.finish_schedule()
             return False
 
@@ -420,7 +554,7 @@ class BkJobService(BaseService, metaclass=ABCMeta):
 
 class BkSopsService(BaseService, metaclass=ABCMeta):
     __need_schedule__ = True
-    interval = StaticIntervalGenerator(5)
+    interval = AdaptiveIntervalGenerator()
     """
     定义调用标准运维的基类
     """
@@ -445,3 +579,9 @@ class BkSopsService(BaseService, metaclass=ABCMeta):
             # 查询异常日志
             self.log_error(rp_data.get("ex_data", _("查询日志失败")))
             return False
+
+        # 任务运行中，以已完成的子节点数作为执行进度
+        children = rp_data.get("children") or {}
+        finished_count = len([child for child in children.values() if child.get("state") == states.FINISHED])
+        self.refresh_adaptive_interval(data, [state, finished_count])
+        return True
@@ -20,6 +20,7 @@ from backend.flow.plugins.components.collections.common.base_service import Base
 from backend.ticket.builders import BuilderFactory
 from backend.ticket.constants import TicketStatus
 from backend.ticket.flow_manager.manager import TicketFlowManager
+from backend.ticket.handler import TicketHandler
 from backend.ticket.models import Ticket
 
 
@@ -49,6 +50,7 @@ class RedisTicketService(BaseService):
         builder = BuilderFactory.create_builder(ticket)
         builder.patch_ticket_detail()
         builder.init_ticket_flows()
+        TicketHandler.sync_related_objects([ticket])
         TicketFlowManager(ticket=ticket).run_next_flow()
 
         self.log_info("succ create ticket for cluster {} : {}".format(kwargs["immute_domain"], ticket))
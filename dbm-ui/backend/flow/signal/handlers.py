@@ -9,55 +9,124 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 import logging
+from typing import Dict
 
+from celery import shared_task
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
 from django.utils.translation import ugettext as _
 
+from backend import env
 from backend.db_dirty.handlers import DBDirtyMachineHandler
-from backend.flow.consts import StateType
+from backend.db_proxy.models import DBExtension
+from backend.flow.consts import (
+    FLOW_STATE_COALESCE_PENDING_EXPIRE,
+    FLOW_STATE_COALESCE_PENDING_KEY,
+    FLOW_STATE_COALESCE_WINDOW_KEY,
+    FLOW_STATE_SIGNAL_STATS_KEY,
+    StateType,
+)
 from backend.flow.engine.bamboo.engine import BambooEngine
 from backend.flow.models import FlowNode, FlowTree
+from backend.flow.utils.base.flow_cache import FlowScopedCache
 from backend.ticket.constants import FlowCallbackType, FlowMsgType, FlowType, TicketFlowStatus
 from backend.ticket.flow_manager.inner import InnerFlow
 from backend.ticket.flow_manager.manager import TicketFlowManager
 from backend.ticket.models import Ticket
 from backend.ticket.tasks.ticket_tasks import send_msg_for_flow
+from backend.utils.redis import RedisConn
 
 logger = logging.getLogger("flow")
 
 
 def post_set_state_signal_handler(sender, node_id, to_state, version, root_id, *args, **kwargs):
-    engine = BambooEngine(root_id=root_id)
-    pipeline_states = engine.get_pipeline_states().data
-
     now = timezone.now()
     logger.debug(_("【状态信号捕获】{} root_id={}, node_id={}, status:{}").format(now, root_id, node_id, to_state))
+
+    # 更新节点状态，运行态时同时记录开始时间
+    node_update_fields = {"version_id": version, "status": to_state, "updated_at": now}
     if to_state == StateType.RUNNING:
-        # 记录开始时间
-        FlowNode.objects.filter(root_id=root_id, node_id=node_id).update(started_at=now)
+        node_update_fields.update(started_at=now)
+    FlowNode.objects.filter(root_id=root_id, node_id=node_id).update(**node_update_fields)
 
-    FlowNode.objects.filter(root_id=root_id, node_id=node_id).update(
-        version_id=version, status=to_state, updated_at=now
-    )
+    RedisConn.hincrby(FLOW_STATE_SIGNAL_STATS_KEY, "received")
+    if coalesce_flow_state(root_id, node_id, to_state):
+        return
+    evaluate_flow_tree_status(root_id, to_state)
+
+
+def coalesce_flow_state(root_id: str, node_id: str, to_state: str) -> bool:
+    """
+    合并窗口期内同一流程的状态信号，返回True表示该信号已被合并，由窗口结束后的评估任务统一处理
+    窗口内的首个信号立即评估，后续信号只记录最新的节点状态，并由首个被合并的信号投递一次延时评估任务
+    @param root_id: 流程ID
+    @param node_id: 节点ID
+    @param to_state: 节点目标状态
+    """
+    window = env.FLOW_STATE_COALESCE_WINDOW
+    # 根节点状态和失败状态直接决定流程结果，不参与合并
+    if not window or node_id == root_id or to_state == StateType.FAILED:
+        return False
+
+    window_key = FLOW_STATE_COALESCE_WINDOW_KEY.format(root_id=root_id)
+    if RedisConn.set(window_key, 1, nx=True, ex=window):
+        return False
+
+    pending_key = FLOW_STATE_COALESCE_PENDING_KEY.format(root_id=root_id)
+    pipeline = RedisConn.pipeline()
+    pipeline.getset(pending_key, to_state)
+    pipeline.expire(pending_key, FLOW_STATE_COALESCE_PENDING_EXPIRE)
+    pipeline.hincrby(FLOW_STATE_SIGNAL_STATS_KEY, "absorbed")
+    pipeline.ttl(window_key)
+    last_pending_state, __, __, window_ttl = pipeline.execute()
+
+    if last_pending_state is None:
+        evaluate_coalesced_flow_state.apply_async(args=(root_id,), countdown=max(window_ttl, 1))
+    return True
+
+
+@shared_task
+def evaluate_coalesced_flow_state(root_id: str):
+    """窗口结束后，使用窗口内最新的节点状态评估一次流程状态"""
+    pending_key = FLOW_STATE_COALESCE_PENDING_KEY.format(root_id=root_id)
+    pipeline = RedisConn.pipeline()
+    pipeline.get(pending_key)
+    pipeline.delete(pending_key)
+    to_state, __ = pipeline.execute()
+    if to_state is None:
+        return
+    evaluate_flow_tree_status(root_id, to_state)
+
+
+def evaluate_flow_tree_status(root_id: str, to_state: str):
+    """
+    根据节点状态和流程根节点状态流转FlowTree的状态
+    @param root_id: 流程ID
+    @param to_state: 触发评估的节点状态
+    """
     try:
         tree = FlowTree.objects.get(root_id=root_id)
     except FlowTree.DoesNotExist:
         logger.debug(_("【状态信号捕获】未查找到FlowTree root_id={}").format(root_id))
         return
 
+    RedisConn.hincrby(FLOW_STATE_SIGNAL_STATS_KEY, "evaluated")
+    root_state = BambooEngine(root_id=root_id).get_pipeline_root_state()
+
     # 流转当前的flow状态
     origin_tree_status = tree.status
     # 如果当前节点或者流程已失败，则状态为失败
-    if to_state == StateType.FAILED or pipeline_states[root_id]["state"] == StateType.FAILED:
+    if to_state == StateType.FAILED or root_state == StateType.FAILED:
         target_tree_status = StateType.FAILED
     # 如果流程已撤销，则状态为撤销
-    elif pipeline_states[root_id]["state"] == StateType.REVOKED:
+    elif root_state == StateType.REVOKED:
         target_tree_status = StateType.REVOKED
-    # 如果当前节点和流程都已完成，则状态为完成
-    elif to_state == StateType.FINISHED and pipeline_states[root_id]["state"] == StateType.FINISHED:
+    # 如果流程已完成，则状态为完成(合并评估时节点状态可能滞后于根节点)
+    elif root_state == StateType.FINISHED:
         target_tree_status = StateType.FINISHED
     # 如果当前节点已完成，流程不处于完成态，则状态为进行
-    elif to_state == StateType.FINISHED and pipeline_states[root_id]["state"] != StateType.FINISHED:
+    elif to_state == StateType.FINISHED:
         target_tree_status = StateType.RUNNING
     else:
         target_tree_status = to_state
@@ -66,8 +135,8 @@ def post_set_state_signal_handler(sender, node_id, to_state, version, root_id, *
     if origin_tree_status != target_tree_status:
         try:
             # 更新flow tree和inner flow的状态
-            tree.updated_at, tree.status = now, target_tree_status
-            tree.save()
+            tree.updated_at, tree.status = timezone.now(), target_tree_status
+            tree.save(update_fields=["updated_at", "status"])
             DBDirtyMachineHandler.handle_dirty_machine(tree.uid, root_id, origin_tree_status, target_tree_status)
             callback_ticket(tree.uid, root_id)
         except Exception as e:  # pylint: disable=broad-except
@@ -75,6 +144,12 @@ def post_set_state_signal_handler(sender, node_id, to_state, version, root_id, *
             return
 
 
+def get_flow_state_signal_stats() -> Dict[str, int]:
+    """获取状态信号的统计计数：received-收到的信号数，absorbed-被合并的信号数，evaluated-流程状态评估次数"""
+    stats = RedisConn.hgetall(FLOW_STATE_SIGNAL_STATS_KEY)
+    return {field: int(stats.get(field, 0)) for field in ["received", "absorbed", "evaluated"]}
+
+
 def callback_ticket(ticket_id, root_id):
     """回调单据以进行后续的步骤"""
     try:
@@ -112,3 +187,18 @@ def callback_ticket(ticket_id, root_id):
     if current_flow and current_flow.flow_obj_id == root_id:
         manager = TicketFlowManager(ticket=ticket)
         manager.run_next_flow()
+
+
+@receiver(post_save, sender=FlowTree)
+def clear_flow_tree_skeleton_handler(sender, instance: FlowTree, created: bool, update_fields=None, **kwargs):
+    """流程树内容发生变更时，清理已缓存的流程树骨架"""
+    if created or (update_fields and not {"tree", "compressed_tree"} & set(update_fields)):
+        return
+    BambooEngine.clear_pipeline_tree_skeleton(instance.root_id)
+
+
+@receiver(post_save, sender=DBExtension)
+@receiver(post_delete, sender=DBExtension)
+def invalidate_flow_scoped_cache_handler(sender, instance: DBExtension, **kwargs):
+    """云区域组件的系统账号发生变更时，失效流程中缓存的旧账号"""
+    FlowScopedCache.invalidate_all()
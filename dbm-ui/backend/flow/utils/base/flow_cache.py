@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import hashlib
+import json
+from typing import Any, Callable, Dict, Optional
+
+from backend.core.encrypt.handlers import SymmetricHandler
+from backend.flow.consts import FLOW_SCOPED_CACHE_EXPIRE_TIME, FLOW_SCOPED_CACHE_GENERATION_KEY, FLOW_SCOPED_CACHE_KEY
+from backend.utils.redis import RedisConn
+
+
+class FlowScopedCache:
+    """
+    流程级别的密码/配置缓存
+    同一个流程(root_id)的活动节点共享查询结果，避免每个节点重复请求密码服务和dbconfig
+    缓存内容加密存储，到期自动失效；密码轮换后调用invalidate/invalidate_all显式失效
+    """
+
+    @classmethod
+    def _cache_key(cls, root_id: str) -> str:
+        generation = RedisConn.get(FLOW_SCOPED_CACHE_GENERATION_KEY) or 0
+        return FLOW_SCOPED_CACHE_KEY.format(root_id=root_id, generation=generation)
+
+    @classmethod
+    def params_field(cls, prefix: str, params: Dict) -> str:
+        """根据请求参数生成缓存字段"""
+        digest = hashlib.md5(json.dumps(params, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        return f"{prefix}:{digest}"
+
+    @classmethod
+    def get(cls, root_id: str, field: str) -> Optional[Any]:
+        content = RedisConn.hget(cls._cache_key(root_id), field)
+        return json.loads(SymmetricHandler.decrypt(content)) if content else None
+
+    @classmethod
+    def set_many(cls, root_id: str, mapping: Dict[str, Any]):
+        """
+        批量写入缓存，每次写入刷新过期时间
+        @param root_id: 流程id
+        @param mapping: {缓存字段: 可json序列化的数据}
+        """
+        if not mapping:
+            return
+        cache_key = cls._cache_key(root_id)
+        pipeline = RedisConn.pipeline(transaction=False)
+        pipeline.hset(
+            cache_key, mapping={field: SymmetricHandler.encrypt(json.dumps(value)) for field, value in mapping.items()}
+        )
+        pipeline.expire(cache_key, FLOW_SCOPED_CACHE_EXPIRE_TIME)
+        pipeline.execute()
+
+    @classmethod
+    def get_or_set(cls, root_id: Optional[str], field: str, func: Callable[[], Any]) -> Any:
+        """
+        获取缓存，未命中时调用func查询并写入缓存。root_id为空时不缓存
+        @param root_id: 流程id
+        @param field: 缓存字段
+        @param func: 查询函数，返回值需要可json序列化
+        """
+        if not root_id:
+            return func()
+
+        value = cls.get(root_id, field)
+        if value is None:
+            value = func()
+            cls.set_many(root_id, {field: value})
+        return value
+
+    @classmethod
+    def invalidate(cls, root_id: str, *fields: str):
+        """失效流程的缓存，不指定字段时失效流程的全部缓存"""
+        if fields:
+            RedisConn.hdel(cls._cache_key(root_id), *fields)
+        else:
+            RedisConn.delete(cls._cache_key(root_id))
+
+    @classmethod
+    def invalidate_all(cls):
+        """密码轮换后失效全部流程的缓存，旧代数的缓存等待过期清理"""
+        RedisConn.incr(FLOW_SCOPED_CACHE_GENERATION_KEY)
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from backend import env
+from backend.components import JobApi
+from backend.flow.consts import (
+    JOB_LOG_BATCH_SIZE,
+    JOB_POLLER_BATCH_SIZE,
+    JOB_POLLER_CONCURRENCY,
+    JOB_POLLER_IDLE_EXPIRE_TIME,
+    JOB_POLLER_RUNNING_KEY,
+    JOB_POLLER_STATUS_EXPIRE_TIME,
+    JOB_POLLER_STATUS_KEY,
+)
+from backend.utils.redis import RedisConn
+
+logger = logging.getLogger("flow")
+
+
+class JobStatusPoller:
+    """
+    job状态共享轮询器
+    节点在调度时登记正在运行的job_instance_id，由周期任务统一分批查询状态并写入缓存，节点调度时直接读取缓存。
+    当缓存不存在(轮询任务未运行/刚登记)时，节点回退为直接查询job状态
+    """
+
+    @staticmethod
+    def _status_key(job_instance_id: int) -> str:
+        return f"{JOB_POLLER_STATUS_KEY}_{job_instance_id}"
+
+    @staticmethod
+    def query_status(job_instance_id: int) -> Dict:
+        """直接查询job状态"""
+        payload = {
+            "bk_biz_id": env.JOB_BLUEKING_BIZ_ID,
+            "job_instance_id": job_instance_id,
+            "return_ip_result": True,
+        }
+        return JobApi.get_job_instance_status(payload, raw=True)
+
+    @classmethod
+    def get_status(cls, job_instance_id: int) -> Dict:
+        """获取job状态，优先读取共享轮询的缓存结果"""
+        # 刷新job的活跃时间，没有节点读取的job会被轮询任务淘汰
+        RedisConn.zadd(JOB_POLLER_RUNNING_KEY, {job_instance_id: time.time()})
+
+        cache_status = RedisConn.get(cls._status_key(job_instance_id))
+        if cache_status:
+            return json.loads(cache_status)
+
+        resp = cls.query_status(job_instance_id)
+        cls._cache_status(job_instance_id, resp)
+        return resp
+
+    @classmethod
+    def _cache_status(cls, job_instance_id: int, resp: Dict, pipeline=None):
+        if not resp.get("result"):
+            return
+        (pipeline or RedisConn).set(cls._status_key(job_instance_id), json.dumps(resp), JOB_POLLER_STATUS_EXPIRE_TIME)
+        # 已经结束的job无需继续轮询
+        if resp["data"].get("finished"):
+            (pipeline or RedisConn).zrem(JOB_POLLER_RUNNING_KEY, job_instance_id)
+
+    @classmethod
+    def poll(cls) -> int:
+        """分批查询所有运行中job的状态，并写入缓存。返回本次轮询的job数量"""
+        # 淘汰长时间没有节点读取的job
+        RedisConn.zremrangebyscore(JOB_POLLER_RUNNING_KEY, 0, time.time() - JOB_POLLER_IDLE_EXPIRE_TIME)
+        job_instance_ids = [int(job_id) for job_id in RedisConn.zrange(JOB_POLLER_RUNNING_KEY, 0, -1)]
+        if not job_instance_ids:
+            return 0
+
+        def _query(job_instance_id: int) -> Tuple[int, Optional[Dict]]:
+            try:
+                return job_instance_id, cls.query_status(job_instance_id)
+            except Exception as e:  # pylint: disable=broad-except
+                logger.warning(f"poll job status failed, job_instance_id: {job_instance_id}, err: {e}")
+                return job_instance_id, None
+
+        with ThreadPoolExecutor(max_workers=JOB_POLLER_CONCURRENCY) as executor:
+            for index in range(0, len(job_instance_ids), JOB_POLLER_BATCH_SIZE):
+                batch_ids = job_instance_ids[index : index + JOB_POLLER_BATCH_SIZE]
+                pipeline = RedisConn.pipeline(transaction=False)
+                for job_instance_id, resp in executor.map(_query, batch_ids):
+                    if resp:
+                        cls._cache_status(job_instance_id, resp, pipeline)
+                pipeline.execute()
+
+        return len(job_instance_ids)
+
+    @staticmethod
+    def batch_get_ip_logs(job_instance_id: int, step_instance_id: int, ip_dicts: List[Dict]) -> Dict[str, Dict]:
+        """
+        批量获取job各个ip的执行日志
+        @param job_instance_id: job实例ID
+        @param step_instance_id: 步骤实例ID
+        @param ip_dicts: ip列表，格式为[{"bk_cloud_id": 0, "ip": "127.0.0.1"}]
+        @return: key为ip，value为对应的日志信息
+        """
+        ip_logs: Dict[str, Dict] = {}
+        for index in range(0, len(ip_dicts), JOB_LOG_BATCH_SIZE):
+            payload = {
+                "bk_biz_id": env.JOB_BLUEKING_BIZ_ID,
+                "job_instance_id": job_instance_id,
+                "step_instance_id": step_instance_id,
+                "ip_list": [
+                    {"bk_cloud_id": ip_dict["bk_cloud_id"], "ip": ip_dict["ip"]}
+                    for ip_dict in ip_dicts[index : index + JOB_LOG_BATCH_SIZE]
+                ],
+            }
+            resp = JobApi.batch_get_job_instance_ip_log(payload, raw=True)
+            if not resp.get("result"):
+                logger.warning(f"batch get job ip log failed, job_instance_id: {job_instance_id}, resp: {resp}")
+                continue
+            for ip_log in (resp.get("data") or {}).get("script_task_logs") or []:
+                ip_logs[ip_log["ip"]] = ip_log
+        return ip_logs
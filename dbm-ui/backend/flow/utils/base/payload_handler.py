@@ -11,6 +11,7 @@ specific language governing permissions and limitations under the License.
 import base64
 import logging
 import re
+from typing import Dict, List, Optional
 
 from backend import env
 from backend.components import DBConfigApi, DBPrivManagerApi
@@ -23,6 +24,7 @@ from backend.db_meta.models import Cluster
 from backend.db_proxy.constants import ExtensionType
 from backend.db_proxy.models import DBExtension
 from backend.flow.consts import DEFAULT_INSTANCE, ConfigTypeEnum, LevelInfoEnum, MySQLPrivComponent, UserName
+from backend.flow.utils.base.flow_cache import FlowScopedCache
 from backend.flow.utils.mysql.get_mysql_sys_user import generate_mysql_tmp_user
 from backend.ticket.constants import TicketType
 from backend.utils.string import base64_encode
@@ -49,8 +51,10 @@ class PayloadHandler(object):
         self.ticket_data = ticket_data
         self.cluster = cluster
         self.cluster_type = cluster_type
+        # 同一流程内的密码和配置查询结果按root_id缓存
+        self.root_id = self.ticket_data.get("job_root_id")
         self.account = self.get_mysql_account()
-        self.proxy_account = self.get_proxy_account()
+        self.proxy_account = self.get_proxy_account(root_id=self.root_id)
 
         # todo 后面可能优化这个问题
         if self.ticket_data.get("module"):
@@ -61,21 +65,76 @@ class PayloadHandler(object):
             self.db_module_id = 0
 
     @staticmethod
-    def get_proxy_account():
+    def get_proxy_account(root_id: str = None):
         """
         获取proxy实例内置帐户密码
+        @param root_id: 流程id，指定时在流程内缓存查询结果
         """
-        data = DBPrivManagerApi.get_password(
-            {
-                "instances": [DEFAULT_INSTANCE],
-                "users": [{"username": UserName.PROXY.value, "component": MySQLPrivComponent.PROXY.value}],
-            }
-        )["items"]
+
+        def _query_proxy_account():
+            data = DBPrivManagerApi.get_password(
+                {"instances": [DEFAULT_INSTANCE], "users": PayloadHandler._proxy_account_users()}
+            )["items"]
+            return PayloadHandler._format_proxy_account(data)
+
+        return FlowScopedCache.get_or_set(root_id, "proxy_account", _query_proxy_account)
+
+    @staticmethod
+    def _proxy_account_users() -> List[Dict]:
+        return [{"username": UserName.PROXY.value, "component": MySQLPrivComponent.PROXY.value}]
+
+    @staticmethod
+    def _format_proxy_account(items: List[Dict]) -> Dict:
         return {
-            "proxy_admin_pwd": base64.b64decode(data[0]["password"]).decode("utf-8"),
-            "proxy_admin_user": data[0]["username"],
+            "proxy_admin_pwd": base64.b64decode(items[0]["password"]).decode("utf-8"),
+            "proxy_admin_user": items[0]["username"],
         }
 
+    @staticmethod
+    def _mysql_account_users() -> List[Dict]:
+        usernames = [
+            UserName.BACKUP,
+            UserName.MONITOR,
+            UserName.MONITOR_ACCESS_ALL,
+            UserName.OS_MYSQL,
+            UserName.REPL,
+            UserName.YW,
+            UserName.PARTITION_YW,
+        ]
+        return [{"username": user.value, "component": MySQLPrivComponent.MYSQL.value} for user in usernames]
+
+    @staticmethod
+    def _format_mysql_account(items: List[Dict]) -> Dict:
+        user_map = {}
+        value_to_name = {member.value: member.name.lower() for member in UserName}
+        for user in items:
+            user_map[value_to_name[user["username"]] + "_user"] = (
+                "MONITOR" if user["username"] == UserName.MONITOR_ACCESS_ALL.value else user["username"]
+            )
+            user_map[value_to_name[user["username"]] + "_pwd"] = base64.b64decode(user["password"]).decode("utf-8")
+        return user_map
+
+    @classmethod
+    def prefetch_flow_cache(cls, root_id: str, bk_cloud_ids: Optional[List[int]] = None):
+        """
+        在流程开始前预取流程内置账号，写入流程缓存，活动节点不再逐个请求密码服务
+        mysql和proxy内置账号合并为一次密码服务查询
+        @param root_id: 流程id
+        @param bk_cloud_ids: 流程涉及的云区域，会一并预取系统管理账号
+        """
+        users = cls._mysql_account_users() + cls._proxy_account_users()
+        items = DBPrivManagerApi.get_password({"instances": [DEFAULT_INSTANCE], "users": users})["items"]
+        mysql_items = [item for item in items if item["component"] == MySQLPrivComponent.MYSQL.value]
+        proxy_items = [item for item in items if item["component"] == MySQLPrivComponent.PROXY.value]
+
+        cache = {"mysql_account": cls._format_mysql_account(mysql_items)}
+        if proxy_items:
+            cache["proxy_account"] = cls._format_proxy_account(proxy_items)
+        if not (env.DRS_USERNAME and env.DBHA_USERNAME):
+            for bk_cloud_id in set(bk_cloud_ids or []):
+                cache[f"super_account:{bk_cloud_id}"] = cls.query_super_account(bk_cloud_id)
+        FlowScopedCache.set_many(root_id, cache)
+
     @staticmethod
     def get_tbinlogdumper_account():
         """
@@ -96,27 +155,14 @@ class PayloadHandler(object):
         """
         获取mysql实例内置帐户密码
         """
-        user_map = {}
-        value_to_name = {member.value: member.name.lower() for member in UserName}
-        data = DBPrivManagerApi.get_password(
-            {
-                "instances": [DEFAULT_INSTANCE],
-                "users": [
-                    {"username": UserName.BACKUP.value, "component": MySQLPrivComponent.MYSQL.value},
-                    {"username": UserName.MONITOR.value, "component": MySQLPrivComponent.MYSQL.value},
-                    {"username": UserName.MONITOR_ACCESS_ALL.value, "component": MySQLPrivComponent.MYSQL.value},
-                    {"username": UserName.OS_MYSQL.value, "component": MySQLPrivComponent.MYSQL.value},
-                    {"username": UserName.REPL.value, "component": MySQLPrivComponent.MYSQL.value},
-                    {"username": UserName.YW.value, "component": MySQLPrivComponent.MYSQL.value},
-                    {"username": UserName.PARTITION_YW.value, "component": MySQLPrivComponent.MYSQL.value},
-                ],
-            }
-        )
-        for user in data["items"]:
-            user_map[value_to_name[user["username"]] + "_user"] = (
-                "MONITOR" if user["username"] == UserName.MONITOR_ACCESS_ALL.value else user["username"]
+
+        def _query_mysql_account():
+            data = DBPrivManagerApi.get_password(
+                {"instances": [DEFAULT_INSTANCE], "users": self._mysql_account_users()}
             )
-            user_map[value_to_name[user["username"]] + "_pwd"] = base64.b64decode(user["password"]).decode("utf-8")
+            return self._format_mysql_account(data["items"])
+
+        user_map = dict(FlowScopedCache.get_or_set(self.root_id, "mysql_account", _query_mysql_account))
 
         if self.ticket_data.get("ticket_type", None) in apply_list:
             # 部署类单据临时给个ADMIN初始化账号密码，部署完成会完成随机化
@@ -159,20 +205,30 @@ class PayloadHandler(object):
         if env.DRS_USERNAME and env.DBHA_USERNAME:
             return self.__get_super_account_bypass()
 
-        bk_cloud_name = AsymmetricCipherConfigType.get_cipher_cloud_name(self.bk_cloud_id)
-        drs = DBExtension.get_latest_extension(bk_cloud_id=self.bk_cloud_id, extension_type=ExtensionType.DRS)
+        drs_account_data, dbha_account_data = FlowScopedCache.get_or_set(
+            self.root_id, f"super_account:{self.bk_cloud_id}", lambda: self.query_super_account(self.bk_cloud_id)
+        )
+        return drs_account_data, dbha_account_data
+
+    @staticmethod
+    def query_super_account(bk_cloud_id: int):
+        """
+        查询云区域的drs和dbha系统管理账号
+        """
+        bk_cloud_name = AsymmetricCipherConfigType.get_cipher_cloud_name(bk_cloud_id)
+        drs = DBExtension.get_latest_extension(bk_cloud_id=bk_cloud_id, extension_type=ExtensionType.DRS)
         drs_account_data = {
             "access_hosts": DBExtension.get_extension_access_hosts(
-                bk_cloud_id=self.bk_cloud_id, extension_type=ExtensionType.DRS
+                bk_cloud_id=bk_cloud_id, extension_type=ExtensionType.DRS
             ),
             "pwd": AsymmetricHandler.decrypt(name=bk_cloud_name, content=drs.details["pwd"]),
             "user": AsymmetricHandler.decrypt(name=bk_cloud_name, content=drs.details["user"]),
         }
 
-        dbha = DBExtension.get_latest_extension(bk_cloud_id=self.bk_cloud_id, extension_type=ExtensionType.DBHA)
+        dbha = DBExtension.get_latest_extension(bk_cloud_id=bk_cloud_id, extension_type=ExtensionType.DBHA)
         dbha_account_data = {
             "access_hosts": DBExtension.get_extension_access_hosts(
-                bk_cloud_id=self.bk_cloud_id, extension_type=ExtensionType.DBHA
+                bk_cloud_id=bk_cloud_id, extension_type=ExtensionType.DBHA
             ),
             "pwd": AsymmetricHandler.decrypt(name=bk_cloud_name, content=dbha.details["pwd"]),
             "user": AsymmetricHandler.decrypt(name=bk_cloud_name, content=dbha.details["user"]),
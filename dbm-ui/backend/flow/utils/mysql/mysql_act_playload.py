@@ -48,6 +48,7 @@ from backend.flow.consts import (
 from backend.flow.engine.bamboo.scene.common.get_real_version import get_mysql_real_version, get_spider_real_version
 from backend.flow.engine.bamboo.scene.spider.common.exceptions import TendbGetBackupInfoFailedException
 from backend.flow.utils.base.bkrepo import get_bk_repo_url
+from backend.flow.utils.base.flow_cache import FlowScopedCache
 from backend.flow.utils.base.payload_handler import PayloadHandler
 from backend.flow.utils.mysql.mysql_bk_config import get_backup_ini_config, get_backup_options_config
 from backend.flow.utils.mysql.proxy_act_payload import ProxyActPayload
@@ -69,52 +70,59 @@ class MysqlActPayload(PayloadHandler, ProxyActPayload, TBinlogDumperActPayload):
         生成并获取mysql实例配置,集群级别配置
         spider/spider-ctl/spider-mysql实例统一用这里拿去配置
         """
-        data = DBConfigApi.get_or_generate_instance_config(
-            {
-                "bk_biz_id": str(self.ticket_data["bk_biz_id"]),
-                "level_name": LevelName.CLUSTER,
-                "level_value": immutable_domain,
-                "level_info": {"module": str(self.db_module_id)},
-                "conf_file": db_version,
-                "conf_type": ConfigTypeEnum.DBConf,
-                "namespace": self.cluster_type,
-                "format": FormatType.MAP_LEVEL,
-                "method": ReqType.GENERATE_AND_PUBLISH,
-            }
+        params = {
+            "bk_biz_id": str(self.ticket_data["bk_biz_id"]),
+            "level_name": LevelName.CLUSTER,
+            "level_value": immutable_domain,
+            "level_info": {"module": str(self.db_module_id)},
+            "conf_file": db_version,
+            "conf_type": ConfigTypeEnum.DBConf,
+            "namespace": self.cluster_type,
+            "format": FormatType.MAP_LEVEL,
+            "method": ReqType.GENERATE_AND_PUBLISH,
+        }
+        return FlowScopedCache.get_or_set(
+            self.root_id,
+            FlowScopedCache.params_field("mysql_config", params),
+            lambda: DBConfigApi.get_or_generate_instance_config(params)["content"],
         )
-        return data["content"]
 
     def __get_version_and_charset(self, db_module_id) -> Any:
         """获取版本号和字符集信息"""
-        data = DBConfigApi.query_conf_item(
-            {
-                "bk_biz_id": str(self.ticket_data["bk_biz_id"]),
-                "level_name": LevelName.MODULE,
-                "level_value": str(db_module_id),
-                "conf_file": "deploy_info",
-                "conf_type": "deploy",
-                "namespace": self.cluster_type,
-                "format": FormatType.MAP,
-            }
-        )["content"]
+        params = {
+            "bk_biz_id": str(self.ticket_data["bk_biz_id"]),
+            "level_name": LevelName.MODULE,
+            "level_value": str(db_module_id),
+            "conf_file": "deploy_info",
+            "conf_type": "deploy",
+            "namespace": self.cluster_type,
+            "format": FormatType.MAP,
+        }
+        data = FlowScopedCache.get_or_set(
+            self.root_id,
+            FlowScopedCache.params_field("deploy_info", params),
+            lambda: DBConfigApi.query_conf_item(params)["content"],
+        )
         return data["charset"], data["db_version"]
 
     def __get_mysql_rotatebinlog_config(self) -> dict:
         """
         远程获取rotate_binlog配置
         """
-        data = DBConfigApi.query_conf_item(
-            {
-                "bk_biz_id": str(self.ticket_data["bk_biz_id"]),
-                "level_name": LevelName.MODULE,
-                "level_value": str(self.db_module_id),
-                "conf_file": "binlog_rotate.yaml",
-                "conf_type": "backup",
-                "namespace": self.cluster_type,
-                "format": FormatType.MAP_LEVEL,
-            }
+        params = {
+            "bk_biz_id": str(self.ticket_data["bk_biz_id"]),
+            "level_name": LevelName.MODULE,
+            "level_value": str(self.db_module_id),
+            "conf_file": "binlog_rotate.yaml",
+            "conf_type": "backup",
+            "namespace": self.cluster_type,
+            "format": FormatType.MAP_LEVEL,
+        }
+        return FlowScopedCache.get_or_set(
+            self.root_id,
+            FlowScopedCache.params_field("rotatebinlog_config", params),
+            lambda: DBConfigApi.query_conf_item(params)["content"],
         )
-        return data["content"]
 
     def get_sys_init_payload(self, **kwargs) -> dict:
         """
@@ -8,8 +8,6 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
-import asyncio
-import concurrent.futures
 import hashlib
 import json
 import logging.config
@@ -19,6 +17,7 @@ from typing import Any, Dict, List, Tuple
 
 from django.utils.translation import ugettext as _
 
+from backend import env
 from backend.components import DBConfigApi, DRSApi
 from backend.components.dbconfig.constants import FormatType, LevelName, OpType, ReqType
 from backend.configuration.constants import DBType
@@ -42,6 +41,7 @@ from backend.flow.consts import (
     DEFAULT_DB_MODULE_ID,
     DEFAULT_REDIS_DBNUM,
     DEFAULT_TWEMPROXY_ADMIN_PORT_EXTRA,
+    REDIS_PRECHECK_PING_CHUNK_SIZE,
     ConfigFileEnum,
     ConfigTypeEnum,
     MediumEnum,
@@ -51,6 +51,7 @@ from backend.flow.consts import (
 from backend.flow.utils.base.payload_handler import PayloadHandler
 from backend.flow.utils.redis.redis_cluster_nodes import decode_cluster_nodes
 from backend.flow.utils.redis.redis_util import version_ge
+from backend.utils.batch_request import request_fan_out
 from backend.utils.string import base64_encode
 
 logger = logging.getLogger("flow")
@@ -933,30 +934,24 @@ def get_cluster_info_by_cluster_id(cluster_id):
     }
 
 
-def async_get_multi_cluster_info_by_cluster_ids(cluster_ids: List[int]) -> Dict[int, Any]:
+def cluster_fan_out(func, items: List[Any]) -> List[Any]:
     """
-    根据集群id批量获取集群信息
+    按集群有界并发执行任务，并发数和单个任务超时时间由环境变量配置
     """
+    return request_fan_out(
+        func,
+        items,
+        max_workers=env.REDIS_CLUSTER_FAN_OUT_CONCURRENCY,
+        timeout=env.REDIS_CLUSTER_FAN_OUT_TIMEOUT,
+    )
 
-    async def async_hanlder(cluster_ids: List[int]) -> Dict[int, Any]:
-        loop = asyncio.get_running_loop()
-
-        # 自定义线程池
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            # 将所有的任务提交到线程池
-            tasks = [
-                loop.run_in_executor(executor, get_cluster_info_by_cluster_id, cluster_id)
-                for cluster_id in cluster_ids
-            ]
-            # 等待所有任务完成并收集结果
-            results = await asyncio.gather(*tasks)
-
-        ret_dict = {}
-        for result in results:
-            ret_dict[result["cluster_id"]] = result
-        return ret_dict
 
-    return asyncio.run(async_hanlder(cluster_ids))
+def async_get_multi_cluster_info_by_cluster_ids(cluster_ids: List[int]) -> Dict[int, Any]:
+    """
+    根据集群id批量获取集群信息
+    """
+    results = cluster_fan_out(get_cluster_info_by_cluster_id, cluster_ids)
+    return {result["cluster_id"]: result for result in results}
 
 
 def get_cluster_info_by_ip(ip: str) -> Dict[str, Any]:
@@ -1097,25 +1092,99 @@ def common_cluster_precheck(cluster_id: int):
             )
 
 
-def async_multi_clusters_precheck(cluster_ids: List[int]):
+def _cluster_instances_precheck(cluster: Cluster):
     """
-    异步批量检查集群
+    检查集群的实例状态和主从关系，使用预取的实例数据，不再逐个查询数据库
     """
+    not_running_proxy = [p for p in cluster.proxyinstance_set.all() if p.status != InstanceStatus.RUNNING]
+    if not_running_proxy:
+        raise Exception(
+            _("redis集群 {} 存在 {} 个状态非 running 的 proxy").format(cluster.immute_domain, len(not_running_proxy))
+        )
 
-    async def async_handler(cluster_ids: List[int]):
-        """
-        异步批量检查集群
-        """
-        loop = asyncio.get_running_loop()
+    not_running_redis = [r for r in cluster.storageinstance_set.all() if r.status != InstanceStatus.RUNNING]
+    if not_running_redis:
+        raise Exception(
+            _("redis集群 {} 存在 {} 个状态非 running 的 redis").format(cluster.immute_domain, len(not_running_redis))
+        )
+
+    master_insts = [r for r in cluster.storageinstance_set.all() if r.instance_role == InstanceRole.REDIS_MASTER.value]
+    if not master_insts:
+        raise Exception(_("redis集群 {} 没有master??").format(cluster.immute_domain))
+    for master_obj in master_insts:
+        if not master_obj.as_ejector.all():
+            raise Exception(_("redis集群{} master {} 没有 slave").format(cluster.immute_domain, master_obj.ip_port))
+
+
+def _ping_chunk(chunk: Dict[str, Any]):
+    """
+    一次DRS请求ping同一云区域、同一密码的多个集群实例
+    请求失败时逐个集群重试，定位到具体失败的集群
+    """
+    addresses = [addr for _cluster_id, addrs in chunk["targets"] for addr in addrs]
+    try:
+        DRSApi.redis_rpc(
+            {
+                "addresses": addresses,
+                "db_num": 0,
+                "password": chunk["password"],
+                "command": "ping",
+                "bk_cloud_id": chunk["bk_cloud_id"],
+            }
+        )
+    except Exception:  # pylint: disable=broad-except
+        logger.warning(f"ping {len(addresses)} instances failed, retry per cluster")
+        for cluster_id in {cluster_id for cluster_id, _addrs in chunk["targets"]}:
+            common_cluster_precheck(cluster_id)
 
-        # 自定义线程池
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            # 将所有的任务提交到线程池
-            tasks = [loop.run_in_executor(executor, common_cluster_precheck, cluster_id) for cluster_id in cluster_ids]
-            # 等待所有任务完成并收集结果
-            await asyncio.gather(*tasks)
 
-    return asyncio.run(async_handler(cluster_ids))
+def async_multi_clusters_precheck(cluster_ids: List[int]):
+    """
+    批量检查集群
+    1. 一次查询预取全部集群的实例，在内存中检查实例状态和主从关系
+    2. 按云区域和密码对全部集群的proxy、redis实例分组，分批合并为DRS ping请求，并发执行
+    """
+    clusters = Cluster.objects.prefetch_related(
+        "proxyinstance_set__machine",
+        "storageinstance_set__machine",
+        "storageinstance_set__as_ejector",
+    ).filter(id__in=cluster_ids)
+    cluster_map = {cluster.id: cluster for cluster in clusters}
+    for cluster_id in cluster_ids:
+        if cluster_id not in cluster_map:
+            raise Exception(_("redis集群 {} 不存在").format(cluster_id))
+        _cluster_instances_precheck(cluster_map[cluster_id])
+
+    # 密码服务按集群查询，有界并发获取
+    clusters = list(cluster_map.values())
+    passwords = dict(zip(cluster_map.keys(), cluster_fan_out(PayloadHandler.redis_get_cluster_password, clusters)))
+
+    # {(bk_cloud_id, password): [(cluster_id, [addr...])]}，同一集群的实例不会被拆分到不同批次
+    ping_groups: Dict[Tuple[int, str], List[Tuple[int, List[str]]]] = defaultdict(list)
+    for cluster_id, cluster in cluster_map.items():
+        proxy_addrs = [p.ip_port for p in cluster.proxyinstance_set.all()]
+        redis_addrs = [r.ip_port for r in cluster.storageinstance_set.all()]
+        if proxy_addrs:
+            ping_groups[(cluster.bk_cloud_id, passwords[cluster_id]["redis_proxy_password"])].append(
+                (cluster_id, proxy_addrs)
+            )
+        ping_groups[(cluster.bk_cloud_id, passwords[cluster_id]["redis_password"])].append((cluster_id, redis_addrs))
+
+    chunks = []
+    for (bk_cloud_id, password), targets in ping_groups.items():
+        chunk = {"bk_cloud_id": bk_cloud_id, "password": password, "targets": []}
+        chunk_size = 0
+        for cluster_id, addrs in targets:
+            if chunk["targets"] and chunk_size + len(addrs) > REDIS_PRECHECK_PING_CHUNK_SIZE:
+                chunks.append(chunk)
+                chunk = {"bk_cloud_id": bk_cloud_id, "password": password, "targets": []}
+                chunk_size = 0
+            chunk["targets"].append((cluster_id, addrs))
+            chunk_size += len(addrs)
+        chunks.append(chunk)
+
+    logger.info(f"precheck {len(cluster_map)} clusters with {len(chunks)} ping requests")
+    cluster_fan_out(_ping_chunk, chunks)
 
 
 def lightning_cluster_nodes(cluster_id: int) -> list:
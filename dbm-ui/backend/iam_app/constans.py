@@ -15,6 +15,12 @@ from blue_krill.data_types.enum import EnumField, StructuredEnum
 
 MAX_ACTION_NAME_LEN = 32
 
+# 用户动作策略缓存key
+IAM_POLICY_CACHE_KEY = "iam_policy_{username}_{action_id}"
+# 策略缓存命中率和权限中心请求耗时的统计key，各进程按间隔(秒)将本地计数累加到redis
+IAM_POLICY_STATS_KEY = "iam_policy_stats"
+IAM_POLICY_STATS_FLUSH_INTERVAL = 10
+
 
 class CommonActionLabel(str, StructuredEnum):
     BIZ_READ_ONLY = EnumField("biz_read_only", _("业务只读"))
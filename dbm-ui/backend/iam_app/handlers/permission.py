@@ -11,11 +11,14 @@ specific language governing permissions and limitations under the License.
 
 import itertools
 import logging
+import threading
+import time
 from functools import wraps
-from typing import Any, Callable, Dict, List, Tuple, Union
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 from blueapps.account.models import User
 from django.conf import settings
+from django.core.cache import cache
 from django.utils.translation import ugettext as _
 from iam import DummyIAM, MultiActionRequest, ObjectSet, Request, Resource, Subject, make_expression
 from iam.apply.models import (
@@ -33,17 +36,77 @@ from iam.utils import gen_perms_apply_data
 
 from backend import env
 from backend.env import BK_IAM_SYSTEM_ID
+from backend.iam_app.constans import IAM_POLICY_CACHE_KEY, IAM_POLICY_STATS_FLUSH_INTERVAL, IAM_POLICY_STATS_KEY
 from backend.iam_app.dataclass.actions import ActionEnum, ActionMeta, _all_actions
 from backend.iam_app.dataclass.resources import ResourceEnum, ResourceMeta, _all_resources
 from backend.iam_app.exceptions import ActionNotExistError, GetSystemInfoError, PermissionDeniedError
 from backend.iam_app.handlers.client import IAM
 from backend.utils.local import local
+from backend.utils.redis import RedisConn
 
 logger = logging.getLogger("root")
 # 关闭iam的debug日志，加快请求速率 & 防止敏感信息泄露
 iam_logger.setLevel(logging.ERROR)
 
 
+class PolicyCacheStats:
+    """
+    策略缓存命中率和请求权限中心耗时的统计
+    计数先在进程内累加，每隔IAM_POLICY_STATS_FLUSH_INTERVAL秒合并到redis，避免每次鉴权都访问redis
+    """
+
+    _lock = threading.Lock()
+    _stats = {"hit": 0, "miss": 0, "iam_requests": 0, "iam_cost": 0.0}
+    _flush_at = 0.0
+
+    @classmethod
+    def incr(cls, key: str, value: Union[int, float] = 1):
+        with cls._lock:
+            cls._stats[key] += value
+            if time.time() - cls._flush_at < IAM_POLICY_STATS_FLUSH_INTERVAL:
+                return
+            stats, cls._flush_at = cls._stats, time.time()
+            cls._stats = {field: 0 for field in stats}
+        cls.flush(stats)
+
+    @classmethod
+    def flush(cls, stats: Dict[str, Union[int, float]]):
+        """将进程内的计数合并到redis，失败时丢弃本次计数，不影响鉴权"""
+        try:
+            pipeline = RedisConn.pipeline(transaction=False)
+            for field, value in stats.items():
+                if value:
+                    pipeline.hincrbyfloat(IAM_POLICY_STATS_KEY, field, value)
+            pipeline.execute()
+        except Exception as e:  # pylint: disable=broad-except
+            logger.warning(f"flush iam policy stats failed: {e}")
+
+    @classmethod
+    def timed_call(cls, func: Callable, *args, **kwargs):
+        """调用权限中心接口，并记录耗时"""
+        start = time.time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            cls.incr("iam_requests")
+            cls.incr("iam_cost", time.time() - start)
+
+    @classmethod
+    def stats(cls) -> Dict[str, Union[int, float]]:
+        """汇总所有进程的统计，包括当前进程未合并的计数"""
+        stats = {field: float(value) for field, value in RedisConn.hgetall(IAM_POLICY_STATS_KEY).items()}
+        with cls._lock:
+            for field, value in cls._stats.items():
+                stats[field] = stats.get(field, 0) + value
+        for field in ["hit", "miss", "iam_requests"]:
+            stats[field] = int(stats[field])
+        total = stats["hit"] + stats["miss"]
+        stats["hit_ratio"] = round(stats["hit"] / total, 4) if total else 0
+        stats["iam_avg_cost"] = round(stats["iam_cost"] / stats["iam_requests"], 4) if stats["iam_requests"] else 0
+        stats["iam_cost"] = round(stats["iam_cost"], 3)
+        return stats
+
+
 class Permission(object):
     """
     权限中心鉴权和无权限申请的通用封装
@@ -195,7 +258,7 @@ class Permission(object):
 
         request = self.make_request(action, resources)
         try:
-            permission = self._iam.is_allowed(request)
+            permission = PolicyCacheStats.timed_call(self._iam.is_allowed, request)
         except AuthAPIError as e:
             logger.exception(f"IAM AuthAPIError: {e}")
             permission = False
@@ -223,7 +286,7 @@ class Permission(object):
 
         multi_request = self.make_multi_request(actions, resources)
         try:
-            permission_list = self._iam.resource_multi_actions_allowed(multi_request)
+            permission_list = PolicyCacheStats.timed_call(self._iam.resource_multi_actions_allowed, multi_request)
         except AuthAPIError as e:
             logger.exception(f"IAM AuthAPIError: {e}")
             permission_list = {action.id: False for action in actions}
@@ -260,12 +323,45 @@ class Permission(object):
                 permission_list[key] = {action.id: True for action in actions}
             return permission_list
 
+        if env.BK_IAM_SKIP:
+            # 跳过权限中心时没有策略可供本地计算，直接由DummyIAM处理
+            batch_permission = self.remote_batch_is_allowed(actions, resources_list)
+        else:
+            try:
+                # 优先使用缓存的策略在本地计算，获取策略或解析表达式失败再降级为请求权限中心
+                batch_permission = self.local_batch_is_allowed(actions, resources_list)
+            except (AuthAPIError, KeyError, ValueError) as e:
+                logger.warning(f"IAM local eval failed, fallback to iam api: {e}")
+                batch_permission = self.remote_batch_is_allowed(actions, resources_list)
+
+        permission_list = itertools.chain(*[list(permission.values()) for permission in batch_permission.values()])
+        is_all_permission_allowed = True
+        for permission in permission_list:
+            is_all_permission_allowed &= permission
+
+        if not is_all_permission_allowed and is_raise_exception:
+            data, url = self.get_apply_data(actions, resources_list)
+            actions_name = ", ".join([action.name for action in actions])
+            raise PermissionDeniedError(actions_name, data, url)
+
+        return batch_permission
+
+    def remote_batch_is_allowed(
+        self, actions: List[ActionMeta], resources_list: List[List[Resource]]
+    ) -> Dict[str, Dict[str, bool]]:
+        """
+        请求权限中心对一批动作的一批资源进行批量鉴权
+        :param actions: 待鉴权的动作列表
+        :param resources_list: 待鉴权的资源列表, 格式为[[resource1], [resources2], ...]
+        """
         multi_request = self.make_multi_request(actions)
         batch_permission = {}
         try:
             # TODO: 暂时屏蔽跨资源类型鉴权，SDK问题待排查
             if len(resources_list[0]) == 1 and self.check_resource_is_local(resources_list[0]):
-                batch_permission = self._iam.batch_resource_multi_actions_allowed(multi_request, resources_list)
+                batch_permission = PolicyCacheStats.timed_call(
+                    self._iam.batch_resource_multi_actions_allowed, multi_request, resources_list
+                )
             # 如果资源不属于本系统，则只能单次调用allowed
             else:
                 batch_permission = {}
@@ -277,18 +373,66 @@ class Permission(object):
             for index in range(len(resources_list)):
                 batch_permission[str(index + 1)] = {action.id: False for action in actions}
 
-        permission_list = itertools.chain(*[list(permission.values()) for permission in batch_permission.values()])
-        is_all_permission_allowed = True
-        for permission in permission_list:
-            is_all_permission_allowed &= permission
+        return batch_permission
 
-        if not is_all_permission_allowed and is_raise_exception:
-            data, url = self.get_apply_data(actions, resources_list)
-            actions_name = ", ".join([action.name for action in actions])
-            raise PermissionDeniedError(actions_name, data, url)
+    def local_batch_is_allowed(
+        self, actions: List[ActionMeta], resources_list: List[List[Resource]]
+    ) -> Dict[str, Dict[str, bool]]:
+        """
+        使用缓存的策略表达式，在本地对一批动作的一批资源进行批量鉴权
+        资源的属性(包括拓扑路径_bk_iam_path_)在构造时已经补充，因此无论是否是本系统资源都可以本地计算
+        跳过权限中心(BK_IAM_SKIP)时没有策略数据，不能调用本方法
+        :param actions: 待鉴权的动作列表
+        :param resources_list: 待鉴权的资源列表, 格式为[[resource1], [resources2], ...]
+        """
+        actions = [ActionEnum.get_action_by_id(action) for action in actions]
+        action_expressions = {}
+        for action in actions:
+            policies = self.get_action_policies(action)
+            action_expressions[action.id] = make_expression(policies) if policies else None
+
+        batch_permission = {}
+        for index, resources in enumerate(resources_list):
+            obj_set = ObjectSet()
+            for resource in resources:
+                obj_set.add_object(resource.type, {**(resource.attribute or {}), "id": resource.id})
+
+            key = index if len(resources) > 1 else resources[0].id
+            batch_permission[key] = {
+                action_id: bool(expression and self._iam._eval_expr(expression, obj_set))
+                for action_id, expression in action_expressions.items()
+            }
 
         return batch_permission
 
+    def get_action_policies(self, action: Union[ActionMeta, str]) -> Optional[Dict]:
+        """
+        获取用户某个动作的策略(不带资源)，按用户+动作短暂缓存
+        :param action: 鉴权动作
+        """
+        action = ActionEnum.get_action_by_id(action)
+        cache_key = IAM_POLICY_CACHE_KEY.format(username=self.username, action_id=action.id)
+        cache_data = cache.get(cache_key) if env.IAM_POLICY_CACHE_TIMEOUT else None
+        if cache_data is not None:
+            PolicyCacheStats.incr("hit")
+            return cache_data["policies"]
+
+        PolicyCacheStats.incr("miss")
+        policies = PolicyCacheStats.timed_call(self._iam._do_policy_query, self.make_request(action=action))
+        if env.IAM_POLICY_CACHE_TIMEOUT:
+            cache.set(cache_key, {"policies": policies}, env.IAM_POLICY_CACHE_TIMEOUT)
+        return policies
+
+    @classmethod
+    def clear_policy_cache(cls, username: str):
+        """
+        清理用户所有动作的策略缓存，在授权后调用，保证新权限立即生效
+        :param username: 用户名
+        """
+        cache.delete_many(
+            [IAM_POLICY_CACHE_KEY.format(username=username, action_id=action_id) for action_id in _all_actions]
+        )
+
     def policy_query(self, action: Union[ActionMeta, str], obj_list: List[Union[int, str]]) -> List:
         """
         批量判断业务资源关联动作是否有权限
@@ -302,8 +446,7 @@ class Permission(object):
 
         # 获得策略数据
         try:
-            request = self.make_request(action=action)
-            policies = self._iam._do_policy_query(request)
+            policies = self.get_action_policies(action)
         except AuthAPIError as e:
             logger.exception(f"IAM AuthAPIError: {e}")
             return []
@@ -446,6 +589,8 @@ class Permission(object):
         try:
             grant_result = grant_func(application, self.bk_token, self.username)
             logger.info(f"[grant_creator_action] Success! resource: {resource.to_dict()}, result: {grant_result}")
+            # 授权后清理创建者的策略缓存
+            self.clear_policy_cache(application["creator"])
         except Exception as e:
             logger.exception(f"[grant_creator_action] Failed! resource: {resource.to_dict()}, result: {e}")
 
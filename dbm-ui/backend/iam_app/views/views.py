@@ -16,7 +16,7 @@ from rest_framework.response import Response
 from backend.bk_web import viewsets
 from backend.bk_web.swagger import common_swagger_auto_schema
 from backend.iam_app.dataclass import assign_auth_to_dba, flush_groups_auth
-from backend.iam_app.handlers.permission import Permission
+from backend.iam_app.handlers.permission import Permission, PolicyCacheStats
 from backend.iam_app.serializers import (
     AssignAuthToDBASerializer,
     CheckAllowedResSerializer,
@@ -40,6 +40,11 @@ class IAMViewSet(viewsets.SystemViewSet):
         result = Permission(username=request.user.username).get_system_info()
         return Response(result)
 
+    @common_swagger_auto_schema(operation_summary=_("获取权限策略缓存命中率和权限中心请求耗时"), tags=[SWAGGER_TAG])
+    @action(methods=["GET"], detail=False)
+    def policy_cache_stats(self, request, *args, **kwargs):
+        return Response(PolicyCacheStats.stats())
+
     @common_swagger_auto_schema(
         operation_summary=_("检查当前用户对该动作是否有权限"),
         request_body=IamActionResourceRequestSerializer(),
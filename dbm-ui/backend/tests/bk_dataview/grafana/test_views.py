@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from types import SimpleNamespace
+
+from django.core.cache.backends.locmem import LocMemCache
+from mock import MagicMock, PropertyMock, patch
+
+from backend.bk_dataview.grafana import provisioning, views
+from backend.bk_dataview.grafana.utils import requests_curl_log
+from backend.bk_dataview.grafana.views import SwitchOrgView
+
+
+class TestGrafanaProvisioning:
+    @staticmethod
+    def test_provision_once_per_version():
+        local_cache = LocMemCache("grafana-test", {})
+        request = SimpleNamespace(org_name="dbm")
+        with patch.object(views, "cache", local_cache), patch.object(provisioning, "cache", local_cache), patch.object(
+            SwitchOrgView, "_provision", return_value=True
+        ) as mock_provision:
+            view = SwitchOrgView()
+            view.perform_provisioning(request)
+            view.perform_provisioning(request)
+            assert mock_provision.call_count == 1
+
+            # 配置变更后重新注入一次
+            provisioning.invalidate_provisioning()
+            view.perform_provisioning(request)
+            view.perform_provisioning(request)
+            assert mock_provision.call_count == 2
+
+    @staticmethod
+    def test_provision_retry_after_failure():
+        local_cache = LocMemCache("grafana-test-retry", {})
+        request = SimpleNamespace(org_name="dbm")
+        with patch.object(views, "cache", local_cache), patch.object(provisioning, "cache", local_cache), patch.object(
+            SwitchOrgView, "_provision", return_value=False
+        ) as mock_provision:
+            view = SwitchOrgView()
+            # 注入未全部成功时只写入短期标记，标记过期后重新注入
+            with patch.object(views, "GRAFANA_PROVISION_RETRY_TTL", 0):
+                view.perform_provisioning(request)
+                view.perform_provisioning(request)
+            assert mock_provision.call_count == 2
+
+            # 短期标记有效期内不重复注入
+            view.perform_provisioning(request)
+            view.perform_provisioning(request)
+            assert mock_provision.call_count == 3
+
+    @staticmethod
+    def test_skip_when_other_worker_provisioning():
+        local_cache = LocMemCache("grafana-test-lock", {})
+        request = SimpleNamespace(org_name="dbm")
+        local_cache.add(views.GRAFANA_PROVISION_LOCK_KEY.format(org_name="dbm"), 1)
+
+        # 其他worker持有注入锁时不等待，直接返回
+        with patch.object(views, "cache", local_cache), patch.object(provisioning, "cache", local_cache), patch.object(
+            SwitchOrgView, "_provision"
+        ) as mock_provision:
+            SwitchOrgView().perform_provisioning(request)
+            mock_provision.assert_not_called()
+
+    @staticmethod
+    def test_stream_non_html_response():
+        proxy_response = MagicMock(status_code=200, headers={"Content-Type": "application/json"})
+        proxy_response.iter_content.return_value = iter([b'{"a":', b" 1}"])
+
+        response = SwitchOrgView().get_django_response(proxy_response)
+        assert response.streaming
+        assert b"".join(response.streaming_content) == b'{"a": 1}'
+        proxy_response.close.assert_called_once()
+
+    @staticmethod
+    def test_stream_consume_lazily():
+        consumed = []
+
+        def iter_content(chunk_size):
+            for chunk in [b"chunk1", b"chunk2"]:
+                consumed.append(chunk)
+                yield chunk
+
+        proxy_response = MagicMock(status_code=200, headers={"Content-Type": "application/octet-stream"})
+        proxy_response.iter_content.side_effect = iter_content
+        content = PropertyMock(side_effect=AssertionError("streamed body must not be buffered"))
+        type(proxy_response).content = content
+
+        response = SwitchOrgView().get_django_response(proxy_response)
+        # 构造响应时不读取上游响应体，迭代时逐块读取
+        assert consumed == []
+        streaming_content = iter(response.streaming_content)
+        assert next(streaming_content) == b"chunk1"
+        assert consumed == [b"chunk1"]
+        assert list(streaming_content) == [b"chunk2"]
+        content.assert_not_called()
+
+    @staticmethod
+    def test_curl_log_not_read_streamed_content():
+        resp = MagicMock(status_code=200, headers={"Content-Type": "application/json", "Content-Length": "10"})
+        resp.request.body = None
+        resp.request.headers = {}
+        resp.elapsed.total_seconds.return_value = 0.1
+        content = PropertyMock(side_effect=AssertionError("streamed body must not be buffered"))
+        type(resp).content = content
+
+        requests_curl_log(resp, stream=True)
+        content.assert_not_called()
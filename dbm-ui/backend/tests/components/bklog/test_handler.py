@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import json
+import re
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+from mock import patch
+
+from backend.components.bklog import handler
+from backend.components.bklog.handler import BKLogScroll
+from backend.utils.time import str2datetime
+
+
+class BKLogMockApi:
+    """按给定时间戳返回日志，dtEventTimeStamp精确到毫秒"""
+
+    def __init__(self, timestamps):
+        self.timestamps = sorted(timestamps)
+        self.calls = []
+
+    @classmethod
+    def every_second(cls, start_time: datetime, count: int):
+        return cls([start_time + timedelta(seconds=i) for i in range(count)])
+
+    def esquery_search(self, params, use_admin=False):
+        self.calls.append(params)
+        # 查询时间只精确到秒，dtEventTimeStamp区间为左闭右开
+        start_time, end_time = str2datetime(params["start_time"]), str2datetime(params["end_time"])
+        start_ms, end_ms = map(int, re.search(r"dtEventTimeStamp:\[(\d+) TO (\d+)}", params["query_string"]).groups())
+        matched = [
+            t
+            for t in self.timestamps
+            if start_time <= t.replace(microsecond=0) <= end_time and start_ms <= self.millis(t) < end_ms
+        ]
+        page = matched[params["start"] : params["start"] + params["size"]]
+        hits = [
+            {
+                "_source": {
+                    "dtEventTimeStamp": str(self.millis(t)),
+                    "log": json.dumps({"ClusterId": 1, "Ts": t.isoformat(timespec="milliseconds")}),
+                }
+            }
+            for t in page
+        ]
+        return {"hits": {"hits": hits, "total": len(matched)}}
+
+    @staticmethod
+    def millis(t: datetime) -> int:
+        return int(t.timestamp()) * 1000 + t.microsecond // 1000
+
+
+class TestBKLogScroll:
+    def test_scroll_pages_and_splits_window(self):
+        start_time = datetime(2024, 5, 20).astimezone(timezone.utc)
+        mock_api = BKLogMockApi.every_second(start_time, 25)
+        with patch.object(handler, "BKLogApi", mock_api), patch.object(handler, "BKLOG_MAX_RESULT_WINDOW", 10):
+            scroll = BKLogScroll("mysql_dbbackup_result", start_time, start_time + timedelta(seconds=30), page_size=4)
+            logs = list(scroll.logs())
+
+        # 窗口切分后不重不漏，且全部在最大翻页范围内
+        assert len(logs) == 25 and len({log["ts"] for log in logs}) == 25
+        assert logs[0]["cluster_id"] == 1
+        assert all(call["start"] + call["size"] <= 10 for call in mock_api.calls)
+        assert not scroll.truncated
+
+    def test_scroll_splits_sub_second_logs(self):
+        start_time = datetime(2024, 5, 20).astimezone(timezone.utc)
+        # 每秒内分布多条不足1秒的日志，包括整秒、切分点附近和秒末尾的日志
+        timestamps = [
+            start_time + timedelta(seconds=second, milliseconds=millis)
+            for second in range(6)
+            for millis in (0, 1, 250, 499, 500, 501, 750, 999)
+        ]
+        mock_api = BKLogMockApi(timestamps)
+        with patch.object(handler, "BKLogApi", mock_api), patch.object(handler, "BKLOG_MAX_RESULT_WINDOW", 5):
+            scroll = BKLogScroll("mysql_dbbackup_result", start_time, start_time + timedelta(seconds=5), page_size=2)
+            logs = list(scroll.logs())
+
+        # 同一秒内的日志被切分到不同窗口，仍然不重不漏且按时间有序
+        assert [log["ts"] for log in logs] == [t.isoformat(timespec="milliseconds") for t in timestamps]
+        assert not scroll.truncated
+
+    def test_scroll_truncated(self):
+        start_time = datetime(2024, 5, 20).astimezone(timezone.utc)
+        mock_api = BKLogMockApi([start_time] * 12)
+        with patch.object(handler, "BKLogApi", mock_api), patch.object(handler, "BKLOG_MAX_RESULT_WINDOW", 10):
+            scroll = BKLogScroll("mysql_dbbackup_result", start_time, start_time, page_size=4)
+            logs = list(scroll.logs())
+
+        # 同一毫秒内的日志超出最大翻页范围，无法再切分，记录截断
+        assert len(logs) == 10
+        assert scroll.truncated_windows == [(start_time, start_time + timedelta(milliseconds=1), 12)]
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+from django.conf import settings
+from mock import patch
+from rest_framework.permissions import AllowAny
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient
+
+from backend.components import base
+from backend.components.base import DataAPITransport
+from backend.configuration.views.system import SystemSettingsViewSet
+
+pytestmark = pytest.mark.django_db
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b'{"result": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def clear_adapters():
+    with patch.object(DataAPITransport, "_adapters", {}):
+        yield
+
+
+def pooled_get(url: str) -> requests.Response:
+    """与DataAPI一致：每次请求新建session，只挂载共享的adapter"""
+    session = requests.Session()
+    DataAPITransport.mount(session, url)
+    return session.get(url, timeout=5)
+
+
+class TestDataAPITransport:
+    def test_adapter_shared_by_host(self):
+        adapter = DataAPITransport.get_adapter("http://esb.example.com/api/c/compapi/v2/cc/")
+        assert DataAPITransport.get_adapter("http://esb.example.com/api/other/") is adapter
+        assert DataAPITransport.get_adapter("http://apigw.example.com/api/") is not adapter
+
+        # fork 出的子进程重建连接池
+        with patch.object(base.os, "getpid", return_value=DataAPITransport._pid + 1):
+            assert DataAPITransport.get_adapter("http://esb.example.com/api/") is not adapter
+
+    def test_sessions_reuse_connection(self, server_url):
+        for __ in range(3):
+            assert pooled_get(f"{server_url}/api/").json() == {"result": True}
+
+        host = server_url.split("://")[1]
+        assert DataAPITransport.stats() == {host: {"requests": 3, "hit": 2, "miss": 1}}
+
+    def test_keep_alive_disabled(self, server_url):
+        host = server_url.split("://")[1]
+        with patch.object(base.env, "DATA_API_POOL_KEEP_ALIVE", False):
+            for __ in range(2):
+                pooled_get(f"{server_url}/api/")
+            # 关闭长连接后每个请求都重新建连
+            assert DataAPITransport.stats() == {host: {"requests": 2, "hit": 0, "miss": 2}}
+
+    @patch.object(settings, "MIDDLEWARE", [])
+    @patch.object(SystemSettingsViewSet, "permission_classes", [AllowAny])
+    @patch.object(SystemSettingsViewSet, "get_permissions", lambda x: [])
+    def test_pool_stats_view(self, server_url):
+        pooled_get(f"{server_url}/api/")
+
+        client = APIClient()
+        client.login(username="admin")
+        response = client.get(reverse("system_settings-data-api-pool-stats"))
+        assert response.status_code == 200
+        host = server_url.split("://")[1]
+        assert response.json()["data"][host] == {"requests": 1, "hit": 0, "miss": 1}
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import pytest
+from mock import patch
+
+from backend.configuration.handlers.password import DBPasswordHandler
+from backend.db_meta.enums import ClusterType, InstanceInnerRole
+from backend.db_meta.models import BKCity, Machine
+from backend.flow.utils.base.flow_cache import FlowScopedCache
+from backend.tests.flow.utils.base.test_flow_cache import FakeRedis
+from backend.tests.mock_data import constant
+
+pytestmark = pytest.mark.django_db
+ROOT_ID = "password_test_root"
+
+
+@pytest.fixture
+def fake_redis():
+    redis = FakeRedis()
+    with patch("backend.flow.utils.base.flow_cache.RedisConn", redis):
+        yield redis
+
+
+class TestDBPasswordHandler:
+    @patch("backend.configuration.handlers.password.DBPrivManagerApi.modify_admin_password")
+    def test_modify_admin_password_invalidate_flow_cache(self, mock_modify, fake_redis, create_city):
+        Machine.objects.create(
+            ip="127.0.0.1", bk_cloud_id=0, bk_host_id=1, bk_biz_id=constant.BK_BIZ_ID, bk_city=BKCity.objects.first()
+        )
+        mock_modify.return_value = {"data": {"success": 1}}
+        FlowScopedCache.set_many(ROOT_ID, {"mysql_account": {"os_mysql_pwd": "old"}})
+
+        instance = {
+            "ip": "127.0.0.1",
+            "port": 20000,
+            "bk_cloud_id": 0,
+            "cluster_type": ClusterType.TenDBHA.value,
+            "role": InstanceInnerRole.MASTER.value,
+        }
+        data = DBPasswordHandler.modify_admin_password("admin", "new_pwd", lock_hour=1, instance_list=[instance])
+
+        assert data == {"success": 1}
+        # 密码修改后流程缓存失效，节点重新查询密码服务
+        assert FlowScopedCache.get(ROOT_ID, "mysql_account") is None
+
+    @patch("backend.configuration.handlers.password.DBPrivManagerApi.modify_admin_password")
+    def test_modify_failed_keep_flow_cache(self, mock_modify, fake_redis, create_city):
+        Machine.objects.create(
+            ip="127.0.0.1", bk_cloud_id=0, bk_host_id=1, bk_biz_id=constant.BK_BIZ_ID, bk_city=BKCity.objects.first()
+        )
+        mock_modify.side_effect = Exception("modify failed")
+        FlowScopedCache.set_many(ROOT_ID, {"mysql_account": {"os_mysql_pwd": "old"}})
+
+        instance = {
+            "ip": "127.0.0.1",
+            "port": 20000,
+            "bk_cloud_id": 0,
+            "cluster_type": ClusterType.TenDBHA.value,
+            "role": InstanceInnerRole.MASTER.value,
+        }
+        with pytest.raises(Exception):
+            DBPasswordHandler.modify_admin_password("admin", "new_pwd", lock_hour=1, instance_list=[instance])
+        assert FlowScopedCache.get(ROOT_ID, "mysql_account") == {"os_mysql_pwd": "old"}
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from mock import patch
+
+from backend.configuration.constants import DBType
+from backend.configuration.tasks.password import randomize_admin_password
+from backend.exceptions import ApiResultError
+from backend.flow.utils.base.flow_cache import FlowScopedCache
+from backend.tests.flow.utils.base.test_flow_cache import FakeRedis
+
+ROOT_ID = "password_task_test_root"
+
+
+class TestRandomizeAdminPassword:
+    def setup_method(self):
+        self.redis = FakeRedis()
+        self.patcher = patch("backend.flow.utils.base.flow_cache.RedisConn", self.redis)
+        self.patcher.start()
+        FlowScopedCache.set_many(ROOT_ID, {"mysql_account": {"os_mysql_pwd": "old"}})
+
+    def teardown_method(self):
+        self.patcher.stop()
+
+    @patch("backend.configuration.tasks.password.DBPrivManagerApi.modify_admin_password")
+    def test_randomize_invalidate_flow_cache(self, mock_modify):
+        randomize_admin_password(DBType.MySQL.value, if_async=True, range_type="randomize_expired", clusters=[])
+
+        mock_modify.assert_called_once()
+        assert FlowScopedCache.get(ROOT_ID, "mysql_account") is None
+
+    @patch("backend.configuration.tasks.password.DBPrivManagerApi.modify_admin_password")
+    def test_randomize_failed_keep_flow_cache(self, mock_modify):
+        mock_modify.side_effect = ApiResultError("modify failed")
+        randomize_admin_password(DBType.MySQL.value, if_async=True, range_type="randomize_expired", clusters=[])
+
+        assert FlowScopedCache.get(ROOT_ID, "mysql_account") == {"os_mysql_pwd": "old"}
@@ -8,6 +8,8 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+import hashlib
+import json
 from unittest.mock import patch
 
 import pytest
@@ -15,7 +17,10 @@ from django.conf import settings
 from rest_framework.test import APIClient
 
 from backend.components import BKMonitorV3Api
-from backend.db_monitor.models.alarm import NoticeGroup
+from backend.configuration.constants import PLAT_BIZ_ID
+from backend.db_monitor.constants import TargetPriority
+from backend.db_monitor.models import alarm
+from backend.db_monitor.models.alarm import MonitorPolicy, NoticeGroup, load_alarm_tpl_manifest
 
 pytestmark = pytest.mark.django_db
 client = APIClient()
@@ -65,3 +70,112 @@ class TestNoticeGroup:
             NoticeGroup.objects.filter(bk_biz_id=0).update(name="TestNoticeGroup2")
             assert NoticeGroup.objects.first().name == "TestNoticeGroup2"
             assert NoticeGroup.objects.first().monitor_group_id != 0
+
+
+def make_template(name, version=1, labels=None, **kwargs):
+    return {
+        "name": name,
+        "bk_biz_id": PLAT_BIZ_ID,
+        "db_type": "mysql",
+        "version": version,
+        "details": {
+            "labels": labels or ["DBM", "DBM"],
+            "notice": {"options": {}, "signal": ["abnormal"], "user_groups": []},
+        },
+        **kwargs,
+    }
+
+
+@pytest.fixture
+def clear_manifest_cache():
+    load_alarm_tpl_manifest.cache_clear()
+    yield
+    load_alarm_tpl_manifest.cache_clear()
+
+
+class TestPlatMonitorPolicy:
+    def test_load_alarm_tpl_manifest(self, tmp_path, clear_manifest_cache):
+        (tmp_path / "mysql").mkdir()
+        (tmp_path / "v1").mkdir()
+        content = json.dumps(make_template("valid", export_at="2024-01-01")).encode()
+        (tmp_path / "mysql" / "valid.json").write_bytes(content)
+        (tmp_path / "mysql" / "deleted.json").write_text(json.dumps({"name": "deleted", "deleted": True}))
+        (tmp_path / "mysql" / "no_details.json").write_text(json.dumps({"name": "no_details"}))
+        (tmp_path / "mysql" / "broken.json").write_text("{")
+        (tmp_path / "v1" / "legacy.json").write_bytes(content)
+
+        with patch.object(alarm, "TPLS_ALARM_DIR", str(tmp_path)):
+            manifest, invalid_tpls = load_alarm_tpl_manifest()
+            # 进程内只解析一次
+            assert load_alarm_tpl_manifest() is load_alarm_tpl_manifest()
+
+        assert sorted(invalid_tpls) == ["broken.json", "no_details.json"]
+        manifest = {tpl["name"]: tpl for tpl in manifest}
+        assert sorted(manifest) == ["deleted", "valid"]
+        assert manifest["deleted"]["deleted"] is True
+        valid = manifest["valid"]
+        assert (valid["bk_biz_id"], valid["db_type"], valid["version"], valid["deleted"]) == (
+            PLAT_BIZ_ID,
+            "mysql",
+            1,
+            False,
+        )
+        assert valid["content_hash"] == hashlib.md5(content).hexdigest()
+        assert "export_at" not in valid["template"]
+
+    def test_patch_plat_template(self):
+        template = make_template("autofix", labels=["NEED_AUTOFIX", "DBM", "DBM"])
+        patched = MonitorPolicy.patch_plat_template(template, action_id=10)
+
+        assert sorted(patched["details"]["labels"]) == ["DBM", "NEED_AUTOFIX"]
+        assert patched["details"]["name"] == "autofix"
+        assert patched["details"]["priority"] == TargetPriority.PLATFORM.value
+        assert patched["details"]["notice"]["options"]["assign_mode"] == ["by_rule"]
+        assert [action["config_id"] for action in patched["details"]["actions"]] == [10]
+        # 不修改进程内缓存的模板
+        assert template["details"]["labels"] == ["NEED_AUTOFIX", "DBM", "DBM"]
+        assert "actions" not in MonitorPolicy.patch_plat_template(template)["details"]
+
+    @pytest.mark.parametrize(
+        "synced_version, synced_hash, force, expect_sync",
+        [
+            # 已有策略版本更高，不论内容是否变更都跳过
+            (3, "old", False, False),
+            (3, "new", False, False),
+            # 版本相同时比较内容哈希
+            (2, "new", False, False),
+            (2, "old", False, True),
+            # 模板版本升级
+            (1, "new", False, True),
+            # 强制同步
+            (3, "new", True, True),
+        ],
+    )
+    def test_sync_skip_or_upgrade(self, synced_version, synced_hash, force, expect_sync):
+        MonitorPolicy.objects.bulk_create(
+            [
+                MonitorPolicy(
+                    name="policy",
+                    bk_biz_id=PLAT_BIZ_ID,
+                    version=synced_version,
+                    content_hash=synced_hash,
+                    target_priority=TargetPriority.PLATFORM.value,
+                )
+            ]
+        )
+        tpl = {
+            "name": "policy",
+            "bk_biz_id": PLAT_BIZ_ID,
+            "db_type": "mysql",
+            "version": 2,
+            "deleted": False,
+            "content_hash": "new",
+            "template": make_template("policy", version=2),
+        }
+        with patch.object(alarm, "load_alarm_tpl_manifest", return_value=([tpl], [])), patch.object(
+            MonitorPolicy, "parse_details", return_value={}
+        ), patch.object(MonitorPolicy, "save") as mock_save:
+            report = MonitorPolicy.sync_plat_monitor_policy(action_id=1, force=force)
+
+        assert mock_save.called == expect_sync
+        assert (report["skipped"], report["updated"], report["failed"]) == ((0, 1, 0) if expect_sync else (1, 0, 0))
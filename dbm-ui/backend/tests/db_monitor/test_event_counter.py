@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import datetime
+from unittest.mock import patch
+
+import pytest
+from django.utils import timezone
+
+from backend.db_monitor.constants import (
+    MONITOR_EVENT_BUCKET_KEY,
+    MONITOR_EVENT_BUCKET_SECONDS,
+    MONITOR_EVENT_CHECKPOINT_KEY,
+    MONITOR_EVENT_REBUILD_KEY,
+)
+from backend.db_monitor.event_counter import TIME_FORMAT, MonitorEventCounter
+
+BK_BIZ_ID = 2
+STRATEGY_ID = 100
+NOW = 1700003600
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+class FakeRedis:
+    """仅实现MonitorEventCounter用到的redis命令"""
+
+    def __init__(self):
+        self.data = {}
+
+    def mget(self, *keys):
+        return [self.data.get(key) for key in keys]
+
+    def set(self, key, value, ex=None):
+        self.data[key] = str(value)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def hincrby(self, key, field, amount):
+        bucket = self.data.setdefault(key, {})
+        bucket[field] = str(int(bucket.get(field, 0)) + amount)
+
+    def hgetall(self, key):
+        return self.data.get(key, {})
+
+    def expire(self, key, seconds):
+        return True
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+def make_event(event_id, begin: int, app_id="1001"):
+    begin_time = datetime.datetime.fromtimestamp(begin, timezone.get_current_timezone()).strftime(TIME_FORMAT)
+    return {
+        "id": event_id,
+        "strategy_id": STRATEGY_ID,
+        "begin_time": begin_time,
+        "origin_alarm": {"data": {"dimensions": {"appid": app_id}}},
+    }
+
+
+class TestMonitorEventCounter:
+    @pytest.fixture(autouse=True)
+    def fake_redis(self):
+        self.redis = FakeRedis()
+        with patch("backend.db_monitor.event_counter.RedisConn", self.redis):
+            yield
+
+    def sync(self, now, events):
+        with patch("backend.db_monitor.event_counter.time.time", return_value=now + 0.6), patch(
+            "backend.db_monitor.event_counter.MonitorPolicy.bkm_search_event", return_value=events
+        ) as search_event:
+            counts = MonitorEventCounter.sync(BK_BIZ_ID, [STRATEGY_ID])
+        return counts, search_event.call_args.kwargs["time_range"]
+
+    def test_bucket_counts(self):
+        events = [
+            make_event(1, NOW - 10),
+            make_event(2, NOW - 20),
+            make_event(3, NOW - 2 * MONITOR_EVENT_BUCKET_SECONDS),
+        ]
+        counts, __ = self.sync(NOW, events)
+
+        assert counts == {STRATEGY_ID: {"1001": 3}}
+        bucket_key = MONITOR_EVENT_BUCKET_KEY.format(bk_biz_id=BK_BIZ_ID, bucket=MonitorEventCounter._bucket(NOW))
+        assert self.redis.data[bucket_key] == {f"{STRATEGY_ID}:1001": "2"}
+
+    def test_checkpoint_without_gap_or_double_count(self):
+        self.sync(NOW, [make_event(1, NOW)])
+        # 检查点记录为拉取截止的整秒
+        assert self.redis.data[MONITOR_EVENT_CHECKPOINT_KEY.format(bk_biz_id=BK_BIZ_ID)] == str(NOW)
+
+        # 增量拉取从检查点这一秒开始，这一秒内已统计的事件不重复计数
+        counts, time_range = self.sync(NOW + 30, [make_event(1, NOW), make_event(2, NOW), make_event(3, NOW + 30)])
+        assert time_range == MonitorEventCounter._time_range(NOW, NOW + 30)
+        assert counts == {STRATEGY_ID: {"1001": 3}}
+
+    def test_returned_again_with_older_begin_time(self):
+        # 开始时间早于检查点的事件仍在持续，下次拉取会再次返回，不重复计数
+        self.sync(NOW, [make_event(1, NOW - 10)])
+        counts, __ = self.sync(NOW + 30, [make_event(1, NOW - 10), make_event(2, NOW + 20)])
+        assert counts == {STRATEGY_ID: {"1001": 2}}
+
+        # 跳过的事件也记录在检查点内，持续多个拉取周期也只统计一次
+        counts, __ = self.sync(NOW + 60, [make_event(1, NOW - 10), make_event(2, NOW + 20)])
+        assert counts == {STRATEGY_ID: {"1001": 2}}
+
+    def test_rebuild(self):
+        self.sync(NOW, [make_event(1, NOW - 10), make_event(2, NOW - 20)])
+
+        # 到达重建周期后全量拉取，已恢复的事件从统计中剔除
+        self.redis.delete(MONITOR_EVENT_REBUILD_KEY.format(bk_biz_id=BK_BIZ_ID))
+        counts, time_range = self.sync(NOW + 30, [make_event(2, NOW - 20)])
+        window_start = MonitorEventCounter._window_buckets(NOW + 30)[0]
+        assert time_range == MonitorEventCounter._time_range(window_start, NOW + 30)
+        assert counts == {STRATEGY_ID: {"1001": 1}}
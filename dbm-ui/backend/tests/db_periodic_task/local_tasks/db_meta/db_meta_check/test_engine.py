@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import ipaddress
+
+import pytest
+from mock import patch
+
+from backend.db_meta.enums import ClusterType, InstanceInnerRole, InstanceRole, MachineType, TenDBClusterSpiderRole
+from backend.db_meta.models import (
+    BKCity,
+    Cluster,
+    Machine,
+    ProxyInstance,
+    StorageInstance,
+    StorageInstanceTuple,
+    TenDBClusterSpiderExt,
+)
+from backend.db_periodic_task.local_tasks.db_meta.db_meta_check.check_redis_instance import _check_redis_master_slave
+from backend.db_periodic_task.local_tasks.db_meta.db_meta_check.engine import (
+    REDIS_TOPO_RULE,
+    TENDBCLUSTER_TOPO_RULE,
+    TENDBHA_TOPO_RULE,
+    MetaCheckReportWriter,
+)
+from backend.db_report.enums import MetaCheckSubType
+from backend.db_report.models import MetaCheckReport
+from backend.tests.mock_data import constant
+
+pytestmark = pytest.mark.django_db
+
+
+def create_cluster(domain: str, cluster_type: str) -> Cluster:
+    return Cluster.objects.create(
+        bk_biz_id=constant.BK_BIZ_ID, name=domain, immute_domain=domain, cluster_type=cluster_type, db_module_id=0
+    )
+
+
+def get_machine(ip: str) -> Machine:
+    machine, __ = Machine.objects.get_or_create(
+        ip=ip,
+        bk_cloud_id=0,
+        defaults={
+            "bk_host_id": int(ipaddress.IPv4Address(ip)),
+            "bk_biz_id": constant.BK_BIZ_ID,
+            "bk_city": BKCity.objects.first(),
+            "machine_type": MachineType.BACKEND.value,
+        },
+    )
+    return machine
+
+
+def add_storage(cluster: Cluster, ip: str, port: int, role: str, inner_role: str = "") -> StorageInstance:
+    instance = StorageInstance.objects.create(
+        machine=get_machine(ip),
+        port=port,
+        bk_biz_id=constant.BK_BIZ_ID,
+        cluster_type=cluster.cluster_type,
+        instance_role=role,
+        instance_inner_role=inner_role,
+    )
+    instance.cluster.add(cluster)
+    return instance
+
+
+def add_proxy(cluster: Cluster, ip: str, port: int, spider_role: str = None) -> ProxyInstance:
+    instance = ProxyInstance.objects.create(
+        machine=get_machine(ip), port=port, bk_biz_id=constant.BK_BIZ_ID, cluster_type=cluster.cluster_type
+    )
+    instance.cluster.add(cluster)
+    if spider_role:
+        TenDBClusterSpiderExt.objects.create(instance=instance, spider_role=spider_role)
+    return instance
+
+
+def check_rule(rule, exclude_cluster_ids=None):
+    with MetaCheckReportWriter() as writer:
+        rule.check(writer, exclude_cluster_ids=exclude_cluster_ids)
+    return {report.cluster: report for report in MetaCheckReport.objects.all()}
+
+
+@pytest.mark.usefixtures("create_city")
+class TestClusterTopoRule:
+    def test_redis_topo_rule(self):
+        normal = create_cluster("normal.redis.db", ClusterType.TendisTwemproxyRedisInstance)
+        for port in [50000, 50001]:
+            add_proxy(normal, "127.0.0.1", port)
+        alone = create_cluster("alone.redis.db", ClusterType.TendisTwemproxyRedisInstance)
+        add_proxy(alone, "127.0.0.2", 50000)
+        ignored = create_cluster("ignored.redis.db", ClusterType.TendisRedisCluster)
+
+        reports = check_rule(REDIS_TOPO_RULE, exclude_cluster_ids=[ignored.id])
+        assert list(reports.keys()) == ["alone.redis.db"]
+        assert reports["alone.redis.db"].subtype == MetaCheckSubType.AloneInstance.value
+
+    def test_tendbha_topo_rule(self):
+        normal = create_cluster("normal.tendbha.db", ClusterType.TenDBHA)
+        add_proxy(normal, "127.0.0.1", 10000)
+        add_proxy(normal, "127.0.0.2", 10000)
+        add_storage(normal, "127.0.0.3", 20000, InstanceRole.BACKEND_MASTER, InstanceInnerRole.MASTER)
+        add_storage(normal, "127.0.0.4", 20000, InstanceRole.BACKEND_SLAVE, InstanceInnerRole.SLAVE)
+
+        # 接入层不足、两个master、缺少slave
+        abnormal = create_cluster("abnormal.tendbha.db", ClusterType.TenDBHA)
+        add_proxy(abnormal, "127.0.0.5", 10000)
+        add_storage(abnormal, "127.0.0.6", 20000, InstanceRole.BACKEND_MASTER, InstanceInnerRole.MASTER)
+        add_storage(abnormal, "127.0.0.7", 20000, InstanceRole.BACKEND_MASTER, InstanceInnerRole.MASTER)
+
+        reports = check_rule(TENDBHA_TOPO_RULE)
+        assert list(reports.keys()) == ["abnormal.tendbha.db"]
+        assert reports["abnormal.tendbha.db"].msg.count(",") == 2
+        assert reports["abnormal.tendbha.db"].subtype == MetaCheckSubType.ClusterTopo.value
+
+    def test_tendbcluster_topo_rule(self):
+        normal = create_cluster("normal.tendbcluster.db", ClusterType.TenDBCluster)
+        add_proxy(normal, "127.0.0.1", 25000, TenDBClusterSpiderRole.SPIDER_MASTER)
+        add_proxy(normal, "127.0.0.2", 25000, TenDBClusterSpiderRole.SPIDER_MASTER)
+        add_storage(normal, "127.0.0.3", 20000, InstanceRole.REMOTE_MASTER, InstanceInnerRole.MASTER)
+        add_storage(normal, "127.0.0.4", 20000, InstanceRole.REMOTE_SLAVE, InstanceInnerRole.SLAVE)
+
+        # spider master不足，缺少remote slave
+        abnormal = create_cluster("abnormal.tendbcluster.db", ClusterType.TenDBCluster)
+        add_proxy(abnormal, "127.0.0.5", 25000, TenDBClusterSpiderRole.SPIDER_MASTER)
+        add_storage(abnormal, "127.0.0.6", 20000, InstanceRole.REMOTE_MASTER, InstanceInnerRole.MASTER)
+
+        reports = check_rule(TENDBCLUSTER_TOPO_RULE)
+        assert list(reports.keys()) == ["abnormal.tendbcluster.db"]
+        assert reports["abnormal.tendbcluster.db"].msg.count(",") == 1
+
+
+@pytest.mark.usefixtures("create_city")
+class TestRedisMasterSlave:
+    @staticmethod
+    def add_pair(cluster: Cluster, master_ip: str, slave_ip: str, master_port: int, slave_port: int):
+        master = add_storage(cluster, master_ip, master_port, InstanceRole.REDIS_MASTER, InstanceInnerRole.MASTER)
+        slave = add_storage(cluster, slave_ip, slave_port, InstanceRole.REDIS_SLAVE, InstanceInnerRole.SLAVE)
+        StorageInstanceTuple.objects.create(ejector=master, receiver=slave)
+
+    def test_check_all_clusters(self, django_assert_max_num_queries):
+        normal = create_cluster("normal.redis.db", ClusterType.TendisTwemproxyRedisInstance)
+        self.add_pair(normal, "127.0.0.1", "127.0.0.2", 30000, 30000)
+        self.add_pair(normal, "127.0.0.1", "127.0.0.2", 30001, 30001)
+
+        # master缺少slave，不影响后续集群的检查
+        missing = create_cluster("missing.redis.db", ClusterType.TendisTwemproxyRedisInstance)
+        add_storage(missing, "127.0.0.3", 30000, InstanceRole.REDIS_MASTER, InstanceInnerRole.MASTER)
+
+        # 主从端口不一致
+        mismatch = create_cluster("mismatch.redis.db", ClusterType.TendisTwemproxyRedisInstance)
+        self.add_pair(mismatch, "127.0.0.4", "127.0.0.5", 30000, 30001)
+
+        # 一主多从
+        multi = create_cluster("multi.redis.db", ClusterType.TendisTwemproxyRedisInstance)
+        self.add_pair(multi, "127.0.0.6", "127.0.0.7", 30000, 30000)
+        self.add_pair(multi, "127.0.0.6", "127.0.0.8", 30001, 30001)
+
+        clusters = Cluster.objects.filter(cluster_type=ClusterType.TendisTwemproxyRedisInstance)
+        with django_assert_max_num_queries(4), MetaCheckReportWriter() as writer:
+            _check_redis_master_slave(clusters, writer)
+
+        reports = MetaCheckReport.objects.all()
+        assert set(reports.values_list("cluster", flat=True)) == {
+            "missing.redis.db",
+            "mismatch.redis.db",
+            "multi.redis.db",
+        }
+        assert reports.filter(cluster="missing.redis.db").get().ip == "127.0.0.3"
+        # master和slave各报告一次端口不一致
+        assert reports.filter(cluster="mismatch.redis.db").count() == 2
+        assert reports.filter(cluster="multi.redis.db", ip="127.0.0.6").exists()
+
+
+class TestMetaCheckReportWriter:
+    def test_bulk_create_in_chunks(self):
+        with patch.object(
+            MetaCheckReport.objects, "bulk_create", wraps=MetaCheckReport.objects.bulk_create
+        ) as bulk_create:
+            with MetaCheckReportWriter(batch_size=2) as writer:
+                for idx in range(5):
+                    writer.add(bk_biz_id=constant.BK_BIZ_ID, msg=f"report {idx}")
+                # 达到批量大小时写入，剩余的结果在退出时写入
+                assert bulk_create.call_count == 2
+
+        assert bulk_create.call_count == 3
+        assert [len(call.args[0]) for call in bulk_create.call_args_list] == [2, 2, 1]
+        assert MetaCheckReport.objects.filter(status=False).count() == 5
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import datetime
+
+from mock import MagicMock, patch
+
+from backend.db_periodic_task.local_tasks.mysql_backup import bklog_query
+
+
+def binlog_log(cluster_id, filename: str) -> dict:
+    return {
+        "cluster_domain": "binlog.test.db",
+        "cluster_id": cluster_id,
+        "task_id": filename,
+        "filename": filename,
+        "size": 1024,
+        "file_mtime": "2023-01-01 00:00:00",
+        "host": "127.0.0.1",
+        "port": 20000,
+        "db_role": "master",
+        "backup_status": 4,
+        "backup_status_info": "",
+    }
+
+
+class TestFetchBinlogsByCluster:
+    def test_skip_invalid_cluster_id(self):
+        logs = [binlog_log(1, "binlog.000001"), binlog_log("2", "binlog.000002"), binlog_log(None, "binlog.000003")]
+        logs.append(binlog_log("", "binlog.000004"))
+        no_cluster_log = binlog_log(1, "binlog.000005")
+        no_cluster_log.pop("cluster_id")
+        logs.append(no_cluster_log)
+        logs.append(binlog_log(1, "binlog.000006"))
+
+        scroll = MagicMock()
+        scroll.logs.return_value = iter(logs)
+        end_time = datetime.datetime.now()
+        with patch.object(bklog_query, "BKLogScroll", return_value=scroll), patch.object(
+            bklog_query.logger, "warning"
+        ) as mock_warning:
+            cluster_binlogs, __ = bklog_query.fetch_binlogs_by_cluster(end_time - datetime.timedelta(days=1), end_time)
+
+        assert {cluster_id: [r["file_name"] for r in records] for cluster_id, records in cluster_binlogs.items()} == {
+            1: ["binlog.000001", "binlog.000006"],
+            2: ["binlog.000002"],
+        }
+        assert mock_warning.call_count == 3
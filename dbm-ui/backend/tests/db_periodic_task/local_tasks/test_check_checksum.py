@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import pytest
+
+from backend.db_meta.enums import ClusterType, InstanceInnerRole, InstanceRole
+from backend.db_meta.models import Cluster
+from backend.db_periodic_task.local_tasks.check_checksum import Checksum, save_checksum_reports
+from backend.db_report.models import ChecksumCheckReport, ChecksumInstance
+from backend.tests.db_periodic_task.local_tasks.db_meta.db_meta_check.test_engine import add_storage, create_cluster
+
+pytestmark = pytest.mark.django_db
+
+
+def reported_checksum(ip: str, port: int, inconsistent_tables=None) -> Checksum:
+    checksum = Checksum(ip, port)
+    checksum.reported = True
+    checksum.master_ip, checksum.master_port = "127.0.0.1", 20000
+    for db, table in inconsistent_tables or []:
+        checksum.add_not_consistent_table(db, table)
+    return checksum
+
+
+class TestSaveChecksumReports:
+    def setup_method(self):
+        self.ok_cluster = create_cluster("ok.checksum.db", ClusterType.TenDBHA.value)
+        self.fail_cluster = create_cluster("fail.checksum.db", ClusterType.TenDBHA.value)
+        self.other_fail_cluster = create_cluster("fail2.checksum.db", ClusterType.TenDBHA.value)
+        for index, cluster in enumerate([self.ok_cluster, self.fail_cluster, self.other_fail_cluster]):
+            add_storage(
+                cluster, f"127.0.1.{index + 1}", 20000, InstanceRole.BACKEND_SLAVE.value, InstanceInnerRole.SLAVE.value
+            )
+
+    def save(self):
+        checksums = {
+            (self.ok_cluster.id, "127.0.1.1", 20000): reported_checksum("127.0.1.1", 20000),
+            (self.fail_cluster.id, "127.0.1.2", 20000): reported_checksum("127.0.1.2", 20000, [("db1", "tb1")]),
+            (self.other_fail_cluster.id, "127.0.1.3", 20000): reported_checksum(
+                "127.0.1.3", 20000, [("db2", "tb2"), ("db2", "tb3")]
+            ),
+        }
+        clusters = Cluster.objects.filter(
+            id__in=[self.ok_cluster.id, self.fail_cluster.id, self.other_fail_cluster.id]
+        )
+        save_checksum_reports(clusters, checksums)
+
+    def test_instances_linked_to_own_report(self):
+        self.save()
+
+        assert ChecksumCheckReport.objects.count() == 3
+        assert ChecksumCheckReport.objects.get(cluster="ok.checksum.db").status
+        for domain, ip, details in [
+            ("fail.checksum.db", "127.0.1.2", {"db1": ["tb1"]}),
+            ("fail2.checksum.db", "127.0.1.3", {"db2": ["tb2", "tb3"]}),
+        ]:
+            report = ChecksumCheckReport.objects.get(cluster=domain)
+            assert not report.status
+            assert report.fail_slaves == 1
+            instance = ChecksumInstance.objects.get(report=report)
+            assert (instance.ip, instance.details) == (ip, details)
+
+    def test_previous_report_of_same_cluster_untouched(self):
+        # 前一次巡检的报告与本次写入时间相近、集群相同，实例详情只能挂在本次的报告上
+        self.save()
+        old_report_ids = set(ChecksumCheckReport.objects.values_list("id", flat=True))
+        self.save()
+
+        new_reports = ChecksumCheckReport.objects.exclude(id__in=old_report_ids)
+        assert new_reports.count() == 3
+        for report in ChecksumCheckReport.objects.filter(id__in=old_report_ids, status=False):
+            assert ChecksumInstance.objects.filter(report=report).count() == 1
+        for report in new_reports.filter(status=False):
+            assert ChecksumInstance.objects.filter(report=report).count() == 1
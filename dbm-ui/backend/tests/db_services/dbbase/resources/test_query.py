@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import ipaddress
+import logging
+import os
+import time
+from typing import Dict, List
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from mock import patch
+
+from backend.db_meta.enums import ClusterEntryRole, ClusterEntryType, ClusterType, InstanceRole, MachineType
+from backend.db_meta.models import BKCity, Cluster, ClusterEntry, Machine, ProxyInstance, StorageInstance
+from backend.db_services.dbbase.resources import query
+from backend.db_services.dbbase.resources.query import CommonQueryResourceMixin
+from backend.tests.mock_data import constant
+
+pytestmark = pytest.mark.django_db
+logger = logging.getLogger("test")
+
+CLUSTER_TYPES = [ClusterType.TenDBHA.value]
+
+
+def create_machine(ip: str) -> Machine:
+    return Machine.objects.create(
+        ip=ip,
+        bk_cloud_id=0,
+        bk_host_id=int(ipaddress.IPv4Address(ip)),
+        bk_biz_id=constant.BK_BIZ_ID,
+        bk_city=BKCity.objects.first(),
+        machine_type=MachineType.BACKEND.value,
+    )
+
+
+@pytest.fixture
+def clusters(create_city):
+    """5个TenDBHA集群，每个集群2个proxy、1主1从；第一个集群的master同时属于第二个集群"""
+    cluster_list = []
+    for idx in range(5):
+        cluster = Cluster.objects.create(
+            bk_biz_id=constant.BK_BIZ_ID,
+            name=f"cluster{idx}",
+            immute_domain=f"cluster{idx}.db",
+            cluster_type=ClusterType.TenDBHA.value,
+            db_module_id=0,
+        )
+        ClusterEntry.objects.create(
+            cluster=cluster,
+            cluster_entry_type=ClusterEntryType.DNS.value,
+            entry=f"cluster{idx}.dr",
+            role=ClusterEntryRole.SLAVE_ENTRY.value,
+        )
+        for host in [1, 2]:
+            proxy = ProxyInstance.objects.create(
+                machine=create_machine(f"10.0.{idx}.{host}"),
+                port=10000,
+                bk_biz_id=constant.BK_BIZ_ID,
+                cluster_type=cluster.cluster_type,
+                instance_role=InstanceRole.PROXY.value,
+            )
+            proxy.cluster.add(cluster)
+        for host, role in [(3, InstanceRole.BACKEND_MASTER), (4, InstanceRole.BACKEND_SLAVE)]:
+            storage = StorageInstance.objects.create(
+                machine=create_machine(f"10.0.{idx}.{host}"),
+                port=20000,
+                bk_biz_id=constant.BK_BIZ_ID,
+                cluster_type=cluster.cluster_type,
+                instance_role=role.value,
+            )
+            storage.cluster.add(cluster)
+        cluster_list.append(cluster)
+
+    StorageInstance.objects.get(machine__ip="10.0.0.3").cluster.add(cluster_list[1])
+    # 其他业务的集群不会被查询到
+    Cluster.objects.create(
+        bk_biz_id=constant.BK_BIZ_ID + 1, name="other", immute_domain="other.db", cluster_type=ClusterType.TenDBHA
+    )
+    return cluster_list
+
+
+def legacy_query_cluster(bk_biz_id: int, cluster_types: list, cluster_ids: list):
+    """原逐个集群加载实例的查询结果，角色地址按列表返回"""
+    clusters = Cluster.objects.filter(bk_biz_id=bk_biz_id, cluster_type__in=cluster_types)
+    if cluster_ids:
+        clusters = clusters.filter(id__in=cluster_ids)
+    cluster_entry_map = ClusterEntry.get_cluster_entry_map(cluster_ids=list(clusters.values_list("id", flat=True)))
+
+    roles, rows = set(), []
+    for cluster in clusters:
+        row = {
+            "cluster_id": cluster.id,
+            "cluster_name": cluster.name,
+            "cluster_alias": cluster.alias,
+            "cluster_type": cluster.cluster_type,
+            "master_domain": cluster.immute_domain,
+            "slave_domain": cluster_entry_map[cluster.id].get("slave_domain", ""),
+            "major_version": cluster.major_version,
+            "region": cluster.region,
+            "disaster_tolerance_level": cluster.get_disaster_tolerance_level_display(),
+        }
+        for ins in [*cluster.proxyinstance_set.all(), *cluster.storageinstance_set.all()]:
+            row.setdefault(ins.instance_role, []).append(f"{ins.machine.ip}#{ins.port}")
+            roles.add(ins.instance_role)
+        rows.append({key: sorted(value) if isinstance(value, list) else value for key, value in row.items()})
+    return roles, sorted(rows, key=lambda row: row["cluster_id"])
+
+
+def normalize_cluster_rows(rows: List[Dict], role_ids: List[str]) -> List[Dict]:
+    rows = [
+        {key: sorted(value.split("\n")) if key in role_ids else value for key, value in row.items()} for row in rows
+    ]
+    return sorted(rows, key=lambda row: row["cluster_id"])
+
+
+def legacy_query_instance(bk_biz_id: int, cluster_types: list) -> List[Dict]:
+    """原一次加载全部实例的查询结果"""
+    rows = []
+    for model in [StorageInstance, ProxyInstance]:
+        for ins in model.objects.filter(bk_biz_id=bk_biz_id, cluster_type__in=cluster_types):
+            for cluster in ins.cluster.all():
+                rows.append(
+                    {
+                        "bk_host_id": ins.machine.bk_host_id,
+                        "bk_cloud_id": ins.machine.bk_cloud_id,
+                        "ip": ins.machine.ip,
+                        "ip_port": ins.ip_port,
+                        "instance_role": ins.instance_role,
+                        "bk_idc_city_name": ins.machine.bk_city.bk_idc_city_name,
+                        "bk_idc_name": ins.machine.bk_idc_name,
+                        "cluster_id": cluster.id,
+                        "cluster_name": cluster.name,
+                        "cluster_alias": cluster.alias,
+                        "cluster_type": cluster.cluster_type,
+                        "master_domain": cluster.immute_domain,
+                        "major_version": cluster.major_version,
+                    }
+                )
+    return rows
+
+
+def instance_row_key(row: Dict):
+    return row["ip_port"], row["cluster_id"]
+
+
+class TestCommonQuery:
+    # 5个集群：逐个、非整除、整除、一批以内
+    @pytest.mark.parametrize("chunk_size", [1, 2, 5, 7])
+    def test_query_cluster_in_chunks(self, clusters, chunk_size):
+        roles, expected = legacy_query_cluster(constant.BK_BIZ_ID, CLUSTER_TYPES, [])
+        with patch.object(query, "COMMON_QUERY_CHUNK_SIZE", chunk_size):
+            headers, rows = CommonQueryResourceMixin.common_query_cluster(constant.BK_BIZ_ID, CLUSTER_TYPES, [])
+            rows = list(rows)
+
+        role_ids = [header["id"] for header in headers][9:]
+        assert role_ids == [role for role in InstanceRole.get_values() if role in roles]
+        assert normalize_cluster_rows(rows, role_ids) == expected
+        # 多集群实例在每个集群中都会出现
+        assert "10.0.0.3#20000" in rows[1][InstanceRole.BACKEND_MASTER.value]
+
+    def test_query_cluster_by_ids(self, clusters):
+        cluster_ids = [clusters[0].id, clusters[3].id]
+        __, expected = legacy_query_cluster(constant.BK_BIZ_ID, CLUSTER_TYPES, cluster_ids)
+        with patch.object(query, "COMMON_QUERY_CHUNK_SIZE", 1):
+            headers, rows = CommonQueryResourceMixin.common_query_cluster(
+                constant.BK_BIZ_ID, CLUSTER_TYPES, cluster_ids
+            )
+            rows = normalize_cluster_rows(list(rows), [header["id"] for header in headers][9:])
+        assert rows == expected
+
+    def test_query_empty(self):
+        headers, rows = CommonQueryResourceMixin.common_query_cluster(constant.BK_BIZ_ID, CLUSTER_TYPES, [])
+        assert len(headers) == 9
+        assert list(rows) == []
+
+        __, rows = CommonQueryResourceMixin.common_query_instance(constant.BK_BIZ_ID, CLUSTER_TYPES, [])
+        assert list(rows) == []
+
+    @pytest.mark.parametrize("chunk_size", [1, 3, 10, 100])
+    def test_query_instance_in_chunks(self, clusters, chunk_size):
+        expected = legacy_query_instance(constant.BK_BIZ_ID, CLUSTER_TYPES)
+        with patch.object(query, "COMMON_QUERY_CHUNK_SIZE", chunk_size):
+            __, rows = CommonQueryResourceMixin.common_query_instance(constant.BK_BIZ_ID, CLUSTER_TYPES, [])
+            rows = list(rows)
+
+        # 20个实例，其中一个属于两个集群
+        assert len(rows) == 21
+        assert sorted(rows, key=instance_row_key) == sorted(expected, key=instance_row_key)
+
+    def test_query_instance_by_hosts(self, clusters):
+        bk_host_ids = [int(ipaddress.IPv4Address("10.0.0.3")), int(ipaddress.IPv4Address("10.0.2.1"))]
+        __, rows = CommonQueryResourceMixin.common_query_instance(constant.BK_BIZ_ID, CLUSTER_TYPES, bk_host_ids)
+        assert sorted(instance_row_key(row) for row in rows) == [
+            ("10.0.0.3:20000", clusters[0].id),
+            ("10.0.0.3:20000", clusters[1].id),
+            ("10.0.2.1:10000", clusters[2].id),
+        ]
+
+    @pytest.mark.benchmark
+    @pytest.mark.skipif(not os.getenv("RUN_BENCHMARK"), reason="benchmark is opt-in, set RUN_BENCHMARK=1 to run")
+    def test_query_instance_benchmark(self, create_city):
+        """5万实例的通用属性查询，分批查询的次数与批次数成正比，与实例数无关"""
+        machine_count, ports_per_machine = 500, 100
+        cluster = Cluster.objects.create(
+            bk_biz_id=constant.BK_BIZ_ID, name="bench", immute_domain="bench.db", cluster_type=ClusterType.TenDBHA
+        )
+        Machine.objects.bulk_create(
+            [
+                Machine(
+                    ip=str(ipaddress.IPv4Address("10.1.0.0") + idx),
+                    bk_cloud_id=0,
+                    bk_host_id=idx + 1,
+                    bk_biz_id=constant.BK_BIZ_ID,
+                    bk_city=BKCity.objects.first(),
+                    machine_type=MachineType.BACKEND.value,
+                )
+                for idx in range(machine_count)
+            ]
+        )
+        StorageInstance.objects.bulk_create(
+            [
+                StorageInstance(
+                    machine_id=host_id,
+                    port=20000 + port,
+                    bk_biz_id=constant.BK_BIZ_ID,
+                    cluster_type=ClusterType.TenDBHA.value,
+                    instance_role=InstanceRole.BACKEND_SLAVE.value,
+                )
+                for host_id in range(1, machine_count + 1)
+                for port in range(ports_per_machine)
+            ],
+            batch_size=5000,
+        )
+        through = StorageInstance.cluster.through
+        through.objects.bulk_create(
+            [
+                through(storageinstance_id=instance_id, cluster_id=cluster.id)
+                for instance_id in StorageInstance.objects.values_list("id", flat=True)
+            ],
+            batch_size=5000,
+        )
+
+        start = time.time()
+        with CaptureQueriesContext(connection) as queries:
+            __, rows = CommonQueryResourceMixin.common_query_instance(constant.BK_BIZ_ID, CLUSTER_TYPES, [])
+            row_count = sum(1 for __ in rows)
+        cost = time.time() - start
+
+        logger.info(
+            "common_query_instance: %s rows, %s queries, %.3fs, chunk size: %s",
+            row_count,
+            len(queries),
+            cost,
+            query.COMMON_QUERY_CHUNK_SIZE,
+        )
+        assert row_count == machine_count * ports_per_machine
+        # 每批次固定查询实例(关联机器、城市)和集群，查询次数不随实例数增长
+        chunk_count = row_count // query.COMMON_QUERY_CHUNK_SIZE
+        assert len(queries) <= 3 * (chunk_count + 2)
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import base64
+import datetime
+import json
+
+import pytest
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from backend.db_meta.enums import ClusterType
+from backend.db_meta.models import Cluster
+from backend.db_services.dbbase.resources.query_base import build_q_for_keyset, decode_cursor, encode_cursor
+
+pytestmark = pytest.mark.django_db
+
+
+def raw_cursor(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+class TestKeysetCursor:
+    def test_datetime_keeps_microseconds(self):
+        create_at = timezone.make_aware(datetime.datetime(2024, 1, 1, 12, 0, 0, 123456))
+        assert decode_cursor(encode_cursor(create_at, 10)) == (create_at, 10)
+
+    @pytest.mark.parametrize("payload", [["x", None], ["x"], [{"datetime": "bad"}, 1], "x"])
+    def test_invalid_cursor(self, payload):
+        with pytest.raises(ValueError):
+            decode_cursor(raw_cursor(payload))
+
+    @pytest.mark.parametrize("ordering", ["create_at", "-create_at"])
+    def test_datetime_ordering_pages(self, ordering):
+        # 多个集群的创建时间落在同一毫秒内，只有微秒不同，且存在相同的创建时间
+        base_time = timezone.make_aware(datetime.datetime(2024, 1, 1, 12, 0, 0, 100000))
+        cluster_ids = []
+        for offset in [1, 2, 2, 3, 4, 5]:
+            name = get_random_string(8)
+            cluster = Cluster.objects.create(
+                name=name, cluster_type=ClusterType.TenDBSingle, immute_domain=f"{name}.db", bk_biz_id=1
+            )
+            Cluster.objects.filter(id=cluster.id).update(create_at=base_time + datetime.timedelta(microseconds=offset))
+            cluster_ids.append(cluster.id)
+
+        queryset = Cluster.objects.filter(id__in=cluster_ids)
+        order_by = [ordering, "-id" if ordering.startswith("-") else "id"]
+        expected = list(queryset.order_by(*order_by).values_list("id", flat=True))
+
+        paged_ids, cursor = [], None
+        while True:
+            page_queryset = queryset.filter(build_q_for_keyset(ordering, cursor)) if cursor else queryset
+            page = list(page_queryset.order_by(*order_by).values_list("id", "create_at")[:2])
+            if not page:
+                break
+            paged_ids.extend(pk for pk, _ in page)
+            cursor = encode_cursor(page[-1][1], page[-1][0])
+
+        assert paged_ids == expected
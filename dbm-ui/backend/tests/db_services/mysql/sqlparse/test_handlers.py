@@ -8,10 +8,30 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+import ast
+import logging
+import os
+import time
+
 import pytest
+from mock import patch
 
+from backend.db_services.mysql.sqlparse import handlers
 from backend.db_services.mysql.sqlparse.exceptions import SQLParseBaseException
-from backend.db_services.mysql.sqlparse.handlers import SQLParseHandler
+from backend.db_services.mysql.sqlparse.handlers import SQLDigestCache, SQLParseHandler
+
+logger = logging.getLogger("test")
+
+
+def load_sql_corpus():
+    """收集本文件测试用例中的全部SQL，作为批量解析和基准测试的语料"""
+    with open(__file__, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    return [
+        node.value.value
+        for node in ast.walk(tree)
+        if isinstance(node, ast.Assign) and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str)
+    ]
 
 
 class TestSQLParseHandler:
@@ -977,3 +997,57 @@ class TestSQLParseHandler:
         SHOW CREATE TABLE TEST_DB;
         """
         assert SQLParseHandler().parse_select_statement(show_create_table_sql) is None
+
+
+class TestSQLDigestBatch:
+    @staticmethod
+    def test_batch_parse_sql():
+        corpus = load_sql_corpus()
+        SQLDigestCache.clear()
+        expected = [SQLParseHandler().parse_sql(sql) for sql in corpus]
+
+        # 缓存命中与进程池解析的结果都与逐条解析一致
+        assert SQLParseHandler.batch_parse_sql(corpus, use_process_pool=False) == expected
+        SQLDigestCache.clear()
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setattr(handlers, "SQL_DIGEST_PROCESS_POOL_THRESHOLD", 1)
+            assert SQLParseHandler.batch_parse_sql(corpus * 2) == expected * 2
+
+    @staticmethod
+    def test_digest_cache_hit():
+        corpus = load_sql_corpus()
+        SQLDigestCache.clear()
+        with patch.object(handlers.sqlparse, "parse", wraps=handlers.sqlparse.parse) as mock_parse:
+            expected = SQLParseHandler.batch_parse_sql(corpus, use_process_pool=False)
+            parse_count = mock_parse.call_count
+            # 相同SQL只解析一次，再次批量解析全部命中缓存
+            assert parse_count == len(set(corpus))
+            assert SQLParseHandler.batch_parse_sql(corpus, use_process_pool=False) == expected
+            assert mock_parse.call_count == parse_count
+
+    @staticmethod
+    def test_batch_size_limit():
+        with patch.object(handlers, "SQL_DIGEST_BATCH_MAX_SIZE", 1):
+            with pytest.raises(SQLParseBaseException):
+                SQLParseHandler.batch_parse_sql(["select 1", "select 2"], use_process_pool=False)
+
+    @staticmethod
+    @pytest.mark.benchmark
+    @pytest.mark.skipif(not os.getenv("RUN_BENCHMARK"), reason="benchmark is opt-in, set RUN_BENCHMARK=1 to run")
+    def test_digest_benchmark():
+        corpus, rounds = load_sql_corpus(), 10
+
+        start = time.time()
+        for __ in range(rounds):
+            SQLDigestCache.clear()
+            SQLParseHandler.batch_parse_sql(corpus, use_process_pool=False)
+        cold_cost = time.time() - start
+
+        start = time.time()
+        for __ in range(rounds):
+            SQLParseHandler.batch_parse_sql(corpus, use_process_pool=False)
+        cached_cost = time.time() - start
+
+        logger.info("corpus: %s sqls x %s, cold: %.3fs, cached: %.3fs", len(corpus), rounds, cold_cost, cached_cost)
+        # 命中缓存时无需重新解析
+        assert cached_cost < cold_cost
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import json
+
+import pytest
+from django.test import RequestFactory
+from mock import patch
+
+from backend.db_services.mysql.sqlparse.views import batch_parse_sql
+
+factory = RequestFactory()
+
+
+def post(body: str):
+    request = factory.post("/apis/mysql/batch_parse_sql/", data=body, content_type="application/json")
+    return batch_parse_sql(request)
+
+
+class TestBatchParseSQLView:
+    @patch("backend.db_services.mysql.sqlparse.views.SQLParseHandler.batch_parse_sql", return_value=[{}, {}])
+    def test_batch_parse_sql(self, mock_batch_parse):
+        response = post(json.dumps({"contents": ["select 1", " select 2 "]}))
+        assert response.status_code == 200
+        assert json.loads(response.content) == {"results": [{}, {}]}
+        # SQL原文不做裁剪
+        mock_batch_parse.assert_called_once_with(sqls=["select 1", " select 2 "])
+
+    @patch("backend.db_services.mysql.sqlparse.views.SQLParseHandler.batch_parse_sql", return_value=[])
+    def test_missing_contents(self, mock_batch_parse):
+        assert post(json.dumps({})).status_code == 200
+        mock_batch_parse.assert_called_once_with(sqls=[])
+
+    @pytest.mark.parametrize(
+        "body",
+        [
+            "not json",
+            json.dumps(["select 1"]),
+            json.dumps({"contents": "select 1"}),
+            json.dumps({"contents": [{"sql": "select 1"}]}),
+            json.dumps({"contents": [None]}),
+        ],
+    )
+    @patch("backend.db_services.mysql.sqlparse.views.SQLParseHandler.batch_parse_sql")
+    def test_invalid_contents(self, mock_batch_parse, body):
+        response = post(body)
+        assert response.status_code == 400
+        assert json.loads(response.content)["result"] is False
+        mock_batch_parse.assert_not_called()
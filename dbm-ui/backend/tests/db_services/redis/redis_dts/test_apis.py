@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from mock import MagicMock, patch
+
+from backend.db_services.redis.redis_dts import apis
+from backend.db_services.redis.redis_dts.apis import dts_claim_tasks, get_dts_claim_stats
+from backend.db_services.redis.redis_dts.constants import DTS_CLAIM_STATS_KEY, DTS_UNASSIGNED_SERVER
+from backend.db_services.redis.redis_dts.models import TbTendisDtsTask
+
+pytestmark = pytest.mark.django_db
+
+DTS_SERVER = "127.0.0.1"
+
+
+class FakeClock:
+    """只在sleep时前进的时钟，用于验证长轮询的等待时间"""
+
+    def __init__(self):
+        self.now, self.sleeps = 1000.0, []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def redis_conn():
+    with patch.object(apis, "RedisConn", MagicMock()) as mock_redis:
+        mock_redis.hgetall.return_value = {}
+        yield mock_redis
+
+
+@pytest.fixture
+def tasks():
+    """可认领的task按(优先级降序，创建时间，权重)排序后依次为：high, early_light, early_heavy, late"""
+    now = datetime.now(timezone.utc)
+    claimable = {
+        "late": {"src_cluster_priority": 1, "create_time": now - timedelta(hours=1)},
+        "early_heavy": {"src_cluster_priority": 1, "create_time": now - timedelta(hours=2), "src_weight": 2},
+        "early_light": {"src_cluster_priority": 1, "create_time": now - timedelta(hours=2), "src_weight": 1},
+        "high": {"src_cluster_priority": 2, "create_time": now},
+    }
+    # 不可认领：其他云区域、已分配、已开始、超出调度时间范围
+    unclaimable = [
+        {"bk_cloud_id": 1},
+        {"dts_server": "127.0.0.2"},
+        {"task_type": "tendisBackup"},
+        {"status": 1},
+        {"create_time": now - timedelta(days=31)},
+    ]
+    name_ids = {}
+    for name, fields in [*claimable.items(), *[(str(i), f) for i, f in enumerate(unclaimable)]]:
+        create_time = fields.pop("create_time", now)
+        fields = {"bk_cloud_id": 0, "dts_server": DTS_UNASSIGNED_SERVER, **fields}
+        task = TbTendisDtsTask.objects.create(bill_id=1, src_cluster=name, **fields)
+        TbTendisDtsTask.objects.filter(id=task.id).update(create_time=create_time)
+        name_ids[name] = task.id
+    return name_ids
+
+
+class TestDtsClaimTasks:
+    def test_claim_order_and_limit(self, tasks, redis_conn):
+        payload = {"bk_cloud_id": 0, "dts_server": DTS_SERVER}
+        with patch.object(apis, "DTS_CLAIM_MAX_LIMIT", 2):
+            first = dts_claim_tasks({**payload, "limit": 100})
+            second = dts_claim_tasks({**payload, "limit": 0})
+            third = dts_claim_tasks({**payload, "limit": 2})
+
+        # limit超过上限时按上限认领，小于1时至少认领1个，已认领的task不会被重复认领
+        assert [task["src_cluster"] for task in first] == ["high", "early_light"]
+        assert [task["src_cluster"] for task in second] == ["early_heavy"]
+        assert [task["src_cluster"] for task in third] == ["late"]
+        claimed_ids = [tasks[name] for name in ["high", "early_light", "early_heavy", "late"]]
+        assert set(TbTendisDtsTask.objects.filter(dts_server=DTS_SERVER).values_list("id", flat=True)) == set(
+            claimed_ids
+        )
+
+        # 云区域的统计只计入认领到task的请求
+        assert get_dts_claim_stats({"bk_cloud_id": 0})["queue_depth"] == 0
+        pipeline = redis_conn.pipeline.return_value
+        stats_key = DTS_CLAIM_STATS_KEY.format(bk_cloud_id=0)
+        assert pipeline.hincrby.call_args_list.count(((stats_key, "claims"),)) == 3
+        assert ((stats_key, "empty_polls"),) not in pipeline.hincrby.call_args_list
+
+    def test_claim_skip_locked(self, tasks, redis_conn):
+        with CaptureQueriesContext(connection) as context:
+            dts_claim_tasks({"bk_cloud_id": 0, "dts_server": DTS_SERVER})
+
+        select_sqls = [query["sql"] for query in context.captured_queries if query["sql"].startswith("SELECT")]
+        if connection.features.has_select_for_update_skip_locked:
+            assert any("FOR UPDATE SKIP LOCKED" in sql for sql in select_sqls)
+
+    def test_claim_wait_clamped(self, redis_conn):
+        clock = FakeClock()
+        with patch.object(apis, "time", clock), patch.object(apis, "DTS_CLAIM_MAX_WAIT_SECONDS", 2), patch.object(
+            apis, "DTS_CLAIM_POLL_INTERVAL", 1
+        ):
+            assert dts_claim_tasks({"bk_cloud_id": 0, "dts_server": DTS_SERVER, "wait_seconds": 100}) == []
+
+        # 等待时间按上限截断，空轮询单独计数
+        assert clock.sleeps == [1, 1]
+        stats_key = DTS_CLAIM_STATS_KEY.format(bk_cloud_id=0)
+        hincrby_calls = redis_conn.pipeline.return_value.hincrby.call_args_list
+        assert hincrby_calls == [((stats_key, "empty_polls"),)] * 3
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import itertools
+import random
+from typing import Dict, List
+
+import pytest
+from django.db.models import Count
+
+from backend.db_meta.enums import ClusterType
+from backend.db_services.redis.redis_dts.constants import DtsOperateType, DtsTaskType
+from backend.db_services.redis.redis_dts.enums import DtsSyncStatus
+from backend.db_services.redis.redis_dts.models import TbTendisDTSJob, TbTendisDtsTask
+from backend.db_services.redis.redis_dts.util import (
+    _dts_task_status_conditions,
+    batch_dts_job_cnt_and_status,
+    is_full_transfer_failed,
+    is_in_full_transfer,
+    is_in_incremental_sync,
+    is_incremental_sync_failed,
+    is_pending_execution,
+    is_transfer_competed,
+    is_transfer_terminated,
+)
+
+pytestmark = pytest.mark.django_db
+
+# 覆盖全部源类型、task类型、状态、rdb消息和强制终止操作的组合
+TASK_COMBINATIONS = list(
+    itertools.product(
+        [
+            ClusterType.TendisTendisSSDInstance.value,
+            ClusterType.TendisRedisInstance.value,
+            ClusterType.TendisTendisplusInsance.value,
+            "",
+        ],
+        ["", *DtsTaskType.get_values()],
+        [-1, 0, 1, 2],
+        ["", "rdb dumping"],
+        ["", DtsOperateType.FORCE_KILL_SUCC.value],
+    )
+)
+
+
+def create_tasks(bill_id: int, combinations: List) -> List[TbTendisDtsTask]:
+    TbTendisDtsTask.objects.bulk_create(
+        [
+            TbTendisDtsTask(
+                bill_id=bill_id,
+                src_cluster="src.redis.db",
+                dst_cluster="dst.redis.db",
+                src_dbtype=src_dbtype,
+                task_type=task_type,
+                status=status,
+                message=message,
+                sync_operate=sync_operate,
+            )
+            for src_dbtype, task_type, status, message, sync_operate in combinations
+        ]
+    )
+    return list(TbTendisDtsTask.objects.filter(bill_id=bill_id))
+
+
+def legacy_task_counts(task: TbTendisDtsTask) -> Dict[str, int]:
+    """按原逐个task判断的逻辑分类"""
+    counts = dict.fromkeys(_dts_task_status_conditions().keys(), 0)
+    if is_pending_execution(task):
+        counts["pending_exec_cnt"] += 1
+    elif task.task_type == DtsTaskType.TENDISSSD_BACKUP.value and task.status == 0:
+        counts["pending_exec_cnt"] += 1
+    elif task.task_type == DtsTaskType.TENDISSSD_BACKUP.value and task.status == 1:
+        counts["running_cnt"] += 1
+    elif task.task_type != DtsTaskType.TENDISSSD_BACKUP.value and (task.status == 0 or task.status == 1):
+        counts["running_cnt"] += 1
+    elif task.status == -1:
+        counts["failed_cnt"] += 1
+    elif task.status == 2:
+        counts["success_cnt"] += 1
+
+    if is_transfer_competed(task):
+        counts["transfer_completed_cnt"] += 1
+    elif is_transfer_terminated(task):
+        counts["transfer_terminated_cnt"] += 1
+    elif is_full_transfer_failed(task):
+        counts["full_transfer_failed_cnt"] += 1
+    elif is_incremental_sync_failed(task):
+        counts["incremental_sync_failed_cnt"] += 1
+    elif is_in_full_transfer(task):
+        counts["full_transfer_running_cnt"] += 1
+    elif is_in_incremental_sync(task):
+        counts["incremental_sync_running_cnt"] += 1
+    return counts
+
+
+def legacy_job_status(tasks: List[TbTendisDtsTask]) -> dict:
+    """按原逐个task统计的逻辑得出job任务状态"""
+    counts = dict.fromkeys(_dts_task_status_conditions().keys(), 0)
+    for task in tasks:
+        for name, count in legacy_task_counts(task).items():
+            counts[name] += count
+
+    total_cnt = len(tasks)
+    ret = {"total_cnt": total_cnt}
+    for cnt_key in ["pending_exec_cnt", "running_cnt", "failed_cnt", "success_cnt"]:
+        ret[cnt_key] = counts[cnt_key]
+    if counts["pending_exec_cnt"] == total_cnt:
+        ret["status"] = DtsSyncStatus.PENDING_EXECUTION.value
+    elif counts["transfer_completed_cnt"] == total_cnt:
+        ret["status"] = DtsSyncStatus.TRANSFER_COMPLETED.value
+    elif counts["transfer_terminated_cnt"] == total_cnt:
+        ret["status"] = DtsSyncStatus.TRANSFER_TERMINATED.value
+    elif counts["full_transfer_failed_cnt"] > 0:
+        ret["status"] = DtsSyncStatus.FULL_TRANSFER_FAILED.value
+    elif counts["incremental_sync_failed_cnt"] > 0:
+        ret["status"] = DtsSyncStatus.INCREMENTAL_SYNC_FAILED.value
+    elif counts["full_transfer_running_cnt"] > 0:
+        ret["status"] = DtsSyncStatus.IN_FULL_TRANSFER.value
+    elif counts["incremental_sync_running_cnt"] > 0:
+        ret["status"] = DtsSyncStatus.IN_INCREMENTAL_SYNC.value
+    return ret
+
+
+def dts_job(bill_id: int) -> TbTendisDTSJob:
+    return TbTendisDTSJob(bill_id=bill_id, src_cluster="src.redis.db", dst_cluster="dst.redis.db")
+
+
+class TestDtsTaskStatusAggregation:
+    def test_task_conditions_parity(self):
+        tasks = create_tasks(1, TASK_COMBINATIONS)
+        conditions = _dts_task_status_conditions()
+        task_counts = (
+            TbTendisDtsTask.objects.filter(bill_id=1)
+            .values("id")
+            .annotate(**{name: Count("id", filter=condition) for name, condition in conditions.items()})
+        )
+        task_counts = {row.pop("id"): row for row in task_counts}
+
+        for task in tasks:
+            assert task_counts[task.id] == legacy_task_counts(task), (
+                task.src_dbtype,
+                task.task_type,
+                task.status,
+                task.message,
+                task.sync_operate,
+            )
+
+    def test_job_status_parity(self):
+        # 随机组合task作为job，每个task的分类已由上一个用例覆盖
+        rnd = random.Random(0)
+        job_combinations = [rnd.sample(TASK_COMBINATIONS, rnd.randint(1, 8)) for __ in range(300)]
+        # 全部待执行、全部完成、全部终止的job
+        job_combinations += [
+            [(ClusterType.TendisRedisInstance.value, "", 0, "", "")] * 3,
+            [(ClusterType.TendisRedisInstance.value, DtsTaskType.WATCH_CACHE_SYNC.value, 2, "", "")] * 3,
+            [(ClusterType.TendisRedisInstance.value, "", -1, "", DtsOperateType.FORCE_KILL_SUCC.value)] * 3,
+        ]
+
+        legacy_status = {}
+        for bill_id, combinations in enumerate(job_combinations, start=1):
+            legacy_status[bill_id] = legacy_job_status(create_tasks(bill_id, combinations))
+
+        jobs = [dts_job(bill_id) for bill_id in legacy_status]
+        job_status = batch_dts_job_cnt_and_status(jobs)
+        assert len(job_status) == len(jobs)
+        for job in jobs:
+            assert (
+                job_status[(job.bill_id, job.src_cluster, job.dst_cluster)] == legacy_status[job.bill_id]
+            ), job_combinations[job.bill_id - 1]
+        assert {status.get("status") for status in job_status.values()} >= {
+            DtsSyncStatus.PENDING_EXECUTION.value,
+            DtsSyncStatus.TRANSFER_COMPLETED.value,
+            DtsSyncStatus.TRANSFER_TERMINATED.value,
+            DtsSyncStatus.FULL_TRANSFER_FAILED.value,
+            DtsSyncStatus.INCREMENTAL_SYNC_FAILED.value,
+            DtsSyncStatus.IN_FULL_TRANSFER.value,
+            DtsSyncStatus.IN_INCREMENTAL_SYNC.value,
+        }
+
+    def test_job_without_tasks(self):
+        job = dts_job(1)
+        assert batch_dts_job_cnt_and_status([job])[(1, job.src_cluster, job.dst_cluster)] == legacy_job_status([])
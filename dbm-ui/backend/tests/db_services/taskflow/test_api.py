@@ -14,6 +14,7 @@ from unittest.mock import patch
 
 import pytest
 from django.conf import settings
+from django.utils import timezone
 from rest_framework.permissions import AllowAny
 from rest_framework.test import APIClient
 
@@ -68,6 +69,31 @@ class TestTaskflowApi:
         url = f"/apis/taskflow/{self.root_id}/"
         data = client.get(url).data
         assert data["flow_info"]["root_id"] == self.root_id
+        assert "version" in data
+
+    @patch.object(TaskFlowViewSet, "permission_classes")
+    @patch.object(TaskFlowViewSet, "get_permissions", lambda x: [])
+    def test_taskflow_retrieve_diff(self, mocked_permission_classes, init_taskflow):
+        mocked_permission_classes.return_value = [AllowAny]
+
+        url = f"/apis/taskflow/{self.root_id}/"
+        data = client.get(url, data={"since": 0}).data
+        assert data["flow_info"]["root_id"] == self.root_id
+        assert data["version"] > 0
+        assert isinstance(data["activities"], dict)
+
+    @patch.object(TaskFlowViewSet, "permission_classes")
+    @patch.object(TaskFlowViewSet, "get_permissions", lambda x: [])
+    def test_taskflow_retrieve_not_modified(self, mocked_permission_classes, init_taskflow):
+        mocked_permission_classes.return_value = [AllowAny]
+
+        url = f"/apis/taskflow/{self.root_id}/"
+        etag = client.get(url)["ETag"]
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+        # 节点状态变化后，ETag 失效
+        FlowNode.objects.filter(root_id=self.root_id).update(status=StateType.RUNNING.value, updated_at=timezone.now())
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200
 
     @patch.object(TaskFlowViewSet, "permission_classes")
     @patch.object(TaskFlowViewSet, "get_permissions", lambda x: [])
@@ -22,6 +22,7 @@ from backend.db_package.constants import PackageType
 from backend.db_package.models import Package
 from backend.flow.engine.bamboo.scene.common.get_file_list import GetFileList
 from backend.flow.plugins.components.collections.common.base_service import BkJobService
+from backend.flow.utils.base.job_poller import JobStatusPoller
 from backend.flow.utils.mysql.mysql_context_dataclass import SingleApplyAutoContext
 from backend.tests.flow.components.collections.base import BaseComponentPatcher as Patcher
 from backend.tests.flow.components.collections.base import BaseComponentTest
@@ -102,7 +103,7 @@ class MySQLComponentBaseTest(BaseComponentTest):
     def to_mock_path_list(self) -> List[str]:
         """需要mock的文件路径列表，默认是component所在的文件路径"""
 
-        mock_path_list = [self.component_cls().__module__, BkJobService.__module__]
+        mock_path_list = [self.component_cls().__module__, BkJobService.__module__, JobStatusPoller.__module__]
         return mock_path_list
 
     def get_patchers(self) -> List[Patcher]:
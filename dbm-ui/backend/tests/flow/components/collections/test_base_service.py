@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import time
+
+import pytest
+from mock import MagicMock, patch
+from pipeline.core.data.base import DataObject
+
+from backend.flow.consts import (
+    GLOBAL_DATA_REF_KEY,
+    SCHEDULE_DEFAULT_CEILING,
+    SCHEDULE_INITIAL_INTERVAL,
+    SCHEDULE_MAX_CEILING,
+)
+from backend.flow.engine.exceptions import RootGlobalDataNotFound
+from backend.flow.plugins.components.collections.common.base_service import (
+    AdaptiveIntervalGenerator,
+    BaseService,
+    BkJobService,
+    load_root_global_data,
+)
+
+BASE_SERVICE_PATH = "backend.flow.plugins.components.collections.common.base_service"
+
+
+class TestAdaptiveIntervalGenerator:
+    def test_fast_polling_before_backoff(self):
+        interval = AdaptiveIntervalGenerator().for_node(start_time=time.time())
+        assert interval.next() == SCHEDULE_INITIAL_INTERVAL
+
+    def test_backoff_until_ceiling(self):
+        interval = AdaptiveIntervalGenerator(initial=5, ceiling=60, fast_duration=30, factor=2)
+        assert interval.for_node(start_time=time.time() - 31).next() == 10
+        assert interval.for_node(start_time=time.time() - 61).next() == 20
+        assert interval.for_node(start_time=time.time() - 3600).next() == 60
+
+    def test_expected_duration_hint(self):
+        interval = AdaptiveIntervalGenerator()
+        # 短任务退化为固定的快速轮询
+        short_interval = interval.for_node(start_time=time.time() - 3600, expected_duration=3)
+        assert short_interval.next() == SCHEDULE_INITIAL_INTERVAL
+        # 长任务放宽轮询上限，但不超过最大上限
+        long_interval = interval.for_node(start_time=time.time() - 6 * 3600, expected_duration=6 * 3600)
+        assert long_interval.next() == SCHEDULE_MAX_CEILING
+
+    def test_restart_keeps_ceiling(self):
+        interval = AdaptiveIntervalGenerator().for_node(start_time=time.time() - 6 * 3600, expected_duration=6 * 3600)
+        restarted = interval.restart(time.time())
+        assert restarted.next() == SCHEDULE_INITIAL_INTERVAL
+        assert restarted.ceiling == interval.ceiling == SCHEDULE_MAX_CEILING
+
+
+class TestAdaptiveIntervalProgress:
+    @staticmethod
+    def job_status(ip_status_list, finished=False):
+        return {
+            "result": True,
+            "data": {
+                "finished": finished,
+                "job_instance": {"status": 2},
+                "step_instance_list": [
+                    {
+                        "step_instance_id": 1,
+                        "status": 2,
+                        "step_ip_result_list": [
+                            {"ip": f"127.0.0.{idx}", "status": s} for idx, s in enumerate(ip_status_list)
+                        ],
+                    }
+                ],
+            },
+        }
+
+    def schedule(self, data, now, job_status) -> int:
+        """模拟一次轮询：每次轮询都是新的节点实例，返回节点下次轮询的间隔"""
+        service = BkJobService()
+        with patch(f"{BASE_SERVICE_PATH}.time.time", return_value=now), patch(
+            f"{BASE_SERVICE_PATH}.JobStatusPoller.get_status", return_value=job_status
+        ):
+            assert service.schedule(data, parent_data=None)
+            return service.interval.next()
+
+    def test_interval_progression(self):
+        data = DataObject(
+            inputs={"kwargs": {"node_name": "job", "bk_cloud_id": 0}, "global_data": {}},
+            outputs={"ext_result": {"result": True, "data": {"job_instance_id": 1}}, "exec_ips": ["127.0.0.1"]},
+        )
+        running = self.job_status([7, 7])
+        # 快速轮询阶段内使用初始间隔，之后没有进度变化时按指数退避
+        assert self.schedule(data, 1000, running) == SCHEDULE_INITIAL_INTERVAL
+        assert self.schedule(data, 1030, running) == SCHEDULE_INITIAL_INTERVAL
+        assert self.schedule(data, 1100, running) == 20
+        assert self.schedule(data, 1500, running) == SCHEDULE_DEFAULT_CEILING
+
+        # 有主机执行结束，重新开始快速轮询
+        partial_finished = self.job_status([7, 9])
+        assert self.schedule(data, 1600, partial_finished) == SCHEDULE_INITIAL_INTERVAL
+        assert data.get_one_of_outputs("schedule_start_time") == 1600
+        # 重新开始后没有新的进度，再次退避
+        assert self.schedule(data, 1700, partial_finished) == 20
+
+    def test_no_reset_on_first_observation(self):
+        data = DataObject(inputs={}, outputs={"schedule_start_time": 1000})
+        service = BkJobService()
+        service.interval = service.interval.for_node(start_time=1000)
+        service.refresh_adaptive_interval(data, [2])
+        assert data.get_one_of_outputs("schedule_start_time") == 1000
+        assert data.get_one_of_outputs("schedule_progress") == [2]
+
+
+class TestResolveGlobalData:
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        load_root_global_data.cache_clear()
+        yield
+        load_root_global_data.cache_clear()
+
+    @staticmethod
+    def mock_runtime(context_values):
+        runtime = MagicMock()
+        runtime.return_value.get_context_values.return_value = context_values
+        return patch("backend.flow.plugins.components.collections.common.base_service.BambooDjangoRuntime", runtime)
+
+    def test_merge_root_global_data(self):
+        root_data = {"uid": 1, "ticket_type": "MYSQL_HA_DISABLE", "cluster_ids": [1, 2]}
+        data = DataObject(inputs={"global_data": {GLOBAL_DATA_REF_KEY: "root", "cluster_ids": [2]}})
+        with self.mock_runtime([MagicMock(value=root_data)]):
+            BaseService.resolve_global_data(data)
+
+        assert data.get_one_of_inputs("global_data") == {
+            "uid": 1,
+            "ticket_type": "MYSQL_HA_DISABLE",
+            "cluster_ids": [2],
+        }
+        # 节点拿到的是副本，不会修改缓存的根流程参数
+        assert load_root_global_data("root")["cluster_ids"] == [1, 2]
+
+    def test_missing_root_context(self):
+        data = DataObject(inputs={"global_data": {GLOBAL_DATA_REF_KEY: "root"}})
+        with self.mock_runtime([]), pytest.raises(RootGlobalDataNotFound):
+            BaseService.resolve_global_data(data)
+        # 读取失败不缓存，根流程上下文就绪后可以正常读取
+        with self.mock_runtime([MagicMock(value={"uid": 1})]):
+            assert load_root_global_data("root") == {"uid": 1}
+
+    def test_not_shared_global_data(self):
+        data = DataObject(inputs={"global_data": {"uid": 1}})
+        BaseService.resolve_global_data(data)
+        assert data.get_one_of_inputs("global_data") == {"uid": 1}
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import pytest
+from pipeline.eri.models import State
+
+from backend.flow.consts import StateType
+from backend.flow.engine.bamboo.engine import BambooEngine
+
+pytestmark = pytest.mark.django_db
+ROOT_ID = "engine_test_root"
+
+
+def create_states(root_state, child_states):
+    states = [State(node_id=ROOT_ID, root_id=ROOT_ID, name=root_state, version="v")] if root_state else []
+    states.extend(
+        State(node_id=f"node{idx}", root_id=ROOT_ID, parent_id=ROOT_ID, name=state, version="v")
+        for idx, state in enumerate(child_states)
+    )
+    State.objects.bulk_create(states)
+
+
+class TestGetPipelineRootState:
+    @pytest.mark.parametrize(
+        "root_state, child_states, expected",
+        [
+            (None, [], None),
+            (StateType.RUNNING, [StateType.FINISHED, StateType.RUNNING], StateType.RUNNING),
+            # 根节点运行中时，以异常子节点的状态为准：失败 > 撤销 > 暂停
+            (StateType.RUNNING, [StateType.SUSPENDED, StateType.FAILED], StateType.FAILED),
+            (StateType.RUNNING, [StateType.SUSPENDED, StateType.REVOKED], StateType.REVOKED),
+            (StateType.RUNNING, [StateType.FINISHED, StateType.SUSPENDED], StateType.SUSPENDED),
+            # 根节点不处于运行中时，以根节点状态为准
+            (StateType.FINISHED, [StateType.FAILED], StateType.FINISHED),
+            (StateType.REVOKED, [StateType.RUNNING], StateType.REVOKED),
+        ],
+    )
+    def test_root_state(self, root_state, child_states, expected):
+        create_states(root_state, child_states)
+        assert BambooEngine(root_id=ROOT_ID).get_pipeline_root_state() == expected
+
+    def test_other_pipeline_not_affected(self, django_assert_num_queries):
+        create_states(StateType.RUNNING, [StateType.FINISHED])
+        State.objects.create(node_id="other_node", root_id="other_root", name=StateType.FAILED, version="v")
+        # 只查询一次State记录
+        with django_assert_num_queries(1):
+            assert BambooEngine(root_id=ROOT_ID).get_pipeline_root_state() == StateType.RUNNING
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import pytest
+from mock import MagicMock, patch
+
+from backend.flow.consts import FLOW_STATE_COALESCE_PENDING_KEY, StateType
+from backend.flow.signal import handlers
+from backend.flow.signal.handlers import (
+    evaluate_coalesced_flow_state,
+    get_flow_state_signal_stats,
+    post_set_state_signal_handler,
+)
+
+pytestmark = pytest.mark.django_db
+ROOT_ID = "signal_test_root"
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+class FakeRedis:
+    """仅实现状态信号合并用到的redis命令，过期时间只记录不生效"""
+
+    def __init__(self):
+        self.data = {}
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = str(value)
+        return True
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def getset(self, key, value):
+        old_value, self.data[key] = self.data.get(key), value
+        return old_value
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def expire(self, key, seconds):
+        return True
+
+    def ttl(self, key):
+        return 2
+
+    def hincrby(self, key, field, amount=1):
+        hash_data = self.data.setdefault(key, {})
+        hash_data[field] = str(int(hash_data.get(field, 0)) + amount)
+
+    def hgetall(self, key):
+        return self.data.get(key, {})
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class TestFlowStateCoalesce:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.redis = FakeRedis()
+        with patch.object(handlers, "RedisConn", self.redis), patch.object(
+            handlers.env, "FLOW_STATE_COALESCE_WINDOW", 2
+        ), patch.object(handlers, "evaluate_flow_tree_status") as evaluate, patch.object(
+            handlers.evaluate_coalesced_flow_state, "apply_async"
+        ) as apply_async:
+            self.evaluate, self.apply_async = evaluate, apply_async
+            yield
+
+    def signal(self, node_id, to_state):
+        post_set_state_signal_handler(sender=None, node_id=node_id, to_state=to_state, version="v1", root_id=ROOT_ID)
+
+    def test_repeated_transitions_coalesced(self):
+        for idx in range(5):
+            self.signal(f"node{idx}", StateType.RUNNING)
+            self.signal(f"node{idx}", StateType.FINISHED)
+
+        # 窗口内只有首个信号立即评估，其余信号合并为一次延时评估
+        self.evaluate.assert_called_once_with(ROOT_ID, StateType.RUNNING)
+        self.apply_async.assert_called_once_with(args=(ROOT_ID,), countdown=2)
+        pending_key = FLOW_STATE_COALESCE_PENDING_KEY.format(root_id=ROOT_ID)
+        assert self.redis.get(pending_key) == StateType.FINISHED
+
+        # 延时评估使用窗口内最新的节点状态，评估后清理待评估状态
+        evaluate_coalesced_flow_state(ROOT_ID)
+        self.evaluate.assert_called_with(ROOT_ID, StateType.FINISHED)
+        assert self.redis.get(pending_key) is None
+        evaluate_coalesced_flow_state(ROOT_ID)
+        assert self.evaluate.call_count == 2
+
+        stats = get_flow_state_signal_stats()
+        assert (stats["received"], stats["absorbed"]) == (10, 9)
+
+    def test_root_and_failed_state_not_coalesced(self):
+        self.signal("node0", StateType.RUNNING)
+        self.signal("node1", StateType.FAILED)
+        self.signal(ROOT_ID, StateType.FINISHED)
+
+        assert [call.args for call in self.evaluate.call_args_list] == [
+            (ROOT_ID, StateType.RUNNING),
+            (ROOT_ID, StateType.FAILED),
+            (ROOT_ID, StateType.FINISHED),
+        ]
+        self.apply_async.assert_not_called()
+
+    def test_coalesce_disabled(self):
+        with patch.object(handlers.env, "FLOW_STATE_COALESCE_WINDOW", 0):
+            self.signal("node0", StateType.RUNNING)
+            self.signal("node0", StateType.FINISHED)
+        assert self.evaluate.call_count == 2
+        assert get_flow_state_signal_stats() == {"received": 2, "absorbed": 0, "evaluated": 0}
+
+
+def test_report_flow_state_signal_stats():
+    from backend.db_periodic_task.local_tasks import ticket
+
+    with patch.object(ticket, "get_flow_state_signal_stats", return_value={"received": 3}), patch.object(
+        ticket, "logger", MagicMock()
+    ) as mock_logger:
+        ticket.report_flow_state_signal_stats()
+    assert mock_logger.info.call_args.args[-1] == {"received": 3}
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import pytest
+from mock import MagicMock, patch
+
+from backend.flow.utils.base.flow_cache import FlowScopedCache
+
+ROOT_ID = "flow_cache_test_root"
+
+
+class FakeRedis:
+    """仅实现FlowScopedCache用到的redis命令"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def incr(self, key):
+        self.data[key] = int(self.data.get(key) or 0) + 1
+        return self.data[key]
+
+    def hget(self, key, field):
+        return self.data.get(key, {}).get(field)
+
+    def hset(self, key, mapping):
+        self.data.setdefault(key, {}).update(mapping)
+
+    def hdel(self, key, *fields):
+        for field in fields:
+            self.data.get(key, {}).pop(field, None)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def expire(self, key, seconds):
+        return True
+
+    def pipeline(self, transaction=True):
+        pipeline = MagicMock()
+        pipeline.hset.side_effect = self.hset
+        pipeline.expire.side_effect = self.expire
+        return pipeline
+
+
+@pytest.fixture
+def fake_redis():
+    redis = FakeRedis()
+    with patch("backend.flow.utils.base.flow_cache.RedisConn", redis):
+        yield redis
+
+
+class TestFlowScopedCache:
+    def test_encrypt_round_trip(self, fake_redis):
+        account = {"user": "repl", "pwd": "plain-secret"}
+        FlowScopedCache.set_many(ROOT_ID, {"mysql_account": account})
+
+        stored = fake_redis.hget(FlowScopedCache._cache_key(ROOT_ID), "mysql_account")
+        assert "plain-secret" not in stored
+        assert FlowScopedCache.get(ROOT_ID, "mysql_account") == account
+
+    def test_get_or_set_query_once(self, fake_redis):
+        func = MagicMock(return_value={"pwd": "xxx"})
+        assert FlowScopedCache.get_or_set(ROOT_ID, "proxy_account", func) == {"pwd": "xxx"}
+        assert FlowScopedCache.get_or_set(ROOT_ID, "proxy_account", func) == {"pwd": "xxx"}
+        assert func.call_count == 1
+
+    def test_without_root_id_bypass_cache(self, fake_redis):
+        func = MagicMock(return_value={"pwd": "xxx"})
+        FlowScopedCache.get_or_set(None, "proxy_account", func)
+        FlowScopedCache.get_or_set(None, "proxy_account", func)
+        assert func.call_count == 2
+        assert not fake_redis.data
+
+    def test_invalidate_all_bump_generation(self, fake_redis):
+        FlowScopedCache.set_many(ROOT_ID, {"proxy_account": {"pwd": "old"}})
+        old_key = FlowScopedCache._cache_key(ROOT_ID)
+
+        FlowScopedCache.invalidate_all()
+
+        assert FlowScopedCache._cache_key(ROOT_ID) != old_key
+        assert FlowScopedCache.get(ROOT_ID, "proxy_account") is None
+        func = MagicMock(return_value={"pwd": "new"})
+        assert FlowScopedCache.get_or_set(ROOT_ID, "proxy_account", func) == {"pwd": "new"}
+        func.assert_called_once()
+
+    def test_invalidate_fields(self, fake_redis):
+        FlowScopedCache.set_many(ROOT_ID, {"proxy_account": {"pwd": "a"}, "mysql_account": {"pwd": "b"}})
+        FlowScopedCache.invalidate(ROOT_ID, "proxy_account")
+        assert FlowScopedCache.get(ROOT_ID, "proxy_account") is None
+        assert FlowScopedCache.get(ROOT_ID, "mysql_account") == {"pwd": "b"}
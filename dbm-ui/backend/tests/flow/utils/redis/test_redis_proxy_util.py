@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import pytest
+from mock import patch
+
+from backend.db_meta.enums import ClusterType, InstanceRole, InstanceStatus
+from backend.db_meta.models import Cluster, StorageInstanceTuple
+from backend.flow.utils.redis import redis_proxy_util
+from backend.tests.db_periodic_task.local_tasks.db_meta.db_meta_check.test_engine import (
+    add_proxy,
+    add_storage,
+    create_cluster,
+)
+
+pytestmark = pytest.mark.django_db
+
+
+def create_redis_cluster(domain: str, bk_cloud_id: int, ip: str) -> Cluster:
+    """创建一个proxy + 一对主从的redis集群，实例均为running"""
+    cluster = create_cluster(domain, ClusterType.TendisTwemproxyRedisInstance.value)
+    Cluster.objects.filter(id=cluster.id).update(bk_cloud_id=bk_cloud_id)
+    add_proxy(cluster, ip, 50000)
+    master = add_storage(cluster, ip, 30000, InstanceRole.REDIS_MASTER.value)
+    slave = add_storage(cluster, ip, 30001, InstanceRole.REDIS_SLAVE.value)
+    StorageInstanceTuple.objects.create(ejector=master, receiver=slave)
+    cluster.proxyinstance_set.update(status=InstanceStatus.RUNNING)
+    cluster.storageinstance_set.update(status=InstanceStatus.RUNNING)
+    return cluster
+
+
+class TestAsyncMultiClustersPrecheck:
+    def setup_method(self):
+        # 集群域名 -> 密码分组，同一分组的集群密码相同
+        self.password_groups = {"a.redis.db": "A", "b.redis.db": "A", "c.redis.db": "A", "d.redis.db": "B"}
+        self.cluster_a = create_redis_cluster("a.redis.db", 0, "127.0.2.1")
+        self.cluster_b = create_redis_cluster("b.redis.db", 0, "127.0.2.2")
+        self.cluster_c = create_redis_cluster("c.redis.db", 1, "127.0.2.3")
+        self.cluster_d = create_redis_cluster("d.redis.db", 0, "127.0.2.4")
+        self.cluster_ids = [self.cluster_a.id, self.cluster_b.id, self.cluster_c.id, self.cluster_d.id]
+        self.rpc_calls = []
+
+    def get_password(self, cluster):
+        group = self.password_groups[cluster.immute_domain]
+        return {"redis_password": f"redis-{group}", "redis_proxy_password": f"proxy-{group}"}
+
+    def redis_rpc(self, params):
+        self.rpc_calls.append((params["bk_cloud_id"], params["password"], sorted(params["addresses"])))
+        return [{"address": addr, "result": "PONG"} for addr in params["addresses"]]
+
+    def precheck(self, redis_rpc=None):
+        # 线程池内的数据库连接与测试事务隔离，这里顺序执行
+        with patch.object(
+            redis_proxy_util, "cluster_fan_out", side_effect=lambda func, items: [func(item) for item in items]
+        ), patch.object(
+            redis_proxy_util.PayloadHandler, "redis_get_cluster_password", side_effect=self.get_password
+        ), patch.object(
+            redis_proxy_util.DRSApi, "redis_rpc", side_effect=redis_rpc or self.redis_rpc
+        ):
+            redis_proxy_util.async_multi_clusters_precheck(self.cluster_ids)
+
+    def test_group_by_cloud_and_password(self):
+        self.precheck()
+
+        assert sorted(self.rpc_calls) == [
+            (0, "proxy-A", ["127.0.2.1:50000", "127.0.2.2:50000"]),
+            (0, "proxy-B", ["127.0.2.4:50000"]),
+            (0, "redis-A", ["127.0.2.1:30000", "127.0.2.1:30001", "127.0.2.2:30000", "127.0.2.2:30001"]),
+            (0, "redis-B", ["127.0.2.4:30000", "127.0.2.4:30001"]),
+            (1, "proxy-A", ["127.0.2.3:50000"]),
+            (1, "redis-A", ["127.0.2.3:30000", "127.0.2.3:30001"]),
+        ]
+
+    @pytest.mark.parametrize("chunk_size,proxy_chunks", [(1, 2), (2, 1), (3, 1)])
+    def test_chunk_keeps_cluster_addresses_together(self, chunk_size, proxy_chunks):
+        with patch.object(redis_proxy_util, "REDIS_PRECHECK_PING_CHUNK_SIZE", chunk_size):
+            self.precheck()
+
+        group_calls = {}
+        for bk_cloud_id, password, addrs in self.rpc_calls:
+            group_calls.setdefault((bk_cloud_id, password), []).append(addrs)
+        # 单个集群的实例数超过分批大小时也不拆分，a、b两个集群的redis实例各自成批
+        assert sorted(group_calls[(0, "redis-A")]) == [
+            ["127.0.2.1:30000", "127.0.2.1:30001"],
+            ["127.0.2.2:30000", "127.0.2.2:30001"],
+        ]
+        assert len(group_calls[(0, "proxy-A")]) == proxy_chunks
+        assert sorted(addr for addrs in group_calls[(0, "proxy-A")] for addr in addrs) == [
+            "127.0.2.1:50000",
+            "127.0.2.2:50000",
+        ]
+
+    def test_chunk_fallback_per_cluster(self):
+        def redis_rpc(params):
+            self.redis_rpc(params)
+            if "127.0.2.2:50000" in params["addresses"]:
+                raise Exception("ping failed")
+            return []
+
+        with pytest.raises(Exception) as err:
+            self.precheck(redis_rpc)
+
+        # 合并请求失败后，批次内的集群逐个重试，报错定位到具体集群
+        assert "b.redis.db" in str(err.value)
+        assert (0, "proxy-A", ["127.0.2.2:50000"]) in self.rpc_calls
+
+    def test_chunk_fallback_all_clusters_pass(self):
+        failed_chunks = []
+
+        def redis_rpc(params):
+            self.redis_rpc(params)
+            # 仅合并请求失败，逐个集群重试成功
+            if len(params["addresses"]) > 1 and params["password"] == "proxy-A":
+                failed_chunks.append(params["addresses"])
+                raise Exception("ping failed")
+            return []
+
+        self.precheck(redis_rpc)
+
+        assert len(failed_chunks) == 1
+        assert (0, "proxy-A", ["127.0.2.1:50000"]) in self.rpc_calls
+        assert (0, "proxy-A", ["127.0.2.2:50000"]) in self.rpc_calls
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import pytest
+from django.core.cache.backends.locmem import LocMemCache
+from iam import IAM, Resource
+from mock import MagicMock, patch
+
+from backend.iam_app.dataclass.actions import ActionEnum
+from backend.iam_app.dataclass.resources import ResourceEnum
+from backend.iam_app.handlers import permission
+from backend.iam_app.handlers.permission import Permission, PolicyCacheStats
+
+pytestmark = pytest.mark.django_db
+
+# 只允许访问业务1和业务2
+BIZ_POLICY = {"op": "in", "field": "biz.id", "value": ["1", "2"]}
+
+
+@pytest.fixture
+def iam_client():
+    client = IAM("bk_dbm", "secret", bk_apigateway_url="http://iam.example.com")
+    local_cache = LocMemCache("iam-policy-test", {})
+    with patch.object(permission.env, "BK_IAM_SKIP", False), patch.object(
+        Permission, "get_iam_client", return_value=client
+    ), patch.object(permission, "cache", local_cache), patch.object(PolicyCacheStats, "flush"), patch.object(
+        client, "_do_policy_query", return_value=BIZ_POLICY
+    ):
+        yield client
+
+
+def biz_resources(*bk_biz_ids):
+    return [[Resource("bk_cmdb", ResourceEnum.BUSINESS.id, str(bk_biz_id), {})] for bk_biz_id in bk_biz_ids]
+
+
+class TestPermission:
+    def test_local_batch_is_allowed(self, iam_client):
+        client = Permission(username="normal_user")
+        with patch.object(client, "remote_batch_is_allowed") as mock_remote:
+            result = client.batch_is_allowed([ActionEnum.DB_MANAGE], biz_resources(1, 3))
+            # 再次鉴权命中策略缓存，不再请求权限中心
+            client.batch_is_allowed([ActionEnum.DB_MANAGE], biz_resources(2))
+
+        assert result == {"1": {ActionEnum.DB_MANAGE.id: True}, "3": {ActionEnum.DB_MANAGE.id: False}}
+        assert iam_client._do_policy_query.call_count == 1
+        mock_remote.assert_not_called()
+
+    def test_local_eval_fallback(self, iam_client):
+        iam_client._do_policy_query.return_value = {"op": "unknown", "field": "biz.id", "value": "1"}
+        client = Permission(username="normal_user")
+        remote_result = {"1": {ActionEnum.DB_MANAGE.id: True}}
+        with patch.object(client, "remote_batch_is_allowed", return_value=remote_result) as mock_remote:
+            assert client.batch_is_allowed([ActionEnum.DB_MANAGE], biz_resources(1)) == remote_result
+        mock_remote.assert_called_once()
+
+    def test_skip_iam_use_remote(self, iam_client):
+        client = Permission(username="normal_user")
+        remote_result = {"1": {ActionEnum.DB_MANAGE.id: True}}
+        with patch.object(permission.env, "BK_IAM_SKIP", True), patch.object(
+            client, "remote_batch_is_allowed", return_value=remote_result
+        ) as mock_remote, patch.object(client, "local_batch_is_allowed") as mock_local:
+            assert client.batch_is_allowed([ActionEnum.DB_MANAGE], biz_resources(1)) == remote_result
+        mock_remote.assert_called_once()
+        mock_local.assert_not_called()
+
+    def test_grant_creator_actions_clear_policy_cache(self, iam_client):
+        client = Permission(username="normal_user")
+        client.get_action_policies(ActionEnum.DB_MANAGE)
+        client.get_action_policies(ActionEnum.DB_MANAGE)
+        assert iam_client._do_policy_query.call_count == 1
+
+        # 授权后创建者的策略缓存失效，下次鉴权重新获取策略
+        iam_client.grant_resource_creator_actions = MagicMock(return_value=[])
+        client.grant_creator_actions(Resource("bk_dbm", ResourceEnum.MYSQL.id, "1", {"name": "db"}), "normal_user")
+        client.get_action_policies(ActionEnum.DB_MANAGE)
+        assert iam_client._do_policy_query.call_count == 2
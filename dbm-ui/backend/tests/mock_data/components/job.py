@@ -56,3 +56,15 @@ class JobApiMock(object):
             "step_instance_id": STEP_INSTANCE_ID,
         }
         return {**cls.base_info, "data": data}
+
+    @classmethod
+    def batch_get_job_instance_ip_log(cls, payload, raw=True):
+        data = {
+            "job_instance_id": payload["job_instance_id"],
+            "step_instance_id": payload["step_instance_id"],
+            "log_type": 1,
+            "script_task_logs": [
+                {"bk_cloud_id": ip["bk_cloud_id"], "ip": ip["ip"], "log_content": ""} for ip in payload["ip_list"]
+            ],
+        }
+        return {**cls.base_info, "data": data}
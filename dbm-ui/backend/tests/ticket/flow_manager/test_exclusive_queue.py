@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import pytest
+from mock import patch
+
+from backend.ticket.constants import FlowErrCode, FlowType, TicketFlowStatus
+from backend.ticket.flow_manager import exclusive_queue
+from backend.ticket.flow_manager.exclusive_queue import ExclusiveWaitQueue
+from backend.ticket.models import Flow, Ticket
+from backend.ticket.tasks.ticket_tasks import TicketTask
+
+pytestmark = pytest.mark.django_db
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+class FakeRedis:
+    """仅实现ExclusiveWaitQueue用到的redis命令，成员与redis一样以字符串返回"""
+
+    def __init__(self):
+        self.data = {}
+
+    def zadd(self, key, mapping, nx=False):
+        zset = self.data.setdefault(key, {})
+        for member, score in mapping.items():
+            if not (nx and str(member) in zset):
+                zset[str(member)] = score
+
+    def zscore(self, key, member):
+        return self.data.get(key, {}).get(str(member))
+
+    def zrem(self, key, *members):
+        zset = self.data.get(key, {})
+        for member in members:
+            zset.pop(str(member), None)
+        if not zset:
+            self.data.pop(key, None)
+
+    def zrange(self, key, start, end, withscores=False):
+        members = sorted(self.data.get(key, {}).items(), key=lambda item: (item[1], item[0]))
+        members = members[start:] if end == -1 else members[start : end + 1]
+        return members if withscores else [member for member, __ in members]
+
+    def zcard(self, key):
+        return len(self.data.get(key, {}))
+
+    def exists(self, key):
+        return int(key in self.data)
+
+    def hset(self, key, field, value):
+        self.data.setdefault(key, {})[str(field)] = value
+
+    def hmget(self, key, fields):
+        return [self.data.get(key, {}).get(str(field)) for field in fields]
+
+    def hdel(self, key, *fields):
+        for field in fields:
+            self.data.get(key, {}).pop(str(field), None)
+
+    def hincrby(self, key, field, amount=1):
+        hash_data = self.data.setdefault(key, {})
+        hash_data[field] = str(int(hash_data.get(field, 0)) + amount)
+
+    def hincrbyfloat(self, key, field, amount):
+        hash_data = self.data.setdefault(key, {})
+        hash_data[field] = str(float(hash_data.get(field, 0)) + amount)
+
+    def hgetall(self, key):
+        return self.data.get(key, {})
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+@pytest.fixture
+def fake_redis():
+    redis = FakeRedis()
+    with patch.object(exclusive_queue, "RedisConn", redis):
+        yield redis
+
+
+def enqueue_at(timestamp, flow_id, cluster_ids):
+    with patch.object(exclusive_queue.time, "time", return_value=timestamp):
+        ExclusiveWaitQueue.enqueue(flow_id, cluster_ids)
+
+
+class TestExclusiveWaitQueue:
+    def test_wake_order_fifo(self, fake_redis):
+        enqueue_at(100, 3, [1])
+        enqueue_at(101, 1, [1, 2])
+        enqueue_at(102, 2, [2])
+        # 重复入队保留首次入队时间
+        enqueue_at(200, 3, [1])
+
+        assert ExclusiveWaitQueue.has_waiters([1])
+        assert not ExclusiveWaitQueue.has_waiters([3])
+        # 多个集群的等待队列合并去重，按入队时间排序
+        assert ExclusiveWaitQueue.get_waiting_flow_ids([1, 2]) == [3, 1, 2]
+        assert ExclusiveWaitQueue.get_waiting_flow_ids([2]) == [1, 2]
+        assert ExclusiveWaitQueue.get_all_waiting_flow_ids() == [3, 1, 2]
+
+    def test_dequeue_and_stats(self, fake_redis):
+        enqueue_at(100, 1, [1, 2])
+        enqueue_at(110, 2, [2])
+
+        with patch.object(exclusive_queue.time, "time", return_value=130):
+            ExclusiveWaitQueue.get_waiting_flow_ids([2])
+            ExclusiveWaitQueue.dequeue([1, 99])
+            stats = ExclusiveWaitQueue.stats()
+
+        # 出队后从所有集群的等待队列中移除，不存在的flow不计入等待时间
+        assert not ExclusiveWaitQueue.has_waiters([1])
+        assert ExclusiveWaitQueue.get_waiting_flow_ids([2]) == [2]
+        assert stats == {"depth": 1, "max_wait_seconds": 20, "wakeups": 1, "dequeued": 1, "avg_wait_seconds": 30}
+
+    def test_wake_exclusive_inner_flow(self, fake_redis):
+        ticket = Ticket.objects.create(bk_biz_id=1, creator="admin", updater="admin")
+        Flow.objects.bulk_create(
+            [
+                Flow(
+                    id=flow_id,
+                    ticket=ticket,
+                    flow_type=FlowType.INNER_FLOW,
+                    status=TicketFlowStatus.FAILED,
+                    err_code=err_code,
+                )
+                for flow_id, err_code in [
+                    (1, FlowErrCode.AUTO_EXCLUSIVE_ERROR),
+                    (2, FlowErrCode.AUTO_EXCLUSIVE_ERROR),
+                    (3, FlowErrCode.GENERAL_ERROR),
+                ]
+            ]
+        )
+        enqueue_at(100, 2, [1])
+        enqueue_at(101, 3, [1])
+        enqueue_at(102, 1, [1])
+
+        retried = []
+
+        def retry(inner_flow):
+            retried.append(inner_flow.flow_obj.id)
+            # flow 2 仍然互斥，flow 1 重试成功
+            if inner_flow.flow_obj.id == 1:
+                inner_flow.flow_obj.err_code = None
+
+        with patch("backend.ticket.tasks.ticket_tasks.InnerFlow.retry", autospec=True, side_effect=retry):
+            TicketTask.wake_exclusive_inner_flow([1])
+
+        # 按入队顺序重试，不再互斥等待的flow出队，仍然互斥的flow保留原入队时间
+        assert retried == [2, 1]
+        assert ExclusiveWaitQueue.get_all_waiting_flow_ids() == [2]
+        assert fake_redis.zscore(ExclusiveWaitQueue._cluster_queue_key(1), 2) == 100
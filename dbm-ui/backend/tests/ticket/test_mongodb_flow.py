@@ -13,7 +13,6 @@ import logging
 from unittest.mock import PropertyMock, patch
 
 import pytest
-from bamboo_engine.api import EngineAPIResult
 from bamboo_engine.states import StateType
 from django.conf import settings
 from pipeline.eri.signals import post_set_state
@@ -242,7 +241,7 @@ class TestMangodbFlow:
 
     @pytest.mark.skip()
     @patch.object(TicketViewSet, "permission_classes")
-    @patch.object(BambooEngine, "get_pipeline_states")
+    @patch.object(BambooEngine, "get_pipeline_root_state")
     @patch.object(InnerFlow, "_run")
     @patch.object(PauseFlow, "status", new_callable=PropertyMock)
     @patch.object(TicketViewSet, "get_permissions", lambda x: [])
@@ -254,7 +253,7 @@ class TestMangodbFlow:
         self,
         mock_pause_status,
         mocked__run,
-        mocked_pipeline_states,
+        mocked_pipeline_root_state,
         mocked_permission_classes,
         query_fixture,
         db,
@@ -290,15 +289,7 @@ class TestMangodbFlow:
         client.post(f"/apis/tickets/{current_flow.ticket_id}/process_todo/", data=process_todo_data)
         current_flow = Flow.objects.filter(ticket=current_flow.ticket, flow_type=FlowType.INNER_FLOW).first()
 
-        mocked_pipeline_states.return_value = EngineAPIResult(
-            **{
-                "result": True,
-                "message": "success",
-                "exc": None,
-                "data": {current_flow.flow_obj_id: {"state": StateType.FINISHED.value}},
-                "exc_trace": None,
-            }
-        )
+        mocked_pipeline_root_state.return_value = StateType.FINISHED.value
 
         flow_tree_data = {
             "bk_biz_id": BK_BIZ_ID,
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import pytest
+from mock import patch
+
+from backend.ticket.constants import FlowType, TicketFlowStatus
+from backend.ticket.models import ClusterOperateRecord, Flow, Ticket
+from backend.ticket.signals import wake_exclusive_waiting_flows
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def inner_flow():
+    ticket = Ticket.objects.create(bk_biz_id=1, creator="admin", updater="admin")
+    flow = Flow(ticket=ticket, flow_type=FlowType.INNER_FLOW, status=TicketFlowStatus.RUNNING)
+    Flow.objects.bulk_create([flow])
+    flow = Flow.objects.get(ticket=ticket)
+    ClusterOperateRecord.objects.bulk_create([ClusterOperateRecord(cluster_id=1, flow=flow, ticket=ticket)])
+    return flow
+
+
+class TestWakeExclusiveWaitingFlows:
+    @pytest.fixture(autouse=True)
+    def mock_wake(self):
+        with patch("backend.ticket.signals.ExclusiveWaitQueue.has_waiters", return_value=True), patch(
+            "backend.ticket.tasks.ticket_tasks.wake_exclusive_inner_flow.apply_async"
+        ) as apply_async:
+            self.apply_async = apply_async
+            yield
+
+    @staticmethod
+    def post_save(flow, update_fields=None):
+        wake_exclusive_waiting_flows(sender=Flow, instance=flow, created=False, update_fields=update_fields)
+
+    def test_wake_on_terminal_status_change(self, inner_flow):
+        inner_flow.status = TicketFlowStatus.SUCCEEDED
+        self.post_save(inner_flow, update_fields=["status", "update_at"])
+        self.apply_async.assert_called_once_with(args=([1],))
+
+        # 状态未变更的再次保存不重复唤醒
+        self.post_save(inner_flow, update_fields=["status", "update_at"])
+        self.post_save(inner_flow)
+        assert self.apply_async.call_count == 1
+
+    def test_full_save_with_changed_status(self, inner_flow):
+        inner_flow.status = TicketFlowStatus.TERMINATED
+        self.post_save(inner_flow)
+        self.apply_async.assert_called_once()
+
+    @pytest.mark.parametrize(
+        "status, update_fields",
+        [
+            # 非结束态
+            (TicketFlowStatus.RUNNING, ["status"]),
+            (TicketFlowStatus.PENDING, ["status"]),
+            # 未保存状态字段
+            (TicketFlowStatus.SUCCEEDED, ["details", "update_at"]),
+        ],
+    )
+    def test_skip_without_terminal_status_change(self, inner_flow, status, update_fields):
+        inner_flow.status = status
+        self.post_save(inner_flow, update_fields=update_fields)
+        self.apply_async.assert_not_called()
+
+    def test_skip_loaded_in_terminal_status(self, inner_flow):
+        Flow.objects.filter(id=inner_flow.id).update(status=TicketFlowStatus.FAILED)
+        flow = Flow.objects.get(id=inner_flow.id)
+        flow.err_msg = "error"
+        self.post_save(flow)
+        self.apply_async.assert_not_called()
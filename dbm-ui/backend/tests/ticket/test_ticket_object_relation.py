@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import pytest
+
+from backend.db_meta.enums import ClusterType
+from backend.db_meta.models import Cluster
+from backend.ticket.constants import TicketRelatedObjectType
+from backend.ticket.filters import TicketListFilter
+from backend.ticket.handler import TicketHandler
+from backend.ticket.models import Ticket, TicketObjectRelation
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def tickets():
+    # 集群1的域名在details中已补充，集群2需要从集群表中补充
+    cluster = Cluster.objects.create(
+        name="relation", cluster_type=ClusterType.TenDBHA, immute_domain="relation2.db", bk_biz_id=1
+    )
+    details = {
+        "cluster_ids": [1, cluster.id],
+        "clusters": {"1": {"immute_domain": "relation1.db"}},
+        "infos": [{"instance_id": 10}, {"instance_id": "127.0.0.1:20000"}],
+        "instances": {"10": {"instance": "127.0.0.1:10000"}},
+    }
+    ticket = Ticket.objects.create(bk_biz_id=1, details=details)
+    other = Ticket.objects.create(bk_biz_id=1, details={"cluster_id": 1, "clusters": details["clusters"]})
+    return ticket, other, cluster
+
+
+class TestTicketObjectRelation:
+    def test_sync_related_objects(self, tickets):
+        ticket, other, cluster = tickets
+        TicketHandler.sync_related_objects([ticket, other])
+        # 重复同步时先清理旧的关联关系，不会产生重复数据
+        TicketHandler.sync_related_objects([ticket])
+
+        relations = TicketObjectRelation.objects.filter(ticket=ticket)
+        assert set(relations.values_list("object_type", "object_id", "display_name")) == {
+            (TicketRelatedObjectType.CLUSTER, 1, "relation1.db"),
+            (TicketRelatedObjectType.CLUSTER, cluster.id, "relation2.db"),
+            # 无法转换为ID的实例被忽略
+            (TicketRelatedObjectType.INSTANCE, 10, "127.0.0.1:10000"),
+        }
+        assert TicketObjectRelation.objects.filter(ticket=other).count() == 1
+
+    @pytest.mark.parametrize(
+        "value, expected",
+        [
+            ("relation1", {"ticket", "other"}),
+            ("RELATION2.db", {"ticket"}),
+            ("lation", {"ticket", "other"}),
+            ("127.0.0.1", set()),
+        ],
+    )
+    def test_filter_cluster(self, tickets, value, expected):
+        ticket, other, _ = tickets
+        TicketHandler.sync_related_objects([ticket, other])
+
+        ticket_ids = TicketListFilter(data={"cluster": value}, queryset=Ticket.objects.all()).qs.values_list(
+            "id", flat=True
+        )
+        assert set(ticket_ids) == {{"ticket": ticket.id, "other": other.id}[name] for name in expected}
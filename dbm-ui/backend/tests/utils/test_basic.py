@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import pytest
+
+from backend.utils.basic import chunk_iterable, chunk_lists
+
+
+class TestChunkIterable:
+    @pytest.mark.parametrize("length, n", [(0, 3), (6, 3), (7, 3), (2, 3), (5, 1)])
+    def test_same_as_chunk_lists(self, length, n):
+        items = list(range(length))
+        assert list(chunk_iterable(iter(items), n)) == list(chunk_lists(items, n))
+
+    def test_empty(self):
+        assert list(chunk_iterable([], 3)) == []
+
+    def test_exact_multiple(self):
+        assert list(chunk_iterable(range(6), 3)) == [[0, 1, 2], [3, 4, 5]]
+
+    def test_consume_lazily(self):
+        consumed = []
+
+        def generate():
+            for i in range(10):
+                consumed.append(i)
+                yield i
+
+        chunks = chunk_iterable(generate(), 4)
+        assert consumed == []
+        assert next(chunks) == [0, 1, 2, 3]
+        # 只读取当前批次需要的元素
+        assert consumed == [0, 1, 2, 3]
+        assert list(chunks) == [[4, 5, 6, 7], [8, 9]]
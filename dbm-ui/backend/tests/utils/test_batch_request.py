@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import pytest
+
+from backend.utils.batch_request import request_fan_out
+
+
+class TestRequestFanOut:
+    def test_bounded_and_in_order(self):
+        running, peak, lock = [0], [0], threading.Lock()
+
+        def _task(item):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+            return item * 2
+
+        assert request_fan_out(_task, range(10), max_workers=3) == [i * 2 for i in range(10)]
+        assert peak[0] <= 3
+
+    def test_raise_exception(self):
+        def _task(item):
+            if item == 2:
+                raise ValueError(item)
+            return item
+
+        with pytest.raises(ValueError):
+            request_fan_out(_task, range(5), max_workers=2)
+
+    def test_task_timeout(self):
+        with pytest.raises(FutureTimeoutError):
+            request_fan_out(lambda item: time.sleep(item), [0, 2], max_workers=2, timeout=0.5)
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from io import BytesIO
+
+from backend.utils.excel import ExcelHandler
+
+HEADERS = [{"id": "ip", "name": "IP"}, {"id": "role", "name": "角色"}, {"id": "extra", "name": "备注"}]
+
+
+class TestExcelHandler:
+    def test_stream_response(self):
+        rows = ({"ip": f"127.0.0.{i}", "role": "backend_master\nbackend_slave"} for i in range(20))
+        wb = ExcelHandler.serialize_stream(rows, headers=HEADERS, sample_size=5)
+        response = ExcelHandler.stream_response(wb, "test.xlsx", chunk_size=1024)
+
+        assert response["Content-Disposition"] == "attachment;filename=test.xlsx"
+        data_list = ExcelHandler.paser(BytesIO(b"".join(response.streaming_content)))
+        # 采样之外的行同样写入
+        assert len(data_list) == 20
+        assert data_list[-1]["IP"] == "127.0.0.19"
+        assert data_list[-1]["角色"] == "backend_master\nbackend_slave"
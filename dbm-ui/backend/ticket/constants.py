@@ -95,6 +95,14 @@ class TicketFlowStatus(str, StructuredEnum):
 
 
 FLOW_FINISHED_STATUS = [TicketFlowStatus.SKIPPED, TicketStatus.SUCCEEDED]
+# flow的结束态，inner flow进入结束态后释放集群操作记录
+FLOW_TERMINAL_STATUS = [
+    TicketFlowStatus.SUCCEEDED,
+    TicketFlowStatus.FAILED,
+    TicketFlowStatus.TERMINATED,
+    TicketFlowStatus.REVOKED,
+    TicketFlowStatus.SKIPPED,
+]
 FLOW_NOT_EXECUTE_STATUS = [TicketFlowStatus.SKIPPED, TicketStatus.PENDING]
 
 BAMBOO_STATE__TICKET_STATE_MAP = {
@@ -110,6 +118,15 @@ BAMBOO_STATE__TICKET_STATE_MAP = {
 
 EXCLUSIVE_TICKET_EXCEL_PATH = "backend/ticket/exclusive_ticket.xlsx"
 
+# 执行互斥等待队列：集群维度的等待队列key(有序集合，score为入队时间)，全局等待flow集合key，等待flow关联的集群key
+EXCLUSIVE_WAIT_CLUSTER_QUEUE_KEY = "ticket_exclusive_wait_cluster_{cluster_id}"
+EXCLUSIVE_WAIT_FLOWS_KEY = "ticket_exclusive_wait_flows"
+EXCLUSIVE_WAIT_FLOW_CLUSTERS_KEY = "ticket_exclusive_wait_flow_clusters"
+# 执行互斥等待统计key(唤醒次数，出队数，累计等待时间)
+EXCLUSIVE_WAIT_STATS_KEY = "ticket_exclusive_wait_stats"
+# 互斥等待flow的兜底重试周期(秒)，正常情况下由集群操作释放事件唤醒
+EXCLUSIVE_WAIT_SWEEP_INTERVAL = 60
+
 
 class TicketEnumField(EnumField):
     """ticket专属枚举类，目前用于自动注册iam"""
@@ -530,6 +547,13 @@ class FlowRetryType(str, StructuredEnum):
     MANUAL_RETRY = EnumField("manual_retry", _("手动重试"))
 
 
+class TicketRelatedObjectType(str, StructuredEnum):
+    """单据关联对象类型"""
+
+    CLUSTER = EnumField("cluster", _("集群"))
+    INSTANCE = EnumField("instance", _("实例"))
+
+
 class FlowErrCode(int, StructuredEnum):
     """flow的错误代码"""
 
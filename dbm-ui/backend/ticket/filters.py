@@ -12,8 +12,8 @@ specific language governing permissions and limitations under the License.
 from django.utils.translation import ugettext_lazy as _
 from django_filters import rest_framework as filters
 
-from backend.db_meta.models import Cluster
-from backend.ticket.models import ClusterOperateRecord, Ticket
+from backend.ticket.constants import TicketRelatedObjectType
+from backend.ticket.models import Ticket
 
 
 class TicketListFilter(filters.FilterSet):
@@ -33,9 +33,10 @@ class TicketListFilter(filters.FilterSet):
         }
 
     def filter_cluster(self, queryset, name, value):
-        clusters = Cluster.objects.filter(immute_domain__icontains=value).values_list("id", flat=True)
-        records = ClusterOperateRecord.objects.filter(cluster_id__in=clusters).values_list("id", flat=True)
-        return queryset.filter(clusteroperaterecord__in=records)
+        return queryset.filter(
+            related_objects__object_type=TicketRelatedObjectType.CLUSTER,
+            related_objects__display_name__icontains=value,
+        ).distinct()
 
     def filter_ids(self, queryset, name, value):
         ids = list(map(int, value.split(",")))
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import json
+import time
+from typing import Dict, Iterable, List
+
+from backend.ticket.constants import (
+    EXCLUSIVE_WAIT_CLUSTER_QUEUE_KEY,
+    EXCLUSIVE_WAIT_FLOW_CLUSTERS_KEY,
+    EXCLUSIVE_WAIT_FLOWS_KEY,
+    EXCLUSIVE_WAIT_STATS_KEY,
+)
+from backend.utils.redis import RedisConn
+
+
+class ExclusiveWaitQueue:
+    """
+    执行互斥的等待队列
+    因执行互斥而阻塞的inner flow按集群入队，集群上的inner flow结束后只唤醒等待该集群的flow，并按入队顺序(FIFO)重试
+    """
+
+    @classmethod
+    def _cluster_queue_key(cls, cluster_id: int) -> str:
+        return EXCLUSIVE_WAIT_CLUSTER_QUEUE_KEY.format(cluster_id=cluster_id)
+
+    @classmethod
+    def enqueue(cls, flow_id: int, cluster_ids: List[int]):
+        """
+        互斥阻塞的flow入队，重复入队时保留首次入队时间，保证唤醒顺序不变
+        @param flow_id: 阻塞的flow ID
+        @param cluster_ids: flow操作的集群ID列表
+        """
+        if not cluster_ids:
+            return
+
+        now = time.time()
+        pipeline = RedisConn.pipeline(transaction=False)
+        pipeline.zadd(EXCLUSIVE_WAIT_FLOWS_KEY, {flow_id: now}, nx=True)
+        pipeline.hset(EXCLUSIVE_WAIT_FLOW_CLUSTERS_KEY, flow_id, json.dumps(cluster_ids))
+        for cluster_id in cluster_ids:
+            pipeline.zadd(cls._cluster_queue_key(cluster_id), {flow_id: now}, nx=True)
+        pipeline.execute()
+
+    @classmethod
+    def dequeue(cls, flow_ids: Iterable[int]):
+        """
+        flow出队，并记录等待时间
+        @param flow_ids: 出队的flow ID列表
+        """
+        flow_ids = [str(flow_id) for flow_id in flow_ids]
+        if not flow_ids:
+            return
+
+        pipeline = RedisConn.pipeline(transaction=False)
+        for flow_id in flow_ids:
+            pipeline.zscore(EXCLUSIVE_WAIT_FLOWS_KEY, flow_id)
+        pipeline.hmget(EXCLUSIVE_WAIT_FLOW_CLUSTERS_KEY, flow_ids)
+        *enqueue_times, flow_clusters = pipeline.execute()
+
+        now = time.time()
+        pipeline = RedisConn.pipeline(transaction=False)
+        for flow_id, cluster_ids in zip(flow_ids, flow_clusters):
+            for cluster_id in json.loads(cluster_ids or "[]"):
+                pipeline.zrem(cls._cluster_queue_key(cluster_id), flow_id)
+        pipeline.zrem(EXCLUSIVE_WAIT_FLOWS_KEY, *flow_ids)
+        pipeline.hdel(EXCLUSIVE_WAIT_FLOW_CLUSTERS_KEY, *flow_ids)
+
+        enqueue_times = [enqueue_time for enqueue_time in enqueue_times if enqueue_time is not None]
+        pipeline.hincrby(EXCLUSIVE_WAIT_STATS_KEY, "dequeued", len(enqueue_times))
+        pipeline.hincrbyfloat(EXCLUSIVE_WAIT_STATS_KEY, "total_wait_seconds", sum(now - t for t in enqueue_times))
+        pipeline.execute()
+
+    @classmethod
+    def has_waiters(cls, cluster_ids: List[int]) -> bool:
+        """判断集群上是否有等待的flow"""
+        if not cluster_ids:
+            return False
+        pipeline = RedisConn.pipeline(transaction=False)
+        for cluster_id in cluster_ids:
+            pipeline.exists(cls._cluster_queue_key(cluster_id))
+        return any(pipeline.execute())
+
+    @classmethod
+    def get_waiting_flow_ids(cls, cluster_ids: List[int]) -> List[int]:
+        """
+        获取等待集群的flow，多个集群的等待队列合并后按入队时间排序
+        @param cluster_ids: 释放的集群ID列表
+        """
+        pipeline = RedisConn.pipeline(transaction=False)
+        for cluster_id in cluster_ids:
+            pipeline.zrange(cls._cluster_queue_key(cluster_id), 0, -1, withscores=True)
+
+        flow_enqueue_time: Dict[int, float] = {}
+        for queue in pipeline.execute():
+            for flow_id, enqueue_time in queue:
+                flow_enqueue_time[int(flow_id)] = enqueue_time
+
+        RedisConn.hincrby(EXCLUSIVE_WAIT_STATS_KEY, "wakeups")
+        return sorted(flow_enqueue_time, key=lambda flow_id: (flow_enqueue_time[flow_id], flow_id))
+
+    @classmethod
+    def get_all_waiting_flow_ids(cls) -> List[int]:
+        """获取全部等待中的flow，按入队时间排序"""
+        return [int(flow_id) for flow_id in RedisConn.zrange(EXCLUSIVE_WAIT_FLOWS_KEY, 0, -1)]
+
+    @classmethod
+    def stats(cls) -> Dict[str, float]:
+        """
+        等待队列的统计指标
+        depth: 当前等待的flow数量; max_wait_seconds: 当前最长的等待时间;
+        wakeups: 累计唤醒次数; dequeued: 累计出队数量; avg_wait_seconds: 已出队flow的平均等待时间
+        """
+        pipeline = RedisConn.pipeline(transaction=False)
+        pipeline.zcard(EXCLUSIVE_WAIT_FLOWS_KEY)
+        pipeline.zrange(EXCLUSIVE_WAIT_FLOWS_KEY, 0, 0, withscores=True)
+        pipeline.hgetall(EXCLUSIVE_WAIT_STATS_KEY)
+        depth, oldest, counter = pipeline.execute()
+
+        dequeued = int(counter.get("dequeued", 0))
+        total_wait_seconds = float(counter.get("total_wait_seconds", 0))
+        return {
+            "depth": depth,
+            "max_wait_seconds": round(time.time() - oldest[0][1], 2) if oldest else 0,
+            "wakeups": int(counter.get("wakeups", 0)),
+            "dequeued": dequeued,
+            "avg_wait_seconds": round(total_wait_seconds / dequeued, 2) if dequeued else 0,
+        }
@@ -26,6 +26,7 @@ from backend.ticket import constants
 from backend.ticket.builders.common.base import fetch_cluster_ids
 from backend.ticket.constants import BAMBOO_STATE__TICKET_STATE_MAP, FlowCallbackType, TicketType
 from backend.ticket.flow_manager.base import BaseTicketFlow
+from backend.ticket.flow_manager.exclusive_queue import ExclusiveWaitQueue
 from backend.ticket.models import Flow
 from backend.utils.basic import generate_root_id
 from backend.utils.time import datetime2str
@@ -123,8 +124,10 @@ class InnerFlow(BaseTicketFlow):
         )
 
     def handle_exclusive_error(self):
-        """处理执行互斥后重试的逻辑"""
-        pass
+        """处理执行互斥后重试的逻辑：自动重试的flow进入集群等待队列，待集群上的操作结束后唤醒"""
+        if self.flow_obj.err_code != constants.FlowErrCode.AUTO_EXCLUSIVE_ERROR:
+            return
+        ExclusiveWaitQueue.enqueue(self.flow_obj.id, fetch_cluster_ids(details=self.ticket.details))
 
     def callback(self, callback_type: FlowCallbackType) -> None:
         """
@@ -155,6 +158,7 @@ class InnerFlow(BaseTicketFlow):
             )
             # 处理互斥异常和非预期的异常
             self.run_error_status_handler(err)
+            self.handle_exclusive_error()
             return
         else:
             # 记录inner flow的集群动作和实例动作
@@ -11,6 +11,7 @@ specific language governing permissions and limitations under the License.
 import itertools
 import json
 import logging
+from collections import defaultdict
 from typing import Dict, List
 
 from django.db import transaction
@@ -33,17 +34,69 @@ from backend.ticket.constants import (
     FlowTypeConfig,
     OperateNodeActionType,
     TicketFlowStatus,
+    TicketRelatedObjectType,
     TicketType,
 )
 from backend.ticket.exceptions import TicketFlowsConfigException
 from backend.ticket.flow_manager.manager import TicketFlowManager
-from backend.ticket.models import Flow, Ticket, TicketFlowsConfig, Todo
+from backend.ticket.models import Flow, Ticket, TicketFlowsConfig, TicketObjectRelation, Todo
 from backend.ticket.todos import ActionType, TodoActorFactory
 
 logger = logging.getLogger("root")
 
 
 class TicketHandler:
+    @classmethod
+    def sync_related_objects(cls, tickets: List[Ticket]):
+        """
+        解析单据details，写入单据与集群/实例的关系表
+        @param tickets: 单据列表(需要已经补充了集群、实例详情)
+        """
+        relations: List[TicketObjectRelation] = []
+        ticket_cluster_ids_map: Dict[int, List[int]] = {}
+        cluster_id_immute_domain_map: Dict[int, str] = {}
+        for ticket in tickets:
+            clusters = ticket.details.get("clusters", {})
+            cluster_id_immute_domain_map.update(
+                {int(cluster_id): info["immute_domain"] for cluster_id, info in clusters.items()}
+            )
+            ticket_cluster_ids_map[ticket.id] = fetch_cluster_ids(ticket.details)
+
+            # 实例ID可能是字符串，无法转换为ID的忽略
+            instances = ticket.details.get("instances", {})
+            for inst_id in set(fetch_instance_ids(ticket.details)):
+                if not str(inst_id).isdigit():
+                    continue
+                relations.append(
+                    TicketObjectRelation(
+                        ticket=ticket,
+                        object_type=TicketRelatedObjectType.INSTANCE,
+                        object_id=int(inst_id),
+                        display_name=instances.get(str(inst_id), {}).get("instance", ""),
+                    )
+                )
+
+        # details中没有补充集群信息的，从集群表中补充域名，方便按域名过滤
+        all_cluster_ids = set(itertools.chain(*ticket_cluster_ids_map.values()))
+        missing_cluster_ids = all_cluster_ids - set(cluster_id_immute_domain_map.keys())
+        cluster_id_immute_domain_map.update(Cluster.get_cluster_id_immute_domain_map(list(missing_cluster_ids)))
+        for ticket in tickets:
+            relations.extend(
+                [
+                    TicketObjectRelation(
+                        ticket=ticket,
+                        object_type=TicketRelatedObjectType.CLUSTER,
+                        object_id=cluster_id,
+                        display_name=cluster_id_immute_domain_map.get(cluster_id, ""),
+                    )
+                    for cluster_id in set(ticket_cluster_ids_map[ticket.id])
+                ]
+            )
+
+        with transaction.atomic():
+            TicketObjectRelation.objects.filter(ticket__in=tickets).delete()
+            TicketObjectRelation.objects.bulk_create(relations, batch_size=1000)
+
     @classmethod
     def add_related_object(cls, ticket_data: List[Dict]) -> List[Dict]:
         """
@@ -53,46 +106,19 @@ class TicketHandler:
         - ...
         """
         ticket_ids = [ticket["id"] for ticket in ticket_data]
-        # 单据关联对象映射表
-        ticket_id_obj_ids_map: Dict[int, Dict[str, List[int]]] = {}
-
-        # 查询单据对应的集群列表、实例列表等
-        cluster_id_immute_domain_map, instance_id_ip_port_map = {}, {}
-        for ticket in Ticket.objects.filter(id__in=ticket_ids):
-            clusters = ticket.details.get("clusters", {})
-            cluster_id_immute_domain_map.update(
-                {int(cluster_id): info["immute_domain"] for cluster_id, info in clusters.items()}
-            )
-            instances = ticket.details.get("instances", {})
-            instance_id_ip_port_map.update({int(inst_id): info["instance"] for inst_id, info in instances.items()})
-            ticket_id_obj_ids_map[ticket.id] = {
-                "cluster_ids": fetch_cluster_ids(ticket.details),
-                "instance_ids": fetch_instance_ids(ticket.details),
-            }
+        # 单据关联对象映射表：{ticket_id: {object_type: [display_name]}}
+        ticket_id_objects_map: Dict[int, Dict[str, List[str]]] = defaultdict(lambda: defaultdict(list))
+        relations = TicketObjectRelation.objects.filter(ticket_id__in=ticket_ids).exclude(display_name="")
+        for relation in relations.order_by("id"):
+            ticket_id_objects_map[relation.ticket_id][relation.object_type].append(relation.display_name)
 
-        # 补充关联对象信息
+        # 补充关联对象信息，实例信息优先于集群信息
         for item in ticket_data:
-            ticket_cluster_ids = ticket_id_obj_ids_map[item["id"]]["cluster_ids"]
-            if ticket_cluster_ids:
-                item["related_object"] = {
-                    "title": _("集群"),
-                    "objects": [
-                        cluster_id_immute_domain_map.get(cluster_id)
-                        for cluster_id in ticket_cluster_ids
-                        if cluster_id_immute_domain_map.get(cluster_id)
-                    ],
-                }
-
-            ticket_instance_ids = ticket_id_obj_ids_map[item["id"]]["instance_ids"]
-            if ticket_instance_ids:
-                item["related_object"] = {
-                    "title": _("实例"),
-                    "objects": [
-                        instance_id_ip_port_map.get(instance_id)
-                        for instance_id in ticket_instance_ids
-                        if instance_id_ip_port_map.get(instance_id)
-                    ],
-                }
+            objects_map = ticket_id_objects_map.get(item["id"], {})
+            if objects_map.get(TicketRelatedObjectType.INSTANCE):
+                item["related_object"] = {"title": _("实例"), "objects": objects_map[TicketRelatedObjectType.INSTANCE]}
+            elif objects_map.get(TicketRelatedObjectType.CLUSTER):
+                item["related_object"] = {"title": _("集群"), "objects": objects_map[TicketRelatedObjectType.CLUSTER]}
         return ticket_data
 
     @classmethod
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import logging
+
+from django.core.management.base import BaseCommand
+from django.utils.translation import gettext_lazy as _
+
+from backend.ticket.handler import TicketHandler
+from backend.ticket.models import Ticket
+
+logger = logging.getLogger("root")
+
+
+class Command(BaseCommand):
+    help = _("回填单据与集群/实例的关联关系表")
+
+    def add_arguments(self, parser):
+        parser.add_argument("-b", "--batch-size", type=int, default=500, help=_("每批处理的单据数量"))
+        parser.add_argument("-s", "--start-id", type=int, default=0, help=_("从该单据ID开始回填"))
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        start_id = options["start_id"]
+
+        # 按ID游标分批处理，避免一次性加载所有单据的details
+        while True:
+            tickets = list(Ticket.objects.filter(id__gt=start_id).order_by("id")[:batch_size])
+            if not tickets:
+                break
+            TicketHandler.sync_related_objects(tickets)
+            start_id = tickets[-1].id
+            logger.info(_("单据关联对象回填至单据: {}").format(start_id))
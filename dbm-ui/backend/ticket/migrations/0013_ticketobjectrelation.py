@@ -0,0 +1,53 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ticket", "0012_alter_ticket_remark"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TicketObjectRelation",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "object_type",
+                    models.CharField(
+                        choices=[("cluster", "集群"), ("instance", "实例")], max_length=32, verbose_name="对象类型"
+                    ),
+                ),
+                ("object_id", models.BigIntegerField(verbose_name="对象ID")),
+                (
+                    "display_name",
+                    models.CharField(default="", max_length=255, verbose_name="对象展示名(集群域名/实例IP:PORT)"),
+                ),
+                (
+                    "ticket",
+                    models.ForeignKey(
+                        help_text="关联单据",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="related_objects",
+                        to="ticket.ticket",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "单据关联对象(TicketObjectRelation)",
+                "verbose_name_plural": "单据关联对象(TicketObjectRelation)",
+                "unique_together": {("ticket", "object_type", "object_id")},
+            },
+        ),
+        migrations.AddIndex(
+            model_name="ticketobjectrelation",
+            index=models.Index(fields=["object_type", "object_id"], name="idx_ticket_rel_object_id"),
+        ),
+        migrations.AddIndex(
+            model_name="ticketobjectrelation",
+            index=models.Index(fields=["object_type", "display_name"], name="idx_ticket_rel_display_name"),
+        ),
+    ]
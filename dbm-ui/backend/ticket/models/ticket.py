@@ -11,6 +11,7 @@ specific language governing permissions and limitations under the License.
 
 import logging
 from collections import defaultdict
+from functools import lru_cache
 from typing import Any, Dict, List, Union
 
 from django.db import models, transaction
@@ -36,6 +37,18 @@ from backend.utils.time import calculate_cost_time
 logger = logging.getLogger("root")
 
 
+@lru_cache(maxsize=1)
+def get_exclusive_ticket_map() -> Dict[str, Dict[str, bool]]:
+    """解析单据互斥矩阵，进程内只解析一次"""
+    _exclusive_matrix = ExcelHandler.paser_matrix(EXCLUSIVE_TICKET_EXCEL_PATH)
+    _exclusive_ticket_map = defaultdict(dict)
+    for row_key, inner_dict in _exclusive_matrix.items():
+        for col_key, value in inner_dict.items():
+            row_key, col_key = TicketType.get_choice_value(row_key), TicketType.get_choice_value(col_key)
+            _exclusive_ticket_map[row_key][col_key] = value == "N"
+    return _exclusive_ticket_map
+
+
 class Flow(models.Model):
     """
     单据流程
@@ -66,6 +79,13 @@ class Flow(models.Model):
         verbose_name_plural = verbose_name = _("单据流程(Flow)")
         indexes = [models.Index(fields=["err_code"])]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 记录加载时的状态，保存时据此判断状态是否发生变更
+        instance._loaded_status = instance.__dict__.get("status")
+        return instance
+
     def update_details(self, **kwargs):
         self.details.update(kwargs)
         self.save(update_fields=["details", "update_at"])
@@ -179,6 +199,7 @@ class Ticket(AuditedModel):
         """
 
         from backend.ticket.builders import BuilderFactory
+        from backend.ticket.handler import TicketHandler
 
         with transaction.atomic():
             send_msg_config = send_msg_config or {}
@@ -196,6 +217,7 @@ class Ticket(AuditedModel):
             builder = BuilderFactory.create_builder(ticket)
             builder.patch_ticket_detail()
             builder.init_ticket_flows()
+            TicketHandler.sync_related_objects([ticket])
 
         if auto_execute:
             # 开始单据流程
@@ -273,15 +295,23 @@ class ClusterOperateRecordManager(models.Manager):
 
     def filter_inner_actives(self, cluster_id, *args, **kwargs):
         """获取集群正在运行的inner flow的单据记录。此时认为集群会在互斥阶段"""
+        return self.filter_batch_inner_actives([cluster_id], *args, **kwargs)
+
+    def filter_batch_inner_actives(self, cluster_ids: List[int], *args, **kwargs):
+        """批量获取集群正在运行的inner flow的单据记录，并预加载关联的单据和流程"""
         # 排除特定的单据，如自身单据重试排除自身
         exclude_ticket_ids = kwargs.pop("exclude_ticket_ids", [])
-        return self.filter(
-            cluster_id=cluster_id,
-            flow__flow_type=FlowType.INNER_FLOW,
-            flow__status=TicketFlowStatus.RUNNING,
-            *args,
-            **kwargs,
-        ).exclude(flow__ticket_id__in=exclude_ticket_ids)
+        return (
+            self.filter(
+                cluster_id__in=cluster_ids,
+                flow__flow_type=FlowType.INNER_FLOW,
+                flow__status=TicketFlowStatus.RUNNING,
+                *args,
+                **kwargs,
+            )
+            .exclude(flow__ticket_id__in=exclude_ticket_ids)
+            .select_related("ticket", "flow")
+        )
 
     def get_cluster_operations(self, cluster_id, **kwargs):
         """集群上的正在运行的操作列表"""
@@ -289,33 +319,27 @@ class ClusterOperateRecordManager(models.Manager):
 
     def has_exclusive_operations(self, ticket_type, cluster_id, **kwargs):
         """判断当前单据类型与集群正在进行中的单据是否互斥"""
-        active_tickets = self.filter_inner_actives(cluster_id, **kwargs)
-        exclusive_infos = []
-        for active_ticket in active_tickets:
-            try:
-                if self.exclusive_ticket_map[ticket_type][active_ticket.ticket.ticket_type]:
-                    exclusive_infos.append(
-                        {"exclusive_ticket": active_ticket.ticket, "root_id": active_ticket.flow.flow_obj_id}
-                    )
-            except KeyError:
-                pass
-
-        return exclusive_infos
+        return self.batch_has_exclusive_operations(ticket_type, [cluster_id], **kwargs).get(cluster_id, [])
+
+    def batch_has_exclusive_operations(self, ticket_type, cluster_ids: List[int], **kwargs) -> Dict[int, List[Dict]]:
+        """
+        批量判断当前单据类型与集群正在进行中的单据是否互斥，一次查询所有集群的运行记录后在内存中比对互斥矩阵
+        @param ticket_type: 当前单据类型
+        @param cluster_ids: 集群ID列表
+        @return: {cluster_id: [互斥信息]}，只包含存在互斥的集群
+        """
+        exclusive_map = self.exclusive_ticket_map.get(ticket_type, {})
+        cluster_exclusive_infos: Dict[int, List[Dict]] = defaultdict(list)
+        for active_ticket in self.filter_batch_inner_actives(cluster_ids, **kwargs):
+            if exclusive_map.get(active_ticket.ticket.ticket_type):
+                cluster_exclusive_infos[active_ticket.cluster_id].append(
+                    {"exclusive_ticket": active_ticket.ticket, "root_id": active_ticket.flow.flow_obj_id}
+                )
+        return cluster_exclusive_infos
 
     @property
     def exclusive_ticket_map(self):
-        if hasattr(self, "_exclusive_ticket_map"):
-            return self._exclusive_ticket_map
-
-        _exclusive_matrix = ExcelHandler.paser_matrix(EXCLUSIVE_TICKET_EXCEL_PATH)
-        _exclusive_ticket_map = defaultdict(dict)
-        for row_key, inner_dict in _exclusive_matrix.items():
-            for col_key, value in inner_dict.items():
-                row_key, col_key = TicketType.get_choice_value(row_key), TicketType.get_choice_value(col_key)
-                _exclusive_ticket_map[row_key][col_key] = value == "N"
-
-        setattr(self, "_exclusive_ticket_map", _exclusive_ticket_map)
-        return self._exclusive_ticket_map
+        return get_exclusive_ticket_map()
 
 
 class ClusterOperateRecord(AuditedModel):
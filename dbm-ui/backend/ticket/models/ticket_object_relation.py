@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from django.db import models
+from django.utils.translation import ugettext_lazy as _
+
+from backend.bk_web.constants import LEN_LONG
+from backend.ticket.constants import TicketRelatedObjectType
+
+
+class TicketObjectRelation(models.Model):
+    """
+    单据与关联对象(集群、实例)的关系表
+    在单据创建时写入，避免列表页展示和过滤时递归解析单据details
+    """
+
+    ticket = models.ForeignKey("Ticket", help_text=_("关联单据"), related_name="related_objects", on_delete=models.CASCADE)
+    object_type = models.CharField(_("对象类型"), choices=TicketRelatedObjectType.get_choices(), max_length=32)
+    object_id = models.BigIntegerField(_("对象ID"))
+    display_name = models.CharField(_("对象展示名(集群域名/实例IP:PORT)"), max_length=LEN_LONG, default="")
+
+    class Meta:
+        verbose_name_plural = verbose_name = _("单据关联对象(TicketObjectRelation)")
+        unique_together = (("ticket", "object_type", "object_id"),)
+        indexes = [
+            models.Index(fields=["object_type", "object_id"], name="idx_ticket_rel_object_id"),
+            models.Index(fields=["object_type", "display_name"], name="idx_ticket_rel_display_name"),
+        ]
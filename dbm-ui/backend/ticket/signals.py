@@ -8,8 +8,10 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+from backend.ticket.constants import FLOW_TERMINAL_STATUS, FlowType
+from backend.ticket.flow_manager.exclusive_queue import ExclusiveWaitQueue
 from backend.ticket.flow_manager.manager import TicketFlowManager
-from backend.ticket.models import Flow
+from backend.ticket.models import ClusterOperateRecord, Flow
 
 
 def update_ticket_status(sender, instance: Flow, **kwargs):
@@ -19,3 +21,24 @@ def update_ticket_status(sender, instance: Flow, **kwargs):
     if not instance.pk:
         return
     TicketFlowManager(instance.ticket).update_ticket_status()
+
+
+def wake_exclusive_waiting_flows(sender, instance: Flow, created=False, update_fields=None, **kwargs):
+    """
+    inner flow的状态变更为结束态时，集群操作记录随之释放，唤醒等待这些集群的互斥flow
+    """
+    loaded_status = getattr(instance, "_loaded_status", None)
+    instance._loaded_status = instance.status
+    if instance.flow_type != FlowType.INNER_FLOW or instance.status not in FLOW_TERMINAL_STATUS:
+        return
+    # 只处理状态变更的保存：未保存状态字段，或状态与上次加载/保存时相同的跳过
+    if created or (update_fields and "status" not in update_fields) or loaded_status == instance.status:
+        return
+
+    cluster_ids = list(ClusterOperateRecord.objects.filter(flow=instance).values_list("cluster_id", flat=True))
+    if not ExclusiveWaitQueue.has_waiters(cluster_ids):
+        return
+
+    from backend.ticket.tasks.ticket_tasks import wake_exclusive_inner_flow
+
+    wake_exclusive_inner_flow.apply_async(args=(cluster_ids,))
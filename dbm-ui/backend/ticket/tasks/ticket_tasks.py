@@ -45,6 +45,7 @@ from backend.ticket.constants import (
     TodoType,
 )
 from backend.ticket.exceptions import TicketTaskTriggerException
+from backend.ticket.flow_manager.exclusive_queue import ExclusiveWaitQueue
 from backend.ticket.flow_manager.inner import InnerFlow
 from backend.ticket.models.ticket import Flow, Ticket, TicketFlowsConfig
 from backend.utils.time import date2str, datetime2str
@@ -68,8 +69,12 @@ class TicketTask(object):
 
     @classmethod
     def retry_exclusive_inner_flow(cls) -> None:
-        """重试互斥错误的inner flow"""
+        """兜底重试互斥错误的inner flow，正常情况下由集群操作释放时的唤醒事件触发重试"""
         to_retry_flows = Flow.objects.filter(err_code=FlowErrCode.AUTO_EXCLUSIVE_ERROR)
+        # 清理已不再处于互斥等待的flow(如已被终止)
+        waiting_flow_ids = set(ExclusiveWaitQueue.get_all_waiting_flow_ids())
+        ExclusiveWaitQueue.dequeue(waiting_flow_ids - set(to_retry_flows.values_list("id", flat=True)))
+        logger.info(f"exclusive wait queue stats: {ExclusiveWaitQueue.stats()}")
         if not to_retry_flows:
             return
 
@@ -81,6 +86,25 @@ class TicketTask(object):
         for flow in to_retry_flows:
             InnerFlow(flow_obj=flow).retry()
 
+    @classmethod
+    def wake_exclusive_inner_flow(cls, cluster_ids: List[int]) -> None:
+        """
+        集群上的inner flow结束后，按入队顺序重试等待这些集群的互斥flow
+        仍然互斥的flow会保留原有的入队时间重新入队
+        @param cluster_ids: 释放的集群ID列表
+        """
+        waiting_flow_ids = ExclusiveWaitQueue.get_waiting_flow_ids(cluster_ids)
+        flows = Flow.objects.in_bulk(waiting_flow_ids)
+        for flow_id in waiting_flow_ids:
+            flow = flows.get(flow_id)
+            if not flow or flow.err_code != FlowErrCode.AUTO_EXCLUSIVE_ERROR:
+                ExclusiveWaitQueue.dequeue([flow_id])
+                continue
+
+            InnerFlow(flow_obj=flow).retry()
+            if flow.err_code != FlowErrCode.AUTO_EXCLUSIVE_ERROR:
+                ExclusiveWaitQueue.dequeue([flow_id])
+
     @classmethod
     def _create_ticket(cls, ticket_type, creator, bk_biz_id, remark, details) -> None:
         """创建一个新单据"""
@@ -308,6 +332,12 @@ def apply_ticket_task(
     return res
 
 
+@shared_task
+def wake_exclusive_inner_flow(cluster_ids: List[int]):
+    """唤醒等待集群的互斥flow"""
+    TicketTask.wake_exclusive_inner_flow(cluster_ids)
+
+
 @shared_task
 def send_msg_for_flow(
     flow_id: int,
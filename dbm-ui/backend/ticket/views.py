@@ -220,6 +220,7 @@ class TicketViewSet(viewsets.AuditedModelViewSet):
             builder = BuilderFactory.create_builder(ticket)
             builder.patch_ticket_detail()
             builder.init_ticket_flows()
+            TicketHandler.sync_related_objects([ticket])
 
         TicketFlowManager(ticket=ticket).run_next_flow()
 
@@ -8,6 +8,7 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+import itertools
 import uuid
 from collections import Counter, namedtuple
 from copy import deepcopy
@@ -84,6 +85,16 @@ def chunk_lists(lst: List[Any], n) -> List[Any]:
         yield lst[idx : idx + n]
 
 
+def chunk_iterable(iterable: Iterable[Any], n) -> Iterable[List[Any]]:
+    """将任意可迭代对象(如生成器、queryset.iterator())按n个一组切分，不需要预先物化为列表"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, n))
+        if not chunk:
+            return
+        yield chunk
+
+
 def distinct_dict_list(dict_list: list):
     """
     返回去重后字典列表，仅支持value为不可变对象的字典
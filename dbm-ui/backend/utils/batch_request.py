@@ -8,13 +8,17 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures import as_completed, wait
 from copy import deepcopy
 from multiprocessing.pool import ThreadPool
-from typing import Callable
+from typing import Any, Callable, Iterable, List, Optional
 
 import wrapt
 from django.conf import settings
+from django.db import connections
 from django.utils.translation import get_language
 
 from backend.core.translation.context import RespectsLanguage
@@ -25,6 +29,8 @@ WRITE_CMDB_LIMIT = 500
 QUERY_CMDB_MODULE_LIMIT = 500
 QUERY_CLOUD_LIMIT = 200
 QUERY_ITSM_LIMIT = 200
+# 并发扇出时检查任务超时的间隔(秒)
+FAN_OUT_POLL_INTERVAL = 0.5
 
 
 def inject_request(func: Callable):
@@ -71,7 +77,7 @@ def batch_request(
     limit=QUERY_CMDB_LIMIT,
     sort=None,
     split_params=False,
-    **kwargs
+    **kwargs,
 ):
     """
     异步并发请求接口
@@ -183,6 +189,60 @@ def request_multi_thread(func, params_list, get_data=lambda x: [], in_order=Fals
     return result
 
 
+def request_fan_out(
+    func: Callable[[Any], Any],
+    items: Iterable[Any],
+    max_workers: int = None,
+    timeout: Optional[float] = None,
+) -> List[Any]:
+    """
+    有界并发地对每个元素执行func，按元素顺序返回结果
+    - 并发数不超过max_workers，默认为settings.CONCURRENT_NUMBER
+    - 任一任务抛出异常或者执行超过timeout秒时，取消未开始的任务并抛出该异常
+    - 每个任务结束后关闭工作线程的数据库连接，避免线程退出后连接泄露
+    :param func: 任务函数，接收单个元素
+    :param items: 元素列表
+    :param max_workers: 最大并发数
+    :param timeout: 单个任务的超时时间(秒)，从任务开始执行时计算，为空表示不超时
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    start_times = {}
+
+    def _run(index, item):
+        start_times[index] = time.time()
+        try:
+            return func(item)
+        finally:
+            connections.close_all()
+
+    results = [None] * len(items)
+    executor = ThreadPoolExecutor(max_workers=min(len(items), max_workers or settings.CONCURRENT_NUMBER))
+    run = RespectsLanguage(language=get_language())(_run)
+    futures = {executor.submit(run, index, item): index for index, item in enumerate(items)}
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=FAN_OUT_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[futures[future]] = future.result()
+
+            if not timeout:
+                continue
+            now = time.time()
+            for future in pending:
+                index = futures[future]
+                if index in start_times and now - start_times[index] > timeout:
+                    raise FutureTimeoutError(f"task of {items[index]} timeout after {timeout}s")
+    finally:
+        # 超时的任务无法被中断，只能取消尚未开始的任务，不等待运行中的任务结束
+        executor.shutdown(wait=not pending, cancel_futures=True)
+
+    return results
+
+
 def batch_decorator(
     batch=True,
     is_classmethod=False,
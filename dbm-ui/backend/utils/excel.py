@@ -9,23 +9,34 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 
+import itertools
+import tempfile
 from collections import defaultdict
 from io import BytesIO
-from typing import Any, Dict, List, Union
+from typing import Any, Dict, Iterable, List, Union
 
 import openpyxl
 from django.http.response import HttpResponse, StreamingHttpResponse
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Alignment, PatternFill
+from openpyxl.utils import get_column_letter
 from openpyxl.worksheet.worksheet import Worksheet
 from openpyxl.writer.excel import save_virtual_workbook
 
+from backend.constants import EXCEL_STREAM_CHUNK_SIZE, EXCEL_WIDTH_SAMPLE_ROWS
+
 
 class ExcelHandler:
     """
     封装常用的excel处理函数
     """
 
+    @classmethod
+    def _text_width(cls, value: Any) -> float:
+        """单元格内容的显示宽度，同一单元格中通过\n分割的字符视为独立的长度"""
+        return max(len(cell_str.encode("gbk", errors="replace")) for cell_str in str(value).split("\n")) * 1.3
+
     @classmethod
     def _adapt_sheet_weight_height(cls, sheet: Worksheet, first_header_row: int = 1):
         """
@@ -46,12 +57,11 @@ class ExcelHandler:
                 cell = sheet.cell(row, col)
                 cell.alignment = Alignment(wrapText=True)
 
-                cell_str_len_list = [len(cell_str.encode("gbk")) for cell_str in str(cell.value).split("\n")]
-                max_col_dimensions[col] = max(max_col_dimensions[col], max(cell_str_len_list) * 1.3)
+                max_col_dimensions[col] = max(max_col_dimensions[col], cls._text_width(cell.value))
 
         # 自动调整列宽度
         for col in range(1, col_num + 1):
-            sheet.column_dimensions[chr(ord("A") + col - 1)].width = max_col_dimensions[col]
+            sheet.column_dimensions[get_column_letter(col)].width = max_col_dimensions[col]
 
     @classmethod
     def paser(cls, excel: BytesIO, header_row: int = 0, sheet_name: str = "") -> List[Dict]:
@@ -164,6 +174,92 @@ class ExcelHandler:
         return response
 
     @classmethod
-    def stream_response(cls, wb: Workbook, excel_name: str) -> StreamingHttpResponse:
-        # TODO 如果excel文件过大，需采用流式返回，待实现
-        raise NotImplementedError
+    def serialize_stream(
+        cls,
+        rows: Iterable[Dict],
+        headers: List,
+        header_style: Dict = None,
+        match_header: bool = True,
+        sample_size: int = EXCEL_WIDTH_SAMPLE_ROWS,
+    ) -> Workbook:
+        """
+        - 将数据行流式序列化为只写模式的excel对象，适用于大数据量的导出
+        - 数据行逐行写入临时文件，不在内存中保留整个表格；列宽根据前sample_size行采样计算
+        :param rows: 数据行的可迭代对象，可以是生成器
+        :param headers: excel数据头 [{"id": "header_id", "name": "header_name"}]
+        :param header_style: excel的头部样式(颜色)
+        :param match_header: 数据是否匹配表头，如果为True，则根据 header 严格匹配列名，若不存在，则在该 cell 填充空
+        :param sample_size: 计算列宽的采样行数
+        """
+        wb: Workbook = Workbook(write_only=True)
+        sheet = wb.create_sheet()
+        header_ids = [header if isinstance(header, str) else header["id"] for header in headers]
+        header_names = [str(header if isinstance(header, str) else header["name"]) for header in headers]
+        wrap_alignment = Alignment(wrapText=True)
+
+        def to_values(_row: Dict) -> List[str]:
+            if match_header:
+                return [str(_row[header_id]) if header_id in _row else "" for header_id in header_ids]
+            return [str(value) for value in _row.values()]
+
+        # 只写模式下列宽需要在写入数据前设置，因此先缓存采样行计算列宽
+        rows = iter(rows)
+        sample_rows = [to_values(row) for row in itertools.islice(rows, sample_size)]
+        col_widths = [cls._text_width(name) for name in header_names]
+        for values in sample_rows:
+            for col, value in enumerate(values[: len(col_widths)]):
+                col_widths[col] = max(col_widths[col], cls._text_width(value))
+        for col, width in enumerate(col_widths):
+            sheet.column_dimensions[get_column_letter(col + 1)].width = width
+
+        header_cells = []
+        for name in header_names:
+            cell = WriteOnlyCell(sheet, value=name)
+            if header_style:
+                cell.fill = PatternFill("solid", fgColor=header_style[name])
+            header_cells.append(cell)
+        sheet.append(header_cells)
+
+        def to_cells(_values: List[str]) -> List[Union[str, WriteOnlyCell]]:
+            # 只有多行内容需要自动换行，其余单元格直接写入值，避免为每个单元格创建样式
+            cells = []
+            for value in _values:
+                if "\n" in value:
+                    value = WriteOnlyCell(sheet, value=value)
+                    value.alignment = wrap_alignment
+                cells.append(value)
+            return cells
+
+        for values in sample_rows:
+            sheet.append(to_cells(values))
+        for row in rows:
+            sheet.append(to_cells(to_values(row)))
+
+        return wb
+
+    @classmethod
+    def stream_response(
+        cls, wb: Workbook, excel_name: str, chunk_size: int = EXCEL_STREAM_CHUNK_SIZE
+    ) -> StreamingHttpResponse:
+        """
+        - 返回excel文件的StreamingHttpResponse，excel先写入临时文件，再分块返回
+        :param wb: excel的Workbook
+        :param excel_name: excel文件名
+        :param chunk_size: 每次返回的文件块大小
+        """
+        excel_file = tempfile.TemporaryFile()
+        wb.save(excel_file)
+        excel_file.seek(0)
+
+        def file_iterator():
+            with excel_file:
+                while True:
+                    chunk = excel_file.read(chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+
+        response = StreamingHttpResponse(file_iterator(), content_type="application/octet-stream")
+        response["Content-Disposition"] = f"attachment;filename={excel_name}"
+        response["Access-Control-Expose-Headers"] = "content-disposition"
+        return response